@@ -0,0 +1,35 @@
+'''Analyze Sidewall.py
+Part of the "Microscope Measurement Tools" scripts
+
+Measure the sidewall angle, etch depth & footing of an etched sidewall in a calibrated cross-section SEM image, without drawing lines by hand:
+the edge of the sidewall is found on every row of a region around it, and fitted with a robust (RANSAC) line, while the top surface & the floor
+are found on either side.  The results are in calibrated units, taking the pixel aspect ratio into account.
+Works on the current image (draw a rectangle around one sidewall to set the region), or on a whole directory of images with a pool of worker threads,
+writing one CSV row per image and optionally saving an annotated copy of each image, in the Draw Line colors.
+The default region & the side the material is on are set in `Microscope_Calibrations_user_settings.py`.
+
+The plugin itself is `mmtools.plugins.analyzeSidewall()`: this file only adds the "Microscope Measurement Tools" folder to `sys.path` and calls it,
+so nothing happens when it is imported, and no ImageJ classes are loaded until it runs.
+'''
+
+import sys, os
+
+
+
+def run():
+    '''This is the main function run when the plugin is called.'''
+    from mmtools import plugins
+    plugins.analyzeSidewall()
+#end run()
+
+
+
+# Fiji runs scripts as `__main__` (`__builtin__` in older versions), so importing this file elsewhere doesn't run anything:
+if __name__ in ('__main__', '__builtin__'):
+    # add the path to this script, so we can find `mmtools` & the user-settings
+    libpth = os.path.split(  os.path.split( sys.path[0] )[0]  )[0]  # path to Fiji folder
+    libpth = os.path.join(libpth, 'plugins', 'Analyze', 'Microscope Measurement Tools')
+    if libpth not in sys.path:
+        sys.path.append( libpth )
+
+    run()       # Run the script function!
@@ -0,0 +1,44 @@
+''' Batch_Microscope_Calibration.py
+Plugin for FIJI, to apply a microscope calibration to every image in a directory, without opening image windows.
+
+Uses the same calibrations as `Choose_Microscope_Calibration.py`, from the file `Microscope_Calibrations_user_settings.py`.
+Choose "Auto" to try each custom calibration class (eg. `JEOL_SEM_CalFromTxt`) on every image.
+The images are calibrated by a pool of worker threads and saved as TIFF (which stores the calibration): TIFFs in place,
+other formats as "<name>_cal.tif" next to them.
+With "Stamp TIFFs in place", the calibration is written into the header of each TIFF instead, without re-encoding the pixels.
+With "Add a scale bar", a scale bar is drawn into each saved image (or added to its overlay, with `useoverlay`), using the Draw Line settings.
+A line per file and a throughput summary are printed to the console.
+
+Can be run headless, eg.:
+    ImageJ --headless -eval 'run("Batch Microscope Calibration", "directory=/data/sem/*.tif calibration=Auto workers=8 save");'
+    ImageJ --headless -eval 'run("Batch Microscope Calibration", "directory=/data/sem calibration=Auto workers=8 stamp");'
+    ImageJ --headless -eval 'run("Batch Microscope Calibration", "directory=/data/sem calibration=Auto workers=8 save add");'
+
+
+Demis D. John, Univ. of California Santa Barbara, 2019
+
+The plugin itself is `mmtools.plugins.batchCalibration()`: this file only adds the "Microscope Measurement Tools" folder to `sys.path` and calls it,
+so nothing happens when it is imported, and no ImageJ classes are loaded until it runs.
+'''
+
+import sys, os
+
+
+
+def run():
+    '''This is the main function run when the plugin is called.'''
+    from mmtools import plugins
+    plugins.batchCalibration()
+#end run()
+
+
+
+# Fiji runs scripts as `__main__` (`__builtin__` in older versions), so importing this file elsewhere doesn't run anything:
+if __name__ in ('__main__', '__builtin__'):
+    # add the path to this script, so we can find `mmtools` & the user-settings
+    libpth = os.path.split(  os.path.split( sys.path[0] )[0]  )[0]  # path to Fiji folder
+    libpth = os.path.join(libpth, 'plugins', 'Analyze', 'Microscope Measurement Tools')
+    if libpth not in sys.path:
+        sys.path.append( libpth )
+
+    run()       # Run the script function!
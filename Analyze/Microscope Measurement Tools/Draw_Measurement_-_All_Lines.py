@@ -0,0 +1,33 @@
+'''Draw Measurement - All Lines.py
+Part of the "Microscope Measurement Tools" scripts
+
+Draw a Line & Length of the Line for every straight-line ROI in the ROI Manager, in one pass.
+ROIs that belong to a stack slice are drawn on that slice.
+Uses the same line & text settings as "Draw Measurement - Line", from `Microscope_Calibrations_user_settings.py`.
+The image is only updated once, after all the lines are drawn.
+
+The plugin itself is `mmtools.plugins.drawAllLines()`: this file only adds the "Microscope Measurement Tools" folder to `sys.path` and calls it,
+so nothing happens when it is imported, and no ImageJ classes are loaded until it runs.
+'''
+
+import sys, os
+
+
+
+def run():
+    '''This is the main function run when the plugin is called.'''
+    from mmtools import plugins
+    plugins.drawAllLines()
+#end run()
+
+
+
+# Fiji runs scripts as `__main__` (`__builtin__` in older versions), so importing this file elsewhere doesn't run anything:
+if __name__ in ('__main__', '__builtin__'):
+    # add the path to this script, so we can find `mmtools` & the user-settings
+    libpth = os.path.split(  os.path.split( sys.path[0] )[0]  )[0]  # path to Fiji folder
+    libpth = os.path.join(libpth, 'plugins', 'Analyze', 'Microscope Measurement Tools')
+    if libpth not in sys.path:
+        sys.path.append( libpth )
+
+    run()       # Run the script function!
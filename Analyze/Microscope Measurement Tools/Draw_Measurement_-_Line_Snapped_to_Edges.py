@@ -0,0 +1,33 @@
+'''Draw Measurement - Line Snapped to Edges.py
+Part of the "Microscope Measurement Tools" scripts
+
+Draw a Line & Length of the Line along the currently selected Line ROI, after moving its ends onto the strongest edges near them,
+eg. the sidewalls of a trench, so the measurement doesn't depend on how precisely the line was dragged.
+The edges are searched along the line, within `snapreach` pixels of each end, in a band `snapbandwidth` pixels wide (see `Microscope_Calibrations_user_settings.py`).
+Ends with no clear edge nearby stay where they were.  The line ROI is moved to the snapped ends.
+
+The plugin itself is `mmtools.plugins.drawMeasurementLine( snap=True )`: this file only adds the "Microscope Measurement Tools" folder to `sys.path` and calls it,
+so nothing happens when it is imported, and no ImageJ classes are loaded until it runs.
+'''
+
+import sys, os
+
+
+
+def run():
+    '''This is the main function run when the plugin is called.'''
+    from mmtools import plugins
+    plugins.drawMeasurementLine( snap=True )
+#end run()
+
+
+
+# Fiji runs scripts as `__main__` (`__builtin__` in older versions), so importing this file elsewhere doesn't run anything:
+if __name__ in ('__main__', '__builtin__'):
+    # add the path to this script, so we can find `mmtools` & the user-settings
+    libpth = os.path.split(  os.path.split( sys.path[0] )[0]  )[0]  # path to Fiji folder
+    libpth = os.path.join(libpth, 'plugins', 'Analyze', 'Microscope Measurement Tools')
+    if libpth not in sys.path:
+        sys.path.append( libpth )
+
+    run()       # Run the script function!
@@ -0,0 +1,39 @@
+''' Export_Annotated_Images.py
+Plugin for FIJI, to publish annotated copies of every image in a directory, without opening image windows.
+
+Each image is calibrated (with the chosen calibration, or "Auto"), the line ROIs of the ROI set saved next to it (`<image>.zip`, `<image>_RoiSet.zip` or `<image>.roi`)
+are drawn with their calibrated lengths, as by `Draw_Measurement_-_Line.py`, and a scale bar is added.  The copies are saved as "<image>_annotated.png" (or .jpg, .tif, .zip),
+next to the images or in an output directory.
+Reading, drawing & writing overlap: they run on their own threads, joined by bounded queues, with at most a few images open at once (`exportinflight` in the settings).
+With "Draw into the TIFFs in place", huge uncompressed TIFFs (eg. stitched mosaics) are annotated in their own files instead, without decoding them:
+only the strips or tiles under the lines & their text are read & rewritten.
+
+Can be run headless, eg.:
+    ImageJ --headless -eval 'run("Export Annotated Images", "directory=/data/sem output=/data/publish calibration=Auto format=jpg jpeg=90 scale");'
+
+
+The plugin itself is `mmtools.plugins.exportAnnotatedImages()`: this file only adds the "Microscope Measurement Tools" folder to `sys.path` and calls it,
+so nothing happens when it is imported, and no ImageJ classes are loaded until it runs.
+'''
+
+import sys, os
+
+
+
+def run():
+    '''This is the main function run when the plugin is called.'''
+    from mmtools import plugins
+    plugins.exportAnnotatedImages()
+#end run()
+
+
+
+# Fiji runs scripts as `__main__` (`__builtin__` in older versions), so importing this file elsewhere doesn't run anything:
+if __name__ in ('__main__', '__builtin__'):
+    # add the path to this script, so we can find `mmtools` & the user-settings
+    libpth = os.path.split(  os.path.split( sys.path[0] )[0]  )[0]  # path to Fiji folder
+    libpth = os.path.join(libpth, 'plugins', 'Analyze', 'Microscope Measurement Tools')
+    if libpth not in sys.path:
+        sys.path.append( libpth )
+
+    run()       # Run the script function!
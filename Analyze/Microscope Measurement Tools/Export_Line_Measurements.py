@@ -0,0 +1,38 @@
+''' Export_Line_Measurements.py
+Plugin for FIJI, to export calibrated measurements of line & polyline ROIs to a CSV file, without drawing them.
+
+Measures either the ROIs in the ROI Manager (using the current image's calibration),
+or the ROI sets saved next to every image in a directory (`<image>.zip`, `<image>_RoiSet.zip` or `<image>.roi`), using each image's own calibration.
+Each row has the calibrated end points, length & angle of one ROI.  Rows are written as they are measured.
+
+Can be run headless for a directory, eg.:
+    ImageJ --headless -eval 'run("Export Line Measurements", "source=[Saved ROI sets in a directory] directory=/data/sem csv=/data/sem/lines.csv");'
+
+
+Demis D. John, Univ. of California Santa Barbara, 2019
+
+The plugin itself is `mmtools.plugins.exportLineMeasurements()`: this file only adds the "Microscope Measurement Tools" folder to `sys.path` and calls it,
+so nothing happens when it is imported, and no ImageJ classes are loaded until it runs.
+'''
+
+import sys, os
+
+
+
+def run():
+    '''This is the main function run when the plugin is called.'''
+    from mmtools import plugins
+    plugins.exportLineMeasurements()
+#end run()
+
+
+
+# Fiji runs scripts as `__main__` (`__builtin__` in older versions), so importing this file elsewhere doesn't run anything:
+if __name__ in ('__main__', '__builtin__'):
+    # add the path to this script, so we can find `mmtools` & the user-settings
+    libpth = os.path.split(  os.path.split( sys.path[0] )[0]  )[0]  # path to Fiji folder
+    libpth = os.path.join(libpth, 'plugins', 'Analyze', 'Microscope Measurement Tools')
+    if libpth not in sys.path:
+        sys.path.append( libpth )
+
+    run()       # Run the script function!
@@ -0,0 +1,31 @@
+'''Flatten Measurement Overlay.py
+Part of the "Microscope Measurement Tools" scripts
+
+Burn the measurement annotations in the image Overlay (see `useoverlay` in `Microscope_Calibrations_user_settings.py`) into pixels, for export.
+Either makes a new RGB image of the current slice with the overlay drawn in, or draws the overlay into every slice of this image, keeping its bit depth.
+
+The plugin itself is `mmtools.plugins.flattenMeasurementOverlay()`: this file only adds the "Microscope Measurement Tools" folder to `sys.path` and calls it,
+so nothing happens when it is imported, and no ImageJ classes are loaded until it runs.
+'''
+
+import sys, os
+
+
+
+def run():
+    '''This is the main function run when the plugin is called.'''
+    from mmtools import plugins
+    plugins.flattenMeasurementOverlay()
+#end run()
+
+
+
+# Fiji runs scripts as `__main__` (`__builtin__` in older versions), so importing this file elsewhere doesn't run anything:
+if __name__ in ('__main__', '__builtin__'):
+    # add the path to this script, so we can find `mmtools` & the user-settings
+    libpth = os.path.split(  os.path.split( sys.path[0] )[0]  )[0]  # path to Fiji folder
+    libpth = os.path.join(libpth, 'plugins', 'Analyze', 'Microscope Measurement Tools')
+    if libpth not in sys.path:
+        sys.path.append( libpth )
+
+    run()       # Run the script function!
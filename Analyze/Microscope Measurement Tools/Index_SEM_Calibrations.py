@@ -0,0 +1,37 @@
+''' Index_SEM_Calibrations.py
+Plugin for FIJI, to build or update a calibration index for a whole tree of JEOL SEM images.
+
+Every image with an accompanying *.txt file is parsed once, and its scale, unit & magnification are stored in the index file.
+Running it again only re-parses the *.txt files that changed since the last run.
+To use the index, pass its path to the JEOL calibration in `Microscope_Calibrations_user_settings.py`:
+    jeol_sem_cal_from_txt = JEOL_SEM_CalFromTxt( index='/data/sem/calindex.tsv' )
+`Choose_Microscope_Calibration.py` & `Batch_Microscope_Calibration.py` will then look each image up in the index instead of parsing its *.txt file.
+
+
+Demis D. John, Univ. of California Santa Barbara, 2019
+
+The plugin itself is `mmtools.plugins.indexSEMCalibrations()`: this file only adds the "Microscope Measurement Tools" folder to `sys.path` and calls it,
+so nothing happens when it is imported, and no ImageJ classes are loaded until it runs.
+'''
+
+import sys, os
+
+
+
+def run():
+    '''This is the main function run when the plugin is called.'''
+    from mmtools import plugins
+    plugins.indexSEMCalibrations()
+#end run()
+
+
+
+# Fiji runs scripts as `__main__` (`__builtin__` in older versions), so importing this file elsewhere doesn't run anything:
+if __name__ in ('__main__', '__builtin__'):
+    # add the path to this script, so we can find `mmtools` & the user-settings
+    libpth = os.path.split(  os.path.split( sys.path[0] )[0]  )[0]  # path to Fiji folder
+    libpth = os.path.join(libpth, 'plugins', 'Analyze', 'Microscope Measurement Tools')
+    if libpth not in sys.path:
+        sys.path.append( libpth )
+
+    run()       # Run the script function!
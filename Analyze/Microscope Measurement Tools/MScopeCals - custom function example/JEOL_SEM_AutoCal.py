@@ -17,7 +17,7 @@ The class must have methods named as follows:
     MyClass.unit - a string that is the measurement unit, eg. "cm" or "nm" etc.
     MyClass.aspect - numeric value of pixel aspect ratio, eg. 1.0
 
-After you edit this file, be sure to delete the corresponding *.pyclass file and restart Fiji for the changes to take effect.
+After you edit this file, the changes are picked up the next time you run one of the plugins, as long as the settings file imports it.
 '''
 
 
@@ -29,14 +29,15 @@ After you edit this file, be sure to delete the corresponding *.pyclass file and
 
 """
 
-jeol_DEBUG = False     # Send debugging info to the log file?
+# Debugging info is sent to the console with `instrument.note()`, when `instrumentation = True` in the settings file.
 
 
 class JEOL_SEM_CalFromTxt(object):
     '''    Class with functions for automatic calibration of image scale.
     
-    JEOL_SEM_CalFromTxt() : (Constructor)
-        Only sets the `name` to be used in the Calibrations list.
+    JEOL_SEM_CalFromTxt( index=None ) : (Constructor)
+        Sets the `name` to be used in the Calibrations list.
+        `index` is an optional path to a calibration index file made by "Index SEM Calibrations".  Images found in the index are calibrated without parsing their *.txt file.
     
     JEOL_SEM_CalFromTxt.name : string
         The name that shows up in the Calibrations list.
@@ -48,6 +49,7 @@ class JEOL_SEM_CalFromTxt(object):
             self.pixel_per_unit (unused)
             self.unit
             self.aspect_ratio
+            self.magnification (unused, None if not in the *.txt file)
     
     JEOL_SEM_CalFromTxt.unit : string
         String indicating the unit used in the pixel-per-unit returned by `self.cal()`.  The string will be used by annotations and set internally in ImageJ's "Set Scale" etc.  Should be the short abbreviation of the unit name.
@@ -58,9 +60,10 @@ class JEOL_SEM_CalFromTxt(object):
     
     '''
     
-    def __init__(self):
+    def __init__(self, index=None):
         ''' See `help(JEOL_SEM_CalFromTxt)` for help on this constructor.'''
         self.name =     "JEOL SEM: AutoCal from *.txt"
+        self.index =    index
     #end __init__()
     
 
@@ -74,66 +77,41 @@ class JEOL_SEM_CalFromTxt(object):
             self.aspect_ratio
         '''
         
-        import re   # RegEx matching, for parsing text file
         import os.path  # file-path manipulation functions
+        from mmtools import sidecar     # cached, single-pass parser for the *.txt file
+        from mmtools import instrument  # debugging messages
         
         filepath =    imp.getOriginalFileInfo().directory  +  os.path.sep  +  imp.getOriginalFileInfo().fileName
-        if jeol_DEBUG: 
-            print( "imp=", imp )
-            print( "ImagePath=", filepath )
+        instrument.note( "imp= %s", imp )
+        instrument.note( "ImagePath= %s", filepath )
+        
+        txtpath = sidecar.sidecarPath( filepath )
+        instrument.note( "txtpath = %s", txtpath )
+        
+        # use the calibration index if the image is in it, and its .txt file hasn't changed since:
+        if self.index:
+            from mmtools import calindex
+            entry = calindex.openIndex( self.index ).lookup( filepath )
+            if entry is not None and os.path.isfile(txtpath) and os.path.getmtime(txtpath) == entry[4]:
+                instrument.note( 'Calibration found in index: %s', entry )
+                self.pixel_per_unit, self.unit, self.aspect_ratio, self.magnification = entry[:4]
+                return self.pixel_per_unit
+        #end if(index)
         
-        txtpath = os.path.splitext( filepath )[0] + ".txt"
-        if jeol_DEBUG: print "txtpath = ", txtpath
         if not os.path.isfile(txtpath): raise IOError("Text File not found at: \n\t" + txtpath)
         
-        # set up regex search groups:
-        re_bar = re.compile( r'\$\$SM_MICRON_BAR (\d*)'  ) # captures the digits in "$$SM_MICRON_BAR 90" to a group
-        re_barmark = re.compile( r'\$\$SM_MICRON_MARKER (\d*)([a-zA-Z]*)')  # captures the decimals and units in "$$SM_MICRON_MARKER 100nm" to separate groups
-    
-    
-        # try to load the .txt file:
-        BarLength_px = None
-        BarLength_dist = None
-        BarLength_unit = None
-    
-        txtfile = open(txtpath, 'r')
+        # load the .txt file, or re-use it from the cache if it hasn't changed:
         try:
-            while True:
-                txtline = txtfile.readline()  # grab one line of text
-                if len(txtline) == 0:
-                    # end of file, exit the loop
-                    break
-                #end(if end-of-file)
-            
-            
-                # search for strings/values:
-                match1 = re_bar.search( txtline )
-                if match1:
-                    BarLength_px = float( match1.group(1)  )  # this is pixel width of the scale bar
-                    if jeol_DEBUG: print 'Scale Bar Pixel Length found:', match1.groups(), ' --> ', BarLength_px    
-                #end if(match1)
-            
-            
-                match2 = re_barmark.search( txtline )
-                if match2:
-                    BarLength_dist = float( match2.group(1)  )  # this is physical width of the scale bar
-                    BarLength_unit = str( match2.group(2)  )
-                    if jeol_DEBUG: print 'Scale Bar Distance Length found:', match2.groups(), ' --> ', BarLength_dist, BarLength_unit
-                #end if(match2)
-            
-            #end while(file-reading)
-
+            pixel_per_unit, BarLength_unit = sidecar.jeolScale( txtpath )
         except IOError:
             raise IOError("Could not load text file that accompanies this image file.  Expected the text file to have the same filename as the image, except with '.txt' extension.  Expected file to be here:\n\t" + txtpath )
-    
-        finally:
-            # make sure python closes the file no matter what
-            txtfile.close()
         #end try(txtfile)
+        instrument.note( 'Scale Bar found: %s px/%s', pixel_per_unit, BarLength_unit )
         
-        self.pixel_per_unit = (BarLength_px/BarLength_dist)
+        self.pixel_per_unit = pixel_per_unit
         self.unit = BarLength_unit
         self.aspect_ratio = 1.0
+        self.magnification = sidecar.jeolMagnification( txtpath )
         
         # return pixel-per-unit
         return self.pixel_per_unit
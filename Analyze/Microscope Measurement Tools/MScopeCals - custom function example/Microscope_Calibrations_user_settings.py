@@ -8,7 +8,7 @@ In addition, an instance of the class is inserted into the lists of names/calibr
 
 Please make sure the lists `names`, `cals` and `units` all have the same number of items!
 
-After you edit this file, be sure to delete the corresponding *.pyclass file and restart Fiji for the settings to take effect.
+After you edit & save this file, the new settings are picked up the next time you run one of the plugins - there is no need to restart Fiji.
 '''
 
 
@@ -26,6 +26,18 @@ Microscope scaling/pixel-size calibration settings.
 # Custom Function: Load JEOL SEM autocal class from a file:
 from JEOL_SEM_AutoCal   import JEOL_SEM_CalFromTxt
 jeol_sem_cal_from_txt = JEOL_SEM_CalFromTxt()    # instantiate the class
+# To look the calibrations up in an index made by "Index SEM Calibrations", instead of parsing every *.txt file, use this line instead (uncomment):
+#jeol_sem_cal_from_txt = JEOL_SEM_CalFromTxt( index='/path/to/calindex.tsv' )
+
+# Custom Function: read the scale bar burned into the SEM data bar, for images without their *.txt file.
+#   The table of { scale bar length in pixels : marker } depends on your microscope & image size, so fill it in from images of known scale,
+#   eg. { 53:'100nm' } for the example image here - with a wrong table, any image with a bar of that length would be silently mis-calibrated
+#   by the Auto calibration, "Batch Microscope Calibration" & "Watch Folder Calibration".
+#   Then uncomment these lines, and the `sem_scalebar_cal` entries of the lists below:
+#from SEM_ScaleBar_AutoCal   import SEM_ScaleBar_CalFromImage
+#sem_scalebar_cal = SEM_ScaleBar_CalFromImage( markers={ } )    # { scale bar length in pixels : marker }
+# To read the marker text from the data bar instead, pass template images of each marker:
+#sem_scalebar_cal = SEM_ScaleBar_CalFromImage( templates={ '100nm':'/path/to/100nm.tif', '1um':'/path/to/1um.tif' } )
 
 
 names = [
@@ -36,6 +48,7 @@ names = [
         'FluoroScope 150x',
         'Olympus DUV 100x',
         jeol_sem_cal_from_txt,   # instance of class with custom function `MyClass.cal()` for setting image scale.
+        #sem_scalebar_cal,
         ]
 
 
@@ -48,6 +61,7 @@ cals = [
         13.5333,
         54.6875,
         jeol_sem_cal_from_txt,  # placeholder for custom function
+        #sem_scalebar_cal,
         ]
 #   This is just 1/pixel_width, in case you were wondering.
 
@@ -61,6 +75,7 @@ units = [
         'um',
         'um',
         jeol_sem_cal_from_txt,
+        #sem_scalebar_cal,
         ]
 # for identical units for all cals, use the following line instead (uncomment):
 #units = ['um'    for x in cals]    # list-comprehension with constant `um`
@@ -77,11 +92,34 @@ aspect_ratio = [
         1,
         1,
         jeol_sem_cal_from_txt,
+        #sem_scalebar_cal,
                 ]
 # The following sets the aspect ratio to 1 for all calibrations (uncomment to use):
 #aspect_ratio =  [ 1.0    for x in cals ]   # list-comprehension with constant `1`
 
 
+# Optional, for z-stacks, time series & hyperstacks:  the Z step between slices (in the calibration's unit),
+#   the time between frames, and the time unit.  Use `None` to keep the image's own value.  Leave commented out for 2D images.
+#pixel_depth =     [ None    for x in cals ]
+#frame_interval =  [ None    for x in cals ]
+#time_unit = 'sec'      # one unit for all calibrations, or a list
+
+
+
+
+
+# Calibrations can also be loaded from CSV or JSON tables, in addition to the lists above.
+#   CSV tables need a header row with the columns:  name, cal, unit, aspect_ratio, group, pixel_depth, frame_interval, time_unit
+#   (only `name` & `cal` are required - `unit` defaults to um, `aspect_ratio` to 1.0, and `group` to the name without the objective, eg. "Swift" for "Swift 40x")
+#   JSON tables hold a list of objects with the same keys, eg. [ {"name": "Swift 4x", "cal": 0.9058}, ... ]
+#   Relative paths are relative to this settings file.
+calibration_tables = []
+#calibration_tables = [ 'facility_calibrations.csv' ]     # uncomment to load a table
+
+# "Choose Microscope Calibration" resolves custom calibrations (eg. reading a *.txt file from a network share) in the background, with a Cancel button:
+calibrationtimeout = 60     # give up after this many seconds, 0 to wait for ever
+
+
 
 
 
@@ -108,6 +146,48 @@ textcolor =     [ 0, 0.8, 0,   1.0]
 textbackgroundcolor = [ 0, 0, 0,   0.6]       # background color behind text.
 #textbackgroundcolor = None      # set to None for no background - uncomment this line
 texttoleft = True      # put text on left or right side of last point?
+useoverlay = False      # add the annotations to the image Overlay (non-destructive, use "Flatten Measurement Overlay" to burn them in), instead of drawing into the pixels?
+scalebarposition = 'bottom right'     # corner of the scale bar added by "Choose Microscope Calibration" & "Batch Microscope Calibration": 'bottom right', 'bottom left', 'top right' or 'top left'
+snaptoedges = False     # "Draw Measurement - Line" moves the ends of the line onto the nearest strong edges (eg. sidewalls) before measuring?  "Draw Measurement - Line Snapped to Edges" always does.
+snapreach = 10          # how far (in pixels) before & past each end of the line to look for an edge
+snapbandwidth = 5       # width (in pixels) of the band of intensity profiles averaged along the line, to find the edges in noisy images
+
+
+
+
+"""
+################################
+   Export Annotated Images
+################################
+Defaults of "Export Annotated Images", which publishes calibrated copies of a batch of images with their line measurements & a scale bar drawn on.
+"""
+exportformat = 'png'    # 'png', 'jpg', 'tif' or 'zip' (deflate-compressed TIFF).  PNG & JPEG have the Overlay burned in, and only hold the current slice of stacks.
+exportquality = 85      # JPEG quality, 0-100
+exportinflight = 4      # max number of images open at once while exporting, over the read, draw & write stages
+
+
+
+
+"""
+################################
+   Sidewall analysis
+################################
+Used by "Analyze Sidewall" when no rectangle is drawn on the image, and for batches.
+"""
+sidewallregion = None       # (x, y, width, height) in pixels of a region holding one sidewall, with some of the top surface & floor each side, eg. (200, 100, 300, 400).  None for the whole image.
+sidewallmaterial = 'left'   # side of the sidewall the etched material is on: 'left' or 'right'
+
+
+
+
+"""
+################################
+   Timing instrumentation
+################################
+Time each stage of the plugins (dialog, calibration, *.txt file reading, repaint, drawing), and print debugging messages to the console.
+"""
+instrumentation = False     # collect timings & print debugging messages?
+instrumentation_file = None     # file to write the timings to after each plugin run, eg. '/tmp/mmtools-timing.json' (JSON) or '/tmp/mmtools-timing.txt' (text table)
 
 
 
@@ -131,7 +211,7 @@ def run():
     gd.addMessage("This file is only for setting the microscope calibrations and settings for the plugins 'Microscope Measurement Tools'.\nNothing is done when this settings file is run by itself.\nPlease open this file in a text editor instead, to edit the calibrations.\n  \n"  +  \
     "The file should reside in a path like the following\n"  +  \
     "Fiji.app/plugins/Scripts/Analyze/Microscope Measurement Tools/Microscope_Calibrations_user_settings.py\n  "  +  "\n" +  \
-    "Changes to the settings file are not automatically picked up by Fiji.  The workaround is to\n  1) Quit Fiji.\n  2) Delete the '$py.class' file 'Microscope_Calibrations_user_settings$py.class'\n  3) Open Fiji.  Make sure the new settings show up in 'Choose Microscope Calibration'."  )
+    "Changes to the settings file are picked up automatically the next time you run 'Choose Microscope Calibration' or 'Draw Measurement - Line'."  )
     
     gd.showDialog()
 #end run()
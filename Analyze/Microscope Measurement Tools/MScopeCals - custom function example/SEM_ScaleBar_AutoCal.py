@@ -0,0 +1,150 @@
+'''
+	FIJI Plugin
+Additional Function for Choose_Microscope_Calibration.py
+Demis D. John, Univ. of California Santa Barbara, 2019
+
+This file adds functions for SEM images that have a scale bar burned into the data bar at the bottom of the image, to set the scale when the accompanying *.txt file is missing.
+Only a thin strip at the bottom of the image is scanned, to measure the length of the scale bar in pixels, see `mmtools/databar.py`.
+The marker value (eg. "100nm") is looked up from the bar length in a table, or found by matching small template images of the marker text.
+
+The class will be accessed by  `Choose_Microscope_Calibration.py`.
+The class must have methods named as follows:
+    MyClass() - class constructor, which defines MyClass.name attribute:
+    MyClass.name - a string that shows up in the available calibrations list.
+    MyClass.cal() - returns the Pixel-Per-Unit calibration (numeric)
+    MyClass.unit - a string that is the measurement unit, eg. "cm" or "nm" etc.
+    MyClass.aspect - numeric value of pixel aspect ratio, eg. 1.0
+
+After you edit this file, the changes are picked up the next time you run one of the plugins, as long as the settings file imports it.
+'''
+
+
+"""
+################################
+   SEM AutoCal from the data-bar scale bar
+################################
+
+
+"""
+
+# Debugging info is sent to the console with `instrument.note()`, when `instrumentation = True` in the settings file.
+
+
+class SEM_ScaleBar_CalFromImage(object):
+    '''    Class with functions for automatic calibration of image scale.
+
+    SEM_ScaleBar_CalFromImage( markers=None, templates=None, strip=0.1, tolerance=1 ) : (Constructor)
+        Sets the `name` to be used in the Calibrations list.
+        `markers` is a table of { scale bar length in pixels : marker }, eg. { 53:"100nm", 106:"200nm" }.
+            Bar lengths within `tolerance` pixels match.  The bar length is the distance from its first to its last pixel, as in JEOL's `$$SM_MICRON_BAR`.
+        `templates` is a table of { marker : template image path }, eg. { "100nm":"/path/to/100nm.tif" }.
+            A template is the marker text cropped tightly out of a data bar and saved as an image.  It's used when the bar length isn't in `markers`.
+        `strip` is the height of the data bar in pixels, or as a fraction of the image height if less than 1.
+
+    SEM_ScaleBar_CalFromImage.name : string
+        The name that shows up in the Calibrations list.
+
+    SEM_ScaleBar_CalFromImage.cal(  ImagePlus_Object ) :
+        Takes in the ImagePlusObject being analyzed.
+        Returns the pixel-per-unit numeric value, using a custom function.
+        Sets the following internal attributes:
+            self.pixel_per_unit (unused)
+            self.unit
+            self.aspect_ratio
+            self.bar_length (unused, length of the scale bar in pixels)
+
+    SEM_ScaleBar_CalFromImage.unit : string
+        String indicating the unit used in the pixel-per-unit returned by `self.cal()`, taken from the marker, eg. "nm" for "100nm".
+
+    SEM_ScaleBar_CalFromImage.aspect_ratio
+        Numeric aspect ratio (width/height) of the pixel-per-unit, always 1.0.
+
+    '''
+
+    def __init__(self, markers=None, templates=None, strip=0.1, tolerance=1):
+        ''' See `help(SEM_ScaleBar_CalFromImage)` for help on this constructor.'''
+        self.name =         "SEM: AutoCal from Scale Bar"
+        self.markers =      markers or {}
+        self.templates =    templates or {}
+        self.strip =        strip
+        self.tolerance =    tolerance
+        self._templates =   {}      # the loaded templates, { marker : (row masks, width) }
+    #end __init__()
+
+
+    def _loadTemplates( self ):
+        '''Load the template images once, the instance keeps them for the next images.'''
+        from mmtools import databar
+        for marker, path in self.templates.items():
+            if marker not in self._templates:
+                self._templates[marker] = databar.loadTemplate( path )
+        return self._templates
+    #end _loadTemplates()
+
+
+    def cal( self, imp ):
+        '''
+        Takes in the ImagePlusObject being analyzed.
+        Returns the pixel-per-unit numeric value.
+        Finds the scale bar in the data bar at the bottom of the image, and reads its marker value from the `markers` table or `templates`.
+        Sets the following internal attributes:
+            self.unit
+            self.aspect_ratio
+        '''
+        from mmtools import databar, sidecar, instrument
+
+        rows = databar.stripRows( imp, self.strip )
+        threshold = databar.autoThreshold( rows )
+        x, y, BarLength_px, thickness = databar.findScaleBar( rows, threshold )
+        instrument.note( "Scale Bar found at x=%i, y=%i in the strip: %i px long, %i px thick", x, y, BarLength_px, thickness )
+
+        try:
+            marker = databar.lookupMarker( self.markers, BarLength_px, self.tolerance )
+        except ValueError:
+            if not self.templates: raise
+            marker = databar.findMarker( rows, self._loadTemplates(), threshold )
+        #end try(marker table)
+        instrument.note( "Marker: %s", marker )
+
+        BarLength_dist, BarLength_unit = sidecar.parseMarker( marker )
+
+        self.bar_length = BarLength_px
+        self.pixel_per_unit = BarLength_px / BarLength_dist
+        self.unit = BarLength_unit
+        self.aspect_ratio = 1.0
+
+        # return pixel-per-unit
+        return self.pixel_per_unit
+    #end cal()
+#end class(SEM_ScaleBar_CalFromImage)
+
+
+
+
+
+
+
+
+
+
+
+
+'''
+---------------------------------------------------------
+Warn user if they run this file as a stand-alone plugin.
+'''
+
+def run():
+    ''' If someone tries to run this file by itself, warn them of their error.  Unfortunately, since I was too lazy to make Microscope_Calibrations a full plugin (rather than a script), this accompanying settings file will show up in the Scripts menu.'''
+    from ij.gui import GenericDialog
+
+    gd = GenericDialog("Microscope_Calibrations_user_settings.py")
+    gd.addMessage("This file is only for adding functionality to the plugin 'Microscope Measurement Tools'.\nNothing is done when this settings file is run by itself."  )
+
+    gd.showDialog()
+#end run()
+
+if __name__ == '__main__':
+    run()   # run the above function if the user called this file!
+
+
@@ -0,0 +1,34 @@
+'''Measure Critical Dimensions.py
+Part of the "Microscope Measurement Tools" scripts
+
+Measure the widths of the lines or trenches that cross a region of a calibrated image (critical-dimension metrology), without drawing lines by hand:
+parallel scanlines are laid across the region, the edges along each are found to a fraction of a pixel and paired into features,
+and each feature's width is reported as mean, sigma, min & max in calibrated units.
+Works on the current image (draw a rectangle to set the region), or on a whole directory of images with a pool of worker threads,
+writing one CSV row per feature and optionally saving an annotated copy of each image.
+
+The plugin itself is `mmtools.plugins.measureCriticalDimensions()`: this file only adds the "Microscope Measurement Tools" folder to `sys.path` and calls it,
+so nothing happens when it is imported, and no ImageJ classes are loaded until it runs.
+'''
+
+import sys, os
+
+
+
+def run():
+    '''This is the main function run when the plugin is called.'''
+    from mmtools import plugins
+    plugins.measureCriticalDimensions()
+#end run()
+
+
+
+# Fiji runs scripts as `__main__` (`__builtin__` in older versions), so importing this file elsewhere doesn't run anything:
+if __name__ in ('__main__', '__builtin__'):
+    # add the path to this script, so we can find `mmtools` & the user-settings
+    libpth = os.path.split(  os.path.split( sys.path[0] )[0]  )[0]  # path to Fiji folder
+    libpth = os.path.join(libpth, 'plugins', 'Analyze', 'Microscope Measurement Tools')
+    if libpth not in sys.path:
+        sys.path.append( libpth )
+
+    run()       # Run the script function!
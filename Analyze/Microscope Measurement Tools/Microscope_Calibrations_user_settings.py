@@ -6,7 +6,7 @@
 
 Make sure the lists `names`, `cals`, `units` and `aspect_ratio` all have the same number of items!
 
-After you edit this file, be sure to delete the corresponding *.pyclass file and restart Fiji for the settings to take effect.
+After you edit & save this file, the new settings are picked up the next time you run one of the plugins - there is no need to restart Fiji.
 
 
 All of these lists are regular Python Lists, so define them however you prefer to define pythonic lists.  You can define them in-line like normal:
@@ -29,6 +29,10 @@ or even do python math on the lists, such as repeating an item with `*`, or usin
 Microscope scaling/pixel-size calibration settings.
 """
 
+# To read the scale from the metadata of each image instead (Zeiss & FEI TIFF headers, JEOL & Hitachi *.txt files, or the TIFF resolution), uncomment these lines and add `autocal` to each of the lists `names`, `cals`, `units` & `aspect_ratio`:
+#from mmtools.vendors import AutoDetect
+#autocal = AutoDetect()
+
 # The names of the microscope calibrations (shows up as the radio button names):
 names = [
         'Swift 4x',
@@ -62,6 +66,28 @@ aspect_ratio =  [ 1.0    for x in cals ]   # list-comprehension with constant `1
 #aspect_ratio = [1, 1, 1, 1, 1]
 
 
+# Optional, for z-stacks, time series & hyperstacks:  the Z step between slices (in the calibration's unit),
+#   the time between frames, and the time unit.  Use `None` to keep the image's own value.  Leave commented out for 2D images.
+#pixel_depth =     [ None    for x in cals ]
+#frame_interval =  [ None    for x in cals ]
+#time_unit = 'sec'      # one unit for all calibrations, or a list
+
+
+
+
+
+# Calibrations can also be loaded from CSV or JSON tables, in addition to the lists above.
+#   CSV tables need a header row with the columns:  name, cal, unit, aspect_ratio, group, pixel_depth, frame_interval, time_unit
+#   (only `name` & `cal` are required - `unit` defaults to um, `aspect_ratio` to 1.0, and `group` to the name without the objective, eg. "Swift" for "Swift 40x")
+#   JSON tables hold a list of objects with the same keys, eg. [ {"name": "Swift 4x", "cal": 0.9058}, ... ]
+#   Relative paths are relative to this settings file.
+calibration_tables = []
+#calibration_tables = [ 'facility_calibrations.csv' ]     # uncomment to load a table
+
+# "Choose Microscope Calibration" resolves custom calibrations (eg. reading a *.txt file from a network share) in the background, with a Cancel button:
+calibrationtimeout = 60     # give up after this many seconds, 0 to wait for ever
+
+
 
 
 
@@ -88,6 +114,48 @@ textcolor = [ 0, 0, 0,   1.0]
 textbackgroundcolor = [ 1, 1, 1, 0.4] # background color behind text.
 #textbackgroundcolor = None # set to None for no background - uncomment this line
 texttoleft = True # put text on left or right side of last point?
+useoverlay = False      # add the annotations to the image Overlay (non-destructive, use "Flatten Measurement Overlay" to burn them in), instead of drawing into the pixels?
+scalebarposition = 'bottom right'     # corner of the scale bar added by "Choose Microscope Calibration" & "Batch Microscope Calibration": 'bottom right', 'bottom left', 'top right' or 'top left'
+snaptoedges = False     # "Draw Measurement - Line" moves the ends of the line onto the nearest strong edges (eg. sidewalls) before measuring?  "Draw Measurement - Line Snapped to Edges" always does.
+snapreach = 10          # how far (in pixels) before & past each end of the line to look for an edge
+snapbandwidth = 5       # width (in pixels) of the band of intensity profiles averaged along the line, to find the edges in noisy images
+
+
+
+
+"""
+################################
+   Export Annotated Images
+################################
+Defaults of "Export Annotated Images", which publishes calibrated copies of a batch of images with their line measurements & a scale bar drawn on.
+"""
+exportformat = 'png'    # 'png', 'jpg', 'tif' or 'zip' (deflate-compressed TIFF).  PNG & JPEG have the Overlay burned in, and only hold the current slice of stacks.
+exportquality = 85      # JPEG quality, 0-100
+exportinflight = 4      # max number of images open at once while exporting, over the read, draw & write stages
+
+
+
+
+"""
+################################
+   Sidewall analysis
+################################
+Used by "Analyze Sidewall" when no rectangle is drawn on the image, and for batches.
+"""
+sidewallregion = None       # (x, y, width, height) in pixels of a region holding one sidewall, with some of the top surface & floor each side, eg. (200, 100, 300, 400).  None for the whole image.
+sidewallmaterial = 'left'   # side of the sidewall the etched material is on: 'left' or 'right'
+
+
+
+
+"""
+################################
+   Timing instrumentation
+################################
+Time each stage of the plugins (dialog, calibration, *.txt file reading, repaint, drawing), and print debugging messages to the console.
+"""
+instrumentation = False     # collect timings & print debugging messages?
+instrumentation_file = None     # file to write the timings to after each plugin run, eg. '/tmp/mmtools-timing.json' (JSON) or '/tmp/mmtools-timing.txt' (text table)
 
 
 
@@ -111,7 +179,7 @@ def run():
     gd.addMessage("This file is only for setting the microscope calibrations and settings for the plugins 'Microscope Measurement Tools'.\nNothing is done when this settings file is run by itself.\nPlease open this file in a text editor instead, to edit the calibrations.\n  \n"  +  \
     "The file should reside in a path like the following\n"  +  \
     "Fiji.app/plugins/Scripts/Analyze/Microscope Measurement Tools/Microscope_Calibrations_user_settings.py\n  "  +  "\n" +  \
-    "Changes to the settings file are not automatically picked up by Fiji.  The workaround is to\n  1) Quit Fiji.\n  2) Delete the '$py.class' file 'Microscope_Calibrations_user_settings$py.class'\n  3) Open Fiji.  Make sure the new settings show up in 'Choose Microscope Calibration'."  )
+    "Changes to the settings file are picked up automatically the next time you run 'Choose Microscope Calibration' or 'Draw Measurement - Line'."  )
 
     gd.showDialog()
 #end run()
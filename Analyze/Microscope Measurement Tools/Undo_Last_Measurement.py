@@ -0,0 +1,32 @@
+'''Undo Last Measurement.py
+Part of the "Microscope Measurement Tools" scripts
+
+Put back the pixels under the last measurement (or text) drawn into the current image by `Draw Measurement - Line`.
+Only the rectangle under the line & its text was saved before drawing, rather than the whole image, so this works on huge mosaics too.
+One level of undo per image, on the slice it was drawn on.  Measurements added to the Overlay (`useoverlay = True`) don't change any pixels, delete them from the Overlay instead.
+
+The plugin itself is `mmtools.plugins.undoLastMeasurement()`: this file only adds the "Microscope Measurement Tools" folder to `sys.path` and calls it,
+so nothing happens when it is imported, and no ImageJ classes are loaded until it runs.
+'''
+
+import sys, os
+
+
+
+def run():
+    '''This is the main function run when the plugin is called.'''
+    from mmtools import plugins
+    plugins.undoLastMeasurement()
+#end run()
+
+
+
+# Fiji runs scripts as `__main__` (`__builtin__` in older versions), so importing this file elsewhere doesn't run anything:
+if __name__ in ('__main__', '__builtin__'):
+    # add the path to this script, so we can find `mmtools` & the user-settings
+    libpth = os.path.split(  os.path.split( sys.path[0] )[0]  )[0]  # path to Fiji folder
+    libpth = os.path.join(libpth, 'plugins', 'Analyze', 'Microscope Measurement Tools')
+    if libpth not in sys.path:
+        sys.path.append( libpth )
+
+    run()       # Run the script function!
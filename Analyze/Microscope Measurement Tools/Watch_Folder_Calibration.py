@@ -0,0 +1,40 @@
+''' Watch_Folder_Calibration.py
+Plugin for FIJI, to calibrate the images an instrument writes into an acquisition directory, as they arrive.
+
+Each new image (and its *.txt file, eg. from a JEOL SEM) is calibrated once it has been completely written, ie. once its size hasn't changed
+for the "Settle time", using the same calibrations as `Choose_Microscope_Calibration.py`.  Choose "Auto" to try each custom calibration class
+(eg. `JEOL_SEM_CalFromTxt`) on every image.  The calibration is stamped into the TIFF header in place, or the image is saved as a calibrated TIFF,
+optionally with a scale bar.  A line per image, with the time from its arrival to its calibration, is printed to the console,
+and a summary with the queue depth & latency when watching stops.
+
+Can be run headless, eg. for 8 hours:
+    ImageJ --headless -eval 'run("Watch Folder Calibration", "directory=/data/sem/today calibration=Auto output=[Stamp TIFF headers in place] worker=2 settle=2 duration=480");'
+
+
+Demis D. John, Univ. of California Santa Barbara, 2019
+
+The plugin itself is `mmtools.plugins.watchFolderCalibration()`: this file only adds the "Microscope Measurement Tools" folder to `sys.path` and calls it,
+so nothing happens when it is imported, and no ImageJ classes are loaded until it runs.
+'''
+
+import sys, os
+
+
+
+def run():
+    '''This is the main function run when the plugin is called.'''
+    from mmtools import plugins
+    plugins.watchFolderCalibration()
+#end run()
+
+
+
+# Fiji runs scripts as `__main__` (`__builtin__` in older versions), so importing this file elsewhere doesn't run anything:
+if __name__ in ('__main__', '__builtin__'):
+    # add the path to this script, so we can find `mmtools` & the user-settings
+    libpth = os.path.split(  os.path.split( sys.path[0] )[0]  )[0]  # path to Fiji folder
+    libpth = os.path.join(libpth, 'plugins', 'Analyze', 'Microscope Measurement Tools')
+    if libpth not in sys.path:
+        sys.path.append( libpth )
+
+    run()       # Run the script function!
@@ -0,0 +1,58 @@
+'''
+	FIJI Plugin - Microscope Measurement Tools
+        Shared library for Choose_Microscope_Calibration.py, Draw_Measurement_-_Line.py & friends.
+        Demis D. John, University of California Santa Barbara, Nanofabrication Facility, 2019
+
+The modules in this folder are imported by the plugins, they are not plugins themselves:
+    mmtools.settings - load `Microscope_Calibrations_user_settings.py`, and reload it when it changes
+    mmtools.registry - all the calibrations, as an indexed registry of records
+    mmtools.calibration - look up & apply the calibrations from `Microscope_Calibrations_user_settings.py`
+    mmtools.geometry - midpoints, lengths & text placement of the line measurements
+    mmtools.edges - sub-pixel edges along a line, from a band of interpolated intensity profiles
+    mmtools.annotate - draw line measurements & their calibrated lengths onto images
+    mmtools.scalebar - headless scale bars with "nice" lengths, drawn with cached character masks
+    mmtools.measure - calibrated measurements of line ROIs, streamed to CSV
+    mmtools.metrology - automatic critical-dimension (line & trench width) measurement from scanlines, for single images & batches
+    mmtools.sidewall - sidewall angle, etch depth & footing of cross-section SEM images, from a RANSAC fit of the sidewall edge
+    mmtools.batch - stream files from a directory/glob through a pool of worker threads, or a pipeline of stages
+    mmtools.export - publish annotated copies of a batch of images, reading, drawing & writing them in overlapping stages
+    mmtools.tiles - annotate huge uncompressed TIFFs in place, reading & writing only the strips or tiles under the annotations
+    mmtools.watch - calibrate the images written into an acquisition directory, as they arrive
+    mmtools.sidecar - cached parser for the JEOL SEM *.txt files that accompany each image
+    mmtools.calindex - persistent index of the calibrations of a tree of JEOL SEM images
+    mmtools.databar - find the scale bar burned into the data bar of SEM images
+    mmtools.tiffheader - read TIFF header tags without decoding the pixels
+    mmtools.vendors - calibration extractors for Zeiss, FEI, JEOL & Hitachi metadata, with auto-detection
+    mmtools.instrument - timing spans, counters & debugging messages, off unless `instrumentation = True` in the settings
+    mmtools.plugins - the dialogs & main functions of the plugins, which are only thin shims calling these
+
+The plugins add the "Microscope Measurement Tools" folder to `sys.path`, so these can be imported as
+    import mmtools.calibration
+
+ImageJ & AWT classes are only ever imported inside the functions that need them, so every module imports under plain CPython,
+and the ones that don't draw or open images (geometry, tiles' region I/O, edges, metrology's measurement, sidewall's fit, registry, sidecar, calindex, tiffheader, vendors, databar's scanning, calibration's
+`resolveCalibration()`/`headerCalibration()`, batch's `WorkerPool` & `Pipeline`, instrument) run there too, eg. in batch workers:
+    sys.path.append( '/path/to/Fiji.app/plugins/Analyze/Microscope Measurement Tools' )
+    from mmtools import vendors
+    name, ppu, unit, aspect = vendors.headerScale( '/data/sem/image01.tif' )
+'''
+
+
+
+'''
+---------------------------------------------------------
+Warn user if they run this file as a stand-alone plugin.
+'''
+
+def run():
+    ''' If someone tries to run this file by itself, warn them of their error.'''
+    from ij.gui import GenericDialog
+
+    gd = GenericDialog("mmtools")
+    gd.addMessage("This folder is only a library used by the plugins 'Microscope Measurement Tools'.\nNothing is done when this file is run by itself."  )
+
+    gd.showDialog()
+#end run()
+
+if __name__ == '__main__':
+    run()   # run the above function if the user called this file!
@@ -0,0 +1,391 @@
+''' mmtools/annotate.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Draw line measurements (a line plus its calibrated length as text) onto images,
+using the line & text settings from `Microscope_Calibrations_user_settings.py`.
+
+The colors & font are built once into a `Style`, and the drawing functions only draw into an ImageProcessor,
+so many measurements can be drawn before a single `imp.updateAndDraw()`.
+
+Alternatively, the `overlay...()` functions add the line & text as vector Line/TextRoi elements of the image's Overlay,
+which doesn't change any pixels, and costs the same regardless of image size.  `flattenOverlay()` burns them in for export.
+
+The drawing functions can note the rectangle they touched in a `DirtyRect`, and `measurementLayout()` tells where a measurement
+will go before it is drawn, so `saveUndo()` only copies that rectangle of the image, and `updateRegion()` only repaints it:
+annotating a huge mosaic costs as much as annotating a small image.
+
+The ImageJ & AWT classes are only imported inside the functions that draw.  The geometry (midpoint, text placement, lengths) is in `mmtools.geometry`,
+which doesn't need them, and is imported here too.
+'''
+
+import time
+
+from mmtools import instrument
+from mmtools.geometry import parsePosition, textPosition, placeText, lineLength, lengthText, LabelLayout, \
+                             lineBox, textBox, clipBox, DirtyRect     # pure Python, see `mmtools.geometry`
+
+__all__ = [ 'TEXTCACHE', 'UNDO_PROPERTY', 'unitString', 'lineEndpoints', 'Style', 'jcolor', 'drawLine', 'drawLabel', 'drawText',
+            'measurementText', 'measurementLayout', 'drawMeasurement', 'saveUndo', 'undoLast', 'updateRegion', 'isStraightLine',
+            'overlayMeasurement', 'imageOverlay', 'flattenOverlay', 'annotateRois',
+            # the geometry the plugins use through this module:
+            'parsePosition', 'placeText', 'textBox', 'clipBox' ]
+
+
+TEXTCACHE = 20000   # max number of text sizes cached, see `Style.textSize()`
+
+_textsizes = {}     # { (font name, font style, font size, text) : (width, height) }, shared by all Styles
+
+UNDO_PROPERTY = "mmtools.undo"      # image property holding the pixels saved by `saveUndo()`
+
+
+
+def unitString( imp ):
+    '''The image's calibration unit, as a string that can be drawn & printed.'''
+    unit = imp.getCalibration().getUnit().encode('utf-8')    # get the unit as UTF-8 (for \mu)
+    if len(unit) == 3 : unit=unit[1:] # strip weird char at start of \mu
+    return unit
+#end unitString()
+
+
+
+def lineEndpoints( roi ):
+    '''Returns the end points (x1,y1), (x2,y2) of a straight-line ROI, as floats.'''
+    return [ roi.x1d, roi.y1d ], [ roi.x2d, roi.y2d ]
+#end lineEndpoints()
+
+
+
+class Style(object):
+    '''The line & text style from the settings, with the Java colors & font created once.
+
+    Style( sets ) : `sets` is the settings module, as returned by `mmtools.settings.getSettings()`
+    Style.linewidth : int
+    Style.linecolor, Style.textcolor : java.awt.Color
+    Style.textbackground : java.awt.Color, or None for no background behind the text
+    Style.font : java.awt.Font
+    Style.overlay : bool
+        True to add the annotations to the image Overlay instead of drawing them into the pixels (setting `useoverlay`).
+    Style.scalebarposition : str
+        Corner of the scale bars drawn by `mmtools.scalebar`, 'br', 'bl', 'tr' or 'tl' (setting `scalebarposition`, default bottom right).
+    Style.textSize( text ) :
+        Returns the (width, height) of `text` in pixels, cached per font & string.
+    '''
+
+    def __init__(self, sets):
+        from java.awt import Font as jFont      # for setting text font
+
+        self.linewidth = int( sets.linethickness )
+        self.linecolor = jcolor( sets.linecolor )
+        self.textsize = sets.textsize
+        self.font = jFont( 'SansSerif', 0, sets.textsize )
+        self.textcolor = jcolor( sets.textcolor )
+        self.textbackground = jcolor( sets.textbackgroundcolor )  if sets.textbackgroundcolor  else None
+        self.overlay = bool( getattr(sets, 'useoverlay', False) )
+        self.scalebarposition = parsePosition(  getattr(sets, 'scalebarposition', 'bottom right')  )
+        self._metrics = None
+    #end __init__()
+
+    def metrics(self):
+        '''java.awt.FontMetrics of the text font, for measuring text without an ImageProcessor.'''
+        if self._metrics is None:
+            from java.awt.image import BufferedImage
+            g = BufferedImage( 1, 1, BufferedImage.TYPE_INT_RGB ).createGraphics()
+            self._metrics = g.getFontMetrics( self.font )
+            g.dispose()
+        return self._metrics
+    #end metrics()
+
+    def textSize(self, text):
+        '''(width, height) in pixels of `text` in the text font.  Measured once per font & string, then looked up.'''
+        key = ( self.font.getName(), self.font.getStyle(), self.font.getSize(), text )
+        size = _textsizes.get( key )
+        if size is None:
+            fm = self.metrics()
+            size = ( fm.stringWidth( text ), fm.getHeight() )
+            if len( _textsizes ) >= TEXTCACHE:
+                _textsizes.clear()
+            _textsizes[key] = size
+        return size
+    #end textSize()
+#end class(Style)
+
+
+
+def jcolor( rgba ):
+    '''Convert a settings color [R, G, B, transparency] (values 0->1.0) to a java.awt.Color.'''
+    from java.awt import Color as jColor    # for setting color
+    return jColor(  float(rgba[0]), float(rgba[1]), float(rgba[2]), float(rgba[3])  )
+#end jcolor()
+
+
+
+def drawLine( ip, p1, p2, style, dirty=None, origin=(0, 0) ):
+    '''Draw the line from `p1` to `p2` into the ImageProcessor `ip`.
+    The rectangle touched is added to the `DirtyRect` `dirty`, if given.
+    `origin` is the position in the image of the top-left pixel of `ip`, if it only holds a region of the image (see `mmtools.tiles`).'''
+    ''' Uses ip.drawLine instead of roi.draw, since roi.draw didn't always apply the line thickness. '''
+    with instrument.span( 'draw.line' ):
+        ip.setLineWidth(  style.linewidth  )
+        ip.setColor(  style.linecolor  )
+        ip.drawLine(  int(p1[0]) - origin[0], int(p1[1]) - origin[1], int(p2[0]) - origin[0], int(p2[1]) - origin[1]  )
+    if dirty is not None:
+        dirty.add(  lineBox( p1, p2, style.linewidth )  )
+#end drawLine()
+
+
+
+def drawLabel( ip, text, x, y, style, dirty=None, origin=(0, 0) ):
+    '''Draw a text string into the ImageProcessor `ip` exactly at (x,y), the bottom-left of the text, with the text color & background of `style`.
+    `dirty` & `origin` are as for `drawLine()`.'''
+    if ip.getFont() != style.font:
+        ip.setFont(  style.font  )      # resets the processor's font metrics, so only when it changes
+    ip.setColor(  style.textcolor  )
+    if style.textbackground:
+        ip.drawString( text, x - origin[0], y - origin[1], style.textbackground )     # write the text w/ BG color
+    else:
+        ip.drawString( text, x - origin[0], y - origin[1] )     # write the text alone
+    if dirty is not None:
+        strw, strh = style.textSize( text )
+        dirty.add(  textBox( x, y, strw, strh )  )
+#end drawLabel()
+
+
+
+def drawText( ip, text, x, y, position, style, layout=None, dirty=None ):
+    '''Draw a text string into the ImageProcessor `ip` at the specified coordinates & relative position (see `parsePosition()`),
+    ensuring text doesn't go over the edge of the image.  Returns the final (x,y) of the text.
+    `layout` is an optional `LabelLayout` of the image, to keep the text clear of the labels already drawn.
+    The rectangle touched is added to the `DirtyRect` `dirty`, if given.'''
+    pos = parsePosition( position )
+
+    with instrument.span( 'draw.text' ):
+        strw, strh = style.textSize( text )
+
+        if layout is not None:
+            x, y = layout.place( int(x), int(y), pos, strw, strh )
+        else:
+            x, y = placeText( int(x), int(y), pos, strw, strh, ip.getWidth(), ip.getHeight() )
+
+        drawLabel( ip, text, x, y, style, dirty )
+    instrument.note( "drawText(): final (x,y)=(%i,%i)", x, y )
+    return x, y
+#end drawText()
+
+
+
+def measurementText( imp, p1, p2, unit=None ):
+    '''The calibrated length of the line from `p1` to `p2` as drawn, eg. "3.142 um", using the calibration of `imp`.
+    `unit` is the unit string, looked up from `imp` if not given.'''
+    cal = imp.getCalibration()
+    if unit is None:  unit = unitString( imp )
+    return lengthText(  lineLength( p1, p2, cal.pixelWidth, cal.pixelHeight ),  unit  )
+#end measurementText()
+
+
+
+def measurementLayout( p1, p2, text, style, imgw, imgh, layout=None ):
+    '''Where the measurement of the line from `p1` to `p2`, labelled `text`, goes in an image of size (imgw, imgh), without drawing anything.
+
+    (x, y), box = measurementLayout( p1, p2, text, style, imgw, imgh, layout )
+
+    (x, y) is where the text is drawn, as by `drawText()` (the label is placed in the `LabelLayout` `layout`, if given),
+    and `box` the (x, y, width, height) rectangle of all the pixels that drawing the line & text touches, eg. for `saveUndo()`.
+    '''
+    strw, strh = style.textSize( text )
+    pos = parsePosition( textPosition(p1, p2) )
+    if layout is not None:
+        x, y = layout.place( int(p2[0]), int(p2[1]), pos, strw, strh )
+    else:
+        x, y = placeText( int(p2[0]), int(p2[1]), pos, strw, strh, imgw, imgh )
+    dirty = DirtyRect(  lineBox( p1, p2, style.linewidth )  )
+    dirty.add(  textBox( x, y, strw, strh )  )
+    return (x, y), dirty.box
+#end measurementLayout()
+
+
+
+def drawMeasurement( ip, imp, p1, p2, style, unit=None, layout=None, text=None, dirty=None ):
+    '''Draw the line from `p1` to `p2` and its calibrated length (using the calibration of `imp`) into `ip`.
+    `unit` is the unit string, looked up from `imp` if not given.  `layout` is an optional `LabelLayout`, see `drawText()`.
+    `text` is drawn instead of the length, if given.  The rectangle touched is added to the `DirtyRect` `dirty`, if given.
+    Returns the text that was drawn.'''
+    lenstr = text  if text is not None  else measurementText( imp, p1, p2, unit )
+
+    drawLine( ip, p1, p2, style, dirty )
+    drawText( ip, lenstr, p2[0], p2[1], textPosition(p1, p2), style, layout, dirty )
+    return lenstr
+#end drawMeasurement()
+
+
+
+def saveUndo( imp, box ):
+    '''Save the pixels of the rectangle `box` (x, y, width, height) of the current slice of `imp`, before drawing into it, for `undoLast()`.
+    Only that rectangle is copied, rather than the whole image as `ImageProcessor.snapshot()` would.  Kept as a property of the image,
+    so it goes when the image is closed.  Replaces the one saved before.'''
+    ip = imp.getProcessor()
+    oldroi = ip.getRoi()
+    ip.setRoi( box[0], box[1], box[2], box[3] )
+    saved = ip.crop()
+    ip.setRoi( oldroi )
+    imp.setProperty(  UNDO_PROPERTY,  ( imp.getCurrentSlice(), tuple(box), saved )  )
+#end saveUndo()
+
+
+
+def undoLast( imp ):
+    '''Put back the pixels saved by `saveUndo()`, and repaint them.
+    Returns the rectangle restored, or None if there is nothing to undo on the current slice.'''
+    saved = imp.getProperty( UNDO_PROPERTY )
+    if saved is None or saved[0] != imp.getCurrentSlice():
+        return None
+    n, box, pixels = saved
+    imp.getProcessor().insert( pixels, box[0], box[1] )
+    imp.setProperty( UNDO_PROPERTY, None )
+    updateRegion( imp, box )
+    return box
+#end undoLast()
+
+
+
+def updateRegion( imp, box ):
+    '''Repaint only the rectangle `box` (x, y, width, height) of the image window, after drawing into the pixels there,
+    instead of the whole image as `imp.updateAndDraw()` does.  Does nothing if the image has no window.
+    The window paints from a cached display image - an 8-bit copy for 16 & 32-bit images, and for 8-bit images with adjusted contrast -
+    which `imp.draw()` alone doesn't refresh, so the canvas is told the image changed first: that copy is rebuilt on the next paint,
+    but only the rectangle is painted.'''
+    win = imp.getWindow()
+    if box is None or win is None:
+        return
+    if imp.isComposite():
+        imp.updateAndDraw()     # the channels are merged for display as a whole
+        return
+    canvas = win.getCanvas()
+    if canvas is not None:
+        canvas.setImageUpdated()    # rebuild the display image from the pixels in the next paint()
+    imp.draw( int(box[0]), int(box[1]), int(box[2]), int(box[3]) )
+#end updateRegion()
+
+
+
+def isStraightLine( roi ):
+    '''True if the ROI is a straight line.'''
+    return roi is not None and roi.getTypeAsString() == "Straight Line"
+#end isStraightLine()
+
+
+
+def overlayMeasurement( overlay, imp, p1, p2, style, unit=None, position=0, layout=None, text=None ):
+    '''Add the line from `p1` to `p2` and its calibrated length (using the calibration of `imp`) to the Overlay `overlay`,
+    as a Line and a TextRoi.  No pixels are changed.  `position` is the stack slice to show them on, or 0 for all slices.
+    `layout` is an optional `LabelLayout`, see `drawText()`.  `text` is shown instead of the length, if given.
+    Returns the text of the measurement.'''
+    from ij.gui import Line, TextRoi
+
+    lenstr = text  if text is not None  else measurementText( imp, p1, p2, unit )
+
+    line = Line( p1[0], p1[1], p2[0], p2[1] )
+    line.setStrokeWidth( style.linewidth )
+    line.setStrokeColor( style.linecolor )
+
+    (x, y), box = measurementLayout( p1, p2, lenstr, style, imp.getWidth(), imp.getHeight(), layout )
+    strh = style.textSize( lenstr )[1]
+    textroi = TextRoi( x, y - strh, lenstr, style.font )     # TextRoi is placed by its top-left corner, drawString by the bottom
+    textroi.setStrokeColor( style.textcolor )
+    if style.textbackground:  textroi.setFillColor( style.textbackground )
+
+    for roi in (line, textroi):
+        roi.setName( "mmtools measurement" )
+        if position:  roi.setPosition( position )
+        overlay.add( roi )
+    return lenstr
+#end overlayMeasurement()
+
+
+
+def imageOverlay( imp ):
+    '''The image's Overlay, or a new empty one if it has none.'''
+    from ij.gui import Overlay
+    overlay = imp.getOverlay()
+    return overlay  if overlay is not None  else Overlay()
+#end imageOverlay()
+
+
+
+def flattenOverlay( imp, inplace=False ):
+    '''Burn the image's Overlay into pixels, for export.
+
+    inplace=False : returns a new RGB ImagePlus of the current slice with the overlay drawn in (same as Image > Overlay > Flatten).
+    inplace=True : draws the overlay into the pixels of every slice of `imp`, keeping the bit depth, then removes the overlay.  Returns `imp`.
+    Raises ValueError for virtual stacks, whose slices are re-read from the file and can't keep any drawing.
+    '''
+    overlay = imp.getOverlay()
+    if overlay is None:
+        raise ValueError( "flattenOverlay(): The image has no overlay to flatten." )
+    if not inplace:
+        return imp.flatten()
+
+    stack = imp.getStack()
+    if stack.isVirtual() and stack.getSize() > 1:
+        raise ValueError( "flattenOverlay(): Can't draw into the slices of a virtual stack - duplicate it into memory first (Image > Duplicate), or flatten to a new image." )
+    for n in range( 1, stack.getSize()+1 ):
+        ip = imp.getProcessor()  if n == imp.getCurrentSlice()  else stack.getProcessor( n )
+        ip.setSliceNumber( n )      # so only the overlay elements for this slice are drawn
+        ip.drawOverlay( overlay )
+    imp.setOverlay( None )
+    imp.updateAndDraw()
+    return imp
+#end flattenOverlay()
+
+
+
+def annotateRois( imp, rois, style ):
+    '''Draw the measurement of every straight-line ROI in `rois` onto the image `imp`, in one pass.
+
+    ROIs with a stack position (eg. from the ROI Manager) are drawn on that slice, the others on the current slice.
+    One ImageProcessor per slice, and the one `style`, are shared by all the ROIs, and the image is only updated once, at the end,
+    and only in the rectangle drawn into on the current slice (see `updateRegion()`).
+    The labels of each slice are laid out by a `LabelLayout`, so they don't overlap each other, however close the lines are.
+    If `style.overlay` is set, the measurements are added to the image's Overlay instead of the pixels.
+    So are the ones on other slices of a virtual stack, whose slices are re-read from the file each time, so drawing into their pixels would be lost.
+
+    nDrawn, seconds = annotateRois( imp, rois, style )
+    '''
+    t0 = time.time()
+    stack = imp.getStack()
+    current = imp.getCurrentSlice()
+    unit = unitString( imp )
+    processors = {}     # { slice number : ImageProcessor }
+    layouts = {}        # { slice number : LabelLayout }
+    overlay = imageOverlay( imp )  if style.overlay or stack.isVirtual()  else None
+    dirty = DirtyRect()     # drawn into on the current slice
+    nOverlaid = 0       # measurements moved to the Overlay, as they're on other slices of a virtual stack
+
+    nDrawn = 0
+    for roi in rois:
+        if not isStraightLine( roi ):  continue
+        n = roi.getPosition()
+        if n < 1 or n > stack.getSize():  n = current
+        p1, p2 = lineEndpoints( roi )
+        if n not in layouts:
+            layouts[n] = LabelLayout( imp.getWidth(), imp.getHeight() )
+
+        if style.overlay or (overlay is not None and n != current):
+            overlayMeasurement( overlay, imp, p1, p2, style, unit, position=(n if stack.getSize() > 1 else 0), layout=layouts[n] )
+            if not style.overlay:  nOverlaid += 1
+        else:
+            if n not in processors:
+                processors[n] = imp.getProcessor()  if n == current  else stack.getProcessor( n )
+            drawMeasurement( processors[n], imp, p1, p2, style, unit, layouts[n], dirty=(dirty if n == current else None) )
+        nDrawn += 1
+    #end for(rois)
+
+    instrument.count(  'draw.label_collisions',  sum( lay.collisions for lay in layouts.values() )  )
+    with instrument.span( 'draw.update' ):
+        if style.overlay or nOverlaid:
+            imp.setOverlay( overlay )   # repaints the overlay only
+        if not style.overlay:
+            updateRegion(  imp,  dirty.clip( imp.getWidth(), imp.getHeight() )  )     # update the image, once
+    if nOverlaid:
+        print( "annotateRois(): %i measurement(s) on other slices of the virtual stack were added to the Overlay, as their pixels can't be drawn into." % nOverlaid )
+    return nDrawn, time.time() - t0
+#end annotateRois()
@@ -0,0 +1,466 @@
+''' mmtools/batch.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Headless batch calibration of whole directories of images.
+Files are streamed from a directory (or glob pattern) into a bounded queue, which a pool of worker threads consumes, so the file list is never built up front.
+Used by `Batch_Microscope_Calibration.py`.
+TIFFs can also be "stamped": the calibration is written into the file header in place, without re-encoding the pixels (see `stampFile()`).
+A `Pipeline` runs several stages (eg. read, draw & write) on their own threads joined by bounded queues, so successive files overlap, see `mmtools.export`.
+A `BackgroundTask` runs a single slow call (eg. resolving a custom calibration) off the user-interface thread, with a timeout & cancel.
+'''
+
+import os, glob, threading, time
+
+try:
+    import Queue as queue   # Jython/Python 2
+except ImportError:
+    import queue            # Python 3
+
+from mmtools import calibration, instrument, tiffheader
+
+
+# file extensions that are treated as images when walking a directory:
+IMAGE_EXTENSIONS = ['.tif', '.tiff', '.jpg', '.jpeg', '.png', '.bmp', '.gif']
+
+CALIBRATED_SUFFIX = '_cal'      # added to the name of the TIFF saved for an image in another format, see `savedPath()`
+
+
+
+def iterImageFiles( source, extensions=IMAGE_EXTENSIONS ):
+    '''Generator yielding the paths of image files, one at a time.
+
+    `source` is either a directory, which is walked recursively, or a glob pattern such as "/data/sem/*.tif".
+    When walking a directory, only files with an extension in `extensions` (case-insensitive) are returned.
+    '''
+    if os.path.isdir( source ):
+        for dirpath, dirnames, filenames in os.walk( source ):
+            dirnames.sort()
+            for fn in sorted(filenames):
+                if os.path.splitext(fn)[1].lower() in extensions:
+                    yield os.path.join( dirpath, fn )
+        #end for(os.walk)
+    else:
+        for path in glob.iglob( source ):
+            if os.path.isfile( path ):
+                yield path
+    #end if(dir or glob)
+#end iterImageFiles()
+
+
+
+class WorkerPool(object):
+    '''Pool of worker threads fed from a bounded queue.
+
+    pool = WorkerPool( func, workers=4 )
+    for item in items:
+        pool.put( item )    # blocks while the queue is full
+    pool.join()
+
+    `func( item )` is called on a worker thread for every item.  Exceptions raised by `func` are passed to `onerror( item, exception )` if given, otherwise they are printed,
+    as are exceptions raised by `onerror` itself, so a worker never dies.
+    `maxqueue` is the number of items allowed to wait in the queue, default is twice the number of workers.
+    '''
+
+    _STOP = object()    # sentinel telling a worker to exit
+
+    def __init__(self, func, workers=4, maxqueue=None, onerror=None):
+        self.func = func
+        self.onerror = onerror
+        self.workers = max( 1, int(workers) )
+        if maxqueue is None:  maxqueue = 2 * self.workers
+        self.queue = queue.Queue( maxqueue )
+        self.threads = []
+        for ii in range( self.workers ):
+            t = threading.Thread( target=self._work, name="mmtools-worker-%i"%(ii) )
+            t.setDaemon( True )
+            t.start()
+            self.threads.append( t )
+    #end __init__()
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is WorkerPool._STOP:
+                break
+            try:
+                self.func( item )
+            except Exception as e:
+                self._report( item, e )
+            #end try
+        #end while
+    #end _work()
+
+    def _report(self, item, e):
+        '''Pass the exception of an item to `onerror`, or print it.  An `onerror` that raises is only printed, so the worker lives on
+        to drain the queue - otherwise `put()` & `join()` would block for ever once the queue is full.'''
+        try:
+            if self.onerror:
+                self.onerror( item, e )
+            else:
+                print( "WorkerPool: %s failed: %s" % (item, e) )
+        except Exception as e2:
+            print( "WorkerPool: error handler failed for %s: %s" % (item, e2) )
+    #end _report()
+
+    def put(self, item):
+        '''Queue an item for processing.  Blocks while the queue is full.'''
+        self.queue.put( item )
+
+    def qsize(self):
+        '''Approximate number of items waiting in the queue.'''
+        return self.queue.qsize()
+
+    def join(self):
+        '''Wait for all queued items to finish, then stop the worker threads.'''
+        for t in self.threads:
+            self.queue.put( WorkerPool._STOP )
+        for t in self.threads:
+            t.join()
+    #end join()
+#end class(WorkerPool)
+
+
+
+class Pipeline(object):
+    '''Stages on their own worker threads, joined by bounded queues, so eg. the reading, drawing & writing of successive images overlap.
+
+    pipe = Pipeline( [ ('decode', read, 1), ('annotate', draw, 2), ('encode', write, 1) ], maxinflight=4 )
+    for path in paths:
+        pipe.put( path )    # blocks while `maxinflight` items are in the pipeline
+    pipe.join()
+
+    Each stage is (name, func, workers): `func( value )` is called on one of the stage's `workers` threads, and returns the value for the next stage.
+    The first stage gets the item passed to `put()`.  At most `maxinflight` items are between `put()` and the end of the last stage,
+    so no more than that many images are ever in memory, however much faster one stage is than the next.
+    `ondone( item, result, seconds )` is called with the result of the last stage.  If a stage raises, the item leaves the pipeline
+    and `onerror( item, stage name, value, exception )` gets the value the stage failed on (eg. an image to close), otherwise the error is printed.
+    Both are called on the worker threads, before the item's place in the pipeline is freed; exceptions they raise are printed, so a worker never dies
+    (a dead stage would leave its bounded queue full, and `put()` & `join()` blocked for ever).  The busy time of each stage is summed in `stagetime`, and recorded as the instrumentation span "<prefix>.<stage name>".
+    '''
+
+    _STOP = object()    # sentinel telling a worker to exit
+
+    def __init__(self, stages, maxinflight=4, ondone=None, onerror=None, prefix='pipeline'):
+        if not stages:
+            raise ValueError( "Pipeline(): Need at least one stage." )
+        self.names = [ name for name, func, workers in stages ]
+        self.ondone = ondone
+        self.onerror = onerror
+        self.prefix = prefix
+        self.maxinflight = max( 1, int(maxinflight) )
+        self.slots = threading.BoundedSemaphore( self.maxinflight )
+        self.lock = threading.Lock()
+        self.stagetime = dict(  ( name, 0.0 )  for name in self.names  )
+        self.queues = [  queue.Queue( self.maxinflight )  for stage in stages  ]
+        self.threads = []       # [ [ threads of stage 0 ], ... ]
+        for ii, (name, func, workers) in enumerate( stages ):
+            threads = []
+            for jj in range(  max( 1, int(workers) )  ):
+                t = threading.Thread( target=self._work, args=(ii, func), name="mmtools-%s-%i" % (name, jj) )
+                t.setDaemon( True )
+                t.start()
+                threads.append( t )
+            self.threads.append( threads )
+    #end __init__()
+
+    def _work(self, ii, func):
+        name = self.names[ii]
+        last = ( ii == len(self.names) - 1 )
+        while True:
+            job = self.queues[ii].get()
+            if job is Pipeline._STOP:
+                break
+            item, value, t0 = job
+            ts = time.time()
+            try:
+                value = func( value )
+            except Exception as e:
+                self._finish( ii, ts )
+                try:
+                    if self.onerror:
+                        self.onerror( item, name, job[1], e )
+                    else:
+                        print( "Pipeline: %s failed in `%s`: %s" % (item, name, e) )
+                except Exception as e2:
+                    print( "Pipeline: error handler failed for %s in `%s`: %s" % (item, name, e2) )
+                self.slots.release()    # only once the item is cleaned up
+                continue
+            self._finish( ii, ts )
+            if last:
+                try:
+                    if self.ondone:  self.ondone( item, value, time.time() - t0 )
+                except Exception as e2:
+                    print( "Pipeline: ondone() failed for %s: %s" % (item, e2) )
+                self.slots.release()
+            else:
+                self.queues[ii+1].put(  ( item, value, t0 )  )
+        #end while
+    #end _work()
+
+    def _finish(self, ii, ts):
+        dt = time.time() - ts
+        with self.lock:
+            self.stagetime[ self.names[ii] ] += dt
+        instrument.record( self.prefix + '.' + self.names[ii], dt )
+    #end _finish()
+
+    def put(self, item):
+        '''Feed an item to the first stage.  Blocks while `maxinflight` items are in the pipeline.'''
+        self.slots.acquire()
+        self.queues[0].put(  ( item, item, time.time() )  )
+
+    def join(self):
+        '''Wait for all the items to leave the pipeline, then stop the worker threads, one stage after the other.'''
+        for q, threads in zip( self.queues, self.threads ):
+            for t in threads:
+                q.put( Pipeline._STOP )
+            for t in threads:
+                t.join()
+    #end join()
+
+    def summary(self):
+        '''The busy time of each stage, as a printable string.'''
+        return ", ".join(  "%s %0.2f s" % ( name, self.stagetime[name] )  for name in self.names  )
+#end class(Pipeline)
+
+
+
+class BackgroundTask(object):
+    '''Call `func( *args )` once, on a daemon thread, so that a slow call (eg. a custom calibration reading its sidecar file from a network share)
+    doesn't block the thread that started it.  That thread can `wait()` for it with a timeout, and `cancel()` it.
+
+    task = BackgroundTask( resolve, (rec, imp), name='mmtools-calibrate' )
+    if task.wait( 30 ):
+        value = task.get()      # raises the exception of `func`, if it raised one
+
+    Threads can't be stopped from outside, so a cancelled or timed-out call runs on to its end, and its result is then dropped.
+
+    BackgroundTask.result : the return value of `func`, once done
+    BackgroundTask.error : the exception raised by `func`, or None
+    BackgroundTask.cancelled : True once `cancel()` was called
+    BackgroundTask.seconds : how long `func` ran, once done
+    '''
+
+    def __init__(self, func, args=(), name='mmtools-task'):
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.seconds = 0.0
+        self.name = name
+        self.finished = threading.Event()
+        self.thread = threading.Thread( target=self._run, args=(func, args), name=name )
+        self.thread.setDaemon( True )   # an abandoned call doesn't keep ImageJ from quitting
+        self.thread.start()
+    #end __init__()
+
+    def _run(self, func, args):
+        ts = time.time()
+        try:
+            self.result = func( *args )
+        except Exception as e:
+            self.error = e
+        finally:
+            self.seconds = time.time() - ts
+            instrument.record( self.name, self.seconds )
+            self.finished.set()
+    #end _run()
+
+    def done(self):
+        '''True once `func` has returned or raised.'''
+        return self.finished.is_set()
+
+    def wait(self, timeout=None):
+        '''Wait up to `timeout` seconds (None = for ever) for `func` to finish.  Returns False if it is still running.'''
+        self.finished.wait( timeout )
+        return self.finished.is_set()
+
+    def cancel(self):
+        '''Give up on the call: `get()` then raises, whether or not `func` has finished yet.'''
+        self.cancelled = True
+
+    def get(self):
+        '''The return value of `func`.  Raises its exception if it raised one, or RuntimeError if the task was cancelled or hasn't finished.'''
+        if self.cancelled:
+            raise RuntimeError( "BackgroundTask(): `%s` was cancelled." % self.name )
+        if not self.done():
+            raise RuntimeError( "BackgroundTask(): `%s` hasn't finished yet." % self.name )
+        if self.error is not None:
+            raise self.error
+        return self.result
+    #end get()
+#end class(BackgroundTask)
+
+
+
+class BatchStats(object):
+    '''Thread-safe counters for the throughput summary.
+    `verb` starts the summary, eg. "Calibrated 12 files (0 failed) ...", or "Measured ..." for a batch of measurements.'''
+
+    def __init__(self, verb='Calibrated'):
+        self.verb = verb
+        self.lock = threading.Lock()
+        self.done = 0
+        self.failed = 0
+        self.busytime = 0.0     # summed per-file time, over all workers
+        self.start = time.time()
+
+    def add(self, seconds, ok=True):
+        with self.lock:
+            if ok:
+                self.done += 1
+            else:
+                self.failed += 1
+            self.busytime += seconds
+    #end add()
+
+    def summary(self):
+        '''Returns the total throughput as a printable string.'''
+        elapsed = time.time() - self.start
+        total = self.done + self.failed
+        rate = total / elapsed  if elapsed > 0 else 0.0
+        perfile = 1000. * self.busytime / total  if total else 0.0
+        return "%s %i files (%i failed) in %0.2f s:  %0.1f files/s, %0.1f ms/file" % (self.verb, total, self.failed, elapsed, rate, perfile)
+    #end summary()
+#end class(BatchStats)
+
+
+
+def calibrateFile( path, registry, rec=None, save=True, scalebar=None ):
+    '''Open the image at `path` (without a window), apply a calibration and optionally save it.
+
+    calName, PixelPerUnit, Unit = calibrateFile( path, registry, rec, save )
+
+    `rec` is the CalRecord to apply, or None to try each custom calibration class in the `registry` in turn (see `calibration.autoCalibration`).
+    `scalebar` is an `annotate.Style` to add a scale bar with (see `mmtools.scalebar`), or None for no scale bar.
+    TIFF files are saved in place.  Other formats cannot store the calibration, so a TIFF is written next to them, see `savedPath()`.
+    Stacks also get the Z spacing & frame interval of the calibration, if it sets them.  If not `save`, TIFF stacks are opened as
+    virtual stacks, so only the plane needed by a custom calibration is read.
+    '''
+    from ij import IJ
+
+    imp = openImage( path, virtual=not save )
+    try:
+        if rec is None:
+            result = calibration.autoCalibration( registry, imp, stack=True )
+        else:
+            result = calibration.resolveCalibration( rec, imp, stack=True )
+        calName, newPixelPerUnit, newUnit = result[:3]
+
+        imp.setCalibration(  calibration.makeCalibration( imp, *result[1:] )  )
+        if scalebar is not None:
+            from mmtools import scalebar as sb
+            sb.addScaleBar( imp, scalebar )
+
+        if save:
+            IJ.saveAsTiff(  imp,  savedPath( path )  )
+    finally:
+        imp.close()
+    #end try
+
+    return calName, newPixelPerUnit, newUnit
+#end calibrateFile()
+
+
+
+def savedPath( path ):
+    '''The file `calibrateFile()` saves the image at `path` to: `path` itself for TIFFs, otherwise "<name>_cal.tif" next to it,
+    so an existing "<name>.tif" - maybe a different acquisition - is never overwritten.'''
+    root, ext = os.path.splitext( path )
+    if ext.lower() in ('.tif', '.tiff'):
+        return path
+    return root + CALIBRATED_SUFFIX + '.tif'
+#end savedPath()
+
+
+
+def openImage( path, virtual=False ):
+    '''Open the image at `path` without a window.  With `virtual`, TIFFs are opened as virtual stacks, reading the headers & only the current plane.
+    Raises IOError if the image couldn't be opened.'''
+    from ij import IJ
+
+    imp = None
+    if virtual and os.path.splitext( path )[1].lower() in ('.tif', '.tiff'):
+        imp = IJ.openVirtual( path )
+    if imp is None:
+        imp = IJ.openImage( path )
+    if imp is None:
+        raise IOError( "Could not open image: " + path )
+    return imp
+#end openImage()
+
+
+
+def stampFile( path, registry, rec=None ):
+    '''Write a calibration into the header of a TIFF file in place, without re-encoding its pixels.
+
+    calName, PixelPerUnit, Unit = stampFile( path, registry, rec )
+
+    Fixed calibrations & the header extractors of `mmtools.vendors` are computed without opening the image at all,
+    other custom calibrations (eg. `JEOL_SEM_CalFromTxt`) open it as a virtual stack to compute the scale, but the file is still only patched.
+    The Z spacing & frame interval of stacks are stamped too, if the calibration sets them.
+    Non-TIFF files are calibrated & saved as TIFF, as by `calibrateFile()`.
+    '''
+    if os.path.splitext( path )[1].lower() not in ('.tif', '.tiff'):
+        return calibrateFile( path, registry, rec, save=True )
+
+    result = calibration.headerCalibration( registry, rec, path, stack=True )
+    if result is None:
+        imp = openImage( path, virtual=True )
+        try:
+            if rec is None:
+                result = calibration.autoCalibration( registry, imp, stack=True )
+            else:
+                result = calibration.resolveCalibration( rec, imp, stack=True )
+        finally:
+            imp.close()
+    #end if(needs the image)
+
+    calName, newPixelPerUnit, newUnit, newAspect, pixelDepth, frameInterval, timeUnit = result
+    pixelWidth, pixelHeight = calibration.pixelSize( newPixelPerUnit, newAspect )
+    tiffheader.writeResolution( path, pixelWidth, pixelHeight, newUnit, pixelDepth, frameInterval, timeUnit )
+    return calName, newPixelPerUnit, newUnit
+#end stampFile()
+
+
+
+def runBatch( source, registry, rec=None, workers=4, save=True, log=None, stamp=False, scalebar=None ):
+    '''Calibrate every image in `source` (a directory or glob pattern) using a pool of `workers` threads.
+
+    `rec` is the CalRecord to apply, or None for automatic calibration with the custom calibration classes in the `registry`.
+    `log( message )` receives the per-file lines and the final summary, default is to print them.
+    If `stamp` is True, TIFFs are stamped in place with `stampFile()` instead of being opened & re-saved, and `save` is ignored.
+    `scalebar` is an `annotate.Style` to add a scale bar to each image with, or None.  Stamped TIFFs keep their pixels, so they get no scale bar.
+    Returns the BatchStats object.
+    '''
+    if log is None:
+        def log( msg ):  print( msg )
+
+    stats = BatchStats()
+    loglock = threading.Lock()
+
+    def work( path ):
+        t0 = time.time()
+        try:
+            if stamp:
+                calName, newPixelPerUnit, newUnit = stampFile( path, registry, rec )
+            else:
+                calName, newPixelPerUnit, newUnit = calibrateFile( path, registry, rec, save, scalebar )
+        except Exception as e:
+            dt = time.time() - t0
+            stats.add( dt, ok=False )
+            with loglock:  log( "FAILED  %s  (%0.1f ms): %s" % (path, 1000.*dt, e) )
+            return
+        dt = time.time() - t0
+        stats.add( dt )
+        instrument.record( 'batch.file', dt )
+        with loglock:  log( "%s  -->  `%s` : %g px/%s  (%0.1f ms)" % (path, calName, newPixelPerUnit, newUnit, 1000.*dt) )
+    #end work()
+
+    pool = WorkerPool( work, workers )
+    for path in iterImageFiles( source ):
+        pool.put( path )
+    pool.join()
+
+    log(  stats.summary()  )
+    return stats
+#end runBatch()
@@ -0,0 +1,224 @@
+''' mmtools/calibration.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Resolve the calibrations from the registry (see `mmtools.registry`) and apply them to ImagePlus objects.
+A calibration record is either a fixed value from the settings file/tables, or a custom class with a `.cal( ImagePlus )` method, such as `JEOL_SEM_CalFromTxt`.
+
+Resolving a calibration is plain Python (ImageJ is only imported by the functions that apply it), so `resolveCalibration()`,
+`headerCalibration()` & `pixelSize()` also work under CPython.
+
+Z-stacks, time series & hyperstacks also get their slice spacing & frame interval, when the calibration sets them
+(`pixel_depth`, `frame_interval` & `time_unit`, see `mmtools.registry`).  Calibrating only replaces the image's Calibration object,
+so it costs the same for a virtual stack of thousands of planes as for a single image - no planes are read.
+'''
+
+import copy, threading, time
+
+from mmtools import instrument
+
+
+
+STACK_AXES = ('pixel_depth', 'frame_interval', 'time_unit')
+NO_AXES = (None, None, None)
+
+
+def stackAxes( obj ):
+    '''(PixelDepth, FrameInterval, TimeUnit) of a CalRecord or custom calibration object, None for the ones it doesn't set.'''
+    return tuple(  getattr( obj, name, None )  for name in STACK_AXES  )
+
+
+
+def resolveCalibration( rec, imp, stack=False ):
+    '''Compute the scaling for the calibration record `rec`.
+
+    calName, PixelPerUnit, Unit, Aspect = resolveCalibration( rec, imp )
+    calName, PixelPerUnit, Unit, Aspect, PixelDepth, FrameInterval, TimeUnit = resolveCalibration( rec, imp, stack=True )
+
+    `imp` is the ImagePlus being calibrated - only used by custom calibration classes, which are called as `classObj.cal( imp )`.
+    `Aspect` is defined as pixelHeight = pixelWidth * Aspect.
+    With `stack`, the Z spacing (in `Unit`s), frame interval & time unit are added, each None if the calibration doesn't set it.
+    '''
+    if not rec.isCustom():
+        '''It's just a regular calibration setting'''
+        result = rec.name, rec.pixel_per_unit, rec.unit, rec.aspect_ratio
+        calObject = rec
+    else:
+        ''' Custom function/class '''
+        # call the class' `classObj.cal( ImagePlusObject )` function to get the scale value.
+        # `.cal()` stores `.unit` etc. on the object, so work on a copy in case batch threads share it:
+        calObject = copy.copy( rec.custom )
+        with instrument.span( 'calibration.custom' ):
+            newPixelPerUnit = calObject.cal( imp )
+        result = calObject.name, newPixelPerUnit, calObject.unit, calObject.aspect_ratio
+    #end if(custom)
+    return result + stackAxes( calObject )  if stack  else result
+#end resolveCalibration()
+
+
+
+def pixelSize( PixelPerUnit, Aspect ):
+    '''Returns the (pixelWidth, pixelHeight) in units, for a scale of `PixelPerUnit` & aspect ratio `Aspect`.'''
+    # the following translated from "Microscope_Scale.java":
+    pixelWidth = 1. / PixelPerUnit
+    return pixelWidth, pixelWidth * Aspect
+#end pixelSize()
+
+
+
+def makeCalibration( imp, PixelPerUnit, Unit, Aspect, PixelDepth=None, FrameInterval=None, TimeUnit=None ):
+    '''Returns a copy of the image's Calibration object, with the new scaling & unit set.
+    `PixelDepth` (Z spacing in `Unit`s), `FrameInterval` & `TimeUnit` are only set if not None, otherwise the image keeps its own.'''
+    newcal = imp.getCalibration().copy()   # make a copy of current calibration object
+
+    newcal.setUnit(  Unit  )
+    newcal.pixelWidth, newcal.pixelHeight = pixelSize( PixelPerUnit, Aspect )
+    if PixelDepth is not None:
+        newcal.pixelDepth = PixelDepth
+    if FrameInterval is not None:
+        newcal.frameInterval = FrameInterval
+    if TimeUnit is not None:
+        newcal.setTimeUnit( TimeUnit )
+    return newcal
+#end makeCalibration()
+
+
+
+def autoCalibration( registry, imp, stack=False ):
+    '''Try each custom calibration class in the registry, in order, and use the first one that works for this image.
+
+    calName, PixelPerUnit, Unit, Aspect = autoCalibration( registry, imp )
+
+    With `stack`, the Z/T values are added as for `resolveCalibration()`.
+
+    Raises ValueError if none of the custom calibrations could calibrate the image.
+    '''
+    errors = []
+    for rec in registry.customs():
+        try:
+            return resolveCalibration( rec, imp, stack )
+        except (IOError, ValueError, TypeError, ZeroDivisionError) as e:
+            errors.append(  "%s: %s" % ( rec.name, e )  )
+    #end for(custom cals)
+
+    if not errors:
+        raise ValueError( "autoCalibration(): No custom calibrations are defined in the settings file." )
+    raise ValueError( "autoCalibration(): No custom calibration worked for this image:\n\t" + "\n\t".join(errors) )
+#end autoCalibration()
+
+
+
+def headerCalibration( registry, rec, path, stack=False ):
+    '''Compute the calibration of an image file without opening it, when the calibration allows it.
+
+    calName, PixelPerUnit, Unit, Aspect = headerCalibration( registry, rec, path )
+
+    Fixed calibrations & the header extractors of `mmtools.vendors` (anything with a `.fromPath( path )` method) don't need the pixels.
+    `rec` is the CalRecord, or None to try the custom calibrations in order, as `autoCalibration()` does.
+    Returns None if the image has to be opened, ie. when a custom class that needs the ImagePlus comes first.
+    Raises ValueError if no calibration worked.
+    With `stack`, the Z/T values are added as for `resolveCalibration()` (always None from the header extractors).
+    '''
+    axes = ()
+    if rec is not None and not rec.isCustom():
+        if stack:
+            axes = stackAxes( rec )
+        return (rec.name, rec.pixel_per_unit, rec.unit, rec.aspect_ratio) + axes
+    if stack:
+        axes = NO_AXES
+
+    errors = []
+    for r in ( [rec]  if rec is not None  else registry.customs() ):
+        if not hasattr( r.custom, 'fromPath' ):
+            return None     # eg. JEOL_SEM_CalFromTxt, which gets the path from the ImagePlus
+        try:
+            ppu, unit, aspect = r.custom.fromPath( path )
+            return (r.name, ppu, unit, aspect) + axes
+        except (IOError, ValueError, TypeError, ZeroDivisionError) as e:
+            errors.append(  "%s: %s" % ( r.name, e )  )
+    #end for(custom cals)
+    raise ValueError( "headerCalibration(): No calibration worked for this image:\n\t" + "\n\t".join(errors) )
+#end headerCalibration()
+
+
+
+_pending = set()        # windows waiting for the next coalesced repaint
+_pendinglock = threading.Lock()
+
+
+def _flushRepaints():
+    '''Repaint all the pending windows.  Runs on the Event Dispatch Thread.'''
+    with _pendinglock:
+        windows = list( _pending )
+        _pending.clear()
+    with instrument.span( 'repaint' ):
+        for win in windows:
+            win.repaint()
+#end _flushRepaints()
+
+
+def repaintLater( windows ):
+    '''Queue windows for one coalesced repaint on the Event Dispatch Thread.
+    Windows that are hidden or minimized are skipped.  Returns the number of windows queued.'''
+    from java.awt import EventQueue, Frame
+
+    visible = [ win for win in windows  if win is not None and win.isShowing() and not (win.getExtendedState() & Frame.ICONIFIED) ]
+    with _pendinglock:
+        first = not _pending
+        _pending.update( visible )
+    if first and visible:
+        EventQueue.invokeLater( _flushRepaints )    # later calls just add to the pending set
+    return len( visible )
+#end repaintLater()
+
+
+
+def onUiThread( func, *args ):
+    '''Call `func( *args )` on the Event Dispatch Thread, wait for it & return its result.  Used to apply a calibration resolved on a
+    background thread (see `batch.BackgroundTask`), so the images & their windows are only changed from the thread that paints them.
+    Runs `func` directly if already on the Event Dispatch Thread, or if there is no display (headless/batch mode).'''
+    from java.awt import EventQueue, GraphicsEnvironment
+
+    if GraphicsEnvironment.isHeadless() or EventQueue.isDispatchThread():
+        return func( *args )
+
+    out = {}
+    def call():
+        try:
+            out['result'] = func( *args )
+        except Exception as e:
+            out['error'] = e
+    EventQueue.invokeAndWait( call )     # an exception on the Event Dispatch Thread wouldn't reach this one, so it is passed back
+    if 'error' in out:
+        raise out['error']
+    return out.get( 'result' )
+#end onUiThread()
+
+
+
+def applyCalibration( imp, newcal, allimages=False ):
+    '''Set the Calibration `newcal` on the image `imp`, or globally on all open images if `allimages` is True,
+    and refresh the image windows in a single deferred repaint.
+    Images without a window (hidden/batch-mode images) are calibrated but not repainted.
+    Only the Calibration object is replaced, so hyperstacks & virtual stacks are calibrated without reading any of their planes.
+
+    nImages, nRepainted, seconds = applyCalibration( imp, newcal, allimages )
+    '''
+    from ij import WindowManager
+
+    t0 = time.time()
+    if allimages:
+        '''Apply to all images'''
+        imp.setGlobalCalibration( newcal )
+        ids = WindowManager.getIDList() or []       # None if no images are open
+        imps = [ WindowManager.getImage(wid) for wid in ids ]
+        imps = [ im for im in imps  if im is not None ]
+    else:
+        imp.setGlobalCalibration( None )
+        imp.setCalibration( newcal )    # set the new calibration
+        imps = [ imp ]
+    #end if(allimages)
+
+    nRepainted = repaintLater(  [ im.getWindow() for im in imps ]  )
+    instrument.record( 'calibration.apply', time.time() - t0 )
+    return len(imps), nRepainted, time.time() - t0
+#end applyCalibration()
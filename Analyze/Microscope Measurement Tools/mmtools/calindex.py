@@ -0,0 +1,155 @@
+''' mmtools/calindex.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Persistent index of the calibrations of a whole tree of JEOL SEM images, so the *.txt sidecars don't have to be parsed every time.
+The index maps each image path to
+    (pixel-per-unit, unit, aspect ratio, magnification, sidecar mtime)
+and is stored as a tab-separated text file, which is loaded into a dictionary for O(1) lookups.
+Re-indexing a tree only re-parses the sidecars whose mtime changed, and drops images that were deleted.
+
+Build/update an index with the plugin `Index_SEM_Calibrations.py`, then point the JEOL calibration at it in the settings file:
+    jeol_sem_cal_from_txt = JEOL_SEM_CalFromTxt( index='/data/sem/calindex.tsv' )
+'''
+
+import os, threading, time
+
+from mmtools import sidecar, batch
+
+
+HEADER = "# Microscope Measurement Tools calibration index v1\n"
+
+
+
+class CalIndex(object):
+    '''Calibration index stored in the file `path`.  The file is loaded on construction if it exists.
+
+    CalIndex.entries : dict
+        { image_path : (PixelPerUnit, Unit, Aspect, Magnification, SidecarMtime) }
+        Image paths are absolute.  Magnification is None if the sidecar didn't have one.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.isfile( path ):
+            self.load()
+    #end __init__()
+
+
+    def load(self):
+        '''(Re)load the entries from the index file.'''
+        entries = {}
+        f = open( self.path, 'r' )
+        try:
+            for line in f:
+                if line.startswith('#'): continue
+                fields = line.rstrip('\r\n').split('\t')
+                if len(fields) != 6: continue
+                imgpath, ppu, unit, aspect, mag, mtime = fields
+                entries[imgpath] = ( float(ppu), unit, float(aspect), (float(mag) if mag else None), float(mtime) )
+            #end for(lines)
+        finally:
+            f.close()
+        self.entries = entries
+    #end load()
+
+
+    def save(self):
+        '''Write the index file.  A temporary file is written first, so a crash never leaves a half-written index.'''
+        tmppath = self.path + '.tmp'
+        f = open( tmppath, 'w' )
+        try:
+            f.write( HEADER )
+            for imgpath, (ppu, unit, aspect, mag, mtime) in self.entries.items():
+                f.write(  "%s\t%r\t%s\t%r\t%s\t%r\n" % ( imgpath, ppu, unit, aspect, ('' if mag is None else repr(mag)), mtime )  )
+        finally:
+            f.close()
+        if os.path.exists( self.path ):
+            os.remove( self.path )      # os.rename won't overwrite on Windows
+        os.rename( tmppath, self.path )
+    #end save()
+
+
+    def lookup(self, imagepath):
+        '''Returns the index entry (PixelPerUnit, Unit, Aspect, Magnification, SidecarMtime) for an image, or None if it isn't indexed.'''
+        return self.entries.get(  os.path.abspath(imagepath)  )
+    #end lookup()
+
+
+    def update(self, root, log=None):
+        '''Walk the tree `root` and (re)index every image that has a sidecar *.txt file.
+        Sidecars whose mtime matches the index are skipped, and indexed images under `root` that no longer exist are removed.
+
+        Returns (scanned, updated, removed) counts.  Call `save()` afterwards to store the changes.
+        '''
+        root = os.path.abspath( root )
+        seen = set()
+        scanned = updated = 0
+        for imgpath in batch.iterImageFiles( root ):
+            txtpath = sidecar.sidecarPath( imgpath )
+            try:
+                mtime = os.stat( txtpath ).st_mtime
+            except OSError:
+                continue        # no sidecar, not a JEOL image
+            scanned += 1
+            seen.add( imgpath )
+
+            old = self.entries.get( imgpath )
+            if old is not None and old[4] == mtime:
+                continue        # unchanged since last time
+
+            try:
+                ppu, unit = sidecar.jeolScale( txtpath )
+                mag = sidecar.jeolMagnification( txtpath )
+            except (IOError, ValueError) as e:
+                if log: log( "calindex: skipping %s: %s" % (imgpath, e) )
+                continue
+            self.entries[imgpath] = ( ppu, unit, 1.0, mag, mtime )
+            updated += 1
+        #end for(images)
+
+        # remove images under `root` that have disappeared:
+        prefix = root.rstrip(os.sep) + os.sep
+        gone = [ p for p in self.entries  if p.startswith(prefix) and p not in seen ]
+        for p in gone:
+            del self.entries[p]
+
+        return scanned, updated, len(gone)
+    #end update()
+#end class(CalIndex)
+
+
+
+_open = {}      # { index path : (file mtime, CalIndex) }
+_openlock = threading.Lock()
+
+def openIndex( path ):
+    '''Returns the CalIndex stored in `path`, re-using the already-loaded one unless the file changed since.'''
+    try:
+        mtime = os.stat( path ).st_mtime
+    except OSError:
+        mtime = None
+    with _openlock:
+        cached = _open.get( path )
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        idx = CalIndex( path )
+        _open[path] = ( mtime, idx )
+        return idx
+#end openIndex()
+
+
+
+def indexTree( root, indexpath, log=None ):
+    '''Create or update the index file `indexpath` for all the images under `root`, and save it.
+    Returns the CalIndex.'''
+    if log is None:
+        def log( msg ):  print( msg )
+
+    t0 = time.time()
+    idx = CalIndex( indexpath )
+    scanned, updated, removed = idx.update( root, log )
+    idx.save()
+    log( "Indexed %s:  %i images with sidecars, %i (re)parsed, %i removed, %i total in index  (%0.2f s)" % (root, scanned, updated, removed, len(idx.entries), time.time()-t0) )
+    return idx
+#end indexTree()
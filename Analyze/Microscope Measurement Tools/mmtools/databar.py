@@ -0,0 +1,224 @@
+''' mmtools/databar.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Read the scale bar that SEMs burn into the data bar at the bottom of each image, so images without their *.txt sidecar can still be calibrated.
+
+Only a thin strip of rows at the bottom of the image is scanned.  Each row is reduced to its runs of bright pixels,
+and the scale bar is the longest run that repeats identically on several consecutive rows.
+The marker value (eg. "100nm") is then either looked up from the bar length in a table, or found by matching binarized templates of the marker text against the strip.
+
+The scanning works on plain lists of pixel values, only `stripRows()` & `loadTemplate()` need ImageJ.
+'''
+
+import os
+
+
+STRIP_FRACTION = 0.1    # default height of the data-bar strip, as a fraction of the image height
+MIN_LENGTH = 20         # shortest run (pixels) that can be a scale bar, shorter runs are text
+MIN_THICKNESS = 2       # rows the bar has to repeat on
+MAX_WIDTH = 0.9         # longest run that can be a scale bar, as a fraction of the strip width (rules out borders & lines)
+
+
+
+def rowRuns( row, threshold ):
+    '''Returns the list of (start, length) of the runs of pixels brighter than `threshold` in one row of pixel values.'''
+    runs = []
+    start = None
+    for x, v in enumerate( row ):
+        if v > threshold:
+            if start is None:  start = x
+        elif start is not None:
+            runs.append( (start, x - start) )
+            start = None
+    if start is not None:
+        runs.append( (start, len(row) - start) )
+    return runs
+#end rowRuns()
+
+
+
+def autoThreshold( rows ):
+    '''Threshold halfway between the darkest & brightest pixel of the strip - the data bar is usually pure black & white.'''
+    lo = min( min(row) for row in rows )
+    hi = max( max(row) for row in rows )
+    return ( lo + hi ) / 2.0
+#end autoThreshold()
+
+
+
+def findScaleBar( rows, threshold=None, minlength=MIN_LENGTH, minthickness=MIN_THICKNESS ):
+    '''Find the scale bar in the rows of the data-bar strip.
+
+    x, y, length, thickness = findScaleBar( rows, threshold )
+
+    `rows` is a list of rows of pixel values (top to bottom), `threshold` defaults to `autoThreshold( rows )`.
+    `x`, `y` are the top-left pixel of the bar within the strip, `thickness` is the number of rows it spans.
+    `length` is the distance from the first to the last pixel of the bar, ie. one less than the number of pixels,
+    which is how JEOL records the bar in `$$SM_MICRON_BAR`.
+    Raises ValueError if no scale bar is found.
+    '''
+    if threshold is None:
+        threshold = autoThreshold( rows )
+    width = len( rows[0] )
+    maxlength = MAX_WIDTH * width
+
+    best = None
+    active = {}     # { (start, length) : (first row, rows so far) } of the runs in the previous row
+    for y, row in enumerate( rows ):
+        current = {}
+        for run in rowRuns( row, threshold ):
+            if not minlength <= run[1] <= maxlength:  continue
+            y0, n = active.get( run, (y, 0) )
+            current[run] = (y0, n + 1)
+            if n + 1 >= minthickness  and  ( best is None or (run[1], n + 1) > (best[2] + 1, best[3]) ):
+                best = ( run[0], y0, run[1] - 1, n + 1 )
+        #end for(runs)
+        active = current
+    #end for(rows)
+
+    if best is None:
+        raise ValueError( "findScaleBar(): No scale bar found in the data bar (looked for a bright run of %i pixels or more, on at least %i rows)." % (minlength, minthickness) )
+    return best
+#end findScaleBar()
+
+
+
+def lookupMarker( table, length, tolerance=1 ):
+    '''Returns the marker string (eg. "100nm") for a scale bar of `length` pixels, from `table` = { bar length : marker }.
+    Lengths within `tolerance` pixels match.  Raises ValueError if none does.'''
+    nearest = min(  table,  key=lambda k: abs( float(k) - length )  )  if table else None
+    if nearest is None  or  abs( float(nearest) - length ) > tolerance:
+        raise ValueError( "lookupMarker(): No marker in the table for a scale bar of %i pixels." % (length) )
+    return table[nearest]
+#end lookupMarker()
+
+
+
+def binarize( rows, threshold ):
+    '''Pack each row into an integer bit mask: bit x is set where pixel x is brighter than `threshold`.'''
+    masks = []
+    for row in rows:
+        bits = 0
+        for start, length in rowRuns( row, threshold ):
+            bits |= ( (1 << length) - 1 ) << start
+        masks.append( bits )
+    return masks
+#end binarize()
+
+
+
+def _bitcount( bits ):
+    return bin( bits ).count( '1' )
+
+def _lowbit( bits ):
+    '''Position of the lowest set bit.'''
+    return _bitcount( (bits & -bits) - 1 )
+
+def _runlength( bits, start ):
+    '''Number of consecutive set bits from bit `start` up.'''
+    v = bits >> start
+    return _bitcount( v ^ (v + 1) ) - 1
+
+
+
+def matchTemplate( masks, width, template, maxmismatch=0.05 ):
+    '''Find a binarized template in the binarized strip.
+
+    `masks` are the row masks of the strip from `binarize()`, `width` its width in pixels.
+    `template` is (row masks, width) of the template, as returned by `binarize()` on the template image.
+    The template is only tried where one of its runs lines up with a run of the same length in the strip,
+    and matches if no more than `maxmismatch` (fraction of its bright pixels) differ.
+    Returns the (x, y) of the match, or None.
+    '''
+    tmasks, twidth = template
+    full = (1 << twidth) - 1
+    nset = sum( _bitcount(m) for m in tmasks )
+    allowed = int( maxmismatch * nset )
+
+    # anchor on the first run of the template:
+    ty = [ i for i, m in enumerate(tmasks) if m ][0]
+    tx = _lowbit( tmasks[ty] )
+    tlen = _runlength( tmasks[ty], tx )
+
+    for y in range( ty, len(masks) - len(tmasks) + ty + 1 ):
+        m = masks[y]
+        while m:
+            start = _lowbit( m )
+            length = _runlength( m, start )
+            m &= ~( ((1 << length) - 1) << start )      # next run
+            x = start - tx
+            if abs( length - tlen ) > 1  or  x < 0  or  x + twidth > width:  continue
+            mismatch = 0
+            for i, tm in enumerate( tmasks ):
+                mismatch += _bitcount(  ( (masks[y - ty + i] >> x) & full ) ^ tm  )
+                if mismatch > allowed:  break
+            if mismatch <= allowed:
+                return x, y - ty
+        #end while(runs in row)
+    #end for(rows)
+    return None
+#end matchTemplate()
+
+
+
+def findMarker( rows, templates, threshold=None, maxmismatch=0.05 ):
+    '''Returns the marker string of the template that matches the strip.
+
+    `templates` is { marker : (row masks, width) }, eg. from `loadTemplate()`.
+    If several templates match (eg. "10nm" inside "100nm"), the one with the most bright pixels wins.
+    Raises ValueError if none matches.
+    '''
+    if threshold is None:
+        threshold = autoThreshold( rows )
+    masks = binarize( rows, threshold )
+    width = len( rows[0] )
+
+    best, bestsize = None, -1
+    for marker, template in templates.items():
+        size = sum( _bitcount(m) for m in template[0] )
+        if size > bestsize  and  matchTemplate( masks, width, template, maxmismatch ) is not None:
+            best, bestsize = marker, size
+    #end for(templates)
+    if best is None:
+        raise ValueError( "findMarker(): None of the marker templates (%s) was found in the data bar." % ", ".join( sorted(templates) ) )
+    return best
+#end findMarker()
+
+
+
+def stripRows( imp, strip=STRIP_FRACTION ):
+    '''Returns the rows of 8-bit gray values of the data-bar strip at the bottom of an ImagePlus, as lists of ints.
+    `strip` is the height of the strip in pixels, or as a fraction of the image height if less than 1.'''
+    ip = imp.getProcessor()
+    w, h = ip.getWidth(), ip.getHeight()
+    sh = int( round(strip * h) )  if strip < 1  else int( strip )
+    sh = max( 1, min(sh, h) )
+
+    ip.setRoi( 0, h - sh, w, sh )
+    crop = ip.crop()        # only copies the strip
+    ip.resetRoi()
+    if crop.isColorLut():
+        crop = crop.convertToRGB()      # indexed colors, look up the palette
+    crop = crop.convertToByteProcessor()
+    if crop.isInvertedLut():
+        crop.invert()
+
+    pixels = crop.getPixels()
+    return [  [ p & 0xff for p in pixels[ y*w : (y+1)*w ] ]  for y in range( sh )  ]
+#end stripRows()
+
+
+
+def loadTemplate( path, threshold=None ):
+    '''Load a marker template image, eg. the "100nm" text cropped out of a data bar & saved as a TIFF.
+    Returns (row masks, width) for `matchTemplate()`.'''
+    from ij import IJ
+    timp = IJ.openImage( path )
+    if timp is None:
+        raise IOError( "loadTemplate(): Could not open the template image: " + os.path.abspath(path) )
+    rows = stripRows( timp, timp.getHeight() )
+    timp.close()
+    if threshold is None:
+        threshold = autoThreshold( rows )
+    return binarize( rows, threshold ), len( rows[0] )
+#end loadTemplate()
@@ -0,0 +1,246 @@
+''' mmtools/edges.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Find the edges along a line, to snap the ends of a hand-drawn measurement onto the sidewall or trench edges they were meant to mark.
+
+A band of parallel intensity profiles is sampled along the line, extended by `reach` pixels past each end, with bilinear interpolation.
+All the sample points of the band are computed first and interpolated in one pass over a crop of the line's neighbourhood,
+so only the pixels near the line are ever read, however large the image.  The profiles are averaged across the band to beat down the noise,
+smoothed & differentiated, and the strongest edge within `reach` of each end is located to a fraction of a pixel,
+by fitting a parabola through the gradient peak.
+
+Everything works on plain lists of pixel values, only `processorSampler()` & `snapLine()` need an ImageJ ImageProcessor.
+
+    q1, q2, snapped = edges.snapLine( imp.getProcessor(), p1, p2, reach=10 )
+'''
+
+import math
+
+
+SNAP_REACH = 10.0       # pixels searched before & past each end of the line
+BAND_HALFWIDTH = 2      # profiles sampled either side of the line, so the band is 2*BAND_HALFWIDTH+1 profiles wide
+MIN_CONTRAST = 0.1      # weakest edge snapped to: gradient as a fraction of the intensity range along the profile
+
+
+
+class Sampler(object):
+    '''Bilinear interpolation in a rectangle of pixels.
+
+    Sampler( pixels, width, height, x0=0, y0=0 ) :
+        `pixels` is the flat, row-by-row list of the values of a `width` x `height` rectangle (at least 2x2),
+        whose top-left pixel is at (x0, y0) in image coordinates.
+    Sampler( xs, ys ) :
+        Returns the list of values interpolated at the image coordinates (xs[i], ys[i]).
+        Points outside the rectangle get the value of the nearest point on its border.
+    '''
+
+    def __init__(self, pixels, width, height, x0=0, y0=0):
+        if width < 2 or height < 2:
+            raise ValueError( "Sampler(): Need at least 2x2 pixels, got %ix%i." % (width, height) )
+        self.pixels = pixels
+        self.width = width
+        self.height = height
+        self.x0 = x0
+        self.y0 = y0
+    #end __init__()
+
+    def __call__(self, xs, ys):
+        px, w = self.pixels, self.width
+        xmax, ymax = w - 1, self.height - 1
+        x0, y0 = self.x0, self.y0
+        out = []
+        append = out.append
+        for x, y in zip( xs, ys ):
+            x = min( max( x - x0, 0.0 ), xmax )
+            y = min( max( y - y0, 0.0 ), ymax )
+            ix = min( int(x), xmax - 1 )
+            iy = min( int(y), ymax - 1 )
+            fx, fy = x - ix, y - iy
+            i = iy * w + ix
+            top = px[i] + fx * ( px[i+1] - px[i] )
+            bottom = px[i+w] + fx * ( px[i+w+1] - px[i+w] )
+            append(  top + fy * ( bottom - top )  )
+        return out
+    #end __call__()
+#end class(Sampler)
+
+
+
+def bandPoints( p1, p2, reach=SNAP_REACH, halfwidth=BAND_HALFWIDTH ):
+    '''The sample points of the band of profiles along the line from `p1` to `p2`, extended by `reach` pixels past each end.
+
+    xs, ys, n = bandPoints( p1, p2, reach, halfwidth )
+
+    The points are 1 pixel apart along the line, and the 2*halfwidth+1 profiles are 1 pixel apart across it.
+    `xs`, `ys` hold the profiles one after the other, `n` points each.  Point `i` of each profile is `i - reach` pixels from `p1` along the line.
+    Raises ValueError if the line has no length.
+    '''
+    dx, dy = p2[0] - p1[0], p2[1] - p1[1]
+    length = math.hypot( dx, dy )
+    if length == 0:
+        raise ValueError( "bandPoints(): The line has no length." )
+    ux, uy = dx / length, dy / length       # along the line
+    nx, ny = -uy, ux                        # across it
+    n = int( math.ceil( length + 2 * reach ) ) + 1
+    ax, ay = p1[0] - reach * ux, p1[1] - reach * uy
+
+    xs, ys = [], []
+    for k in range( -halfwidth, halfwidth + 1 ):
+        sx, sy = ax + k * nx, ay + k * ny
+        xs.extend(  sx + i * ux  for i in range(n)  )
+        ys.extend(  sy + i * uy  for i in range(n)  )
+    return xs, ys, n
+#end bandPoints()
+
+
+
+def bandBox( p1, p2, reach, halfwidth, imgw, imgh ):
+    '''The rectangle (x, y, w, h) of the image pixels needed to interpolate the band of `bandPoints()`, clipped to the image.'''
+    dx, dy = p2[0] - p1[0], p2[1] - p1[1]
+    length = math.hypot( dx, dy ) or 1.0
+    ux, uy = dx / length, dy / length
+    ex = abs(ux) * (reach + 1) + abs(uy) * (halfwidth + 1)      # half-extent of the band around the end points
+    ey = abs(uy) * (reach + 1) + abs(ux) * (halfwidth + 1)
+    x1 = max(  0,  int( math.floor( min(p1[0], p2[0]) - ex ) )  )
+    y1 = max(  0,  int( math.floor( min(p1[1], p2[1]) - ey ) )  )
+    x2 = min(  imgw,  int( math.ceil( max(p1[0], p2[0]) + ex ) ) + 1  )
+    y2 = min(  imgh,  int( math.ceil( max(p1[1], p2[1]) + ey ) ) + 1  )
+    return x1, y1, max( x2 - x1, 2 ), max( y2 - y1, 2 )
+#end bandBox()
+
+
+
+def bandProfile( values, n ):
+    '''Average the profiles of `n` values each (as sampled at `bandPoints()`) into one profile.'''
+    nprof = len( values ) // n
+    return [  sum( values[i::n] ) / float(nprof)  for i in range(n)  ]
+#end bandProfile()
+
+
+
+def smooth( profile ):
+    '''Smooth a profile with the [1, 2, 1]/4 kernel, repeating the end values.'''
+    if len( profile ) < 3:
+        return list( profile )
+    p = [ profile[0] ] + list( profile ) + [ profile[-1] ]
+    return [  0.25 * ( p[i-1] + 2 * p[i] + p[i+1] )  for i in range( 1, len(p) - 1 )  ]
+#end smooth()
+
+
+
+def gradient( profile ):
+    '''Central-difference gradient of a profile, 0 at both ends.'''
+    g = [ 0.0 ] * len( profile )
+    for i in range( 1, len(profile) - 1 ):
+        g[i] = 0.5 * ( profile[i+1] - profile[i-1] )
+    return g
+#end gradient()
+
+
+
+def strongestEdge( grad, lo, hi, threshold=0.0 ):
+    '''The strongest edge of the gradient `grad` between the positions `lo` & `hi`.
+
+    position, strength = strongestEdge( grad, lo, hi, threshold )
+
+    `position` is refined to a fraction of a pixel by a parabola through the gradient magnitude around the peak.
+    `strength` is the signed gradient at the peak: positive for dark-to-bright edges.
+    Returns None if no gradient in the range is stronger than `threshold`.
+    '''
+    first = max(  1,  int( math.ceil(lo) )  )
+    last = min(  len(grad) - 2,  int( math.floor(hi) )  )
+    if last < first:
+        return None
+    best = max(  range( first, last + 1 ),  key=lambda i: abs( grad[i] )  )
+    if abs( grad[best] ) <= threshold:
+        return None
+    return _refine( grad, best ), grad[best]
+#end strongestEdge()
+
+
+
+def findEdges( grad, threshold=0.0, separation=2 ):
+    '''All the edges of the gradient `grad`: the peaks of the gradient magnitude stronger than `threshold`.
+
+    [ (position, strength), ... ] = findEdges( grad, threshold, separation )
+
+    Of peaks closer than `separation` pixels, only the strongest is kept.  Positions are sub-pixel, as for `strongestEdge()`,
+    and in increasing order.
+    '''
+    mag = [ abs(g) for g in grad ]
+    peaks = [  i  for i in range( 1, len(grad) - 1 )
+               if mag[i] > threshold  and  mag[i] >= mag[i-1]  and  mag[i] > mag[i+1]  ]
+    kept = []
+    for i in sorted( peaks, key=lambda i: -mag[i] ):     # strongest first
+        if all(  abs( i - j ) >= separation  for j in kept  ):
+            kept.append( i )
+    return [  ( _refine( grad, i ), grad[i] )  for i in sorted( kept )  ]
+#end findEdges()
+
+
+
+def _refine( grad, i ):
+    '''Sub-pixel position of the gradient peak at `i`, from a parabola through the magnitudes at i-1, i & i+1.'''
+    a, b, c = abs( grad[i-1] ), abs( grad[i] ), abs( grad[i+1] )
+    denom = a - 2 * b + c
+    offset = 0.5 * ( a - c ) / denom  if denom != 0  else 0.0
+    return i + max( -0.5, min( 0.5, offset ) )
+#end _refine()
+
+
+
+def snapEndpoints( sample, p1, p2, reach=SNAP_REACH, halfwidth=BAND_HALFWIDTH, mincontrast=MIN_CONTRAST ):
+    '''Move the ends of the line `p1` -> `p2` onto the strongest edges within `reach` pixels of each, along the line.
+
+    q1, q2, snapped = snapEndpoints( sample, p1, p2, reach, halfwidth, mincontrast )
+
+    `sample( xs, ys )` returns the interpolated pixel values at the points, eg. a `Sampler`.
+    Each end only searches up to the middle of the line, so both ends can't snap to the same edge.
+    Ends with no edge stronger than `mincontrast` times the intensity range of the profile are left where they were.
+    `q1`, `q2` are the new (x, y) end points, as floats, and `snapped` is a pair of bools telling which ends moved.
+    '''
+    length = math.hypot( p2[0] - p1[0], p2[1] - p1[1] )
+    if length == 0:
+        return [ p1[0], p1[1] ], [ p2[0], p2[1] ], (False, False)
+
+    xs, ys, n = bandPoints( p1, p2, reach, halfwidth )
+    profile = smooth(  bandProfile( sample( xs, ys ), n )  )
+    grad = gradient( profile )
+    threshold = mincontrast * ( max(profile) - min(profile) )
+
+    mid = reach + 0.5 * length      # profile positions: p1 is at `reach`, p2 at `reach + length`
+    edge1 = strongestEdge( grad, 0, min( 2 * reach, mid ), threshold )
+    edge2 = strongestEdge( grad, max( length, mid ), length + 2 * reach, threshold )
+
+    ux, uy = ( p2[0] - p1[0] ) / length, ( p2[1] - p1[1] ) / length
+    def point( pos ):
+        s = pos - reach
+        return [ p1[0] + s * ux, p1[1] + s * uy ]
+    q1 = point( edge1[0] )  if edge1 is not None  else [ p1[0], p1[1] ]
+    q2 = point( edge2[0] )  if edge2 is not None  else [ p2[0], p2[1] ]
+    return q1, q2, ( edge1 is not None, edge2 is not None )
+#end snapEndpoints()
+
+
+
+def processorSampler( ip, box ):
+    '''A `Sampler` of the rectangle `box` = (x, y, w, h) of the ImageProcessor `ip`, eg. from `bandBox()`.
+    Only that rectangle is copied out of the image (RGB images are converted to brightness).'''
+    x, y, w, h = box
+    oldroi = ip.getRoi()
+    ip.setRoi( x, y, w, h )
+    crop = ip.crop()
+    ip.setRoi( oldroi )
+    return Sampler(  list( crop.convertToFloat().getPixels() ),  crop.getWidth(), crop.getHeight(), x, y  )
+#end processorSampler()
+
+
+
+def snapLine( ip, p1, p2, reach=SNAP_REACH, halfwidth=BAND_HALFWIDTH, mincontrast=MIN_CONTRAST ):
+    '''`snapEndpoints()` on the ImageProcessor `ip`, reading only the pixels around the line.
+
+    q1, q2, snapped = snapLine( ip, p1, p2, reach, halfwidth, mincontrast )
+    '''
+    box = bandBox( p1, p2, reach, halfwidth, ip.getWidth(), ip.getHeight() )
+    return snapEndpoints( processorSampler( ip, box ), p1, p2, reach, halfwidth, mincontrast )
+#end snapLine()
@@ -0,0 +1,259 @@
+''' mmtools/export.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Publish annotated copies of a batch of images: each image is calibrated (with a chosen calibration, or automatically, as by `Batch_Microscope_Calibration.py`),
+the line ROIs saved next to it are drawn with their calibrated lengths (as by `Draw_Measurement_-_Line.py`), a scale bar is added,
+and the result is written in the chosen format.
+
+Reading, drawing & writing run as the three stages of a `batch.Pipeline` - "decode", "annotate" & "encode" - on their own threads,
+joined by bounded queues, so the disk I/O of one image overlaps the drawing of the next.  At most `maxinflight` images are open at once,
+so memory use doesn't depend on the size of the batch, or on which stage is the slowest.
+Used by `Export_Annotated_Images.py`.
+
+With `inplace`, huge uncompressed TIFFs (eg. stitched mosaics) are annotated in their own files instead: the stages then only read,
+draw into & write back the rectangles under the measurements, a few strips or tiles each (see `mmtools.tiles`), and the images are never decoded.
+
+    stats = export.runExport( '/data/sem', calreg, outdir='/data/publish', style=annotate.Style( sets ), fmt='jpg', quality=90 )
+'''
+
+import os, threading
+
+from mmtools import batch, calibration, instrument, measure
+
+
+# output formats: { name : file extension }.
+#   tif : uncompressed TIFF, keeps the calibration & the Overlay
+#   zip : the same TIFF, deflate-compressed into a ZIP archive (ImageJ opens it directly)
+#   png : lossless, compressed, 8-bit or RGB
+#   jpg : lossy, with `quality` 0-100
+FORMATS = { 'tif' : '.tif', 'zip' : '.zip', 'png' : '.png', 'jpg' : '.jpg' }
+
+FLATTENED = ('png', 'jpg')      # formats that can't store an Overlay, so it is burned into the pixels
+JPEG_QUALITY = 85
+MAX_INFLIGHT = 4        # images open at once, over all the stages
+
+EXPORT_SUFFIX = '_annotated'    # added to the name of each exported image
+
+
+
+class ExportJob(object):
+    '''One image going through the export pipeline.
+
+    ExportJob.path : the source image file
+    ExportJob.imp : the open ImagePlus, None once written
+    ExportJob.rois : the line ROIs saved next to the image (see `measure.findRoiSet()`)
+    ExportJob.calName : name of the calibration applied
+    ExportJob.nDrawn : number of measurements drawn
+    ExportJob.out : the file written
+    ExportJob.layout : the `tiles.TiffLayout` of the file, when annotating in place
+    ExportJob.regions : the `tiles.Region`s annotated in place
+    ExportJob.raws : the pixels of each region, as raw bytes
+    '''
+    __slots__ = ('path', 'imp', 'rois', 'calName', 'nDrawn', 'out', 'layout', 'regions', 'raws')
+
+    def __init__(self, path):
+        self.path = path
+        self.imp = None
+        self.rois = []
+        self.calName = None
+        self.nDrawn = 0
+        self.out = None
+        self.layout = None
+        self.regions = []
+        self.raws = []
+
+    def close(self):
+        '''Close the image, if it is still open.'''
+        if self.imp is not None:
+            self.imp.close()
+            self.imp = None
+#end class(ExportJob)
+
+
+
+def outputPath( path, fmt, outdir=None, root=None ):
+    '''The file an image is exported to: "<name>_annotated.<ext>", next to the image, or in `outdir`.
+    If `root` is the directory the batch came from, the sub-directories below it are kept under `outdir`.'''
+    name = os.path.splitext(  os.path.basename( path )  )[0] + EXPORT_SUFFIX + FORMATS[fmt]
+    if outdir is None:
+        return os.path.join( os.path.dirname( path ), name )
+    subdir = os.path.relpath( os.path.dirname( path ), root )  if root is not None  else os.curdir
+    return os.path.normpath(  os.path.join( outdir, subdir, name )  )
+#end outputPath()
+
+
+
+def readImage( job ):
+    '''Decode stage: open the image of the ExportJob (without a window) & read the ROI set saved next to it, if any.'''
+    job.imp = batch.openImage( job.path )
+    roiset = measure.findRoiSet( job.path )
+    if roiset is not None:
+        job.rois = measure.readRoiSet( roiset )
+    return job
+#end readImage()
+
+
+
+def annotateImage( job, registry, rec=None, style=None, scalebar=True, flatten=False ):
+    '''Annotate stage: calibrate the image of the ExportJob, draw its line ROIs & a scale bar with the `style` (an `annotate.Style`),
+    and, if `flatten`, burn an Overlay into a new RGB image.
+    `rec` is the CalRecord to apply, or None to try each custom calibration class in the `registry` in turn.'''
+    from mmtools import annotate
+
+    imp = job.imp
+    if rec is None:
+        result = calibration.autoCalibration( registry, imp, stack=True )
+    else:
+        result = calibration.resolveCalibration( rec, imp, stack=True )
+    job.calName = result[0]
+    imp.setCalibration(  calibration.makeCalibration( imp, *result[1:] )  )
+
+    if style is not None:
+        if job.rois:
+            job.nDrawn = annotate.annotateRois( imp, job.rois, style )[0]
+        if scalebar:
+            from mmtools import scalebar as sb
+            sb.addScaleBar( imp, style )
+    #end if(style)
+
+    if flatten and imp.getOverlay() is not None:
+        job.imp = imp.flatten()     # RGB, so the colors of the annotations are kept
+        job.imp.setCalibration( imp.getCalibration() )
+        imp.close()
+    return job
+#end annotateImage()
+
+
+
+def writeImage( job, out, fmt ):
+    '''Encode stage: write the image of the ExportJob to `out` in the format `fmt` (see FORMATS), then close it.
+    PNG & JPEG only hold the current slice of a stack.  The JPEG quality is set once for the batch, by `runExport()`.'''
+    from ij.io import FileSaver
+
+    outdir = os.path.dirname( out )
+    if outdir and not os.path.isdir( outdir ):
+        try:
+            os.makedirs( outdir )
+        except OSError:
+            if not os.path.isdir( outdir ):  raise     # not just made by another worker
+    #end if(new directory)
+
+    saver = FileSaver( job.imp )
+    if fmt == 'tif':
+        ok = saver.saveAsTiffStack( out )  if job.imp.getStackSize() > 1  else saver.saveAsTiff( out )
+    elif fmt == 'zip':
+        ok = saver.saveAsZip( out )
+    elif fmt == 'png':
+        ok = saver.saveAsPng( out )
+    else:
+        ok = saver.saveAsJpeg( out )
+    if not ok:
+        raise IOError( "Could not write image: " + out )
+    job.out = out
+    job.close()
+    return job
+#end writeImage()
+
+
+
+def readRegions( job, registry, rec=None, style=None ):
+    '''Decode stage of in-place exports: stamp the calibration into the header of the TIFF (see `batch.stampFile()`), lay out the line ROIs
+    saved next to it (see `tiles.planRegions()`), and read the pixels of only the rectangles they cover.
+    Raises ValueError, before changing the file, if it isn't an uncompressed TIFF.'''
+    from mmtools import annotate, tiles
+
+    job.layout = tiles.TiffLayout( job.path )
+    job.calName = batch.stampFile( job.path, registry, rec )[0]
+    pixelWidth, pixelHeight, unit = measure.imageScale( job.path )
+    unit = { 'micron':'um', u'\u00b5m':'um' }.get( unit, unit )     # drawable in any font
+
+    roiset = measure.findRoiSet( job.path )
+    rois = measure.readRoiSet( roiset )  if roiset is not None  else []
+    lines = [  annotate.lineEndpoints( roi )  for roi in rois  if annotate.isStraightLine( roi )  ]
+    job.regions = tiles.planRegions( job.layout.width, job.layout.height, lines, style, pixelWidth, pixelHeight, unit )
+    job.raws = [  tiles.readRegion( job.layout, region.box )  for region in job.regions  ]
+    return job
+#end readRegions()
+
+
+
+def annotateRegions( job, style ):
+    '''Annotate stage of in-place exports: draw the measurements into the pixels of each region.'''
+    from mmtools import tiles
+    minmax = tiles.drawingRange( job.layout, job.raws )     # the same colors in every region
+    job.raws = [  tiles.drawRegion( job.layout, region, raw, style, minmax )  for region, raw in zip( job.regions, job.raws )  ]
+    job.nDrawn = sum(  len( region.labels )  for region in job.regions  )
+    return job
+#end annotateRegions()
+
+
+
+def writeRegions( job ):
+    '''Encode stage of in-place exports: write the pixels of each region back into the file, in place.'''
+    from mmtools import tiles
+    for region, raw in zip( job.regions, job.raws ):
+        tiles.writeRegion( job.layout, region.box, raw )
+    job.out = job.path
+    job.raws = []
+    return job
+#end writeRegions()
+
+
+
+def runExport( source, registry, outdir=None, rec=None, style=None, scalebar=True, fmt='png', quality=JPEG_QUALITY,
+               maxinflight=MAX_INFLIGHT, workers=2, log=None, inplace=False ):
+    '''Export an annotated copy of every image in `source` (a directory or glob pattern), see `annotateImage()`, in the format `fmt` (see FORMATS).
+
+    The copies are written next to the images, or to `outdir` (keeping the sub-directories of a `source` directory).
+    Images are read by one thread, and drawn & written by `workers` threads each, with at most `maxinflight` images open at once.
+    `quality` is the JPEG quality, 0-100.  Copies exported by earlier runs (see `measure.ANNOTATED_SUFFIXES`) are skipped.
+    With `inplace`, the measurements are drawn into the (uncompressed TIFF) images themselves, touching only the pixels under them,
+    and `outdir`, `fmt`, `quality` & `scalebar` are ignored.
+    `log( message )` receives a line per image and the final summary, default is to print them.  Returns the `batch.BatchStats`.
+    '''
+    if fmt not in FORMATS:
+        raise ValueError( "runExport(): Unknown format `%s`, should be one of %s." % (fmt, ", ".join( sorted(FORMATS) )) )
+    if log is None:
+        def log( msg ):  print( msg )
+    if inplace and style is None:
+        raise ValueError( "runExport(): Annotating in place needs a `style` to draw the measurements with." )
+    if fmt == 'jpg' and not inplace:
+        from ij.io import FileSaver
+        FileSaver.setJpegQuality(  max( 0, min( 100, int(quality) ) )  )    # a global ImageJ setting, so set once, before the workers start
+
+    root = source  if os.path.isdir( source )  else None
+    flatten = fmt in FLATTENED
+    stats = batch.BatchStats(  'Annotated'  if inplace  else 'Exported'  )
+    loglock = threading.Lock()
+
+    def ondone( job, result, seconds ):
+        stats.add( seconds )
+        instrument.record( 'export.file', seconds )
+        with loglock:  log( "%s  -->  %s  `%s`, %i measurements  (%0.1f ms)" % (job.path, job.out, job.calName, job.nDrawn, 1000.*seconds) )
+
+    def onerror( job, stage, value, e ):
+        job.close()
+        stats.add( 0.0, ok=False )
+        with loglock:  log( "FAILED  %s  (%s): %s" % (job.path, stage, e) )
+
+    if inplace:
+        stages = [
+            ( 'decode',  lambda job: readRegions( job, registry, rec, style ), 1 ),
+            ( 'annotate',  lambda job: annotateRegions( job, style ), workers ),
+            ( 'encode',  writeRegions, 1 ),      # one writer, so the files are patched one at a time
+            ]
+    else:
+        stages = [
+            ( 'decode',  readImage, 1 ),
+            ( 'annotate',  lambda job: annotateImage( job, registry, rec, style, scalebar, flatten ), workers ),
+            ( 'encode',  lambda job: writeImage( job, outputPath( job.path, fmt, outdir, root ), fmt ), workers ),
+            ]
+    pipe = batch.Pipeline( stages, maxinflight, ondone=ondone, onerror=onerror, prefix='export' )
+    for path in batch.iterImageFiles( source ):
+        if not os.path.splitext( path )[0].endswith( measure.ANNOTATED_SUFFIXES ):
+            pipe.put( ExportJob( path ) )
+    pipe.join()
+
+    log(  stats.summary() + ";  busy time: " + pipe.summary()  )
+    return stats
+#end runExport()
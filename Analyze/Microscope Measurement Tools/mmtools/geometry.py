@@ -0,0 +1,325 @@
+''' mmtools/geometry.py
+Part of the "Microscope Measurement Tools" scripts.
+
+The geometry of the line measurements: midpoints, lengths, and where to put the text next to a line, inside the image
+and clear of the other labels (`LabelLayout`).  Also the length & layout of scale bars, drawn by `mmtools.scalebar`,
+and the rectangles a drawing touches (`DirtyRect`), so only those pixels are saved for undo & repainted.
+Pure Python - no ImageJ or AWT - so it can be used under plain CPython, eg. in batch workers, as well as by the plugins.
+`mmtools.annotate` imports everything from here.
+'''
+
+import math
+
+
+MARGIN = 6      # space in pixels away from edge of image
+SPACER = 4      # space in pixels to add between point & text
+
+POSITIONS = {
+    'bottom right' : 'br',  'br' : 'br',
+    'bottom left' : 'bl',   'bl' : 'bl',
+    'top left' : 'tl',      'tl' : 'tl',
+    'top right' : 'tr',     'tr' : 'tr',
+    }
+
+RINGS = 4       # rings of candidate label positions tried around each point, see `LabelLayout`
+PADDING = 1     # space in pixels kept around each label by `LabelLayout`
+GRIDCELL = 64   # size in pixels of the cells of the `LabelLayout` spatial index
+
+SCALEBAR_FRACTION = 0.2     # longest scale bar, as a fraction of the image width
+
+DIRTY_PADDING = 2   # pixels added around drawn lines & text by `lineBox()` & `textBox()`, for rounding & anti-aliasing
+
+
+
+def midpoint( p1, p2 ):
+    ''' return the midpoint as [x,y] list.
+    Takes two points, also as a pair of [x,y] lists.
+    '''
+
+    x1 = min( p1[0], p2[0] )
+    y1 = min( p1[1], p2[1] )
+    x2 = max( p1[0], p2[0] )
+    y2 = max( p1[1], p2[1] )
+
+    xm = (x2-x1)/2. + x1
+    ym = (y2-y1)/2. + y1
+
+    return [int(xm), int(ym)]
+#end midpoint()
+
+
+
+def parsePosition( position ):
+    '''Returns the short form ('br', 'bl', 'tl' or 'tr') of a text `position` such as 'bottom right', case-insensitive.'''
+    try:
+        return POSITIONS[ position.strip().lower() ]
+    except KeyError:
+        raise ValueError( 'drawText(): Invalid `position` argument: "%s".'%(position) )
+#end parsePosition()
+
+
+
+def textPosition( p1, p2 ):
+    '''Position of the text at the end point `p2` of a line from `p1`, so the text is beyond the end of the line, eg. "bottom right".'''
+    # y-coord:
+    if p2[1] > p1[1]:
+        posstr = 'bottom'
+    else:
+        posstr = 'top'
+
+    # x-coord:
+    if p2[0] > p1[0]:
+        posstr += ' right'
+    else:
+        posstr += ' left'
+    return posstr
+#end textPosition()
+
+
+
+def placeText( x, y, pos, strw, strh, imgw, imgh ):
+    '''Returns the (x,y) coordinates at which to draw a string of size (strw, strh) so it sits at `pos` ('br', 'tl' etc.) of the point (x,y),
+    moved inside the edges of an image of size (imgw, imgh).  `y` is the baseline of the text, as used by `ImageProcessor.drawString()`.'''
+
+    # set coords (x,y) based on `position` argument
+    ''' By default, text is horizontally centered at point (x), and vertically above the point (y).  We then modify these default coords.  '''
+    if pos[0] == 'b':
+        y = y + SPACER + strh   # moves down
+    elif pos[0] == 't':
+        y = y - SPACER
+
+    if pos[1] == 'r':
+        x = x + SPACER     # moves right
+    elif pos[1] == 'l':
+        x = x - SPACER - int(strw)
+
+    '''Correct for edge of image'''
+    if   y - strh < 0:
+        y = 0 + strh + MARGIN
+    elif   y > imgh :
+        y = imgh - MARGIN
+
+    if   (x) < 0:
+        x = 0 + MARGIN
+    elif  (x + strw) > imgw:
+        x = imgw - strw - MARGIN
+
+    return x, y
+#end placeText()
+
+
+
+_FLIP = { 'b':'t', 't':'b', 'l':'r', 'r':'l' }
+
+
+class LabelLayout(object):
+    '''Collision-free placement of many text labels on one image.
+
+    Each label is tried at its requested position first, then at the other three corners of its point, then at the same corners
+    moved outwards by one label height at a time (`RINGS` rings), and goes at the first position that doesn't overlap a label placed before it.
+    If they all overlap, the label goes at the first position that only overlaps one label (or at its requested position),
+    and is counted in `collisions`.
+    The placed boxes are kept in a uniform grid of `cell` x `cell` pixels, so each check only looks at the few labels in the cells it covers,
+    and placing a label costs about the same whether the image has ten or a thousand.
+
+    LabelLayout( imgw, imgh, cell=GRIDCELL ) :  for an image of size (imgw, imgh)
+    LabelLayout.place( x, y, pos, strw, strh ) :  returns the (x,y) to draw a string of size (strw, strh), as `placeText()` does
+    LabelLayout.collisions : int, number of labels that had to overlap another one
+    '''
+
+    def __init__(self, imgw, imgh, cell=GRIDCELL):
+        self.imgw = imgw
+        self.imgh = imgh
+        self.cell = int( cell )
+        self.collisions = 0
+        self._grid = {}     # { (column, row) : [ boxes overlapping that cell ] }
+        self._count = 0
+    #end __init__()
+
+    def __len__(self):
+        return self._count
+
+    def _cells(self, box):
+        c = self.cell
+        for col in range( int(box[0]) // c, int(box[2]) // c + 1 ):
+            for row in range( int(box[1]) // c, int(box[3]) // c + 1 ):
+                yield (col, row)
+    #end _cells()
+
+    def collides(self, box):
+        '''True if the box (x0, y0, x1, y1) overlaps a placed label.'''
+        for key in self._cells( box ):
+            for b in self._grid.get( key, () ):
+                if b[0] < box[2] and box[0] < b[2] and b[1] < box[3] and box[1] < b[3]:
+                    return True
+        return False
+    #end collides()
+
+    def overlaps(self, box, limit=None):
+        '''Number of placed labels that the box (x0, y0, x1, y1) overlaps, counting up to `limit` at most.'''
+        found = set()
+        for key in self._cells( box ):
+            for b in self._grid.get( key, () ):
+                if b[0] < box[2] and box[0] < b[2] and b[1] < box[3] and box[1] < b[3]:
+                    found.add( b )
+                    if limit and len(found) >= limit:  return limit
+        return len( found )
+    #end overlaps()
+
+    def add(self, box):
+        '''Mark the box (x0, y0, x1, y1) as taken, eg. by a label placed some other way.'''
+        for key in self._cells( box ):
+            self._grid.setdefault( key, [] ).append( box )
+        self._count += 1
+    #end add()
+
+    def candidates(self, x, y, pos, strw, strh):
+        '''The (x,y) positions tried for a label, in order.'''
+        corners = [ pos, pos[0] + _FLIP[pos[1]], _FLIP[pos[0]] + pos[1], _FLIP[pos[0]] + _FLIP[pos[1]] ]
+        for ring in range( RINGS ):
+            step = ring * ( strh + 2*PADDING )
+            for q in corners:
+                yield placeText( x, (y + step  if q[0] == 'b'  else y - step), q, strw, strh, self.imgw, self.imgh )
+    #end candidates()
+
+    def place(self, x, y, pos, strw, strh):
+        '''Returns the (x,y) at which to draw a string of size (strw, strh) near the point (x,y), preferably at `pos` ('br', 'tl' etc.),
+        without overlapping the labels placed so far.  `y` is the baseline of the text, as for `placeText()`.'''
+        tried = []
+        for tx, ty in self.candidates( x, y, pos, strw, strh ):
+            box = ( tx - PADDING, ty - strh - PADDING, tx + strw + PADDING, ty + PADDING )
+            if not self.collides( box ):
+                self.add( box )
+                return tx, ty
+            tried.append( (tx, ty, box) )
+        #end for(candidates)
+        self.collisions += 1
+        tx, ty, box = min(  tried,  key=lambda t: self.overlaps( t[2], 2 )  )     # stops counting at 2, so crowded cells stay cheap
+        self.add( box )
+        return tx, ty
+    #end place()
+#end class(LabelLayout)
+
+
+
+def lineLength( p1, p2, pixelWidth=1.0, pixelHeight=1.0 ):
+    '''Calibrated length of the line from `p1` to `p2`, given the pixel size.'''
+    return math.hypot(  (p2[0]-p1[0]) * pixelWidth,  (p2[1]-p1[1]) * pixelHeight  )
+#end lineLength()
+
+
+
+def lengthText( length, unit ):
+    '''Text drawn for a measurement, eg. "3.142 um".'''
+    # format of measurement text (eg. 3 decimal points):
+    return "%0.3f" % length + " %s" % (unit)
+#end lengthText()
+
+
+
+def niceLength( fieldwidth, fraction=SCALEBAR_FRACTION ):
+    '''The longest "nice" scale bar length - 1, 2 or 5 x 10^n - that is at most `fraction` of the field width `fieldwidth`, in the same units.'''
+    target = fieldwidth * fraction
+    if not target > 0:
+        raise ValueError( "niceLength(): The field width must be positive, not %s." % (fieldwidth) )
+    exp = int( math.floor( math.log10( target ) ) )
+    for m in (5, 2, 1):
+        length = float( "%ie%i" % (m, exp) )    # exact decimal, eg. 0.2 rather than 2 * 0.1
+        if length <= target * (1 + 1e-9):
+            return length
+    return float( "1e%i" % (exp - 1) )      # only reached through rounding of log10()
+#end niceLength()
+
+
+
+def scaleBarText( length, unit ):
+    '''Text drawn with a scale bar, eg. "200 nm".'''
+    return "%g %s" % (length, unit)
+#end scaleBarText()
+
+
+
+def scaleBarLayout( imgw, imgh, barw, barh, strw, strh, pos='br' ):
+    '''Where to draw a scale bar of size (barw, barh) with its text of size (strw, strh) centered above it, in the corner `pos` ('br', 'tl' etc.)
+    of an image of size (imgw, imgh).
+
+    bar, text, box = scaleBarLayout( imgw, imgh, barw, barh, strw, strh, pos )
+
+    `bar` & `box` (the background behind both) are (x, y, width, height) rectangles, `text` is the (x,y) to draw the text at,
+    with `y` the bottom of the text as for `placeText()`.
+    '''
+    groupw = max( barw, strw )
+    grouph = strh + SPACER + barh
+    inset = MARGIN + SPACER     # the background box is SPACER bigger than the group, and MARGIN from the edge
+
+    x0 = imgw - inset - groupw  if pos[1] == 'r'  else inset
+    y0 = imgh - inset - grouph  if pos[0] == 'b'  else inset
+
+    text = ( x0 + (groupw - strw) // 2,  y0 + strh )
+    bar = ( x0 + (groupw - barw) // 2,  y0 + strh + SPACER,  barw,  barh )
+    box = ( x0 - SPACER,  y0 - SPACER,  groupw + 2*SPACER,  grouph + 2*SPACER )
+    return bar, text, box
+#end scaleBarLayout()
+
+
+
+def lineBox( p1, p2, linewidth=1 ):
+    '''The rectangle (x, y, width, height) of the pixels touched by drawing the line from `p1` to `p2`, `linewidth` pixels wide.'''
+    pad = int( linewidth ) // 2 + DIRTY_PADDING
+    x0, x1 = int( math.floor( min(p1[0], p2[0]) ) ) - pad,  int( math.ceil( max(p1[0], p2[0]) ) ) + pad
+    y0, y1 = int( math.floor( min(p1[1], p2[1]) ) ) - pad,  int( math.ceil( max(p1[1], p2[1]) ) ) + pad
+    return ( x0, y0, x1 - x0 + 1, y1 - y0 + 1 )
+#end lineBox()
+
+
+
+def textBox( x, y, strw, strh ):
+    '''The rectangle (x, y, width, height) of the pixels touched by a string of size (strw, strh) drawn at (x,y),
+    where `y` is the baseline of the text as for `placeText()`.'''
+    pad = DIRTY_PADDING
+    return ( int(x) - pad,  int(y) - int(strh) - pad,  int(strw) + 2*pad + 1,  int(strh) + 2*pad + 1 )
+#end textBox()
+
+
+
+def clipBox( box, imgw, imgh ):
+    '''The rectangle `box` (x, y, width, height) clipped to an image of size (imgw, imgh), or None if it is outside the image.'''
+    x0, y0 = max( box[0], 0 ), max( box[1], 0 )
+    x1, y1 = min( box[0] + box[2], imgw ), min( box[1] + box[3], imgh )
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return ( x0, y0, x1 - x0, y1 - y0 )
+#end clipBox()
+
+
+
+class DirtyRect(object):
+    '''The bounding rectangle of everything drawn into an image, so only that part needs saving for undo & repainting.
+
+    dirty = DirtyRect()
+    dirty.add( lineBox( p1, p2, 2 ) )      # any (x, y, width, height) rectangles
+    dirty.add( textBox( x, y, strw, strh ) )
+    box = dirty.clip( imgw, imgh )      # (x, y, width, height) inside the image, or None if nothing was drawn there
+
+    DirtyRect.box : the (x, y, width, height) bounding rectangle, unclipped, or None while empty
+    '''
+
+    def __init__(self, box=None):
+        self.box = None
+        if box is not None:  self.add( box )
+
+    def add(self, box):
+        '''Grow the rectangle to include `box` (x, y, width, height).'''
+        if self.box is None:
+            self.box = tuple( box )
+            return
+        x0, y0 = min( self.box[0], box[0] ), min( self.box[1], box[1] )
+        x1 = max( self.box[0] + self.box[2], box[0] + box[2] )
+        y1 = max( self.box[1] + self.box[3], box[1] + box[3] )
+        self.box = ( x0, y0, x1 - x0, y1 - y0 )
+    #end add()
+
+    def clip(self, imgw, imgh):
+        '''The rectangle inside an image of size (imgw, imgh), or None if empty.'''
+        return clipBox( self.box, imgw, imgh )  if self.box is not None  else None
+#end class(DirtyRect)
@@ -0,0 +1,206 @@
+''' mmtools/instrument.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Lightweight timing instrumentation, replacing the old on/off debug flags & print statements.
+
+Named spans time each stage (dialog, calibration, sidecar I/O, repaint, drawing) into a per-span counter & histogram,
+counters count events (eg. cache hits), and `note()` replaces the debugging prints.
+Everything is switched off by default: a disabled `span()` returns a shared do-nothing object, and `note()` doesn't even format its message,
+so the calls can stay in the code at almost no cost.
+
+Turn it on in `Microscope_Calibrations_user_settings.py`:
+    instrumentation = True
+    instrumentation_file = '/tmp/mmtools-timing.json'   # optional, *.json for JSON, anything else for a text table
+
+    from mmtools import instrument
+    with instrument.span( 'sidecar.read' ):
+        ...
+    instrument.count( 'sidecar.cache_hit' )
+    instrument.note( "Line Points: p1=%s & p2=%s", p1, p2 )
+    instrument.flush()      # write the statistics to `instrumentation_file`, at the end of a plugin
+'''
+
+import json, math, threading, time
+
+clock = getattr( time, 'perf_counter', time.time )     # time.time on Jython/Python 2
+
+
+_state = {
+    'enabled' : False,
+    'file' : None,      # where flush() writes the statistics, or None
+    }
+_lock = threading.Lock()
+_spans = {}         # { name : Histogram }
+_counters = {}      # { name : int }
+
+
+
+class Histogram(object):
+    '''Count, total, min & max of a span's durations, plus a histogram in power-of-two buckets of microseconds.'''
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = {}   # { upper bound in us : count }
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:  self.min = seconds
+        if seconds > self.max:  self.max = seconds
+        bound = 2 ** math.frexp( max(seconds * 1e6, 1.0) )[1]     # next power of 2 above the duration in us
+        self.buckets[bound] = self.buckets.get( bound, 0 ) + 1
+    #end add()
+
+    def asDict(self):
+        return {
+            'count' : self.count,
+            'total_ms' : 1000. * self.total,
+            'mean_ms' : 1000. * self.total / self.count  if self.count else 0.0,
+            'min_ms' : 1000. * (self.min or 0.0),
+            'max_ms' : 1000. * self.max,
+            'histogram_us' : dict(  ( "<%i" % b, n )  for b, n in sorted( self.buckets.items() )  ),
+            }
+    #end asDict()
+#end class(Histogram)
+
+
+
+class _Span(object):
+    '''Context manager timing one execution of a named span.'''
+    __slots__ = ('name', 't0')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = clock()
+        return self
+
+    def __exit__(self, *exc):
+        record( self.name, clock() - self.t0 )
+        return False
+#end class(_Span)
+
+
+class _NullSpan(object):
+    '''The span returned while instrumentation is off.'''
+    __slots__ = ()
+    def __enter__(self):  return self
+    def __exit__(self, *exc):  return False
+#end class(_NullSpan)
+
+_NULLSPAN = _NullSpan()
+
+
+
+def enabled():
+    return _state['enabled']
+
+
+def configure( enable=False, path=None ):
+    '''Switch instrumentation on/off, and set the file that `flush()` writes to.'''
+    _state['enabled'] = bool( enable )
+    _state['file'] = path or None
+#end configure()
+
+
+def configureFromSettings( sets ):
+    '''Configure from the settings `instrumentation` & `instrumentation_file`, both optional.'''
+    configure(  getattr( sets, 'instrumentation', False ),  getattr( sets, 'instrumentation_file', None )  )
+
+
+
+def span( name ):
+    '''Time a block of code:  `with instrument.span('draw'): ...`'''
+    if not _state['enabled']:
+        return _NULLSPAN
+    return _Span( name )
+#end span()
+
+
+
+def record( name, seconds ):
+    '''Add one duration to the span `name`.'''
+    if not _state['enabled']:  return
+    with _lock:
+        h = _spans.get( name )
+        if h is None:
+            h = _spans[name] = Histogram()
+        h.add( seconds )
+#end record()
+
+
+
+def count( name, n=1 ):
+    '''Add `n` to the counter `name`.'''
+    if not _state['enabled']:  return
+    with _lock:
+        _counters[name] = _counters.get( name, 0 ) + n
+#end count()
+
+
+
+def note( msg, *args ):
+    '''Debugging message, printed to the console only while instrumentation is on.  `msg % args` is only formatted then.'''
+    if not _state['enabled']:  return
+    print( "mmtools: " + (msg % args  if args else msg) )
+#end note()
+
+
+
+def stats():
+    '''Returns { 'spans' : { name : statistics }, 'counters' : { name : count } }.'''
+    with _lock:
+        return {
+            'spans' : dict( (name, h.asDict()) for name, h in _spans.items() ),
+            'counters' : dict( _counters ),
+            }
+#end stats()
+
+
+
+def report():
+    '''The statistics as a text table, slowest total first.'''
+    s = stats()
+    lines = [ "%-28s %8s %12s %10s %10s %10s" % ('span', 'count', 'total ms', 'mean ms', 'min ms', 'max ms') ]
+    for name, d in sorted( s['spans'].items(), key=lambda item: -item[1]['total_ms'] ):
+        lines.append( "%-28s %8i %12.2f %10.3f %10.3f %10.3f" % (name, d['count'], d['total_ms'], d['mean_ms'], d['min_ms'], d['max_ms']) )
+    for name, n in sorted( s['counters'].items() ):
+        lines.append( "%-28s %8i" % (name, n) )
+    return "\n".join( lines )
+#end report()
+
+
+
+def dump( path ):
+    '''Write the statistics to `path`: JSON if it ends in ".json", otherwise the text table of `report()`.'''
+    if path.lower().endswith( '.json' ):
+        text = json.dumps( stats(), indent=2, sort_keys=True )
+    else:
+        text = report()
+    f = open( path, 'w' )
+    try:
+        f.write( text + "\n" )
+    finally:
+        f.close()
+#end dump()
+
+
+
+def flush():
+    '''Write the statistics so far to the configured file, if instrumentation is on and a file is set.  Called at the end of the plugins.'''
+    if _state['enabled'] and _state['file']:
+        dump( _state['file'] )
+#end flush()
+
+
+
+def reset():
+    '''Clear all spans & counters.'''
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+#end reset()
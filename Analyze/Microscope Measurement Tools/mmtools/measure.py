@@ -0,0 +1,246 @@
+''' mmtools/measure.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Calibrated measurements of line & polyline ROIs, exported to CSV without drawing anything.
+
+The ROIs come from the ROI Manager, or from ROI sets saved next to each image of a batch
+(`<image>.zip`, `<image>_RoiSet.zip` or `<image>.roi`).  The pixel size of TIFF images is read from the file header only,
+so the pixel data are never loaded.  Rows are written to the CSV file as they are measured, so memory use doesn't grow with the number of measurements.
+`exportBatch()` does the same for the automatic measurements of `mmtools.metrology` & `mmtools.sidewall`, on a pool of worker threads.
+'''
+
+import csv, math, os, threading, time
+
+from mmtools import batch, instrument
+
+
+COLUMNS = ['image', 'roi', 'type', 'slice', 'points', 'x1', 'y1', 'x2', 'y2', 'length', 'angle', 'unit']
+
+# ROI sets that are looked for next to each image, as (suffix replacing the image extension):
+ROISET_SUFFIXES = ['.zip', '_RoiSet.zip', '.roi']
+
+# annotated copies saved next to the images by the automatic measurements & `mmtools.export`, skipped by `exportBatch()`:
+ANNOTATED_SUFFIXES = ('_cd', '_sidewall', '_annotated')
+
+
+
+def measurePoints( xs, ys, pixelWidth=1.0, pixelHeight=1.0 ):
+    '''Calibrated measurement of the line/polyline through the points (xs[i], ys[i]), in pixels.
+
+    x1, y1, x2, y2, length, angle = measurePoints( xs, ys, pixelWidth, pixelHeight )
+
+    The end points & length are in calibrated units.  `angle` is the direction from the first to the last point,
+    in degrees counter-clockwise from the x-axis (y increases upwards, as in ImageJ's Measure), using the calibrated (aspect-corrected) coordinates.
+    '''
+    cx = [ x * pixelWidth for x in xs ]
+    cy = [ y * pixelHeight for y in ys ]
+    length = sum(  math.hypot( cx[i+1] - cx[i], cy[i+1] - cy[i] )  for i in range( len(cx) - 1 )  )
+    angle = math.degrees(  math.atan2( cy[0] - cy[-1], cx[-1] - cx[0] )  )
+    return cx[0], cy[0], cx[-1], cy[-1], length, angle
+#end measurePoints()
+
+
+
+def isLineRoi( roi ):
+    '''True for straight, segmented (polyline) and freehand line ROIs.'''
+    return roi is not None and roi.isLine()
+#end isLineRoi()
+
+
+
+def roiPoints( roi ):
+    '''The (xs, ys) lists of the points along a line ROI, in pixels.'''
+    if roi.getTypeAsString() == "Straight Line":
+        return [ roi.x1d, roi.x2d ], [ roi.y1d, roi.y2d ]
+    fp = roi.getFloatPolygon()
+    return list( fp.xpoints )[:fp.npoints], list( fp.ypoints )[:fp.npoints]
+#end roiPoints()
+
+
+
+def measureRois( image, rois, pixelWidth, pixelHeight, unit ):
+    '''Generator of CSV rows (see COLUMNS) for every line ROI in `rois`, measured with the given pixel size.'''
+    for ii, roi in enumerate( rois ):
+        if not isLineRoi( roi ):  continue
+        xs, ys = roiPoints( roi )
+        if len(xs) < 2:  continue
+        x1, y1, x2, y2, length, angle = measurePoints( xs, ys, pixelWidth, pixelHeight )
+        yield [ image, roi.getName() or ("%i" % (ii+1)), roi.getTypeAsString(), roi.getPosition(), len(xs),
+                "%g"%x1, "%g"%y1, "%g"%x2, "%g"%y2, "%g"%length, "%g"%angle, unit ]
+    #end for(rois)
+#end measureRois()
+
+
+
+def imageScale( path ):
+    '''Returns (pixelWidth, pixelHeight, unit) of an image file.
+    TIFFs are read from their header only, other formats are opened.'''
+    if os.path.splitext( path )[1].lower() in ('.tif', '.tiff'):
+        from ij.io import TiffDecoder
+        infos = TiffDecoder(  os.path.dirname(path) + os.sep,  os.path.basename(path)  ).getTiffInfo()
+        if infos:
+            fi = infos[0]
+            return fi.pixelWidth, fi.pixelHeight, (fi.unit or "pixel")
+    #end if(tiff)
+
+    from ij import IJ
+    imp = IJ.openImage( path )
+    if imp is None:
+        raise IOError( "Could not open image: " + path )
+    cal = imp.getCalibration()
+    imp.close()
+    return cal.pixelWidth, cal.pixelHeight, cal.getUnit()
+#end imageScale()
+
+
+
+def readRoiSet( path ):
+    '''Returns the list of ROIs in a saved ROI set (*.zip) or single ROI file (*.roi).'''
+    from ij.io import RoiDecoder
+
+    if not path.lower().endswith( '.zip' ):
+        return [ RoiDecoder( path ).getRoi() ]
+
+    from java.util.zip import ZipFile
+    from java.io import ByteArrayOutputStream
+    import jarray
+
+    rois = []
+    zf = ZipFile( path )
+    try:
+        buf = jarray.zeros( 65536, 'b' )
+        for entry in list( zf.entries() ):
+            if not entry.getName().lower().endswith( '.roi' ):  continue
+            stream = zf.getInputStream( entry )
+            out = ByteArrayOutputStream()
+            n = stream.read( buf )
+            while n > 0:
+                out.write( buf, 0, n )
+                n = stream.read( buf )
+            stream.close()
+            roi = RoiDecoder.openFromByteArray( out.toByteArray() )
+            if roi is not None:
+                if not roi.getName():  roi.setName( os.path.splitext( entry.getName() )[0] )
+                rois.append( roi )
+        #end for(entries)
+    finally:
+        zf.close()
+    return rois
+#end readRoiSet()
+
+
+
+def findRoiSet( imagepath ):
+    '''Returns the path of the ROI set saved next to an image, or None if there is none.'''
+    root = os.path.splitext( imagepath )[0]
+    for suffix in ROISET_SUFFIXES:
+        if os.path.isfile( root + suffix ):
+            return root + suffix
+    return None
+#end findRoiSet()
+
+
+
+class MeasurementWriter(object):
+    '''Writes measurement rows to a CSV file as they arrive.
+
+    w = MeasurementWriter( path )
+    w.writeRows( rows )     # any iterable, eg. a generator from `measureRois()`
+    w.close()
+
+    `columns` is the header row, default COLUMNS.
+    '''
+
+    def __init__(self, path, columns=COLUMNS):
+        self.path = path
+        self.f = open( path, 'w' )
+        self.writer = csv.writer( self.f, lineterminator='\n' )
+        self.writer.writerow( columns )
+        self.count = 0
+
+    def writeRows(self, rows):
+        for row in rows:
+            self.writer.writerow( row )
+            self.count += 1
+    #end writeRows()
+
+    def close(self):
+        self.f.close()
+#end class(MeasurementWriter)
+
+
+
+def exportDirectory( source, csvpath, log=None ):
+    '''Measure the line ROIs of the ROI sets saved next to every image in `source` (a directory or glob pattern), and write them to `csvpath`.
+    Returns (number of images with ROI sets, number of measurements).'''
+    if log is None:
+        def log( msg ):  print( msg )
+
+    t0 = time.time()
+    nImages = 0
+    w = MeasurementWriter( csvpath )
+    try:
+        for path in batch.iterImageFiles( source ):
+            roiset = findRoiSet( path )
+            if roiset is None:  continue
+            try:
+                pw, ph, unit = imageScale( path )
+                w.writeRows(  measureRois( path, readRoiSet(roiset), pw, ph, unit )  )
+            except Exception as e:
+                log( "FAILED  %s: %s" % (path, e) )
+                continue
+            nImages += 1
+        #end for(images)
+    finally:
+        w.close()
+
+    log( "Exported %i measurements from %i images to %s in %0.2f s" % (w.count, nImages, csvpath, time.time()-t0) )
+    return nImages, w.count
+#end exportDirectory()
+
+
+
+def exportBatch( source, measurefile, csvpath, columns, workers=4, log=None, name='measure' ):
+    '''Measure every image in `source` (a directory or glob pattern) on a pool of `workers` threads, and write the rows to `csvpath` as the images are done.
+
+    `measurefile( path )` returns (rows, message) for one image: the CSV rows (matching `columns`) and a line for the log.
+    Annotated copies saved by earlier runs (see ANNOTATED_SUFFIXES) are skipped.
+    `log( message )` receives a line per image and the final summary, default is to print them.
+    The time per image is recorded as the instrumentation span "<name>.file".  Returns the `batch.BatchStats`.
+    '''
+    if log is None:
+        def log( msg ):  print( msg )
+
+    stats = batch.BatchStats( 'Measured' )
+    lock = threading.Lock()     # for the CSV file & the log
+    writer = MeasurementWriter( csvpath, columns )
+
+    def work( path ):
+        t0 = time.time()
+        try:
+            rows, message = measurefile( path )
+        except Exception as e:
+            dt = time.time() - t0
+            stats.add( dt, ok=False )
+            with lock:  log( "FAILED  %s  (%0.1f ms): %s" % (path, 1000.*dt, e) )
+            return
+        dt = time.time() - t0
+        stats.add( dt )
+        instrument.record( name + '.file', dt )
+        with lock:
+            writer.writeRows( rows )
+            log( "%s  -->  %s  (%0.1f ms)" % (path, message, 1000.*dt) )
+    #end work()
+
+    try:
+        pool = batch.WorkerPool( work, workers )
+        for path in batch.iterImageFiles( source ):
+            if not os.path.splitext( path )[0].endswith( ANNOTATED_SUFFIXES ):
+                pool.put( path )
+        pool.join()
+    finally:
+        writer.close()
+
+    log(  stats.summary() + ", %i rows written to %s" % (writer.count, csvpath)  )
+    return stats
+#end exportBatch()
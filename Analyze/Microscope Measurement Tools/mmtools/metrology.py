@@ -0,0 +1,332 @@
+''' mmtools/metrology.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Critical-dimension (CD) metrology: measure the widths of the lines or trenches crossing a region of a calibrated image, without drawing any lines by hand.
+
+`scanlines` parallel scanlines are laid across the region, each the average of a few neighbouring rows (see `mmtools.edges.bandPoints()`),
+and the points of all of them are interpolated in one pass over a crop of the region.  The edges along each scanline are found to a fraction
+of a pixel (`edges.findEdges()`) and paired up: a dark-to-bright edge followed by a bright-to-dark one is a bright line (`BRIGHT`),
+the reverse is a dark trench (`DARK`).  The pairs of all the scanlines are grouped into features by their centres,
+and the width of each feature is reported as its mean, sigma, min & max over the scanlines, in calibrated units.
+
+The measurement works on plain lists of pixel values.  `measureImage()`, `annotateFeatures()`, `measureFile()` & `runMetrology()` need ImageJ.
+
+    features = metrology.measureImage( imp, (x, y, w, h), scanlines=20, polarity=metrology.BRIGHT )
+    for f in features:
+        print( f.stats( imp.getCalibration().pixelWidth ) )
+'''
+
+import math, os
+
+from mmtools import batch, calibration, edges, instrument
+
+
+SCANLINES = 20          # scanlines laid across the region
+SCAN_HALFWIDTH = 1      # rows either side of each scanline that are averaged into it
+MIN_CONTRAST = 0.2      # weakest edge: gradient as a fraction of the intensity range of the region
+MIN_SCANLINES = 3       # features found on fewer scanlines than this are dropped as noise
+
+BRIGHT = 'bright'       # measure bright lines on a darker background
+DARK = 'dark'           # measure dark trenches/spaces between brighter features
+
+HORIZONTAL = 'horizontal'   # scanlines along x, so the widths are horizontal (vertical lines & trenches)
+VERTICAL = 'vertical'       # scanlines along y, for horizontal lines & trenches
+
+COLUMNS = ['image', 'feature', 'scanlines', 'center', 'mean', 'sigma', 'min', 'max', 'unit', 'calibration']
+
+
+
+class Feature(object):
+    '''One line or trench crossing the region, with its two edges on each scanline it was found on.
+
+    Feature.lefts, Feature.rights : lists of the edge positions, in pixels along the scanlines from the start of the region
+    Feature.rows : list of the scanline index of each pair of edges
+    Feature.center() : mean position of the feature's centre, in pixels from the start of the region
+    Feature.halfwidth() : half the mean width, in pixels
+    Feature.widths() : list of the widths, in pixels
+    Feature.stats( pixelsize=1.0 ) : dict of the 'scanlines' (number of widths), 'center', 'mean', 'sigma', 'min' & 'max',
+        in units of `pixelsize`
+    '''
+    __slots__ = ('lefts', 'rights', 'rows', '_csum', '_wsum')
+
+    def __init__(self):
+        self.lefts = []
+        self.rights = []
+        self.rows = []
+        self._csum = 0.0
+        self._wsum = 0.0
+
+    def add(self, row, left, right):
+        self.rows.append( row )
+        self.lefts.append( left )
+        self.rights.append( right )
+        self._csum += 0.5 * ( left + right )
+        self._wsum += right - left
+    #end add()
+
+    def center(self):
+        return self._csum / len( self.rows )
+
+    def halfwidth(self):
+        return 0.5 * self._wsum / len( self.rows )
+
+    def widths(self):
+        return [  r - l  for l, r in zip( self.lefts, self.rights )  ]
+
+    def stats(self, pixelsize=1.0):
+        n, mean, sigma, lo, hi = statistics(  [ w * pixelsize for w in self.widths() ]  )
+        return { 'scanlines':n, 'center':self.center() * pixelsize, 'mean':mean, 'sigma':sigma, 'min':lo, 'max':hi }
+#end class(Feature)
+
+
+
+def statistics( values ):
+    '''Returns (n, mean, sigma, min, max) of a list of numbers.  `sigma` is the sample standard deviation, 0 for fewer than 2 values.'''
+    n = len( values )
+    if n == 0:
+        return 0, 0.0, 0.0, 0.0, 0.0
+    mean = sum( values ) / float(n)
+    sigma = math.sqrt(  sum( (v - mean) ** 2  for v in values ) / (n - 1)  )  if n > 1  else 0.0
+    return n, mean, sigma, min( values ), max( values )
+#end statistics()
+
+
+
+def clipRegion( region, imgw, imgh ):
+    '''The region (x, y, w, h) clipped to an image of `imgw` x `imgh` pixels.  None, or a zero width/height, is the whole image.'''
+    if region is None:
+        return 0, 0, imgw, imgh
+    x, y, w, h = [ int(v) for v in region ]
+    if w <= 0:  x, w = 0, imgw
+    if h <= 0:  y, h = 0, imgh
+    x, y = max( 0, min( x, imgw - 2 ) ), max( 0, min( y, imgh - 2 ) )
+    return x, y, max( 2, min( w, imgw - x ) ), max( 2, min( h, imgh - y ) )
+#end clipRegion()
+
+
+
+def scanlinePoints( region, scanlines=SCANLINES, halfwidth=SCAN_HALFWIDTH, direction=HORIZONTAL ):
+    '''The sample points of all the scanlines across `region` = (x, y, w, h), evenly spaced.
+
+    xs, ys, n = scanlinePoints( region, scanlines, halfwidth, direction )
+
+    Each scanline is a band of 2*halfwidth+1 profiles of `n` points, as from `edges.bandPoints()`, and the bands follow each other in `xs`, `ys`.
+    '''
+    x, y, w, h = region
+    xs, ys, n = [], [], 0
+    for k in range( scanlines ):
+        if direction == VERTICAL:
+            xk = x + ( k + 0.5 ) * w / float(scanlines)
+            p1, p2 = (xk, y), (xk, y + h - 1)
+        else:
+            yk = y + ( k + 0.5 ) * h / float(scanlines)
+            p1, p2 = (x, yk), (x + w - 1, yk)
+        bx, by, n = edges.bandPoints( p1, p2, 0, halfwidth )
+        xs.extend( bx )
+        ys.extend( by )
+    return xs, ys, n
+#end scanlinePoints()
+
+
+
+def edgePairs( edgelist, polarity=BRIGHT ):
+    '''Pair up the edges of one scanline, from `edges.findEdges()`, into the (left, right) positions of its features.
+
+    For BRIGHT features, a feature opens at a dark-to-bright edge and closes at the next bright-to-dark one; the reverse for DARK.
+    Of several opening edges in a row, the last one is used.
+    '''
+    rising = ( polarity == BRIGHT )
+    pairs = []
+    start = None
+    for pos, strength in edgelist:
+        if ( strength > 0 ) == rising:
+            start = pos
+        elif start is not None:
+            pairs.append(  (start, pos)  )
+            start = None
+    return pairs
+#end edgePairs()
+
+
+
+def groupPairs( scans ):
+    '''Group the edge pairs of all the scanlines into features.
+
+    `scans` is a list, per scanline, of the (left, right) pairs from `edgePairs()`.
+    A pair joins the feature with the nearest centre, if its centre is within the feature's (or the pair's) half-width and the feature
+    has no pair on this scanline yet, otherwise it starts a new feature.  Returns the Features, sorted by centre.
+    '''
+    features = []
+    for row, pairs in enumerate( scans ):
+        for left, right in pairs:
+            c, half = 0.5 * ( left + right ), 0.5 * ( right - left )
+            best, bestd = None, None
+            for f in features:
+                if f.rows[-1] == row:  continue     # one pair per scanline
+                d = abs( f.center() - c )
+                if d <= max( half, f.halfwidth() )  and  ( best is None or d < bestd ):
+                    best, bestd = f, d
+            if best is None:
+                best = Feature()
+                features.append( best )
+            best.add( row, left, right )
+        #end for(pairs)
+    #end for(scanlines)
+    return sorted(  features,  key=lambda f: f.center()  )
+#end groupPairs()
+
+
+
+def measureRegion( sample, region, scanlines=SCANLINES, polarity=BRIGHT, direction=HORIZONTAL,
+                   halfwidth=SCAN_HALFWIDTH, mincontrast=MIN_CONTRAST, minlines=MIN_SCANLINES ):
+    '''Find the features crossing `region` = (x, y, w, h).
+
+    `sample( xs, ys )` returns the interpolated pixel values at the points, eg. an `edges.Sampler`.
+    `polarity` is BRIGHT to measure bright lines, or DARK for dark trenches.  `direction` is the direction of the scanlines, HORIZONTAL or VERTICAL.
+    Edges weaker than `mincontrast` times the intensity range of the region are ignored, and features found on fewer than `minlines` scanlines are dropped.
+    Returns the list of Features, left/top first.  Their positions are in pixels from the left/top of the region.
+    '''
+    xs, ys, n = scanlinePoints( region, scanlines, halfwidth, direction )
+    values = sample( xs, ys )
+    per = n * ( 2 * halfwidth + 1 )
+    profiles = [  edges.smooth(  edges.bandProfile( values[k*per : (k+1)*per], n )  )  for k in range( scanlines )  ]
+    threshold = mincontrast * (  max( max(p) for p in profiles ) - min( min(p) for p in profiles )  )
+
+    scans = [  edgePairs(  edges.findEdges( edges.gradient(p), threshold ),  polarity  )  for p in profiles  ]
+    return [  f for f in groupPairs( scans )  if len( f.rows ) >= minlines  ]
+#end measureRegion()
+
+
+
+def featureRows( image, features, region, pixelsize, unit, calName, direction=HORIZONTAL ):
+    '''Generator of CSV rows (see COLUMNS) for the features of one image.  `center` is the calibrated position of the feature in the image.'''
+    origin = region[1]  if direction == VERTICAL  else region[0]
+    for ii, f in enumerate( features ):
+        st = f.stats( pixelsize )
+        yield [ image, ii + 1, st['scanlines'], "%g" % ( origin * pixelsize + st['center'] ),
+                "%g" % st['mean'], "%g" % st['sigma'], "%g" % st['min'], "%g" % st['max'], unit, calName ]
+#end featureRows()
+
+
+
+def measureImage( imp, region=None, scanlines=SCANLINES, polarity=BRIGHT, direction=HORIZONTAL,
+                  halfwidth=SCAN_HALFWIDTH, mincontrast=MIN_CONTRAST, minlines=MIN_SCANLINES ):
+    '''`measureRegion()` on the current slice of the ImagePlus `imp`, reading only the pixels of the region.
+    `region` is (x, y, w, h), clipped to the image, or None for the whole image.
+
+    features, region = measureImage( imp, region, ... )
+    '''
+    with instrument.span( 'cd.measure' ):
+        region = clipRegion( region, imp.getWidth(), imp.getHeight() )
+        sample = edges.processorSampler( imp.getProcessor(), region )
+        features = measureRegion( sample, region, scanlines, polarity, direction, halfwidth, mincontrast, minlines )
+    return features, region
+#end measureImage()
+
+
+
+def pixelSize( imp, direction=HORIZONTAL ):
+    '''The calibrated size of a pixel along the scanlines: the pixel width for HORIZONTAL scanlines, the height for VERTICAL ones.'''
+    cal = imp.getCalibration()
+    return cal.pixelHeight  if direction == VERTICAL  else cal.pixelWidth
+#end pixelSize()
+
+
+
+def annotateFeatures( imp, features, region, style, direction=HORIZONTAL ):
+    '''Draw each feature's mean width as a line between its mean edges, across the middle of the region, labelled with the mean & sigma,
+    with the line & text `style` (an `annotate.Style`).  Added to the image Overlay if `style.overlay` is set.  Returns the number drawn.'''
+    from mmtools import annotate
+    from mmtools.geometry import LabelLayout
+
+    x, y, w, h = region
+    pixelsize = pixelSize( imp, direction )
+    unit = annotate.unitString( imp )
+    layout = LabelLayout( imp.getWidth(), imp.getHeight() )
+    overlay = annotate.imageOverlay( imp )  if style.overlay  else None
+    ip = imp.getProcessor()
+
+    for f in features:
+        left = sum( f.lefts ) / len( f.lefts )
+        right = sum( f.rights ) / len( f.rights )
+        if direction == VERTICAL:
+            p1, p2 = [ x + 0.5 * w, y + left ], [ x + 0.5 * w, y + right ]
+        else:
+            p1, p2 = [ x + left, y + 0.5 * h ], [ x + right, y + 0.5 * h ]
+        st = f.stats( pixelsize )
+        text = "%0.3f +/- %0.3f %s" % ( st['mean'], st['sigma'], unit )
+        if overlay is not None:
+            annotate.overlayMeasurement( overlay, imp, p1, p2, style, unit, layout=layout, text=text )
+        else:
+            annotate.drawMeasurement( ip, imp, p1, p2, style, unit, layout, text=text )
+    #end for(features)
+
+    if overlay is not None:
+        imp.setOverlay( overlay )
+    else:
+        imp.updateAndDraw()
+    return len( features )
+#end annotateFeatures()
+
+
+
+def imageCalibration( imp, registry, rec=None ):
+    '''Calibrate the ImagePlus `imp` with the CalRecord `rec`, or with the first custom calibration that works (see `calibration.autoCalibration()`)
+    if `rec` is None.  If none works but the image is already calibrated, eg. stamped by "Batch Microscope Calibration", its own calibration is kept.
+    Returns the name of the calibration used.  Raises ValueError if the image ends up uncalibrated.'''
+    try:
+        if rec is None:
+            result = calibration.autoCalibration( registry, imp, stack=True )
+        else:
+            result = calibration.resolveCalibration( rec, imp, stack=True )
+    except ValueError:
+        if rec is None and imp.getCalibration().scaled():
+            return "image"
+        raise
+    imp.setCalibration(  calibration.makeCalibration( imp, *result[1:] )  )
+    return result[0]
+#end imageCalibration()
+
+
+
+def measureFile( path, registry, rec=None, region=None, scanlines=SCANLINES, polarity=BRIGHT, direction=HORIZONTAL, style=None ):
+    '''Open the image at `path` (without a window), calibrate it as by `imageCalibration()`, and measure its features.
+    If `style` is an `annotate.Style`, the features are drawn onto the image, which is saved next to it as "<name>_cd.tif".
+
+    rows, features = measureFile( path, registry, rec, region, ... )
+
+    `rows` are the CSV rows of `featureRows()`.
+    '''
+    imp = batch.openImage( path )
+    try:
+        calName = imageCalibration( imp, registry, rec )
+        features, region = measureImage( imp, region, scanlines, polarity, direction )
+        unit = imp.getCalibration().getUnit()
+        rows = list(  featureRows( path, features, region, pixelSize( imp, direction ), unit, calName, direction )  )
+
+        if style is not None and features:
+            from ij import IJ
+            annotateFeatures( imp, features, region, style, direction )
+            IJ.saveAsTiff(  imp,  os.path.splitext( path )[0] + '_cd.tif'  )
+    finally:
+        imp.close()
+    return rows, features
+#end measureFile()
+
+
+
+def runMetrology( source, registry, csvpath, rec=None, region=None, scanlines=SCANLINES, polarity=BRIGHT, direction=HORIZONTAL,
+                  workers=4, style=None, log=None ):
+    '''Measure the features of every image in `source` (a directory or glob pattern) using a pool of `workers` threads,
+    and write one CSV row per feature (see COLUMNS) to `csvpath`, as the images are done.
+    The arguments are as for `measureFile()`.  `log( message )` receives a line per image and the final summary, default is to print them.
+    Returns the `batch.BatchStats`.
+    '''
+    from mmtools import measure
+
+    def measurefile( path ):
+        rows, features = measureFile( path, registry, rec, region, scanlines, polarity, direction, style )
+        return rows, "%i features: %s" % (  len(rows),  ", ".join( "%s +/- %s %s" % (r[4], r[5], r[8]) for r in rows )  )
+
+    return measure.exportBatch( source, measurefile, csvpath, COLUMNS, workers, log, name='cd' )
+#end runMetrology()
@@ -0,0 +1,942 @@
+''' mmtools/plugins.py
+Part of the "Microscope Measurement Tools" scripts.
+
+The user interface of the plugins: each plugin file (eg. `Choose_Microscope_Calibration.py`) is only a thin shim that finds this library
+and calls one of the functions below.  Being a module, this file is compiled by Jython once and cached, instead of every time a plugin runs,
+and the ImageJ & AWT classes are imported inside the functions, only when a plugin actually runs.
+
+    from mmtools import plugins
+    plugins.chooseCalibration()
+'''
+
+import os, time
+
+from mmtools import calibration, settings, instrument
+
+
+
+'''
+################################
+   Choose Microscope Calibration
+################################
+'''
+
+ALLGROUPS = "All"      # group choice that shows every calibration
+MAXSHOWN = 500      # max number of filtered calibrations shown in the drop-down list
+CALIBRATION_TIMEOUT = 60    # seconds to wait for a custom calibration, if the settings file has no `calibrationtimeout`
+
+
+def chooseCalibration():
+    '''Choose_Microscope_Calibration.py:  popup a menu of all the calibrations, and apply the chosen one to the current image.'''
+    from ij import IJ
+
+    imp = IJ.getImage()     # get the current Image as ImagePlus object
+
+    calreg = settings.getRegistry()     # all the calibrations, as records
+
+    # Show "Choose Calibration" dialog:
+    with instrument.span( 'dialog' ):
+        rec, SetGlobalScale, AddScaleBar, SaveToFile = uScopeCalDialog(calreg)
+
+    if rec == None: return       # User cancelled - exit
+
+    instrument.note( "Calibration is a custom function: %s", rec.isCustom() )
+    timeout = getattr( settings.getSettings(), 'calibrationtimeout', CALIBRATION_TIMEOUT )
+
+    def resolve():
+        # on a background thread: custom calibrations may read sidecar files from slow network shares
+        result = calibration.resolveCalibration( rec, imp, stack=True )
+        # also sets the Z spacing & frame interval of stacks, if the calibration has them:
+        newcal = calibration.makeCalibration( imp, *result[1:] )
+        return result, newcal
+    #end resolve()
+
+    from mmtools import batch
+    task = batch.BackgroundTask( resolve, name='calibration.resolve' )
+    if not waitForTask( task, "Microscope Calibrations", "Calibrating with `%s` ..." % rec.name, timeout ):
+        return      # cancelled or timed out - the image is left as it was
+    result, newcal = task.get()
+    calName, newPixelPerUnit, newUnit = result[:3]
+    print( "Chose `%s` : %s px/%s" % (calName, newPixelPerUnit, newUnit) )
+
+
+    # set the calibration, on all open images if `SetGlobalScale`, and repaint the visible windows, on the Event Dispatch Thread:
+    nImages, nRepainted, seconds = calibration.onUiThread( calibration.applyCalibration, imp, newcal, SetGlobalScale )
+
+    if SaveToFile:
+        # writing the header is file I/O too, so also in the background - but always waited for, as a half-written header can't be abandoned:
+        task = batch.BackgroundTask( stampImageFile, (imp, newcal), name='calibration.stamp' )
+        waitForTask( task, "Microscope Calibrations", "Saving the calibration into the file ...", cancellable=False )
+        task.get()      # re-raise unexpected errors, as if it hadn't run in the background
+
+    if AddScaleBar:
+        calibration.onUiThread( addScaleBar, imp )
+
+    # last, as `waitForTask()` clears the status bar:
+    IJ.showStatus( "Applied `%s` to %i image(s), repainted %i window(s) in %0.1f ms" % (calName, nImages, nRepainted, 1000.*seconds) )
+    instrument.flush()
+#end chooseCalibration()
+
+
+
+def waitForTask( task, title, message, timeout=None, cancellable=True ):
+    '''Wait for a `batch.BackgroundTask`, showing the `message` & the time elapsed in the ImageJ status bar and, if `cancellable`, in a progress dialog
+    with a Cancel button (only if the task takes more than half a second).  Gives up after `timeout` seconds, None or 0 for no limit.
+    Returns True once the task has finished, or False if it was cancelled or timed out - it is then abandoned, see `batch.BackgroundTask.cancel()`.
+    Tasks that must not be abandoned half-way, such as writing a file, are waited for with `cancellable=False` & no `timeout`.'''
+    from java.awt import GraphicsEnvironment
+    from ij import IJ
+
+    timeout = float( timeout or 0 )  or None
+    monitor = None
+    if cancellable and not GraphicsEnvironment.isHeadless():
+        from javax.swing import ProgressMonitor
+        monitor = ProgressMonitor( IJ.getInstance(), message, "", 0, 1000 )
+        monitor.setMillisToDecideToPopup( 100 )
+        monitor.setMillisToPopup( 500 )
+
+    t0 = time.time()
+    done = cancelled = False
+    while not done:
+        done = task.wait( 0.1 )     # the UI thread is never blocked, only this one
+        elapsed = time.time() - t0
+        cancelled = monitor is not None and monitor.isCanceled()
+        if done or cancelled or (timeout and elapsed >= timeout):
+            break
+        if monitor is not None:
+            # the bar shows the time left before the timeout, or cycles every 10 s without one:
+            monitor.setProgress(  int( 1000 * elapsed / timeout )  if timeout  else int( 100 * elapsed ) % 1000  )
+            monitor.setNote( "%0.0f s" % elapsed )
+        IJ.showStatus( "%s  %0.0f s" % (message, elapsed) )
+    #end while
+    if monitor is not None:
+        monitor.close()
+    IJ.showStatus( "" )
+
+    if done:
+        return True
+    task.cancel()
+    if cancelled:
+        IJ.log( "Cancelled: " + message )
+        IJ.showStatus( "Cancelled: " + message )
+    else:
+        IJ.error( title, "%s\ntimed out after %g s, and was abandoned.\n(set `calibrationtimeout` in the settings file to wait longer)" % (message, timeout) )
+    return False
+#end waitForTask()
+
+
+
+def stampImageFile( imp, newcal ):
+    '''Write the calibration `newcal` into the header of the TIFF file the image was opened from, without re-saving the pixels.
+    The Z spacing & frame interval are written for z-stacks & time series.'''
+    from ij import IJ
+    from mmtools import tiffheader
+
+    fi = imp.getOriginalFileInfo()
+    path = os.path.join( fi.directory, fi.fileName )  if fi is not None and fi.fileName  else None
+    if path is None or os.path.splitext( path )[1].lower() not in ('.tif', '.tiff') or not os.path.isfile( path ):
+        IJ.error("Microscope Calibrations", "The calibration can only be saved into TIFF files - please save the image as TIFF instead.")
+        return
+    try:
+        tiffheader.writeResolution(  path, newcal.pixelWidth, newcal.pixelHeight, newcal.getUnit(),
+                                     newcal.pixelDepth  if imp.getNSlices() > 1  else None,
+                                     newcal.frameInterval  if imp.getNFrames() > 1  else None,
+                                     newcal.getTimeUnit()  if imp.getNFrames() > 1  else None  )
+    except (IOError, ValueError) as e:
+        IJ.error("Microscope Calibrations", "Could not save the calibration into the file:\n" + str(e))
+        return
+    print( "Saved calibration into " + path )
+#end stampImageFile()
+
+
+
+def addScaleBar( imp ):
+    '''Add a scale bar to the image, with the built-in renderer & the Draw Line settings (see `mmtools.scalebar`), and repaint it.'''
+    from ij import IJ
+    from mmtools import annotate, scalebar
+
+    try:
+        length, unit = scalebar.addScaleBar(  imp,  annotate.Style( settings.getSettings() )  )
+    except ValueError as e:
+        IJ.error("Microscope Calibrations", str(e))
+        return
+    imp.updateAndDraw()
+    instrument.note( "Added a %g %s scale bar", length, unit )
+#end addScaleBar()
+
+
+
+def uScopeCalDialog(calreg):
+    ''' Pop up a dialog asking user to choose from the calibration names etc.
+
+    rec, SetGlobalScale, AddScaleBar, SaveToFile = uScopeCalDialog(calreg)
+
+    `calreg` is the CalRegistry of all calibrations, as returned by `mmtools.settings.getRegistry()`
+    from the "user_settings.py" file.
+
+    `rec` is the chosen calibration record (see `mmtools.registry.CalRecord`).
+        Returns `None` if the user cancelled the dialog.
+
+    `SetGlobalScale` is a boolean (True/False) from a checkbox option, if the user wants this calibration set 'globally' to all open images.
+
+    `AddScaleBar` is also a boolean (True/False), for a checkbox option, if user would like a scale bar drawn afterwards (see `mmtools.scalebar`).
+
+    `SaveToFile` is a boolean (True/False), for a checkbox option, if the calibration should be written into the image's TIFF file, without re-saving the pixels.
+
+    Up to 20 calibrations are shown as radio buttons.  Above that, a drop-down list is shown,
+    along with an instrument "Group" choice and a "Filter" text field that narrow down the list as you type.
+    '''
+    from ij import IJ
+    from ij.gui import GenericDialog
+
+    # The following inspired heavily by Correct_3D_drift.py:
+
+    gd = GenericDialog("Microscope Calibrations")
+    gd.addMessage("Choose the calibration to load:")
+
+
+    # text to display in list:
+    CalStr = calreg.labels()
+    instrument.note( "CalStr = %s", CalStr )
+
+
+    '''if > 20 cals, use filtered dropdown list, otherwise use radio buttons'''
+    if len(calreg) > 20:
+        Radio=False
+        # Drop-Down lists, narrowed down by the group & filter text:
+        gd.addChoice("     Group:", [ALLGROUPS] + calreg.groups, ALLGROUPS)
+        gd.addStringField("     Filter:", "", 30)
+        gd.addChoice("     Calibration:", CalStr, CalStr[0]   )   # default = 1st (#0)
+
+        choices = gd.getChoices()
+        if choices:     # not in headless/macro mode
+            gd.addDialogListener(  calFilterListener( calreg, choices[0], gd.getStringFields()[0], choices[1] )  )
+    else:
+        Radio=True
+        gd.addRadioButtonGroup("     Calibration:", CalStr, len(CalStr), 1, CalStr[0])
+        #addRadioButtonGroup(label, [String items],  rows,  columns,  String:defaultItem)
+    #end if(cal>20)
+
+    gd.addCheckbox("Apply Scale to all open images?", False)
+    gd.addCheckbox("Add Scale Bar to this image?", False)
+    gd.addCheckbox("Save calibration into the TIFF file?", False)
+    gd.addMessage("These calibrations can be altered by editing the file: \nFiji.app/plugins/Scripts/Plugins/Analyze/...\n\tMicroscope Measurement Tools/...\n\tMicroscope_Calibrations_user_settings.py")
+
+    gd.showDialog()
+
+
+    if gd.wasCanceled():
+        return  None, None, None, None  # return None's if user cancels
+
+    if Radio:
+        ChosenCal = gd.getNextRadioButton()
+    else:
+        gd.getNextChoice()      # group
+        gd.getNextString()      # filter text
+        ChosenCal = gd.getNextChoice()
+
+    SetGlobalScale = gd.getNextBoolean()
+    AddScaleBar = gd.getNextBoolean()
+    SaveToFile = gd.getNextBoolean()
+
+    # Find the chosen calibration by its label, in the registry's hash index:
+    try:
+        rec = calreg.fromLabel( ChosenCal )
+    except ValueError:
+        IJ.error("Microscope Calibrations", "No calibration was chosen - please change the filter text.")
+        return  None, None, None, None
+
+    instrument.note( "Chose: %s", rec )
+    return rec, SetGlobalScale, AddScaleBar, SaveToFile
+#end uScopeCalDialog()
+
+
+
+def calFilterListener( calreg, groupchoice, filterfield, calchoice ):
+    '''Returns a DialogListener that re-fills the "Calibration" drop-down list of `uScopeCalDialog()` whenever the "Group" or "Filter" text changes.
+    At most MAXSHOWN matches are listed, so the list stays quick to fill for thousands of calibrations.'''
+    from ij.gui import DialogListener
+
+    class CalFilterListener(DialogListener):
+        def __init__(self):
+            self.last = (ALLGROUPS, "")
+
+        def dialogItemChanged(self, gd, e):
+            group = groupchoice.getSelectedItem()
+            text = filterfield.getText()
+            if (group, text) == self.last:  return True     # something else changed
+            self.last = (group, text)
+
+            matches = calreg.search(  text,  (None if group == ALLGROUPS else group)  )
+            calchoice.removeAll()
+            for rec in matches[:MAXSHOWN]:
+                calchoice.add( rec.label )
+            if len(matches) > MAXSHOWN:
+                calchoice.add( "... %i more, type to narrow down" % (len(matches) - MAXSHOWN) )
+            elif not matches:
+                calchoice.add( "(no matches)" )
+            return True
+        #end dialogItemChanged()
+    #end class(CalFilterListener)
+
+    return CalFilterListener()
+#end calFilterListener()
+
+
+
+'''
+################################
+   Batch Microscope Calibration
+################################
+'''
+
+AUTO = "Auto (try each custom calibration)"
+
+
+def batchCalibration():
+    '''Batch_Microscope_Calibration.py:  apply a calibration to every image in a directory, without opening image windows.'''
+    from ij.gui import GenericDialog
+    from mmtools import batch
+
+    calreg = settings.getRegistry()
+    CalStr = [AUTO] + [ rec.name for rec in calreg ]
+
+    gd = GenericDialog("Batch Microscope Calibration")
+    gd.addStringField("Directory or glob pattern:", "", 40)
+    gd.addChoice("Calibration:", CalStr, CalStr[0])
+    gd.addNumericField("Worker threads:", 4, 0)
+    gd.addCheckbox("Save calibrated images (TIFF)?", True)
+    gd.addCheckbox("Stamp TIFFs in place (header only, no re-encoding)?", False)
+    gd.addCheckbox("Add a scale bar to the saved images?", False)
+    gd.showDialog()
+
+    if gd.wasCanceled():  return     # User cancelled - exit
+
+    source = gd.getNextString().strip()
+    ChosenCal = gd.getNextChoice()
+    workers = int( gd.getNextNumber() )
+    save = gd.getNextBoolean()
+    stamp = gd.getNextBoolean()
+    bar = gd.getNextBoolean()
+
+    if not source:
+        raise ValueError( "Batch_Microscope_Calibration: Please enter a directory or glob pattern." )
+
+    if ChosenCal == AUTO:
+        rec = None
+    else:
+        rec = calreg.find( ChosenCal )
+
+    style = None
+    if bar:
+        from mmtools import annotate
+        style = annotate.Style(  settings.getSettings()  )   # one font & set of colors, shared by all the images
+
+    batch.runBatch( source, calreg, rec=rec, workers=workers, save=save, stamp=stamp, scalebar=style )
+    instrument.flush()
+#end batchCalibration()
+
+
+
+STAMP = "Stamp TIFF headers in place"
+SAVE = "Open, calibrate & save as TIFF"
+SAVEBAR = "Open, calibrate & save as TIFF, with a scale bar"
+
+
+def watchFolderCalibration():
+    '''Watch_Folder_Calibration.py:  calibrate the images written into an acquisition directory, as they arrive (see `mmtools.watch`).'''
+    import threading
+    from java.awt import GraphicsEnvironment
+    from ij.gui import GenericDialog, WaitForUserDialog
+    from mmtools import watch
+
+    calreg = settings.getRegistry()
+    CalStr = [AUTO] + [ rec.name for rec in calreg ]
+
+    gd = GenericDialog("Watch Folder Calibration")
+    gd.addStringField("Directory:", "", 40)
+    gd.addChoice("Calibration:", CalStr, CalStr[0])
+    gd.addChoice("Output:", [STAMP, SAVE, SAVEBAR], STAMP)
+    gd.addNumericField("Worker threads:", 2, 0)
+    gd.addNumericField("Settle time:", watch.SETTLE, 1, 6, "s (files unchanged this long are complete)")
+    gd.addNumericField("Duration:", 0, 0, 6, "min (0 = until stopped)")
+    gd.addCheckbox("Include sub-directories?", False)
+    gd.addCheckbox("Also calibrate the images already there?", False)
+    gd.showDialog()
+
+    if gd.wasCanceled():  return     # User cancelled - exit
+
+    root = gd.getNextString().strip()
+    ChosenCal = gd.getNextChoice()
+    output = gd.getNextChoice()
+    workers = int( gd.getNextNumber() )
+    settle = gd.getNextNumber()
+    duration = gd.getNextNumber()
+    recursive = gd.getNextBoolean()
+    existing = gd.getNextBoolean()
+
+    style = None
+    if output == SAVEBAR:
+        from mmtools import annotate
+        style = annotate.Style(  settings.getSettings()  )
+
+    rec = None  if ChosenCal == AUTO  else calreg.find( ChosenCal )
+    watcher = watch.FolderWatcher(  root, calreg, rec=rec, workers=workers, stamp=(output == STAMP), save=True, scalebar=style,
+                                    settle=settle, recursive=recursive, existing=existing  )
+    duration = 60. * duration  if duration > 0  else None
+    print( "Watching %s ..." % root )
+
+    if GraphicsEnvironment.isHeadless():
+        watcher.run( duration )     # until the duration is up, or ImageJ is stopped
+    else:
+        # watch in the background, with a non-modal dialog to stop it:
+        t = threading.Thread( target=watcher.run, args=(duration,), name="mmtools-watch" )
+        t.setDaemon( True )
+        t.start()
+        WaitForUserDialog( "Watch Folder Calibration", "Watching\n" + root + "\nfor new images.  Click OK to stop." ).show()
+        watcher.stop()
+        t.join()
+    print( watcher.stats.summary() )
+    instrument.flush()
+#end watchFolderCalibration()
+
+
+
+'''
+################################
+   Draw Measurement
+################################
+'''
+
+""" java.awt.Font: Font(String name, int style (0=plain?), int size)    """
+"""
+class ImageProcessor:
+    drawString(java.lang.String s, int x, int y)
+        Draws a string at the specified location using the current fill/draw value.
+    drawString(java.lang.String s, int x, int y, java.awt.Color background)
+        Draws a string at the specified location with a filled background.
+"""
+'''ImageProcessor:
+    drawRoi(Roi roi):  Draws the specified ROI on this image using the stroke width, stroke color and fill color defined by roi.setStrokeWidth, roi.setStrokeColor() and roi.setFillColor().
+'''
+
+
+def drawMeasurementLine( snap=None ):
+    '''Draw_Measurement_-_Line.py:  draw a Line & Length of the Line along the currently selected Line ROI.
+    If `snap` (default: the setting `snaptoedges`), the ends of the line are first moved onto the strongest edges near them
+    (see `mmtools.edges`), and the ROI is moved to match.'''
+    from ij import IJ
+    from ij.gui import GenericDialog, Line
+    from mmtools import annotate
+
+    sets = settings.getSettings()   # settings under `sets.linecolor`, `sets.linethickness` etc.
+
+    imp = IJ.getImage()     # get the current Image, which is an ImagePlus object
+    ip = imp.getProcessor()
+
+    roi = imp.getRoi()  # get the drawn ROI
+
+
+    # check ROI type
+    if not annotate.isStraightLine( roi ):
+        gd = GenericDialog("Draw Measurement - Line")
+        gd.addMessage("Please draw a straight-line first!")
+        gd.showDialog()
+        return
+        #raise Exception(  "Please draw a line ROI first!" )
+
+
+    p1 = [  int(roi.x1d),  int(roi.y1d)  ]    # point 1 (x,y)
+    p2 = [  int(roi.x2d),  int(roi.y2d)  ]    # point 2
+    instrument.note( "DrawMeas(): Line Points: p1=%s & p2=%s", p1, p2 )
+
+
+    '''Draw the line & text annotation, with the colors/font from the settings'''
+    style = annotate.Style( sets )
+    q1, q2 = annotate.lineEndpoints( roi )     # un-rounded end points, for the length
+
+    if snap is None:
+        snap = getattr( sets, 'snaptoedges', False )
+    if snap:
+        from mmtools import edges
+        halfwidth = max(  0,  ( int( getattr(sets, 'snapbandwidth', 2 * edges.BAND_HALFWIDTH + 1) ) - 1 ) // 2  )
+        with instrument.span( 'draw.snap' ):
+            q1, q2, snapped = edges.snapLine(  ip, q1, q2, float( getattr(sets, 'snapreach', edges.SNAP_REACH) ), halfwidth  )
+        instrument.note( "DrawMeas(): Snapped to edges: p1=%s (%s) & p2=%s (%s)", q1, snapped[0], q2, snapped[1] )
+        if not any( snapped ):
+            IJ.showStatus( "Draw Measurement: no edges found near the ends of the line" )
+        imp.setRoi(  Line( q1[0], q1[1], q2[0], q2[1] )  )     # so Measure gives the same length
+    #end if(snap)
+
+    if style.overlay:
+        # add vector Line & Text to the image Overlay, leaving the pixels untouched:
+        overlay = annotate.imageOverlay( imp )
+        with instrument.span( 'draw.overlay' ):
+            lenstr = annotate.overlayMeasurement(  overlay, imp, q1, q2, style  )
+        with instrument.span( 'draw.update' ):
+            imp.setOverlay( overlay )
+    else:
+        # save & repaint only the rectangle drawn into, not the whole image:
+        lenstr = annotate.measurementText( imp, q1, q2 )
+        box = annotate.measurementLayout( q1, q2, lenstr, style, imp.getWidth(), imp.getHeight() )[1]
+        box = annotate.clipBox( box, imp.getWidth(), imp.getHeight() )
+        if box is not None:
+            with instrument.span( 'draw.undo' ):
+                annotate.saveUndo( imp, box )   # for "Undo Last Measurement"
+        annotate.drawMeasurement(  ip, imp, q1, q2, style, text=lenstr  )
+        with instrument.span( 'draw.update' ):
+            annotate.updateRegion( imp, box )     #update the image
+    instrument.note( "DrawMeas(): Line length= %s", lenstr )
+    instrument.flush()
+
+    # to do:
+    #   Add dialogue for user to alter draw options?  Or just from settings file?
+
+#end drawMeasurementLine()
+
+
+
+def drawText( text, x, y, position='bottom right', sets=None ):
+    '''Draw a text string on the current image at the specified coordinates & relative position, ensuring text doesn't go over the edge of the image.
+
+    Parameters:
+    -----------
+    text : string
+        The text string to write on the image.
+
+    x, y : int
+        The coordinates at which to draw the text.
+
+    position : { 'bottom right', 'top right', 'top left', 'bottom left' }, case-insensitive, optional
+        Where to draw the text, with respect to the coordinates given.
+        Synonyms for 'bottom right' are 'br'.  This is the default.
+        Synonyms for 'top right' are 'tr'.
+        Synonyms for 'bottom left' are 'bl'.
+        Synonyms for 'top left' are 'tl'.
+
+    sets : module, optional
+        The settings module, as returned by `mmtools.settings.getSettings()`.  Loaded if not given.
+    '''
+    from ij import IJ
+    from mmtools import annotate
+
+    # microscope settings should be in the file `Microscope_Calibrations_user_settings.py`:
+    if sets is None:  sets = settings.getSettings()     # settings under `sets.linecolor`, `sets.linethickness` etc.
+
+    imp = IJ.getImage()     # get the current Image, which is an ImagePlus object
+    style = annotate.Style( sets )
+
+    # save & repaint only the rectangle of the text, not the whole image:
+    strw, strh = style.textSize( text )
+    tx, ty = annotate.placeText( int(x), int(y), annotate.parsePosition(position), strw, strh, imp.getWidth(), imp.getHeight() )
+    box = annotate.clipBox( annotate.textBox( tx, ty, strw, strh ), imp.getWidth(), imp.getHeight() )
+    if box is not None:
+        annotate.saveUndo( imp, box )
+
+    x, y = annotate.drawText( imp.getProcessor(), text, x, y, position, style )     # notes the final (x,y)
+
+    with instrument.span( 'draw.update' ):
+        annotate.updateRegion( imp, box )     #update the image
+#end drawText()
+
+
+
+def undoLastMeasurement():
+    '''Undo_Last_Measurement.py:  put back the pixels under the last measurement or text drawn into the current image.'''
+    from ij import IJ
+    from mmtools import annotate
+
+    imp = IJ.getImage()
+    box = annotate.undoLast( imp )
+    if box is None:
+        IJ.showStatus( "Undo Last Measurement: nothing to undo on this image" )
+    else:
+        instrument.note( "undoLastMeasurement(): restored %s", box )
+#end undoLastMeasurement()
+
+
+
+def drawAllLines():
+    '''Draw_Measurement_-_All_Lines.py:  draw the measurement of every straight-line ROI in the ROI Manager, in one pass.'''
+    from ij import IJ
+    from ij.gui import GenericDialog
+    from ij.plugin.frame import RoiManager
+    from mmtools import annotate
+
+    imp = IJ.getImage()     # get the current Image, which is an ImagePlus object
+
+    rm = RoiManager.getInstance()
+    rois = rm.getRoisAsArray()  if rm is not None  else []
+    lines = [ roi for roi in rois  if annotate.isStraightLine( roi ) ]
+
+    if not lines:
+        gd = GenericDialog("Draw Measurement - All Lines")
+        gd.addMessage("Please add some straight-line ROIs to the ROI Manager first!")
+        gd.showDialog()
+        return
+
+    style = annotate.Style(  settings.getSettings()  )    # one set of colors & font for all the lines
+    nDrawn, seconds = annotate.annotateRois( imp, lines, style )
+
+    instrument.note( "Draw_Measurement_-_All_Lines: drew %i line(s) in %0.1f ms (%0.2f ms per ROI)", nDrawn, 1000.*seconds, 1000.*seconds/nDrawn )
+    instrument.flush()
+#end drawAllLines()
+
+
+
+NEWIMAGE = "New RGB image (for export)"
+INPLACE = "Draw into this image"
+
+
+def flattenMeasurementOverlay():
+    '''Flatten_Measurement_Overlay.py:  burn the measurement annotations in the image Overlay into pixels, for export.'''
+    from ij import IJ
+    from ij.gui import GenericDialog
+    from mmtools import annotate
+
+    imp = IJ.getImage()     # get the current Image, which is an ImagePlus object
+
+    if imp.getOverlay() is None:
+        gd = GenericDialog("Flatten Measurement Overlay")
+        gd.addMessage("This image has no overlay to flatten!")
+        gd.showDialog()
+        return
+
+    gd = GenericDialog("Flatten Measurement Overlay")
+    gd.addChoice("Flatten to:", [NEWIMAGE, INPLACE], NEWIMAGE)
+    gd.showDialog()
+    if gd.wasCanceled():  return     # User cancelled - exit
+
+    if gd.getNextChoice() == INPLACE:
+        try:
+            annotate.flattenOverlay( imp, inplace=True )
+        except ValueError as e:
+            IJ.error( "Flatten Measurement Overlay", str(e) )
+    else:
+        annotate.flattenOverlay( imp ).show()
+#end flattenMeasurementOverlay()
+
+
+
+'''
+################################
+   Export & Index
+################################
+'''
+
+ROIMANAGER = "ROI Manager (current image)"
+DIRECTORY = "Saved ROI sets in a directory"
+
+
+def exportLineMeasurements():
+    '''Export_Line_Measurements.py:  export calibrated measurements of line & polyline ROIs to a CSV file, without drawing them.'''
+    from ij import IJ
+    from ij.gui import GenericDialog
+    from ij.plugin.frame import RoiManager
+    from mmtools import measure
+
+    gd = GenericDialog("Export Line Measurements")
+    gd.addChoice("Source:", [ROIMANAGER, DIRECTORY], ROIMANAGER)
+    gd.addStringField("Directory or glob pattern:", "", 40)
+    gd.addStringField("CSV file:", "", 40)
+    gd.showDialog()
+
+    if gd.wasCanceled():  return     # User cancelled - exit
+
+    source = gd.getNextChoice()
+    directory = gd.getNextString().strip()
+    csvpath = gd.getNextString().strip()
+    if not csvpath:
+        raise ValueError( "Export_Line_Measurements: Please enter the CSV file to write." )
+
+    if source == DIRECTORY:
+        measure.exportDirectory( directory, csvpath )
+        return
+
+    imp = IJ.getImage()
+    rm = RoiManager.getInstance()
+    rois = rm.getRoisAsArray()  if rm is not None  else []
+    cal = imp.getCalibration()
+
+    w = measure.MeasurementWriter( csvpath )
+    try:
+        w.writeRows(  measure.measureRois( imp.getTitle(), rois, cal.pixelWidth, cal.pixelHeight, cal.getUnit() )  )
+    finally:
+        w.close()
+    print( "Exported %i measurements to %s" % (w.count, csvpath) )
+#end exportLineMeasurements()
+
+
+
+def indexSEMCalibrations():
+    '''Index_SEM_Calibrations.py:  build or update a calibration index for a whole tree of JEOL SEM images.'''
+    from ij.gui import GenericDialog
+    from mmtools import calindex
+
+    gd = GenericDialog("Index SEM Calibrations")
+    gd.addStringField("Image directory:", "", 40)
+    gd.addStringField("Index file:", "", 40)
+    gd.addMessage("The index file is created if it doesn't exist yet.\nLeave it empty to use 'calindex.tsv' in the image directory.")
+    gd.showDialog()
+
+    if gd.wasCanceled():  return     # User cancelled - exit
+
+    root = gd.getNextString().strip()
+    indexpath = gd.getNextString().strip()
+
+    if not os.path.isdir( root ):
+        raise ValueError( "Index_SEM_Calibrations: Not a directory: `%s`" % (root) )
+    if not indexpath:
+        indexpath = os.path.join( root, 'calindex.tsv' )
+
+    calindex.indexTree( root, indexpath )
+#end indexSEMCalibrations()
+
+
+
+'''
+################################
+   Measure Critical Dimensions
+################################
+'''
+
+CURRENTIMAGE = "Current image"
+IMAGEFILES = "Images in a directory or glob pattern"
+LINES = "Bright lines"
+TRENCHES = "Dark trenches/spaces"
+ACROSS = "Horizontal (features run vertically)"
+DOWN = "Vertical (features run horizontally)"
+
+
+def measureCriticalDimensions():
+    '''Measure_Critical_Dimensions.py:  measure the widths of the lines or trenches crossing a region of one image, or of a whole batch (see `mmtools.metrology`).'''
+    from ij import IJ, WindowManager
+    from ij.gui import GenericDialog
+    from mmtools import annotate, metrology, measure
+
+    calreg = settings.getRegistry()
+    CalStr = [AUTO] + [ rec.name for rec in calreg ]
+
+    # default region: the rectangle selected on the current image, if any
+    imp = WindowManager.getCurrentImage()
+    roi = imp.getRoi()  if imp is not None  else None
+    x, y, w, h = 0, 0, 0, 0
+    if roi is not None and roi.isArea():
+        r = roi.getBounds()
+        x, y, w, h = r.x, r.y, r.width, r.height
+
+    gd = GenericDialog("Measure Critical Dimensions")
+    gd.addChoice("Images:", [CURRENTIMAGE, IMAGEFILES], CURRENTIMAGE  if imp is not None  else IMAGEFILES)
+    gd.addStringField("Directory or glob pattern:", "", 40)
+    gd.addChoice("Calibration (batch only):", CalStr, CalStr[0])
+    gd.addNumericField("Region x:", x, 0)
+    gd.addNumericField("Region y:", y, 0)
+    gd.addNumericField("Region width:", w, 0, 6, "px (0 = whole image)")
+    gd.addNumericField("Region height:", h, 0, 6, "px (0 = whole image)")
+    gd.addChoice("Features:", [LINES, TRENCHES], LINES)
+    gd.addChoice("Scanlines:", [ACROSS, DOWN], ACROSS)
+    gd.addNumericField("Number of scanlines:", metrology.SCANLINES, 0)
+    gd.addStringField("CSV file:", "", 40)
+    gd.addNumericField("Worker threads:", 4, 0)
+    gd.addCheckbox("Annotate the widths on the images?", True)
+    gd.showDialog()
+
+    if gd.wasCanceled():  return     # User cancelled - exit
+
+    which = gd.getNextChoice()
+    source = gd.getNextString().strip()
+    ChosenCal = gd.getNextChoice()
+    region = [ int( gd.getNextNumber() ) for ii in range(4) ]
+    polarity = metrology.BRIGHT  if gd.getNextChoice() == LINES  else metrology.DARK
+    direction = metrology.HORIZONTAL  if gd.getNextChoice() == ACROSS  else metrology.VERTICAL
+    scanlines = max( 1, int( gd.getNextNumber() ) )
+    csvpath = gd.getNextString().strip()
+    workers = int( gd.getNextNumber() )
+    annotateit = gd.getNextBoolean()
+
+    style = annotate.Style(  settings.getSettings()  )  if annotateit  else None
+
+    if which == IMAGEFILES:
+        if not source or not csvpath:
+            raise ValueError( "Measure_Critical_Dimensions: Please enter a directory or glob pattern, and the CSV file to write." )
+        rec = None  if ChosenCal == AUTO  else calreg.find( ChosenCal )
+        metrology.runMetrology( source, calreg, csvpath, rec=rec, region=region, scanlines=scanlines, polarity=polarity,
+                                direction=direction, workers=workers, style=style )
+        instrument.flush()
+        return
+    #end if(batch)
+
+    if imp is None:
+        IJ.error( "Measure Critical Dimensions", "Please open an image first!" )
+        return
+    if not imp.getCalibration().scaled():
+        IJ.error( "Measure Critical Dimensions", "Please calibrate the image first, eg. with 'Choose Microscope Calibration'." )
+        return
+
+    features, region = metrology.measureImage( imp, region, scanlines, polarity, direction )
+    unit = imp.getCalibration().getUnit()
+    rows = list(  metrology.featureRows( imp.getTitle(), features, region, metrology.pixelSize( imp, direction ), unit, "image", direction )  )
+    for row in rows:
+        print( "Feature %i: %s +/- %s %s  (min %s, max %s, %i scanlines)" % (row[1], row[4], row[5], unit, row[6], row[7], row[2]) )
+    if not rows:
+        IJ.showStatus( "Measure Critical Dimensions: no features found in the region" )
+
+    if csvpath:
+        writer = measure.MeasurementWriter( csvpath, metrology.COLUMNS )
+        try:
+            writer.writeRows( rows )
+        finally:
+            writer.close()
+    if style is not None:
+        metrology.annotateFeatures( imp, features, region, style, direction )
+    instrument.flush()
+#end measureCriticalDimensions()
+
+
+
+'''
+################################
+   Analyze Sidewall
+################################
+'''
+
+MATERIALLEFT = "Left of the sidewall"
+MATERIALRIGHT = "Right of the sidewall"
+
+
+def analyzeSidewall():
+    '''Analyze_Sidewall.py:  sidewall angle, etch depth & footing of one image, or of a whole batch (see `mmtools.sidewall`).'''
+    from ij import IJ, WindowManager
+    from ij.gui import GenericDialog
+    from mmtools import annotate, sidewall, measure
+
+    sets = settings.getSettings()
+    calreg = settings.getRegistry()
+    CalStr = [AUTO] + [ rec.name for rec in calreg ]
+
+    # default region: the rectangle selected on the current image, or the settings
+    imp = WindowManager.getCurrentImage()
+    roi = imp.getRoi()  if imp is not None  else None
+    if roi is not None and roi.isArea():
+        r = roi.getBounds()
+        x, y, w, h = r.x, r.y, r.width, r.height
+    else:
+        x, y, w, h = getattr( sets, 'sidewallregion', None ) or (0, 0, 0, 0)
+    material = getattr( sets, 'sidewallmaterial', sidewall.LEFT )
+
+    gd = GenericDialog("Analyze Sidewall")
+    gd.addChoice("Images:", [CURRENTIMAGE, IMAGEFILES], CURRENTIMAGE  if imp is not None  else IMAGEFILES)
+    gd.addStringField("Directory or glob pattern:", "", 40)
+    gd.addChoice("Calibration (batch only):", CalStr, CalStr[0])
+    gd.addNumericField("Region x:", x, 0)
+    gd.addNumericField("Region y:", y, 0)
+    gd.addNumericField("Region width:", w, 0, 6, "px (0 = whole image)")
+    gd.addNumericField("Region height:", h, 0, 6, "px (0 = whole image)")
+    gd.addChoice("Material:", [MATERIALLEFT, MATERIALRIGHT], MATERIALRIGHT  if material == sidewall.RIGHT  else MATERIALLEFT)
+    gd.addStringField("CSV file:", "", 40)
+    gd.addNumericField("Worker threads:", 4, 0)
+    gd.addCheckbox("Annotate the results on the images?", True)
+    gd.showDialog()
+
+    if gd.wasCanceled():  return     # User cancelled - exit
+
+    which = gd.getNextChoice()
+    source = gd.getNextString().strip()
+    ChosenCal = gd.getNextChoice()
+    region = [ int( gd.getNextNumber() ) for ii in range(4) ]
+    material = sidewall.RIGHT  if gd.getNextChoice() == MATERIALRIGHT  else sidewall.LEFT
+    csvpath = gd.getNextString().strip()
+    workers = int( gd.getNextNumber() )
+    annotateit = gd.getNextBoolean()
+
+    style = annotate.Style( sets )  if annotateit  else None
+
+    if which == IMAGEFILES:
+        if not source or not csvpath:
+            raise ValueError( "Analyze_Sidewall: Please enter a directory or glob pattern, and the CSV file to write." )
+        rec = None  if ChosenCal == AUTO  else calreg.find( ChosenCal )
+        sidewall.runSidewalls( source, calreg, csvpath, rec=rec, region=region, material=material, workers=workers, style=style )
+        instrument.flush()
+        return
+    #end if(batch)
+
+    if imp is None:
+        IJ.error( "Analyze Sidewall", "Please open an image first!" )
+        return
+    if not imp.getCalibration().scaled():
+        IJ.error( "Analyze Sidewall", "Please calibrate the image first, eg. with 'Choose Microscope Calibration'." )
+        return
+
+    try:
+        sw, region = sidewall.analyzeImage( imp, region, material )
+    except ValueError as e:
+        IJ.error( "Analyze Sidewall", str(e) )
+        return
+    unit = imp.getCalibration().getUnit()
+    print( "Sidewall: %0.2f deg, etch depth %g %s, footing %g %s (%g %s high), %i of %i edge points on the fit" % (
+        sw.angle, sw.depth, unit, sw.footing, unit, sw.footheight, unit, sw.inliers, len(sw.points) ) )
+
+    if csvpath:
+        writer = measure.MeasurementWriter( csvpath, sidewall.COLUMNS )
+        try:
+            writer.writeRows(  sidewall.sidewallRows( imp.getTitle(), sw, unit, "image" )  )
+        finally:
+            writer.close()
+    if style is not None:
+        sidewall.annotateSidewall( imp, sw, region, style )
+    instrument.flush()
+#end analyzeSidewall()
+
+
+
+'''
+################################
+   Export Annotated Images
+################################
+'''
+
+def exportAnnotatedImages():
+    '''Export_Annotated_Images.py:  calibrate, annotate & save a copy of every image in a directory, as a pipeline (see `mmtools.export`).'''
+    from ij.gui import GenericDialog
+    from mmtools import annotate, export
+
+    sets = settings.getSettings()
+    calreg = settings.getRegistry()
+    CalStr = [AUTO] + [ rec.name for rec in calreg ]
+    formats = sorted( export.FORMATS )
+    fmt = getattr( sets, 'exportformat', 'png' )
+
+    gd = GenericDialog("Export Annotated Images")
+    gd.addStringField("Directory or glob pattern:", "", 40)
+    gd.addStringField("Output directory:", "", 40)
+    gd.addMessage("(leave empty to save the copies next to the images)")
+    gd.addChoice("Calibration:", CalStr, CalStr[0])
+    gd.addChoice("Format:", formats, fmt  if fmt in formats  else 'png')
+    gd.addNumericField("JPEG quality:", getattr( sets, 'exportquality', export.JPEG_QUALITY ), 0, 6, "(0-100)")
+    gd.addNumericField("Images in memory:", getattr( sets, 'exportinflight', export.MAX_INFLIGHT ), 0)
+    gd.addNumericField("Worker threads:", 2, 0, 6, "per stage")
+    gd.addCheckbox("Add a scale bar?", True)
+    gd.addCheckbox("Draw into the TIFFs in place (huge uncompressed mosaics: only the tiles under the lines are rewritten)?", False)
+    gd.showDialog()
+
+    if gd.wasCanceled():  return     # User cancelled - exit
+
+    source = gd.getNextString().strip()
+    outdir = gd.getNextString().strip() or None
+    ChosenCal = gd.getNextChoice()
+    fmt = gd.getNextChoice()
+    quality = int( gd.getNextNumber() )
+    maxinflight = int( gd.getNextNumber() )
+    workers = int( gd.getNextNumber() )
+    bar = gd.getNextBoolean()
+    inplace = gd.getNextBoolean()
+
+    if not source:
+        raise ValueError( "Export_Annotated_Images: Please enter a directory or glob pattern." )
+
+    rec = None  if ChosenCal == AUTO  else calreg.find( ChosenCal )
+    style = annotate.Style( sets )      # one font & set of colors, shared by all the images
+    export.runExport( source, calreg, outdir=outdir, rec=rec, style=style, scalebar=bar, fmt=fmt, quality=quality,
+                      maxinflight=maxinflight, workers=workers, inplace=inplace )
+    instrument.flush()
+#end exportAnnotatedImages()
@@ -0,0 +1,263 @@
+''' mmtools/registry.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Registry of all the available calibrations, as one record per calibration.
+The records come from the parallel lists `names`, `cals`, `units` & `aspect_ratio` (and optionally `pixel_depth`, `frame_interval` & `time_unit`)
+in `Microscope_Calibrations_user_settings.py`, plus any CSV or JSON tables listed in the settings' `calibration_tables`.
+
+The registry keeps a name -> record index, a label -> record index (for the chooser dialog) and the records grouped by instrument,
+so thousands of calibrations can be looked up & filtered without scanning lists of strings.
+'''
+
+import csv, io, json, os, re
+
+try:
+    basestring
+except NameError:
+    basestring = str    # Python 3
+
+
+# an objective/magnification at the end of a name, eg. "Swift 40x" or "FluoroScope 1.5X":
+re_objective = re.compile( r'^(.*?)\s*\b(\d+(?:\.\d+)?\s*[xX])$' )
+
+CUSTOM_GROUP = "Custom"     # group for the custom calibration classes, unless they have a `.group` attribute
+
+
+
+class CalRecord(object):
+    '''One calibration.
+
+    CalRecord.name : string
+        Name shown in the calibration list.
+    CalRecord.pixel_per_unit : float, or None for custom calibrations
+    CalRecord.unit : string, or None for custom calibrations
+    CalRecord.aspect_ratio : float, or None for custom calibrations
+        pixelHeight = pixelWidth * aspect_ratio
+    CalRecord.pixel_depth : float, or None
+        Z step between slices, in `unit`s, or None to leave the image's own value.
+    CalRecord.frame_interval : float, or None
+        Time between frames, in `time_unit`s, or None to leave the image's own value.
+    CalRecord.time_unit : string, or None
+        Unit of `frame_interval`, eg. "sec" or "min".  None leaves the image's own unit.
+    CalRecord.group : string
+        Instrument name used to group the calibrations, eg. "Swift" for "Swift 40x".
+    CalRecord.objective : string
+        Objective/magnification part of the name, eg. "40x", or "" if there is none.
+    CalRecord.custom : object
+        The instance of a custom calibration class (with a `.cal( ImagePlus )` method), or None for regular calibrations.
+    CalRecord.label : string
+        Text shown in the chooser dialog.
+    '''
+
+    __slots__ = ('name', 'pixel_per_unit', 'unit', 'aspect_ratio', 'pixel_depth', 'frame_interval', 'time_unit', 'group', 'objective', 'custom', 'label', 'key')
+
+    def __init__(self, name, pixel_per_unit=None, unit=None, aspect_ratio=1.0, group=None, custom=None,
+                 pixel_depth=None, frame_interval=None, time_unit=None):
+        self.name = name
+        self.custom = custom
+        if custom is None:
+            self.pixel_per_unit = float( pixel_per_unit )
+            self.unit = unit
+            self.aspect_ratio = float( aspect_ratio )
+            self.pixel_depth = float( pixel_depth )  if pixel_depth not in (None, '')  else None
+            self.frame_interval = float( frame_interval )  if frame_interval not in (None, '')  else None
+            self.time_unit = time_unit or None
+            self.label = name + "      (%s"%pixel_per_unit + " pixels/%s)"%unit
+        else:
+            # custom classes can set the attributes `pixel_depth`, `frame_interval` & `time_unit` in their `.cal()`:
+            self.pixel_per_unit = self.unit = self.aspect_ratio = None
+            self.pixel_depth = self.frame_interval = self.time_unit = None
+            self.label = name
+
+        match = re_objective.match( name.strip() )
+        self.objective = match.group(2)  if match else ""
+        if group:
+            self.group = group
+        elif custom is not None:
+            self.group = getattr( custom, 'group', CUSTOM_GROUP )
+        else:
+            self.group = ( match.group(1)  if match and match.group(1) else name ).strip()
+
+        self.key = ( self.label + " " + self.group ).lower()     # text searched by the chooser's filter
+    #end __init__()
+
+    def isCustom(self):
+        '''True if this record is a custom calibration class, rather than a fixed value.'''
+        return self.custom is not None
+
+    def __repr__(self):
+        return "CalRecord(%r)" % (self.label)
+#end class(CalRecord)
+
+
+
+class CalRegistry(object):
+    '''All the available calibrations, in the order they were defined.
+
+    CalRegistry.records : list of CalRecord
+    CalRegistry.groups : list of the group names, in order of first appearance
+    '''
+
+    def __init__(self, records=()):
+        self.records = []
+        self.groups = []
+        self._byname = {}
+        self._bylabel = {}
+        self._bygroup = {}
+        for rec in records:
+            self.add( rec )
+    #end __init__()
+
+    def add(self, rec):
+        '''Add a CalRecord.  Raises ValueError if a calibration with the same name already exists.'''
+        key = rec.name.strip().lower()
+        if key in self._byname:
+            raise ValueError( 'CalRegistry: The calibration name "%s" is defined more than once.' % (rec.name) )
+        self.records.append( rec )
+        self._byname[key] = rec
+        self._bylabel[rec.label] = rec
+        if rec.group not in self._bygroup:
+            self._bygroup[rec.group] = []
+            self.groups.append( rec.group )
+        self._bygroup[rec.group].append( rec )
+    #end add()
+
+    def __len__(self):
+        return len( self.records )
+
+    def __iter__(self):
+        return iter( self.records )
+
+    def labels(self):
+        '''List of the chooser labels of all records.'''
+        return [ rec.label for rec in self.records ]
+
+    def find(self, name):
+        '''Returns the record called `name` (case-insensitive).  Raises ValueError if there is none.'''
+        try:
+            return self._byname[ name.strip().lower() ]
+        except KeyError:
+            raise ValueError( 'CalRegistry: No calibration named "%s" in the settings file.' % (name) )
+    #end find()
+
+    def fromLabel(self, label):
+        '''Returns the record shown as `label` in the chooser.  Raises ValueError if there is none.'''
+        try:
+            return self._bylabel[ label ]
+        except KeyError:
+            raise ValueError( 'CalRegistry: No calibration labelled "%s".' % (label) )
+    #end fromLabel()
+
+    def group(self, group):
+        '''List of the records in `group`.'''
+        return self._bygroup.get( group, [] )
+
+    def customs(self):
+        '''List of the records that are custom calibration classes.'''
+        return [ rec for rec in self.records  if rec.isCustom() ]
+
+    def search(self, text="", group=None):
+        '''Returns the records in `group` (or in all groups if None) whose label contains every word of `text`, case-insensitive.'''
+        records = self.records  if group is None  else self.group( group )
+        words = text.lower().split()
+        if not words:
+            return list( records )
+        return [ rec for rec in records  if all( w in rec.key for w in words ) ]
+    #end search()
+#end class(CalRegistry)
+
+
+
+def recordsFromSettings( cal ):
+    '''Generator of CalRecords from the parallel lists `names`, `cals`, `units` & `aspect_ratio` of the settings module `cal`,
+    and the optional lists `pixel_depth`, `frame_interval` & `time_unit` (a list, or one string for all).
+    Raises ValueError if the lists don't all have the same length.'''
+    n = len( cal.names )
+    optional = dict(  ( listname, getattr(cal, listname, None) )  for listname in ('pixel_depth', 'frame_interval', 'time_unit')  )
+    if isinstance( optional['time_unit'], basestring ):
+        optional['time_unit'] = [ optional['time_unit'] ] * n
+    lists = [ (listname, getattr(cal, listname))  for listname in ('cals', 'units', 'aspect_ratio') ]
+    lists += [ (listname, lst)  for listname, lst in sorted( optional.items() )  if lst is not None ]
+    for listname, lst in lists:
+        if len( lst ) != n:
+            raise ValueError( "Microscope_Calibrations_user_settings: The list `%s` has %i items, but `names` has %i.  Please make sure the lists `names`, `cals`, `units` and `aspect_ratio` (and `pixel_depth`, `frame_interval` if used) all have the same number of items!" % (listname, len(lst), n) )
+    #end for(lists)
+
+    def item( listname, ii ):
+        lst = optional[listname]
+        return lst[ii]  if lst is not None  else None
+
+    for ii, name in enumerate( cal.names ):
+        if isinstance( name, basestring ):
+            '''It's just a regular calibration setting'''
+            yield CalRecord( name, cal.cals[ii], cal.units[ii], cal.aspect_ratio[ii],
+                             pixel_depth=item('pixel_depth', ii), frame_interval=item('frame_interval', ii), time_unit=item('time_unit', ii) )
+        elif hasattr( name, 'cal' ):
+            ''' A custom function/class '''
+            yield CalRecord( name.name, custom=name )
+        else:
+            raise ValueError('This calibration Name value is invalid, please check your Settings.py file!/n/tFor Calibration Number %i, got: `'%(ii) + str(name) + '`. Expected a String or a Class instance with ".cal()" method, but got type ' + str( type(name) ) + ' with no ".cal()" method.' )
+    #end for(cal.names)
+#end recordsFromSettings()
+
+
+
+def _row( d, path ):
+    '''Make a CalRecord from a dict read from a CSV/JSON table.'''
+    def get( *keys ):
+        for k in keys:
+            if d.get(k) not in (None, ''):
+                return d[k]
+        return None
+    name = get( 'name', 'names' )
+    ppu = get( 'cal', 'cals', 'pixel_per_unit' )
+    if name is None or ppu is None:
+        raise ValueError( "Calibration table %s: every row needs a `name` and a `cal` (pixels per unit), got: %r" % (path, d) )
+    return CalRecord( name, ppu, get('unit', 'units') or 'um', get('aspect_ratio') or 1.0, get('group'),
+                      pixel_depth=get('pixel_depth'), frame_interval=get('frame_interval'), time_unit=get('time_unit') )
+#end _row()
+
+
+def recordsFromTable( path ):
+    '''Generator of CalRecords read from a CSV or JSON table.
+
+    CSV files need a header row with the columns `name`, `cal` (pixels per unit), and optionally `unit` (default "um"), `aspect_ratio` (default 1.0), `group`,
+    and `pixel_depth`, `frame_interval` & `time_unit` for z-stacks & time series.
+    JSON files hold a list of objects with the same keys.
+    '''
+    if os.path.splitext( path )[1].lower() == '.json':
+        f = io.open( path, 'r', encoding='utf-8' )
+        try:
+            rows = json.load( f )
+        finally:
+            f.close()
+        for d in rows:
+            yield _row( d, path )
+    else:
+        f = open( path, 'r' )
+        try:
+            for d in csv.DictReader( f ):
+                yield _row( dict( (k.strip().lower(), (v.strip() if v else v))  for k, v in d.items()  if k ), path )
+        finally:
+            f.close()
+    #end if(json or csv)
+#end recordsFromTable()
+
+
+
+def tablePaths( cal ):
+    '''List of the full paths of the tables in `cal.calibration_tables`.  Relative paths are relative to the settings file.'''
+    basedir = os.path.dirname( os.path.abspath(cal.__file__) )  if hasattr(cal, '__file__') else ''
+    return [  os.path.join( basedir, os.path.expanduser(path) )  for path in getattr( cal, 'calibration_tables', [] )  ]
+#end tablePaths()
+
+
+
+def fromSettings( cal ):
+    '''Build the CalRegistry from the settings module `cal`, including any tables listed in `cal.calibration_tables`.'''
+    reg = CalRegistry(  recordsFromSettings( cal )  )
+    for path in tablePaths( cal ):
+        for rec in recordsFromTable( path ):
+            reg.add( rec )
+    return reg
+#end fromSettings()
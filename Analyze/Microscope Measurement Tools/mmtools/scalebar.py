@@ -0,0 +1,173 @@
+''' mmtools/scalebar.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Headless scale bars, drawn from the image calibration without ImageJ's interactive "Scale Bar..." command,
+so the same bar can be added to thousands of images in a batch.
+The bar length is the longest 1, 2 or 5 x 10^n units that fits in a fifth of the image width (see `mmtools.geometry.niceLength()`),
+and the bar, text & background use the Draw Line settings: `linecolor`, `linethickness`, `textcolor`, `textbackgroundcolor` & `textsize`.
+
+The characters of the text are rendered once per font into small masks (`GlyphCache`), and then only filled in with the text color,
+so drawing the text of a bar costs a few small fills instead of a font rendering.
+
+    style = annotate.Style( settings.getSettings() )
+    length, unit = scalebar.addScaleBar( imp, style )
+'''
+
+from mmtools import geometry, instrument
+
+
+_caches = {}        # { (font name, font style, font size) : GlyphCache }
+
+
+
+class GlyphCache(object):
+    '''Masks of the characters of one font, each rendered the first time it's used.
+
+    GlyphCache( font ) : `font` is a java.awt.Font
+    GlyphCache.height : int, height of a line of text
+    GlyphCache.width( text ) : width in pixels of `text`
+    GlyphCache.draw( ip, text, x, y ) : fill the characters of `text` into the ImageProcessor `ip` in its current color,
+        with `y` the bottom of the text, as for `ImageProcessor.drawString()`
+    '''
+
+    def __init__(self, font):
+        from java.awt.image import BufferedImage
+        self.font = font
+        g = BufferedImage( 1, 1, BufferedImage.TYPE_INT_RGB ).createGraphics()
+        self._metrics = g.getFontMetrics( font )
+        g.dispose()
+        self.height = self._metrics.getHeight()
+        self._glyphs = {}       # { character : (mask ByteProcessor or None, advance width) }
+    #end __init__()
+
+    def glyph(self, ch):
+        '''(mask, advance) of the character `ch`.  The mask is a ByteProcessor that is non-zero on the character, or None for blank characters.'''
+        g = self._glyphs.get( ch )
+        if g is None:
+            from ij.process import ByteProcessor
+            advance = self._metrics.charWidth( ch )
+            mask = None
+            if advance > 0 and not ch.isspace():
+                mask = ByteProcessor( advance, self.height )
+                mask.setFont( self.font )
+                mask.setAntialiasedText( False )    # a mask is on or off
+                mask.setColor( 255 )
+                mask.drawString( ch, 0, self.height )
+            g = self._glyphs[ch] = (mask, advance)
+        return g
+    #end glyph()
+
+    def width(self, text):
+        return sum(  self.glyph( ch )[1]  for ch in text  )
+
+    def draw(self, ip, text, x, y):
+        '''Fill the characters of `text` into `ip` in its current color.  Characters that would be cut by the image edges are skipped.'''
+        top = y - self.height
+        if top < 0 or y > ip.getHeight():  return
+        for ch in text:
+            mask, advance = self.glyph( ch )
+            if mask is not None and 0 <= x and x + advance <= ip.getWidth():
+                ip.setRoi( x, top, advance, self.height )
+                ip.fill( mask )
+            x += advance
+        ip.resetRoi()
+    #end draw()
+#end class(GlyphCache)
+
+
+
+def glyphCache( font ):
+    '''The GlyphCache of a java.awt.Font, shared by all images & threads.'''
+    key = ( font.getName(), font.getStyle(), font.getSize() )
+    cache = _caches.get( key )
+    if cache is None:
+        cache = _caches.setdefault( key, GlyphCache( font ) )
+    return cache
+#end glyphCache()
+
+
+
+def _fillRect( ip, rect ):
+    x, y, w, h = rect
+    ip.setRoi( int(x), int(y), int(w), int(h) )
+    ip.fill()
+    ip.resetRoi()
+#end _fillRect()
+
+
+
+def drawScaleBar( ip, pixelWidth, unit, style, pos='br', fraction=geometry.SCALEBAR_FRACTION ):
+    '''Draw a scale bar into the ImageProcessor `ip`, for pixels `pixelWidth` `unit`s wide.
+    `pos` is the corner ('br', 'tl' etc.), see `mmtools.geometry.scaleBarLayout()`.  Returns the bar length in `unit`s.'''
+    with instrument.span( 'draw.scalebar' ):
+        imgw, imgh = ip.getWidth(), ip.getHeight()
+        length = geometry.niceLength( imgw * pixelWidth, fraction )
+        text = geometry.scaleBarText( length, unit )
+        glyphs = glyphCache( style.font )
+        bar, (x, y), box = geometry.scaleBarLayout(  imgw, imgh, int(round( length / pixelWidth )), max( 1, style.linewidth ),
+                                                     glyphs.width( text ), glyphs.height, pos  )
+
+        if style.textbackground:
+            ip.setColor( style.textbackground )
+            _fillRect( ip, box )
+        ip.setColor( style.linecolor )
+        _fillRect( ip, bar )
+        ip.setColor( style.textcolor )
+        glyphs.draw( ip, text, x, y )
+    return length
+#end drawScaleBar()
+
+
+
+def overlayScaleBar( overlay, imp, style, pos='br', fraction=geometry.SCALEBAR_FRACTION ):
+    '''Add a scale bar for the calibration of `imp` to the Overlay `overlay`, as vector elements shown on all slices.  No pixels are changed.
+    Returns the bar length in the image's unit.'''
+    from ij.gui import Roi, TextRoi
+
+    cal = imp.getCalibration()
+    length = geometry.niceLength( imp.getWidth() * cal.pixelWidth, fraction )
+    text = geometry.scaleBarText( length, cal.getUnit() )
+    strw, strh = style.textSize( text )
+    bar, (x, y), box = geometry.scaleBarLayout(  imp.getWidth(), imp.getHeight(), int(round( length / cal.pixelWidth )), max( 1, style.linewidth ),
+                                                 strw, strh, pos  )
+
+    rois = []
+    if style.textbackground:
+        rois.append(  Roi( *box )  )
+        rois[-1].setFillColor( style.textbackground )
+    rois.append(  Roi( *bar )  )
+    rois[-1].setFillColor( style.linecolor )
+    rois.append(  TextRoi( x, y - strh, text, style.font )  )     # TextRoi is placed by its top-left corner
+    rois[-1].setStrokeColor( style.textcolor )
+
+    for roi in rois:
+        roi.setName( "mmtools scale bar" )
+        overlay.add( roi )
+    return length
+#end overlayScaleBar()
+
+
+
+def addScaleBar( imp, style, pos=None, fraction=geometry.SCALEBAR_FRACTION ):
+    '''Add a scale bar to the image `imp`, from its calibration: to the image Overlay if `style.overlay` is set, otherwise drawn into
+    the pixels of the current slice.  `pos` defaults to `style.scalebarposition`.  The image is not repainted.
+    Raises ValueError if the image isn't calibrated.
+
+    length, unit = addScaleBar( imp, style )
+    '''
+    from mmtools import annotate
+
+    cal = imp.getCalibration()
+    if not cal.scaled():
+        raise ValueError( "addScaleBar(): The image `%s` has no spatial calibration." % imp.getTitle() )
+    if pos is None:
+        pos = style.scalebarposition
+
+    if style.overlay:
+        overlay = annotate.imageOverlay( imp )
+        length = overlayScaleBar( overlay, imp, style, pos, fraction )
+        imp.setOverlay( overlay )
+    else:
+        length = drawScaleBar( imp.getProcessor(), cal.pixelWidth, cal.getUnit(), style, pos, fraction )
+    return length, cal.getUnit()
+#end addScaleBar()
@@ -0,0 +1,166 @@
+''' mmtools/settings.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Loads `Microscope_Calibrations_user_settings.py` once, and reloads it only when the file has changed,
+so edits to the settings are picked up the next time a plugin runs, without restarting Fiji.
+
+Custom calibration modules imported by the settings file (such as `JEOL_SEM_AutoCal.py`) are watched & reloaded too.
+Each call only costs one `os.stat()` per watched file.
+
+    from mmtools import settings
+    sets = settings.getSettings()       # the settings module, eg. `sets.linecolor`
+    calreg = settings.getRegistry()     # CalRegistry of all calibrations, see mmtools.registry
+'''
+
+import os, sys, threading, types
+
+from mmtools import instrument, registry
+
+
+SETTINGS_MODULE = 'Microscope_Calibrations_user_settings'
+
+# folder holding the settings file, ie. the "Microscope Measurement Tools" folder:
+TOOLS_DIR = os.path.dirname(  os.path.dirname( os.path.abspath(__file__) )  )
+
+try:
+    reload
+except NameError:
+    from importlib import reload    # Python 3
+
+
+_lock = threading.Lock()
+_state = {
+    'module' : None,    # the settings module
+    'mtimes' : {},      # { source file : mtime } of the settings & custom calibration modules
+    'registry' : None,  # CalRegistry made from the current settings
+    'tables' : {},      # { table path : mtime } of the calibration_tables in that registry
+    }
+
+
+
+def sourceFile( module ):
+    '''Returns the *.py source file of a module, or None if it has none (eg. built-in or Java modules).'''
+    f = getattr( module, '__file__', None )
+    if not f:
+        return None
+    if f.endswith( '$py.class' ):
+        f = f[:-len('$py.class')] + '.py'     # Jython compiled module
+    elif f.endswith( ('.pyc', '.pyo') ):
+        f = f[:-1]
+    return os.path.abspath( f )
+#end sourceFile()
+
+
+
+def _mtime( path ):
+    try:
+        return os.stat( path ).st_mtime
+    except OSError:
+        return None
+#end _mtime()
+
+
+
+def customModules( sets ):
+    '''Returns the list of modules that the settings module imported from the "Microscope Measurement Tools" folder,
+    eg. `JEOL_SEM_AutoCal` for the custom calibration classes.  The mmtools library itself is not included.'''
+    names = set()
+    for value in vars( sets ).values():
+        if isinstance( value, types.ModuleType ):
+            names.add( value.__name__ )
+        elif isinstance( value, type ):
+            names.add( value.__module__ )
+        elif hasattr( value, '__class__' ):
+            names.add( value.__class__.__module__ )
+    #end for(settings attributes)
+
+    mods = []
+    for name in sorted(names):
+        mod = sys.modules.get( name )
+        src = sourceFile( mod )  if mod is not None else None
+        if src and name != sets.__name__ and not name.startswith('mmtools') and os.path.dirname(src) == TOOLS_DIR:
+            mods.append( mod )
+    #end for(module names)
+    return mods
+#end customModules()
+
+
+
+def _removeCompiled( module ):
+    '''Delete a stale Jython `$py.class` file, so the module is recompiled from the edited *.py file.'''
+    src = sourceFile( module )
+    if src:
+        compiled = src[:-len('.py')] + '$py.class'
+        if os.path.isfile( compiled ):
+            try:
+                os.remove( compiled )
+            except OSError:
+                pass    # read-only install: Jython will still reload from the newer source
+#end _removeCompiled()
+
+
+
+def _watch( sets ):
+    '''Record the mtimes of the settings file & its custom modules.'''
+    files = [ sourceFile(sets) ] + [ sourceFile(m) for m in customModules(sets) ]
+    _state['mtimes'] = dict( (f, _mtime(f)) for f in files  if f )
+#end _watch()
+
+
+
+def _changed():
+    '''True if any of the watched files changed since they were loaded.'''
+    for f, mtime in _state['mtimes'].items():
+        if _mtime( f ) != mtime:
+            return True
+    return False
+#end _changed()
+
+
+
+def getSettings():
+    '''Returns the settings module, (re)loading it if it's the first call or any of its files changed.'''
+    with _lock:
+        sets = _state['module']
+        if sets is None:
+            if TOOLS_DIR not in sys.path:
+                sys.path.append( TOOLS_DIR )
+            sets = __import__( SETTINGS_MODULE )
+        elif _changed():
+            # reload the custom calibration modules first, so the settings file re-imports the new classes:
+            for mod in customModules( sets ):
+                _removeCompiled( mod )
+                reload( mod )
+            _removeCompiled( sets )
+            sets = reload( sets )
+            _state['registry'] = None
+            print( "Microscope Measurement Tools: reloaded settings from %s" % sourceFile(sets) )
+        else:
+            return sets
+        #end if(load or reload)
+
+        _state['module'] = sets
+        _watch( sets )
+        instrument.configureFromSettings( sets )
+        return sets
+#end getSettings()
+
+
+
+def getRegistry():
+    '''Returns the CalRegistry of all the calibrations in the settings, rebuilt only when the settings or one of its calibration tables changed.'''
+    sets = getSettings()
+    with _lock:
+        reg = _state['registry']
+        if reg is not None:
+            for path, mtime in _state['tables'].items():
+                if _mtime( path ) != mtime:
+                    reg = None
+                    break
+        #end if(cached)
+        if reg is None:
+            reg = registry.fromSettings( sets )
+            _state['registry'] = reg
+            _state['tables'] = dict(  (p, _mtime(p))  for p in registry.tablePaths( sets )  )
+        return reg
+#end getRegistry()
@@ -0,0 +1,170 @@
+''' mmtools/sidecar.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Parser for the JEOL SEM *.txt "sidecar" files that accompany each image, which contain lines like
+    $CM_MAG 50000
+    $$SM_MICRON_BAR 53
+    $$SM_MICRON_MARKER 100nm
+
+The file is read in one go, and the `$KEY value` pairs are pulled out in a single pass that stops as soon as the requested keys are found.
+Parsed files are kept in a bounded LRU cache keyed on (path, mtime, size), so an unchanged sidecar is never read twice.
+'''
+
+import io, os, re, threading
+from collections import OrderedDict
+
+from mmtools import instrument
+
+
+# one `$KEY value` pair per line.  Keys keep their leading `$` or `$$`:
+re_pair = re.compile( r'^(\$+[^\s$]+)[ \t]*([^\r\n]*)', re.MULTILINE )
+
+# captures the decimals and units in "100nm" to separate groups:
+re_marker = re.compile( r'([0-9]*\.?[0-9]+)\s*([^\s0-9.]*)' )
+
+# the fields needed to compute the scale:
+SCALE_KEYS = ('$$SM_MICRON_BAR', '$$SM_MICRON_MARKER')
+MAG_KEY = '$CM_MAG'
+
+CACHE_SIZE = 1024       # max number of parsed sidecar files to keep
+
+
+
+def sidecarPath( imagepath ):
+    '''Returns the path to the *.txt file that goes with an image file.'''
+    return os.path.splitext( imagepath )[0] + ".txt"
+#end sidecarPath()
+
+
+
+def parseSidecar( text, wanted=None ):
+    '''Pull the `$KEY value` pairs out of the text of a sidecar file, in one pass.
+
+    Returns a dict of { '$KEY' : 'value string' }.
+    If `wanted` is a list of keys, parsing stops as soon as all of them have been found.
+    '''
+    fields = {}
+    remaining = set(wanted)  if wanted else None
+    for match in re_pair.finditer( text ):
+        key = match.group(1)
+        fields[key] = match.group(2).strip()
+        if remaining is not None:
+            remaining.discard( key )
+            if not remaining: break     # found everything, stop early
+    #end for(pairs)
+    return fields
+#end parseSidecar()
+
+
+
+class LRUCache(object):
+    '''Small thread-safe least-recently-used cache, holding at most `maxsize` items.'''
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data.pop( key )
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data[key] = value      # re-insert as most recently used
+            self.hits += 1
+            return value
+    #end get()
+
+    def put(self, key, value):
+        with self.lock:
+            self.data.pop( key, None )
+            self.data[key] = value
+            while len(self.data) > self.maxsize:
+                self.data.popitem( last=False )     # drop the least recently used
+    #end put()
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.hits = self.misses = 0
+#end class(LRUCache)
+
+
+_cache = LRUCache()
+
+
+
+def readSidecar( txtpath, wanted=None ):
+    '''Returns the dict of `$KEY value` pairs in the sidecar file at `txtpath`, using the cache.
+
+    If `wanted` is given, the file may only be parsed up to the last wanted key.
+    Raises IOError if the file can't be read.
+    '''
+    st = os.stat( txtpath )
+    key = ( os.path.abspath(txtpath), st.st_mtime, st.st_size )
+
+    entry = _cache.get( key )
+    if entry is not None:
+        fields, complete = entry
+        if complete or ( wanted and all(k in fields for k in wanted) ):
+            instrument.count( 'sidecar.cache_hit' )
+            return fields
+    #end if(cached)
+    instrument.count( 'sidecar.cache_miss' )
+
+    with instrument.span( 'sidecar.read' ):
+        f = io.open( txtpath, 'r', encoding='latin-1' )
+        try:
+            text = f.read()     # one bulk read
+        finally:
+            f.close()
+
+    fields = parseSidecar( text, wanted )
+    complete = not wanted  or  not all( k in fields for k in wanted )   # didn't stop early
+    _cache.put( key, (fields, complete) )
+    return fields
+#end readSidecar()
+
+
+
+def parseMarker( marker ):
+    '''Split a scale-bar marker string such as "100nm" or "1.5 um" into (100.0, 'nm').
+    Raises ValueError if there is no number in the string.'''
+    match = re_marker.search( marker )
+    if not match:
+        raise ValueError( "parseMarker(): Could not read the scale-bar marker: `%s`" % (marker) )
+    return float( match.group(1) ), str( match.group(2) )
+#end parseMarker()
+
+
+
+def jeolScale( txtpath ):
+    '''Read the scale from a JEOL sidecar file.
+
+    PixelPerUnit, Unit = jeolScale( txtpath )
+
+    Raises IOError if the file can't be read, and ValueError if it doesn't contain the scale bar fields.
+    '''
+    fields = readSidecar( txtpath, SCALE_KEYS )
+    try:
+        BarLength_px = float(  fields['$$SM_MICRON_BAR'].split()[0]  )     # pixel width of the scale bar
+        BarLength_dist, BarLength_unit = parseMarker(  fields['$$SM_MICRON_MARKER']  )  # physical width of the scale bar
+    except (KeyError, IndexError):
+        raise ValueError( "jeolScale(): The text file is missing the `$$SM_MICRON_BAR` or `$$SM_MICRON_MARKER` lines:\n\t" + txtpath )
+    return BarLength_px / BarLength_dist, BarLength_unit
+#end jeolScale()
+
+
+
+def jeolMagnification( txtpath ):
+    '''Returns the magnification from a JEOL sidecar file as a float, or None if it doesn't have one.'''
+    mag = readSidecar( txtpath, SCALE_KEYS + (MAG_KEY,) ).get( MAG_KEY )
+    try:
+        return float( mag.split()[0] )
+    except (AttributeError, IndexError, ValueError):
+        return None
+#end jeolMagnification()
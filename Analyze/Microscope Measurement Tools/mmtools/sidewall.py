@@ -0,0 +1,298 @@
+''' mmtools/sidewall.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Sidewall analysis of cross-section SEM images: the sidewall angle, etch depth & footing of one etched sidewall, found automatically in a region of the image.
+
+Every row of the region is sampled in one pass (see `mmtools.metrology.scanlinePoints()`), and the strongest edge of each row gives one edge point.
+The top surface and the trench floor are the strongest edges of a few vertical scanlines on the material side & the open side of the sidewall.
+The sidewall is fitted to the edge points between them with RANSAC, so the foot, rounding at the top and stray edges don't pull the fit,
+and the foot is whatever sticks out of the fitted line into the trench near the floor.
+The fit is done in calibrated units, so the angle is right for pixels with an aspect ratio other than 1.
+
+The analysis works on plain lists of pixel values.  `analyzeImage()`, `annotateSidewall()`, `analyzeFile()` & `runSidewalls()` need ImageJ.
+
+    sw = sidewall.analyzeImage( imp, (x, y, w, h), material=sidewall.LEFT )
+    print( "%0.1f deg, %g um deep" % (sw.angle, sw.depth) )
+'''
+
+import math, os, random
+
+from mmtools import batch, edges, instrument, metrology
+
+
+LEFT = 'left'           # the material is left of the sidewall, the trench to the right
+RIGHT = 'right'         # the material is right of the sidewall
+
+SIDE_MARGIN = 5         # pixels kept away from the sidewall when looking for the top surface & the floor
+SURFACE_COLUMNS = 5     # vertical scanlines each side of the sidewall, for the top surface & the floor
+MIN_CONTRAST = 0.2      # weakest edge: gradient as a fraction of the intensity range of the region
+RANSAC_ITERATIONS = 200
+RANSAC_TOLERANCE = 1.0  # pixels: the largest horizontal distance of an edge point from the fitted sidewall that still counts as on it
+FOOT_FRACTION = 0.25    # bottom part of the sidewall, as a fraction of the depth, where footing is looked for
+
+COLUMNS = ['image', 'angle', 'depth', 'footing', 'foot_height', 'top', 'floor', 'inliers', 'edge_points', 'unit', 'calibration']
+
+
+
+class Sidewall(object):
+    '''The result of `findSidewall()`.  Lengths are in calibrated units, positions in pixels.
+
+    Sidewall.angle : degrees between the sidewall & the floor, through the material: 90 is vertical,
+        less is a tapered (sloped) wall, more a re-entrant (undercut) one
+    Sidewall.depth : etch depth, from the top surface to the floor
+    Sidewall.footing : how far the bottom of the sidewall sticks out into the trench, beyond the fitted line, 0 if it doesn't
+    Sidewall.footheight : height of the foot above the floor, 0 if there is none
+    Sidewall.top, Sidewall.floor : y of the top surface & the floor, in pixels
+    Sidewall.slope, Sidewall.offset : the fitted sidewall x = slope * y + offset, in pixels
+    Sidewall.x( y ) : x of the fitted sidewall at `y`, in pixels
+    Sidewall.points : list of the (x, y) edge points between the top & the floor, in pixels
+    Sidewall.inliers : number of the edge points on the fitted line
+    Sidewall.material : LEFT or RIGHT
+    '''
+
+    def __init__(self, angle, depth, footing, footheight, top, floor, slope, offset, points, inliers, material):
+        self.angle = angle
+        self.depth = depth
+        self.footing = footing
+        self.footheight = footheight
+        self.top = top
+        self.floor = floor
+        self.slope = slope
+        self.offset = offset
+        self.points = points
+        self.inliers = inliers
+        self.material = material
+    #end __init__()
+
+    def x(self, y):
+        return self.slope * y + self.offset
+#end class(Sidewall)
+
+
+
+def fitLine( points ):
+    '''Least-squares fit of x = a * y + b to the (x, y) points.  Returns (a, b).'''
+    n = float( len(points) )
+    mx = sum( p[0] for p in points ) / n
+    my = sum( p[1] for p in points ) / n
+    syy = sum(  ( p[1] - my ) ** 2  for p in points  )
+    if syy == 0:
+        return 0.0, mx
+    a = sum(  ( p[1] - my ) * ( p[0] - mx )  for p in points  ) / syy
+    return a, mx - a * my
+#end fitLine()
+
+
+
+def ransacLine( points, tolerance, iterations=RANSAC_ITERATIONS, seed=0 ):
+    '''Robust fit of x = a * y + b to the (x, y) points: the line through 2 random points with the most points within `tolerance` (horizontally),
+    refined by least squares on those inliers.  The random choices are seeded, so the same points always give the same fit.
+
+    a, b, inliers = ransacLine( points, tolerance, iterations, seed )
+
+    Raises ValueError for fewer than 2 points at different heights.
+    '''
+    if len( set( p[1] for p in points ) ) < 2:
+        raise ValueError( "ransacLine(): Need at least 2 edge points at different heights." )
+    rng = random.Random( seed )
+    best = []
+    for it in range( iterations ):
+        (x1, y1), (x2, y2) = rng.sample( points, 2 )
+        if y1 == y2:  continue
+        a = ( x2 - x1 ) / float( y2 - y1 )
+        b = x1 - a * y1
+        inliers = [  p for p in points  if abs( p[0] - a * p[1] - b ) <= tolerance  ]
+        if len( inliers ) > len( best ):
+            best = inliers
+    #end for(iterations)
+    if len( set( p[1] for p in best ) ) < 2:
+        best = points
+    a, b = fitLine( best )
+    inliers = [  p for p in points  if abs( p[0] - a * p[1] - b ) <= tolerance  ]
+    return a, b, inliers
+#end ransacLine()
+
+
+
+def _median( values ):
+    values = sorted( values )
+    n = len( values )
+    return values[n // 2]  if n % 2  else 0.5 * ( values[n//2 - 1] + values[n//2] )
+
+
+
+def _profiles( sample, region, scanlines, halfwidth, direction ):
+    '''The smoothed profiles of the scanlines across `region`, sampled in one pass.  Returns (profiles, positions of the scanlines).'''
+    xs, ys, n = metrology.scanlinePoints( region, scanlines, halfwidth, direction )
+    values = sample( xs, ys )
+    per = n * ( 2 * halfwidth + 1 )
+    profiles = [  edges.smooth(  edges.bandProfile( values[k*per : (k+1)*per], n )  )  for k in range( scanlines )  ]
+    x, y, w, h = region
+    if direction == metrology.VERTICAL:
+        positions = [  x + ( k + 0.5 ) * w / float(scanlines)  for k in range( scanlines )  ]
+    else:
+        positions = [  y + ( k + 0.5 ) * h / float(scanlines)  for k in range( scanlines )  ]
+    return profiles, positions
+#end _profiles()
+
+
+
+def _surface( sample, region, threshold ):
+    '''The y of the strongest horizontal edge in `region`, the median over SURFACE_COLUMNS vertical scanlines.  None if there is none.'''
+    profiles, positions = _profiles( sample, region, SURFACE_COLUMNS, 1, metrology.VERTICAL )
+    found = [  edges.strongestEdge( edges.gradient(p), 0, len(p), threshold )  for p in profiles  ]
+    ys = [  region[1] + e[0]  for e in found  if e is not None  ]
+    return _median( ys )  if ys  else None
+#end _surface()
+
+
+
+def findSidewall( sample, region, material=LEFT, pixelWidth=1.0, pixelHeight=1.0,
+                  mincontrast=MIN_CONTRAST, tolerance=RANSAC_TOLERANCE, margin=SIDE_MARGIN, footfraction=FOOT_FRACTION ):
+    '''Find & measure the sidewall crossing `region` = (x, y, w, h), which should hold one sidewall, with some of the top surface & the floor each side.
+
+    `sample( xs, ys )` returns the interpolated pixel values at the points, eg. an `edges.Sampler`.
+    `material` is the side of the sidewall the material is on, LEFT or RIGHT.  `pixelWidth` & `pixelHeight` are the calibrated pixel size.
+    `tolerance` is the RANSAC inlier distance, in pixels.  Returns a `Sidewall`.
+    Raises ValueError if no sidewall, top surface or floor is found.
+    '''
+    x0, y0, w, h = region
+
+    # one edge point per row:
+    profiles, rowys = _profiles( sample, region, h, 0, metrology.HORIZONTAL )
+    threshold = mincontrast * (  max( max(p) for p in profiles ) - min( min(p) for p in profiles )  )
+    allpoints = []
+    for p, y in zip( profiles, rowys ):
+        e = edges.strongestEdge( edges.gradient(p), 0, len(p), threshold )
+        if e is not None:
+            allpoints.append(  ( x0 + e[0], y )  )
+    if not allpoints:
+        raise ValueError( "findSidewall(): No sidewall edge found in the region." )
+    xwall = _median( [ p[0] for p in allpoints ] )
+
+    # top surface on the material side, floor on the open side:
+    left = ( x0, y0, int( xwall - margin ) - x0, h )
+    right = ( int( xwall + margin ) + 1, y0, x0 + w - int( xwall + margin ) - 1, h )
+    matregion, openregion = ( left, right )  if material == LEFT  else ( right, left )
+    if matregion[2] < 2 or openregion[2] < 2:
+        raise ValueError( "findSidewall(): The sidewall is too close to the edge of the region, make the region wider." )
+    top = _surface( sample, matregion, threshold )
+    floor = _surface( sample, openregion, threshold )
+    if top is None or floor is None:
+        raise ValueError( "findSidewall(): Couldn't find the %s." % ( "top surface"  if top is None  else "floor" ) )
+    if floor <= top:
+        raise ValueError( "findSidewall(): The floor was found above the top surface - is the material on the %s?" % ( RIGHT  if material == LEFT  else LEFT ) )
+
+    # robust fit of the sidewall, in calibrated units:
+    points = [  p for p in allpoints  if top < p[1] < floor  ]
+    cpoints = [  ( px * pixelWidth, py * pixelHeight )  for px, py in points  ]
+    a, b, inliers = ransacLine( cpoints, tolerance * pixelWidth )
+
+    side = 1  if material == LEFT  else -1       # towards the trench
+    angle = math.degrees(  math.atan2( 1.0, side * a )  )
+    footing, footheight = 0.0, 0.0
+    footy = floor - footfraction * ( floor - top )
+    foot = [  ( side * ( cx - a * cy - b ), py )  for (cx, cy), (px, py) in zip( cpoints, points )  if py >= footy  ]
+    foot = [  (r, py) for r, py in foot  if r > tolerance * pixelWidth  ]
+    if foot:
+        footing = max( r for r, py in foot )
+        footheight = ( floor - min( py for r, py in foot ) ) * pixelHeight
+
+    return Sidewall(  angle, ( floor - top ) * pixelHeight, footing, footheight, top, floor,
+                      a * pixelHeight / pixelWidth, b / pixelWidth, points, len( inliers ), material  )
+#end findSidewall()
+
+
+
+def sidewallRows( image, sw, unit, calName ):
+    '''The CSV row (see COLUMNS) of a Sidewall, as a list of one row.'''
+    return [ [ image, "%0.2f" % sw.angle, "%g" % sw.depth, "%g" % sw.footing, "%g" % sw.footheight, "%0.2f" % sw.top, "%0.2f" % sw.floor,
+               sw.inliers, len( sw.points ), unit, calName ] ]
+#end sidewallRows()
+
+
+
+def analyzeImage( imp, region=None, material=LEFT ):
+    '''`findSidewall()` on the current slice of the ImagePlus `imp`, with its calibration, reading only the pixels of the region.
+    `region` is (x, y, w, h), clipped to the image, or None for the whole image.
+
+    sw, region = analyzeImage( imp, region, material )
+    '''
+    with instrument.span( 'sidewall.analyze' ):
+        region = metrology.clipRegion( region, imp.getWidth(), imp.getHeight() )
+        cal = imp.getCalibration()
+        sample = edges.processorSampler( imp.getProcessor(), region )
+        sw = findSidewall( sample, region, material, cal.pixelWidth, cal.pixelHeight )
+    return sw, region
+#end analyzeImage()
+
+
+
+def annotateSidewall( imp, sw, region, style ):
+    '''Draw the fitted sidewall labelled with its angle (and footing), and the etch depth as a vertical line on the trench side,
+    with the line & text `style` (an `annotate.Style`).  Added to the image Overlay if `style.overlay` is set.'''
+    from mmtools import annotate
+    from mmtools.geometry import LabelLayout
+
+    x0, y0, w, h = region
+    unit = annotate.unitString( imp )
+    layout = LabelLayout( imp.getWidth(), imp.getHeight() )
+    overlay = annotate.imageOverlay( imp )  if style.overlay  else None
+
+    text = "%0.1f deg" % sw.angle
+    if sw.footing > 0:
+        text += ", foot %0.3f %s" % (sw.footing, unit)
+    wall = ( [ sw.x( sw.top ), sw.top ], [ sw.x( sw.floor ), sw.floor ], text )
+    xdepth = 0.5 * ( sw.x( sw.floor ) + ( x0 + w  if sw.material == LEFT  else x0 ) )      # middle of the trench side
+    depth = ( [ xdepth, sw.top ], [ xdepth, sw.floor ], None )      # labelled with its calibrated length
+
+    for p1, p2, label in ( wall, depth ):
+        if overlay is not None:
+            annotate.overlayMeasurement( overlay, imp, p1, p2, style, unit, layout=layout, text=label )
+        else:
+            annotate.drawMeasurement( imp.getProcessor(), imp, p1, p2, style, unit, layout, text=label )
+    if overlay is not None:
+        imp.setOverlay( overlay )
+    else:
+        imp.updateAndDraw()
+#end annotateSidewall()
+
+
+
+def analyzeFile( path, registry, rec=None, region=None, material=LEFT, style=None ):
+    '''Open the image at `path` (without a window), calibrate it as by `metrology.imageCalibration()`, and analyze its sidewall.
+    If `style` is an `annotate.Style`, the results are drawn onto the image, which is saved next to it as "<name>_sidewall.tif".
+
+    rows, sw = analyzeFile( path, registry, rec, region, material, style )
+    '''
+    imp = batch.openImage( path )
+    try:
+        calName = metrology.imageCalibration( imp, registry, rec )
+        sw, region = analyzeImage( imp, region, material )
+        rows = sidewallRows( path, sw, imp.getCalibration().getUnit(), calName )
+
+        if style is not None:
+            from ij import IJ
+            annotateSidewall( imp, sw, region, style )
+            IJ.saveAsTiff(  imp,  os.path.splitext( path )[0] + '_sidewall.tif'  )
+    finally:
+        imp.close()
+    return rows, sw
+#end analyzeFile()
+
+
+
+def runSidewalls( source, registry, csvpath, rec=None, region=None, material=LEFT, workers=4, style=None, log=None ):
+    '''Analyze the sidewall of every image in `source` (a directory or glob pattern) using a pool of `workers` threads,
+    and write one CSV row per image (see COLUMNS) to `csvpath`, as the images are done.
+    The arguments are as for `analyzeFile()`.  `log( message )` receives a line per image and the final summary, default is to print them.
+    Returns the `batch.BatchStats`.
+    '''
+    from mmtools import measure
+
+    def measurefile( path ):
+        rows, sw = analyzeFile( path, registry, rec, region, material, style )
+        return rows, "%0.1f deg, depth %s, footing %s %s" % ( sw.angle, rows[0][2], rows[0][3], rows[0][9] )
+
+    return measure.exportBatch( source, measurefile, csvpath, COLUMNS, workers, log, name='sidewall' )
+#end runSidewalls()
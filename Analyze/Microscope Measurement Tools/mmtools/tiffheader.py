@@ -0,0 +1,261 @@
+''' mmtools/tiffheader.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Minimal reader & writer for the first IFD (image file directory) of a TIFF file, used to read and store calibrations without decoding or re-encoding any pixels.
+Only the 8-byte header, the directory entries and the values of the requested tags are read, with bounded seeks & reads,
+so a 50 MB SEM image costs a few kB of I/O.  Works with plain Python, no ImageJ needed.
+
+    tags = readTags( path, wanted=(tiffheader.XRESOLUTION, tiffheader.DESCRIPTION) )
+    writeResolution( path, pixelWidth, pixelHeight, unit )     # patch the calibration in place
+'''
+
+import os, re, struct
+
+
+# standard tags used for the calibration:
+DESCRIPTION = 270       # ImageDescription, holds "unit=..." for ImageJ TIFFs
+XRESOLUTION = 282
+YRESOLUTION = 283
+RESOLUTIONUNIT = 296    # 1 = none, 2 = inch, 3 = cm
+
+# vendor tags:
+ZEISS_SEM = 34118       # CZ_SEM, Zeiss SEM metadata text
+FEI_HELIOS = 34682      # FEI/Thermo Fisher metadata, INI-style text
+FEI_SFEG = 34680
+
+MAX_VALUE = 1 << 20     # largest tag value read, in bytes
+
+# resolution units:
+RESUNIT_NONE = 1
+RESUNIT_INCH = 2
+RESUNIT_CM = 3
+
+# length units per centimeter, for TIFFs whose description isn't ImageJ's and so can only store centimeters:
+PER_CM = { 'cm':1.0, 'mm':10.0, 'um':1e4, 'micron':1e4, 'nm':1e7, 'm':0.01, 'inch':1/2.54 }
+
+# the `unit=` line of an ImageJ description:
+re_ijunit = re.compile( r'^unit=.*$', re.MULTILINE )
+
+# TIFF field type : (struct format, size in bytes)
+_TYPES = {
+    1 : ('B', 1),   # BYTE
+    2 : ('s', 1),   # ASCII
+    3 : ('H', 2),   # SHORT
+    4 : ('I', 4),   # LONG
+    5 : ('II', 8),  # RATIONAL
+    6 : ('b', 1),   # SBYTE
+    7 : ('s', 1),   # UNDEFINED
+    8 : ('h', 2),   # SSHORT
+    9 : ('i', 4),   # SLONG
+    10 : ('ii', 8), # SRATIONAL
+    11 : ('f', 4),  # FLOAT
+    12 : ('d', 8),  # DOUBLE
+    }
+
+
+
+def _decode( fieldtype, count, raw, order ):
+    '''Turn the raw bytes of a tag into a str (ASCII/UNDEFINED), or a tuple of numbers.'''
+    fmt, size = _TYPES[fieldtype]
+    if fmt == 's':
+        return raw.split( b'\0' )[0].decode( 'latin-1' )  if fieldtype == 2  else raw.decode( 'latin-1' )
+    values = struct.unpack( order + fmt[0] * (count * len(fmt)), raw[: count * size] )
+    if len(fmt) == 2:
+        values = tuple(  ( float(values[i]) / values[i+1]  if values[i+1] else 0.0 )  for i in range( 0, len(values), 2 )  )
+    return values
+#end _decode()
+
+
+
+def _readIFD( f ):
+    '''Returns (byte order, IFD offset, { tag : [type, count, 4-byte value field] }, next IFD offset) of the first IFD of an open file.'''
+    head = f.read( 8 )
+    if head[:4] == b'II*\0':
+        order = '<'
+    elif head[:4] == b'MM\0*':
+        order = '>'
+    else:
+        raise ValueError( "Not a TIFF file" )
+    offset = struct.unpack( order + 'I', head[4:8] )[0]
+    f.seek( offset )
+    n = struct.unpack( order + 'H', f.read(2) )[0]
+    raw = f.read( 12 * n + 4 )
+    entries = {}
+    for i in range( n ):
+        tag, fieldtype, count = struct.unpack( order + 'HHI', raw[12*i : 12*i+8] )
+        entries[tag] = [ fieldtype, count, raw[12*i+8 : 12*i+12] ]
+    return order, offset, entries, struct.unpack( order + 'I', raw[12*n : 12*n+4] )[0]
+#end _readIFD()
+
+
+
+def readTags( path, wanted=None ):
+    '''Read the tags of the first IFD of a TIFF file.
+
+    Returns { tag number : value }.  ASCII & UNDEFINED values are strings, all others are tuples of numbers (rationals as floats).
+    If `wanted` is given, only those tags are read & returned.  Values larger than MAX_VALUE bytes are skipped.
+    Raises ValueError if the file is not a (classic, non-Big) TIFF, and IOError if it can't be read.
+    '''
+    f = open( path, 'rb' )
+    try:
+        try:
+            order, offset, entries, nextifd = _readIFD( f )
+        except (ValueError, struct.error):
+            raise ValueError( "readTags(): Not a TIFF file: " + path )
+
+        tags = {}
+        for tag, (fieldtype, count, field) in sorted( entries.items() ):
+            if ( wanted is not None and tag not in wanted )  or  fieldtype not in _TYPES:  continue
+            nbytes = count * _TYPES[fieldtype][1]
+            if nbytes > MAX_VALUE:  continue
+            if nbytes <= 4:
+                raw = field[:nbytes]       # value stored in the entry itself
+            else:
+                f.seek(  struct.unpack( order + 'I', field )[0]  )
+                raw = f.read( nbytes )
+            tags[tag] = _decode( fieldtype, count, raw, order )
+        #end for(entries)
+    finally:
+        f.close()
+    return tags
+#end readTags()
+
+
+
+def byteOrder( path ):
+    '''The byte order of a TIFF file, as a `struct` prefix: '<' for little-endian ("II"), '>' for big-endian ("MM").'''
+    f = open( path, 'rb' )
+    try:
+        head = f.read( 4 )
+    finally:
+        f.close()
+    if head == b'II*\0':
+        return '<'
+    elif head == b'MM\0*':
+        return '>'
+    raise ValueError( "byteOrder(): Not a TIFF file: " + path )
+#end byteOrder()
+
+
+
+def _rational( value ):
+    '''(numerator, denominator) for a positive float, with as many decimals as fit in 32 bits: the denominator is the largest power of 10
+    that keeps the numerator below 2^32, so both tiny (eg. pixels per cm of a huge pixel) and huge values keep their significant digits.
+    Raises ValueError for values that can't be stored as a TIFF RATIONAL at all.'''
+    if not 0 < value <= 0xffffffff:
+        raise ValueError( "_rational(): Resolution %r is out of the range a TIFF can store, 0 to %i - check the calibration's pixel size and unit." % (value, 0xffffffff) )
+    den = 1000000000        # the largest power of 10 below 2^32
+    while den > 1 and value * den > 0xffffffff:
+        den //= 10
+    num = min(  int( round(value * den) ),  0xffffffff  )
+    if num == 0:
+        raise ValueError( "_rational(): Resolution %r is too small for a TIFF to store - check the calibration's pixel size and unit." % value )
+    return num, den
+#end _rational()
+
+
+
+def _append( f, raw ):
+    '''Write `raw` at the end of the file, on a word boundary.  Returns its offset.'''
+    f.seek( 0, os.SEEK_END )
+    offset = f.tell()
+    if offset % 2:
+        f.write( b'\0' )
+        offset += 1
+    f.write( raw )
+    return offset
+#end _append()
+
+
+
+def writeTags( path, newtags ):
+    '''Set tags of the first IFD of a TIFF file, in place, without touching the pixel data.
+
+    `newtags` is { tag : (field type, count, raw value bytes in the file's byte order) }.
+    Values are overwritten where they are if they fit, otherwise appended to the end of the file.
+    If tags are added, the directory is re-written at the end of the file and the header pointed at it;
+    the header is updated last, so an interrupted write leaves the original directory in use.
+    '''
+    f = open( path, 'r+b' )
+    try:
+        order, offset, entries, nextifd = _readIFD( f )     # one read for the whole directory
+        added = False
+        for tag, (fieldtype, count, raw) in sorted( newtags.items() ):
+            old = entries.get( tag )
+            added = added or old is None
+            oldsize = old[1] * _TYPES[old[0]][1]  if old is not None and old[0] in _TYPES  else 0
+            if len(raw) <= 4:
+                field = raw.ljust( 4, b'\0' )      # value fits in the entry itself
+            elif 4 < oldsize  and  len(raw) <= oldsize:
+                field = old[2]      # overwrite the old value where it is
+                f.seek(  struct.unpack( order + 'I', field )[0]  )
+                f.write( raw )
+            else:
+                field = struct.pack(  order + 'I',  _append( f, raw )  )
+            entries[tag] = [ fieldtype, count, field ]
+        #end for(new tags)
+
+        ifd = b''.join(  struct.pack( order + 'HHI', tag, e[0], e[1] ) + e[2]  for tag, e in sorted( entries.items() )  )
+        if added:
+            newoffset = _append(  f,  struct.pack( order + 'H', len(entries) ) + ifd + struct.pack( order + 'I', nextifd )  )
+            f.seek( 4 )
+            f.write(  struct.pack( order + 'I', newoffset )  )
+        else:
+            f.seek( offset + 2 )
+            f.write( ifd )
+    finally:
+        f.close()
+#end writeTags()
+
+
+
+def _setDescriptionLine( desc, key, value ):
+    '''Set the line `key=value` of an ImageJ description, replacing the old one or appending it.'''
+    line = "%s=%s" % (key, value)
+    if key == 'unit':
+        regex = re_ijunit
+    else:
+        regex = re.compile( r'^%s=.*$' % re.escape(key), re.MULTILINE )
+    if regex.search( desc ):
+        return regex.sub( line, desc )
+    return desc.rstrip('\n') + "\n" + line + "\n"
+#end _setDescriptionLine()
+
+
+
+def writeResolution( path, pixelWidth, pixelHeight, unit, pixelDepth=None, frameInterval=None, timeUnit=None ):
+    '''Store a calibration in a TIFF file the way ImageJ does, without re-encoding the pixels:
+    XResolution & YResolution in pixels per `unit`, and `unit=` in the ImageJ ImageDescription (which is added if the file has no description).
+    The Z spacing `pixelDepth`, `frameInterval` & `timeUnit` of stacks are stored as `spacing=`, `finterval=` & `tunit=` if not None.
+    If the file has a description from another program, it is kept, and the resolution is stored in pixels per centimeter instead
+    (such files have nowhere to store the Z/T values, so they are skipped).
+    Raises ValueError if the file is not a TIFF, or the unit can't be stored.
+    '''
+    unit = { u'\u00b5m':'micron', 'um':'micron' }.get( unit, unit )     # ImageJ's ASCII spelling
+    desc = readTags( path, (DESCRIPTION,) ).get( DESCRIPTION )
+    order = byteOrder( path )
+
+    newtags = {}
+    if desc is None or desc.startswith( 'ImageJ=' ):
+        resunit = RESUNIT_NONE
+        if desc is None:
+            desc = "ImageJ=1.53t\n"
+        desc = _setDescriptionLine( desc, 'unit', unit )
+        for key, value in ( ('spacing', pixelDepth), ('finterval', frameInterval), ('tunit', timeUnit) ):
+            if value is not None:
+                desc = _setDescriptionLine( desc, key, value )
+        raw = desc.encode( 'latin-1' ) + b'\0'
+        newtags[DESCRIPTION] = ( 2, len(raw), raw )
+        xscale, yscale = 1.0 / pixelWidth, 1.0 / pixelHeight
+    else:
+        if unit not in PER_CM:
+            raise ValueError( "writeResolution(): This TIFF has a non-ImageJ description, so only metric units can be stored, not `%s`: %s" % (unit, path) )
+        resunit = RESUNIT_CM
+        xscale, yscale = PER_CM[unit] / pixelWidth, PER_CM[unit] / pixelHeight
+    #end if(ImageJ description)
+
+    newtags[XRESOLUTION] = ( 5, 1, struct.pack( order + 'II', *_rational(xscale) ) )
+    newtags[YRESOLUTION] = ( 5, 1, struct.pack( order + 'II', *_rational(yscale) ) )
+    newtags[RESOLUTIONUNIT] = ( 3, 1, struct.pack( order + 'H', resunit ) )
+    writeTags( path, newtags )
+#end writeResolution()
@@ -0,0 +1,306 @@
+''' mmtools/tiles.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Annotate huge images - eg. stitched mosaics of 30k x 30k pixels - in place in their TIFF files, touching only the strips or tiles under the annotations.
+The pixels of an uncompressed TIFF are at fixed places in the file, so the rectangle around each measurement (see `annotate.measurementLayout()`)
+is read with one seek & read per row of each strip or tile it crosses, drawn into a small ImageProcessor of just that rectangle,
+and written back the same way.  The rest of the image is never read, so the cost grows with the size of the annotations, not of the image.
+
+Reading & writing the regions is plain Python, only `regionProcessor()`, `processorBytes()`, `drawRegion()` & `annotateFile()` need ImageJ.
+Handles 8, 16 & 32-bit grayscale and 8-bit RGB, in strips or tiles, in the first image of classic (non-Big) TIFFs.
+
+    layout = tiles.TiffLayout( path )
+    regions = tiles.planRegions( layout.width, layout.height, lines, style, pixelWidth, pixelHeight, unit )
+    raws = [  tiles.readRegion( layout, region.box )  for region in regions  ]
+    minmax = tiles.drawingRange( layout, raws )        # so a color is drawn as the same value in every region
+    for region, raw in zip( regions, raws ):
+        tiles.writeRegion(  layout,  region.box,  tiles.drawRegion( layout, region, raw, style, minmax )  )
+'''
+
+import struct
+
+from mmtools import instrument, tiffheader
+from mmtools.geometry import clipBox, DirtyRect, LabelLayout, lineLength, lengthText
+
+
+# TIFF tags describing where the pixels are:
+IMAGEWIDTH = 256
+IMAGELENGTH = 257
+BITSPERSAMPLE = 258
+COMPRESSION = 259
+PHOTOMETRIC = 262
+STRIPOFFSETS = 273
+SAMPLESPERPIXEL = 277
+ROWSPERSTRIP = 278
+PLANARCONFIG = 284
+SAMPLEFORMAT = 339
+TILEWIDTH = 322
+TILELENGTH = 323
+TILEOFFSETS = 324
+
+LAYOUT_TAGS = ( IMAGEWIDTH, IMAGELENGTH, BITSPERSAMPLE, COMPRESSION, PHOTOMETRIC, STRIPOFFSETS, SAMPLESPERPIXEL, ROWSPERSTRIP,
+                PLANARCONFIG, SAMPLEFORMAT, TILEWIDTH, TILELENGTH, TILEOFFSETS )
+
+# pixel formats handled, as (bits per sample, samples per pixel):
+PIXEL_FORMATS = ( (8, 1), (16, 1), (32, 1), (8, 3) )
+
+
+
+class TiffLayout(object):
+    '''Where the pixels of the first image of an uncompressed TIFF file are, read from its header only.
+
+    TiffLayout( path ) : raises ValueError if the file isn't a TIFF, or its pixels are compressed or in a format not handled here.
+    TiffLayout.width, TiffLayout.height : int, size of the image in pixels
+    TiffLayout.bits : int, bits per sample, 8, 16 or 32
+    TiffLayout.samples : int, samples per pixel, 1 for grayscale, 3 for RGB
+    TiffLayout.order : str, the byte order, as a `struct` prefix
+    TiffLayout.tiled : bool, True if the pixels are in tiles, False if in strips
+    TiffLayout.segments( box ) :
+        Generator of the (file offset, number of bytes) of the pixels of the rectangle `box` (x, y, width, height),
+        one per row of each strip or tile the rectangle crosses, in the order of the rectangle's pixels.
+    TiffLayout.chunks( box ) :
+        The set of the strip or tile numbers the rectangle crosses.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        tags = tiffheader.readTags( path, LAYOUT_TAGS )
+        self.order = tiffheader.byteOrder( path )
+        if IMAGEWIDTH not in tags or IMAGELENGTH not in tags:
+            raise ValueError( "TiffLayout(): No image size in the TIFF header: " + path )
+        self.width, self.height = tags[IMAGEWIDTH][0], tags[IMAGELENGTH][0]
+        self.samples = tags.get( SAMPLESPERPIXEL, (1,) )[0]
+        self.bits = tags.get( BITSPERSAMPLE, (1,) )[0]
+
+        if tags.get( COMPRESSION, (1,) )[0] != 1:
+            raise ValueError( "TiffLayout(): The pixels are compressed, so can't be written in place: " + path )
+        if ( self.bits, self.samples ) not in PIXEL_FORMATS  or  len( set( tags.get( BITSPERSAMPLE, () ) ) ) > 1:
+            raise ValueError( "TiffLayout(): %i samples of %s bits per pixel aren't handled: %s" % (self.samples, tags.get( BITSPERSAMPLE ), path) )
+        if tags.get( PHOTOMETRIC, (1,) )[0] not in (0, 1, 2):
+            raise ValueError( "TiffLayout(): Only grayscale & RGB pixels are handled, not palette or other color spaces: " + path )
+        if self.samples > 1 and tags.get( PLANARCONFIG, (1,) )[0] != 1:
+            raise ValueError( "TiffLayout(): The color channels are in separate planes, which isn't handled: " + path )
+        if self.bits == 32 and tags.get( SAMPLEFORMAT, (3,) )[0] != 3:
+            raise ValueError( "TiffLayout(): Only 32-bit float pixels are handled, not 32-bit integers: " + path )
+        self.bpp = self.bits // 8 * self.samples       # bytes per pixel
+
+        self.tiled = TILEOFFSETS in tags
+        if self.tiled:
+            self.tilewidth, self.tileheight = tags[TILEWIDTH][0], tags[TILELENGTH][0]
+            self.offsets = tags[TILEOFFSETS]
+            self.across = ( self.width + self.tilewidth - 1 ) // self.tilewidth     # tiles per row of tiles
+        elif STRIPOFFSETS in tags:
+            self.tilewidth = self.width
+            self.tileheight = min(  tags.get( ROWSPERSTRIP, (self.height,) )[0],  self.height  )     # a strip is a tile as wide as the image
+            self.offsets = tags[STRIPOFFSETS]
+            self.across = 1
+        else:
+            raise ValueError( "TiffLayout(): No strip or tile offsets in the TIFF header (or too many to read): " + path )
+    #end __init__()
+
+    def segments(self, box):
+        x, y, w, h = box
+        tw, th, bpp = self.tilewidth, self.tileheight, self.bpp
+        cols = range( x // tw, ( x + w - 1 ) // tw + 1 )
+        for row in range( y, y + h ):
+            base = ( row // th ) * self.across
+            inrow = ( row % th ) * tw      # pixels before this row, in its strip or tile
+            for col in cols:
+                x0, x1 = max( x, col * tw ), min( x + w, (col + 1) * tw )
+                yield  self.offsets[ base + col ] + ( inrow + x0 - col * tw ) * bpp,  ( x1 - x0 ) * bpp
+        #end for(rows)
+    #end segments()
+
+    def chunks(self, box):
+        x, y, w, h = box
+        tw, th = self.tilewidth, self.tileheight
+        return set(  r * self.across + c  for r in range( y // th, ( y + h - 1 ) // th + 1 )
+                                          for c in range( x // tw, ( x + w - 1 ) // tw + 1 )  )
+    #end chunks()
+#end class(TiffLayout)
+
+
+
+def readRegion( layout, box ):
+    '''The raw bytes of the pixels of the rectangle `box` (x, y, width, height) of the image of the `TiffLayout`, row by row,
+    as stored in the file.  Only those bytes are read.'''
+    with instrument.span( 'tiles.read' ):
+        f = open( layout.path, 'rb' )
+        try:
+            parts = []
+            for offset, n in layout.segments( box ):
+                f.seek( offset )
+                parts.append( f.read( n ) )
+        finally:
+            f.close()
+    return b''.join( parts )
+#end readRegion()
+
+
+
+def writeRegion( layout, box, raw ):
+    '''Write the raw bytes of the pixels of the rectangle `box` (x, y, width, height) back into the file of the `TiffLayout`, in place,
+    as returned by `readRegion()`.  Only those bytes are written.'''
+    if len( raw ) != box[2] * box[3] * layout.bpp:
+        raise ValueError( "writeRegion(): %i bytes given for a %ix%i region of %i bytes per pixel." % (len(raw), box[2], box[3], layout.bpp) )
+    with instrument.span( 'tiles.write' ):
+        f = open( layout.path, 'r+b' )
+        try:
+            i = 0
+            for offset, n in layout.segments( box ):
+                f.seek( offset )
+                f.write( raw[i : i+n] )
+                i += n
+        finally:
+            f.close()
+#end writeRegion()
+
+
+
+class Region(object):
+    '''A rectangle of the image to annotate, and the measurements drawn into it.
+
+    Region.box : (x, y, width, height), inside the image
+    Region.labels : [ (p1, p2, text, (x, y) of the text), ... ], in image coordinates
+    '''
+    __slots__ = ('box', 'labels')
+
+    def __init__(self, box, labels):
+        self.box = box
+        self.labels = labels
+#end class(Region)
+
+
+
+def _overlap( a, b ):
+    return a[0] < b[0] + b[2]  and  b[0] < a[0] + a[2]  and  a[1] < b[1] + b[3]  and  b[1] < a[1] + a[3]
+
+
+def planRegions( width, height, lines, style, pixelWidth=1.0, pixelHeight=1.0, unit='pixel' ):
+    '''Lay out the measurements of the `lines` [ (p1, p2), ... ] on an image of size (width, height), without reading any pixels.
+    The labels are placed clear of each other by a `LabelLayout`, and the rectangles of measurements that overlap are merged,
+    so each pixel is read & written once.  Returns the list of `Region`s.'''
+    from mmtools import annotate
+
+    layout = LabelLayout( width, height )
+    regions = []
+    for p1, p2 in lines:
+        text = lengthText(  lineLength( p1, p2, pixelWidth, pixelHeight ),  unit  )
+        xy, box = annotate.measurementLayout( p1, p2, text, style, width, height, layout )
+        box = clipBox( box, width, height )
+        if box is None:  continue
+        labels = [ (p1, p2, text, xy) ]
+        merged = True
+        while merged:       # absorb every region this one overlaps, until none are left
+            merged = False
+            for r in regions:
+                if _overlap( box, r.box ):
+                    dirty = DirtyRect( box )
+                    dirty.add( r.box )
+                    box = dirty.box
+                    labels = r.labels + labels
+                    regions.remove( r )
+                    merged = True
+                    break
+        #end while(merged)
+        regions.append(  Region( box, labels )  )
+    #end for(lines)
+    return regions
+#end planRegions()
+
+
+
+def regionProcessor( layout, box, raw ):
+    '''An ImageProcessor of the rectangle `box`, holding the raw bytes `raw` from `readRegion()`.'''
+    import jarray
+    from ij.process import ByteProcessor, ShortProcessor, FloatProcessor, ColorProcessor
+
+    w, h = box[2], box[3]
+    n = w * h
+    if layout.samples == 3:
+        rgb = struct.unpack( '%iB' % (3 * n), raw )
+        pixels = [  (rgb[3*i] << 16) | (rgb[3*i+1] << 8) | rgb[3*i+2]  for i in range( n )  ]
+        return ColorProcessor( w, h, jarray.array( pixels, 'i' ) )
+    if layout.bits == 8:
+        return ByteProcessor( w, h, jarray.array( struct.unpack( '%ib' % n, raw ), 'b' ) )
+    if layout.bits == 16:
+        return ShortProcessor( w, h, jarray.array( struct.unpack( layout.order + '%ih' % n, raw ), 'h' ), None )
+    return FloatProcessor( w, h, jarray.array( struct.unpack( layout.order + '%if' % n, raw ), 'f' ) )
+#end regionProcessor()
+
+
+
+def drawingRange( layout, raws ):
+    '''The (min, max) display range to draw all the regions of an image with, or None for RGB.  ImageJ maps a drawing color into the display range,
+    so without a common range each region - auto-scaled to its own pixels - would get "white" as a different value, invisible in flat dark areas.
+    That's the full range of 8 & 16-bit pixels, and for 32-bit float the range of the pixels of all the regions `raws` (from `readRegion()`),
+    as the rest of the image isn't read.'''
+    if layout.samples == 3:
+        return None
+    if layout.bits < 32:
+        return ( 0, (1 << layout.bits) - 1 )
+    values = []
+    for raw in raws:
+        values.extend(  struct.unpack( layout.order + '%if' % (len( raw ) // 4), raw )  )
+    values = [ v for v in values if v == v ]      # not NaN
+    if not values:
+        return ( 0.0, 1.0 )
+    lo, hi = min( values ), max( values )
+    return ( lo, hi )  if hi > lo  else ( lo, lo + 1.0 )
+#end drawingRange()
+
+
+
+def processorBytes( layout, ip ):
+    '''The raw bytes to write back with `writeRegion()`, of an ImageProcessor from `regionProcessor()`.'''
+    pixels = ip.getPixels()
+    n = len( pixels )
+    if layout.samples == 3:
+        rgb = []
+        for c in pixels:
+            rgb.extend(  ( (c >> 16) & 0xff, (c >> 8) & 0xff, c & 0xff )  )
+        return struct.pack( '%iB' % (3 * n), *rgb )
+    if layout.bits == 8:
+        return struct.pack( '%ib' % n, *pixels )
+    if layout.bits == 16:
+        return struct.pack( layout.order + '%ih' % n, *pixels )
+    return struct.pack( layout.order + '%if' % n, *pixels )
+#end processorBytes()
+
+
+
+def drawRegion( layout, region, raw, style, minmax=None ):
+    '''Draw the measurements of the `Region` into its pixels `raw` (from `readRegion()`) with the `style` (an `annotate.Style`).
+    `minmax` is the display range the colors are mapped into, the same for all the regions of an image, see `drawingRange()`:
+    by default that of this region alone.  Returns the raw bytes to write back.'''
+    from mmtools import annotate
+
+    ip = regionProcessor( layout, region.box, raw )
+    if minmax is None:
+        minmax = drawingRange( layout, [raw] )
+    if minmax is not None:
+        ip.setMinAndMax( minmax[0], minmax[1] )
+    origin = region.box[:2]
+    for p1, p2, text, (x, y) in region.labels:
+        annotate.drawLine( ip, p1, p2, style, origin=origin )
+        annotate.drawLabel( ip, text, x, y, style, origin=origin )
+    return processorBytes( layout, ip )
+#end drawRegion()
+
+
+
+def annotateFile( path, lines, style, pixelWidth=1.0, pixelHeight=1.0, unit='pixel' ):
+    '''Draw the measurements of the `lines` [ (p1, p2), ... ] into the uncompressed TIFF file at `path`, in place,
+    reading & writing only the strips or tiles under them.  The lengths are calibrated with the given pixel size.
+    Returns (number of measurements drawn, number of bytes read & written).'''
+    layout = TiffLayout( path )
+    regions = planRegions( layout.width, layout.height, lines, style, pixelWidth, pixelHeight, unit )
+    raws = [  readRegion( layout, region.box )  for region in regions  ]     # all read first, for a common `drawingRange()`
+    minmax = drawingRange( layout, raws )
+    nDrawn, nBytes = 0, 0
+    for region, raw in zip( regions, raws ):
+        writeRegion(  layout,  region.box,  drawRegion( layout, region, raw, style, minmax )  )
+        nDrawn += len( region.labels )
+        nBytes += len( raw )
+    return nDrawn, nBytes
+#end annotateFile()
@@ -0,0 +1,317 @@
+''' mmtools/vendors.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Calibration extractors for the metadata that microscope vendors store with each image.
+They read the TIFF header only (see `mmtools.tiffheader`) or the small *.txt sidecar file, never the pixels:
+    ZeissTiff       - Zeiss SEM, "Pixel Size" in TIFF tag 34118
+    FEITiff         - FEI / Thermo Fisher, "PixelWidth" in TIFF tag 34682
+    JEOLSidecar     - JEOL SEM *.txt file, see `mmtools.sidecar`
+    HitachiSidecar  - Hitachi SEM *.txt file, "PixelSize=" in nm
+    TiffResolution  - standard XResolution/YResolution/ResolutionUnit tags, and the unit of ImageJ TIFFs
+
+Each extractor is a custom calibration class, like `JEOL_SEM_CalFromTxt`, so it can go straight into the settings' `names` list:
+    from mmtools.vendors import AutoDetect
+    names = [ ..., AutoDetect() ]
+`AutoDetect` picks the extractor for each image from its header.  More extractors can be added with `register()`.
+
+    name, PixelPerUnit, Unit, Aspect = vendors.headerScale( path )      # without opening the image
+'''
+
+import io, os, re
+
+from mmtools import sidecar, tiffheader
+
+
+# `Pixel Size = 1.116 nm` in the Zeiss metadata:
+re_zeiss = re.compile( r'Pixel Size\s*=\s*([0-9.]+(?:[eE][-+]?[0-9]+)?)\s*(\S+)' )
+# `PixelWidth=4.8e-009` (in meters) in the FEI metadata:
+re_fei = re.compile( r'^PixelWidth=([0-9.]+(?:[eE][-+]?[0-9]+)?)', re.MULTILINE )
+re_fei_height = re.compile( r'^PixelHeight=([0-9.]+(?:[eE][-+]?[0-9]+)?)', re.MULTILINE )
+# `PixelSize=1.984375` (in nm) in the Hitachi *.txt file:
+re_hitachi = re.compile( r'^PixelSize=([0-9.]+(?:[eE][-+]?[0-9]+)?)', re.MULTILINE )
+# `unit=nm` in the ImageJ description:
+re_ijunit = re.compile( r'^unit=(\S+)', re.MULTILINE )
+
+# length units in meters:
+METERS = { 'm':1.0, 'mm':1e-3, 'um':1e-6, 'nm':1e-9, 'pm':1e-12 }
+
+
+
+def imagePath( imp ):
+    '''Returns the path of the file an ImagePlus was opened from.  Raises IOError if it wasn't opened from a file.'''
+    fi = imp.getOriginalFileInfo()
+    if fi is None or not fi.fileName:
+        raise IOError( "This image was not opened from a file, so its metadata can't be read." )
+    return fi.directory + os.path.sep + fi.fileName
+#end imagePath()
+
+
+
+def normalizeUnit( unit ):
+    '''Spell the micron as "um", the way the settings do.'''
+    unit = unit.strip()
+    if unit in (u'\u00b5m', u'\u03bcm', 'micron', 'microns', '\\u00B5m'):
+        return 'um'
+    return unit
+#end normalizeUnit()
+
+
+
+def metricScale( size, unit='m' ):
+    '''Returns (PixelPerUnit, Unit) for a pixel `size` in `unit`, with the unit chosen so that values are readable (nm for SEMs, um for optical).'''
+    try:
+        meters = size * METERS[ normalizeUnit(unit) ]
+    except KeyError:
+        raise ValueError( "metricScale(): Unknown length unit `%s`" % (unit) )
+    for u in ('nm', 'um', 'mm'):
+        if meters < 1000 * METERS[u]:
+            break
+    return METERS[u] / meters, u
+#end metricScale()
+
+
+
+class HeaderExtractor(object):
+    '''Base class of the extractors.
+
+    HeaderExtractor.name : string
+        The name that shows up in the Calibrations list.
+    HeaderExtractor.tags : tuple
+        The TIFF tags this extractor needs, so `detect()` & `scale()` get them from a single header read.
+    HeaderExtractor.detect( path, tags ) :
+        True if this extractor can calibrate the image file at `path`, whose header tags are `tags`.
+    HeaderExtractor.scale( path, tags ) :
+        Returns (PixelPerUnit, Unit, Aspect).  Raises ValueError if the metadata has no scale.
+    HeaderExtractor.fromPath( path ) :
+        Returns (PixelPerUnit, Unit, Aspect) of an image file, without opening it.  Raises ValueError if this extractor doesn't recognize it.
+    HeaderExtractor.cal( ImagePlus_Object ) :
+        Custom-calibration interface, sets `.unit`, `.aspect_ratio` & `.pixel_per_unit` and returns the pixel-per-unit.
+    '''
+    name = "Header"
+    tags = ()
+
+    def detect(self, path, tags):
+        '''Abstract: the subclasses check their own metadata.  The base class recognizes nothing.'''
+        return False
+
+    def scale(self, path, tags):
+        '''Abstract: each subclass reads (PixelPerUnit, Unit, Aspect) from its own metadata.  The base class has none, so it raises ValueError.'''
+        raise ValueError( "%s: `%s` doesn't implement scale(), so it can't calibrate %s" % (self.name, type(self).__name__, path) )
+
+    def fromPath(self, path):
+        tags = readHeader( path, self.tags )
+        if not self.detect( path, tags ):
+            raise ValueError( "%s: No calibration in the metadata of %s" % (self.name, path) )
+        return self.scale( path, tags )
+    #end fromPath()
+
+    def cal(self, imp):
+        self.pixel_per_unit, self.unit, self.aspect_ratio = self.fromPath(  imagePath( imp )  )
+        return self.pixel_per_unit
+    #end cal()
+#end class(HeaderExtractor)
+
+
+
+def readHeader( path, wanted ):
+    '''The `wanted` tags of a TIFF file, or {} if it isn't a TIFF.'''
+    if not wanted or os.path.splitext( path )[1].lower() not in ('.tif', '.tiff'):
+        return {}
+    try:
+        return tiffheader.readTags( path, wanted )
+    except ValueError:
+        return {}
+#end readHeader()
+
+
+
+class ZeissTiff(HeaderExtractor):
+    '''Zeiss SEM TIFFs: "Pixel Size = 1.116 nm" in tag 34118.'''
+    name = "Zeiss SEM: AutoCal from TIFF header"
+    tags = ( tiffheader.ZEISS_SEM, )
+
+    def detect(self, path, tags):
+        return tiffheader.ZEISS_SEM in tags
+
+    def scale(self, path, tags):
+        match = re_zeiss.search( tags[tiffheader.ZEISS_SEM] )
+        if not match:
+            raise ValueError( "ZeissTiff: No `Pixel Size` in the Zeiss metadata of " + path )
+        ppu, unit = metricScale(  float( match.group(1) ),  normalizeUnit( match.group(2) )  )
+        return ppu, unit, 1.0
+#end class(ZeissTiff)
+
+
+
+class FEITiff(HeaderExtractor):
+    '''FEI / Thermo Fisher TIFFs: "PixelWidth=..." in meters, in tag 34682.'''
+    name = "FEI SEM: AutoCal from TIFF header"
+    tags = ( tiffheader.FEI_HELIOS, tiffheader.FEI_SFEG )
+
+    def detect(self, path, tags):
+        return tiffheader.FEI_HELIOS in tags  or  tiffheader.FEI_SFEG in tags
+
+    def scale(self, path, tags):
+        text = tags.get( tiffheader.FEI_HELIOS ) or tags.get( tiffheader.FEI_SFEG )
+        match = re_fei.search( text )
+        if not match:
+            raise ValueError( "FEITiff: No `PixelWidth` in the FEI metadata of " + path )
+        width = float( match.group(1) )
+        match = re_fei_height.search( text )
+        aspect = float( match.group(1) ) / width  if match else 1.0
+        ppu, unit = metricScale( width, 'm' )
+        return ppu, unit, aspect
+#end class(FEITiff)
+
+
+
+class JEOLSidecar(HeaderExtractor):
+    '''JEOL SEM images, with their scale bar in the accompanying *.txt file.'''
+    name = "JEOL SEM: AutoCal from *.txt"
+
+    def detect(self, path, tags):
+        txtpath = sidecar.sidecarPath( path )
+        if not os.path.isfile( txtpath ):
+            return False
+        try:
+            return sidecar.SCALE_KEYS[0] in sidecar.readSidecar( txtpath, sidecar.SCALE_KEYS )
+        except IOError:
+            return False
+    #end detect()
+
+    def scale(self, path, tags):
+        ppu, unit = sidecar.jeolScale(  sidecar.sidecarPath( path )  )
+        return ppu, unit, 1.0
+#end class(JEOLSidecar)
+
+
+
+_hitachiCache = sidecar.LRUCache()     # { (path, mtime, size) : (PixelSize string or None,) }
+
+
+class HitachiSidecar(HeaderExtractor):
+    '''Hitachi SEM images, with "PixelSize=" (nm) in the accompanying *.txt file.
+    The value found in each file is cached on (path, mtime, size), like `sidecar.readSidecar()` does, so `detect()` & `scale()` read the file once.'''
+    name = "Hitachi SEM: AutoCal from *.txt"
+
+    def _read(self, path):
+        '''The "PixelSize=" value in the *.txt file of the image at `path`, as a string, or None.'''
+        txtpath = sidecar.sidecarPath( path )
+        try:
+            st = os.stat( txtpath )
+        except OSError:
+            return None     # no *.txt file
+        key = ( os.path.abspath(txtpath), st.st_mtime, st.st_size )
+        entry = _hitachiCache.get( key )
+        if entry is not None:
+            return entry[0]
+
+        f = io.open( txtpath, 'r', encoding='latin-1' )
+        try:
+            match = re_hitachi.search( f.read() )
+        finally:
+            f.close()
+        value = match.group(1)  if match  else None
+        _hitachiCache.put( key, (value,) )
+        return value
+    #end _read()
+
+    def detect(self, path, tags):
+        return self._read( path ) is not None
+
+    def scale(self, path, tags):
+        value = self._read( path )
+        if value is None:
+            raise ValueError( "HitachiSidecar: No `PixelSize=` in the *.txt file of " + path )
+        ppu, unit = metricScale( float( value ), 'nm' )
+        return ppu, unit, 1.0
+#end class(HitachiSidecar)
+
+
+
+class TiffResolution(HeaderExtractor):
+    '''The standard XResolution & YResolution tags.
+    ImageJ TIFFs store pixels per unit, with the unit in the ImageDescription.  Otherwise only centimeter resolutions are used, since inch resolutions are almost always a screen/print DPI rather than a calibration.'''
+    name = "TIFF resolution: AutoCal from TIFF header"
+    tags = ( tiffheader.XRESOLUTION, tiffheader.YRESOLUTION, tiffheader.RESOLUTIONUNIT, tiffheader.DESCRIPTION )
+
+    def _unit(self, tags):
+        match = re_ijunit.search( tags.get( tiffheader.DESCRIPTION, '' ) )
+        if match:
+            return normalizeUnit( match.group(1) )
+        if tags.get( tiffheader.RESOLUTIONUNIT, (2,) )[0] == 3:
+            return 'cm'
+        return None
+    #end _unit()
+
+    def detect(self, path, tags):
+        return tiffheader.XRESOLUTION in tags  and  tags[tiffheader.XRESOLUTION][0] > 0  and  self._unit( tags ) not in (None, 'pixel', 'pixels')
+
+    def scale(self, path, tags):
+        xres = tags[tiffheader.XRESOLUTION][0]
+        yres = tags.get( tiffheader.YRESOLUTION, (xres,) )[0] or xres
+        unit = self._unit( tags )
+        if unit == 'cm':
+            ppu, unit = metricScale( 0.01 / xres )      # pixels per cm, from the standard tags
+        else:
+            ppu = xres      # ImageJ stores pixels per `unit`
+        return ppu, unit, xres / yres
+    #end scale()
+#end class(TiffResolution)
+
+
+
+EXTRACTORS = [ ZeissTiff(), FEITiff(), JEOLSidecar(), HitachiSidecar(), TiffResolution() ]     # tried in this order
+
+
+
+def register( extractor, first=True ):
+    '''Add an extractor (a HeaderExtractor, or any object with the same methods), before the built-in ones if `first`.'''
+    if first:
+        EXTRACTORS.insert( 0, extractor )
+    else:
+        EXTRACTORS.append( extractor )
+#end register()
+
+
+
+def detect( path ):
+    '''Returns (extractor, tags) for the first extractor that recognizes the file, reading its TIFF header only once.
+    Raises ValueError if none does.'''
+    wanted = set()
+    for ex in EXTRACTORS:
+        wanted.update( ex.tags )
+    tags = readHeader( path, wanted )
+    for ex in EXTRACTORS:
+        if ex.detect( path, tags ):
+            return ex, tags
+    raise ValueError( "vendors.detect(): No vendor calibration found in the metadata of " + path )
+#end detect()
+
+
+
+def headerScale( path ):
+    '''Calibration of an image file from its metadata, without opening the image.
+
+    name, PixelPerUnit, Unit, Aspect = headerScale( path )
+
+    Raises ValueError if no extractor can calibrate the file.
+    '''
+    ex, tags = detect( path )
+    ppu, unit, aspect = ex.scale( path, tags )
+    return ex.name, ppu, unit, aspect
+#end headerScale()
+
+
+
+class AutoDetect(HeaderExtractor):
+    '''Custom calibration that picks the extractor for each image from its header.  Put an instance in the settings' `names` list.'''
+
+    def __init__(self, name="AutoCal from file metadata (Zeiss, FEI, JEOL, Hitachi, TIFF)"):
+        self.name = name
+
+    def fromPath(self, path):
+        calname, ppu, unit, aspect = headerScale( path )
+        return ppu, unit, aspect
+    #end fromPath()
+#end class(AutoDetect)
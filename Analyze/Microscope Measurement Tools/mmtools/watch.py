@@ -0,0 +1,255 @@
+''' mmtools/watch.py
+Part of the "Microscope Measurement Tools" scripts.
+
+Watch an acquisition directory, and calibrate every new image as soon as it (and its *.txt file, if any) has been completely written.
+The directory is polled, which also works on network shares where file notifications are unreliable.
+A file is complete once its size & modification time haven't changed for `settle` seconds.
+An image is then handed to a bounded queue of worker threads (see `batch.WorkerPool`), which stamp the calibration into the TIFF header
+(`batch.stampFile()`) or calibrate & save the image, optionally with a scale bar (`batch.calibrateFile()`).
+When the workers fall behind, the queue fills up and the polling waits for them, so files are never queued faster than they're calibrated.
+
+Files already in the directory when watching starts are left alone, unless `existing=True` - except those still being written then.
+Each image is only calibrated once per session, so the files changed by stamping, and the TIFFs saved for other formats, aren't picked up again.
+
+    watcher = FolderWatcher( '/data/sem/today', calreg, rec=None, workers=2, stamp=True )
+    watcher.run()       # until watcher.stop() is called from another thread
+    print( watcher.stats.summary() )
+'''
+
+import os, threading, time
+
+from mmtools import batch, instrument, sidecar
+
+clock = getattr( time, 'perf_counter', time.time )     # time.time on Jython/Python 2
+
+
+SETTLE = 2.0        # seconds a file's size & time must stay the same before it's considered complete
+INTERVAL = 1.0      # seconds between polls of the directory
+SIDECAR_WAIT = 30.0     # seconds to wait for the *.txt file of a complete image, before calibrating it without
+
+
+
+class WatchStats(object):
+    '''Thread-safe counters of a FolderWatcher.
+
+    WatchStats.queued, .done, .failed : int
+    WatchStats.depth() : number of images queued or being calibrated
+    WatchStats.maxdepth : the largest `depth()` so far
+    WatchStats.latency : `instrument.Histogram` of the seconds from an image being first seen to its calibration being written
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.done = 0
+        self.failed = 0
+        self.maxdepth = 0
+        self.latency = instrument.Histogram()
+        self.start = time.time()
+    #end __init__()
+
+    def depth(self):
+        return self.queued - self.done - self.failed
+
+    def put(self):
+        with self.lock:
+            self.queued += 1
+            self.maxdepth = max( self.maxdepth, self.depth() )
+    #end put()
+
+    def add(self, latency, ok=True):
+        with self.lock:
+            if ok:
+                self.done += 1
+                self.latency.add( latency )
+            else:
+                self.failed += 1
+    #end add()
+
+    def summary(self):
+        '''Returns the counters as a printable string.'''
+        with self.lock:
+            lat = self.latency.asDict()
+            return "Watched for %0.0f s: calibrated %i images (%i failed), queue depth %i (max %i), latency mean %0.0f ms, max %0.0f ms" % (
+                time.time() - self.start, self.done, self.failed, self.depth(), self.maxdepth, lat['mean_ms'], lat['max_ms'] )
+    #end summary()
+#end class(WatchStats)
+
+
+
+class FolderWatcher(object):
+    '''Calibrate the images written into a directory, as they arrive.
+
+    FolderWatcher( root, registry, rec=None, workers=2, stamp=True, save=True, scalebar=None, ... ) :
+        `root` is the directory to watch, including its sub-directories if `recursive`.
+        `registry` & `rec` are the calibrations, as for `batch.runBatch()`: `rec` is the CalRecord to apply,
+            or None to try each custom calibration (eg. `JEOL_SEM_CalFromTxt`) in turn.
+        `stamp` writes the calibration into the TIFF headers in place; otherwise images are opened, calibrated
+            and saved (if `save`) with a scale bar if `scalebar` is an `annotate.Style`.
+        `settle` is the seconds a file must stay unchanged, `interval` the seconds between polls,
+            `sidecarwait` the seconds to wait for the *.txt file of a complete image (0 to not wait).
+        `maxqueue` is the number of images allowed to wait for a worker, default twice the workers.
+        `existing` also calibrates the images already in the directory, otherwise only those still changing within `settle` seconds are.
+        `log( message )` receives a line per image, default is to print it.
+
+    FolderWatcher.run( duration=None ) : watch until `stop()` is called, or for `duration` seconds.
+    FolderWatcher.poll() : one scan of the directory, queueing the complete images.  Returns the number queued.
+    FolderWatcher.stop() : stop watching, from another thread.  `run()` returns once the queued images are done.
+    FolderWatcher.stats : the WatchStats
+    '''
+
+    def __init__(self, root, registry, rec=None, workers=2, stamp=True, save=True, scalebar=None,
+                 settle=SETTLE, interval=INTERVAL, sidecarwait=SIDECAR_WAIT, maxqueue=None,
+                 extensions=batch.IMAGE_EXTENSIONS, recursive=False, existing=False, log=None):
+        if not os.path.isdir( root ):
+            raise ValueError( "FolderWatcher(): Not a directory: `%s`" % (root) )
+        self.root = root
+        self.registry = registry
+        self.rec = rec
+        self.workers = workers
+        self.stamp = stamp
+        self.save = save
+        self.scalebar = scalebar
+        self.settle = settle
+        self.interval = interval
+        self.sidecarwait = sidecarwait
+        self.maxqueue = maxqueue
+        self.extensions = extensions
+        self.recursive = recursive
+        if log is None:
+            def log( msg ):  print( msg )
+        self.log = log
+
+        self.stats = WatchStats()
+        self._files = {}        # { path : [size, mtime, first seen, last changed] } of the files not done yet
+        self._done = set()      # paths of the images queued so far, their *.txt files & the files saved for them
+        self._loglock = threading.Lock()
+        self._stop = threading.Event()
+        self._pool = None
+        if not existing:
+            self._skipExisting()
+    #end __init__()
+
+
+    def _skipExisting(self):
+        '''Mark the images already in the directory as done, with their *.txt files.  Only images unchanged for `settle` seconds count,
+        so one the microscope is still writing when watching starts goes through the normal settle path & is calibrated once complete.'''
+        now = time.time()       # file times are wall-clock times
+        for path in self._listImages():
+            try:
+                mtime = os.stat( path ).st_mtime
+            except OSError:
+                continue
+            if now - mtime >= self.settle:
+                self._done.update(  ( path, sidecar.sidecarPath( path ) )  )
+    #end _skipExisting()
+
+
+    def _listFiles(self):
+        '''The paths of all the files in the watched directory.'''
+        if self.recursive:
+            for dirpath, dirnames, filenames in os.walk( self.root ):
+                for fn in filenames:
+                    yield os.path.join( dirpath, fn )
+        else:
+            for fn in os.listdir( self.root ):
+                yield os.path.join( self.root, fn )
+    #end _listFiles()
+
+    def _isImage(self, path):
+        return os.path.splitext( path )[1].lower() in self.extensions
+
+    def _listImages(self):
+        return [ p for p in self._listFiles()  if self._isImage( p ) ]
+
+
+    def _update(self, path, now):
+        '''Stat a file & update its entry.  Returns the entry, or None if the file has gone.'''
+        try:
+            st = os.stat( path )
+        except OSError:
+            self._files.pop( path, None )
+            return None
+        entry = self._files.get( path )
+        if entry is None:
+            entry = self._files[path] = [ st.st_size, st.st_mtime, now, now ]
+        elif (entry[0], entry[1]) != (st.st_size, st.st_mtime):
+            entry[0], entry[1], entry[3] = st.st_size, st.st_mtime, now
+        return entry
+    #end _update()
+
+    def _complete(self, entry, now):
+        return entry is not None and entry[0] > 0 and now - entry[3] >= self.settle
+
+
+    def poll(self):
+        '''Scan the directory once, and queue the images that are complete.  Blocks while the queue is full.  Returns the number of images queued.'''
+        now = clock()
+        ready = []
+        for path in self._listFiles():
+            if path in self._done  or  not ( self._isImage( path ) or path.lower().endswith( '.txt' ) ):  continue
+            entry = self._update( path, now )
+            if self._isImage( path ) and self._complete( entry, now ):
+                ready.append( (path, entry) )
+        #end for(files)
+
+        nqueued = 0
+        for path, entry in sorted( ready, key=lambda pe: pe[1][2] ):    # oldest first
+            txt = sidecar.sidecarPath( path )
+            txtentry = self._files.get( txt )
+            if not self._complete( txtentry, now ):
+                if txtentry is not None or now - entry[3] < self.sidecarwait:
+                    continue    # the *.txt file is still being written, or may still come
+            # the *.txt file would otherwise be stat'ed on every poll from now on, and the TIFF saved for another format calibrated again:
+            self._done.update(  ( path, txt, batch.savedPath( path ) )  )
+            self._files.pop( path, None )
+            self._files.pop( txt, None )
+            self.stats.put()
+            instrument.count( 'watch.queued' )
+            self._pool.put(  (path, entry[2])  )    # blocks while the workers are behind
+            nqueued += 1
+        #end for(ready images)
+        return nqueued
+    #end poll()
+
+
+    def _work(self, item):
+        path, seen = item
+        try:
+            if self.stamp:
+                calName, newPixelPerUnit, newUnit = batch.stampFile( path, self.registry, self.rec )
+            else:
+                calName, newPixelPerUnit, newUnit = batch.calibrateFile( path, self.registry, self.rec, self.save, self.scalebar )
+        except Exception as e:
+            self.stats.add( clock() - seen, ok=False )
+            instrument.count( 'watch.failed' )
+            with self._loglock:  self.log( "FAILED  %s: %s" % (path, e) )
+            return
+        latency = clock() - seen
+        self.stats.add( latency )
+        instrument.record( 'watch.latency', latency )
+        with self._loglock:  self.log( "%s  -->  `%s` : %g px/%s  (%0.1f s after it appeared)" % (path, calName, newPixelPerUnit, newUnit, latency) )
+    #end _work()
+
+
+    def run(self, duration=None):
+        '''Watch the directory until `stop()` is called, or for `duration` seconds.  Returns the WatchStats.'''
+        self._stop.clear()
+        self._pool = batch.WorkerPool( self._work, self.workers, self.maxqueue )
+        end = None  if duration is None  else clock() + duration
+        try:
+            while not self._stop.is_set()  and  ( end is None or clock() < end ):
+                with instrument.span( 'watch.poll' ):
+                    self.poll()
+                self._stop.wait( self.interval )
+        finally:
+            self._pool.join()       # finish the queued images
+            self._pool = None
+        return self.stats
+    #end run()
+
+
+    def stop(self):
+        '''Stop watching.  Can be called from any thread.'''
+        self._stop.set()
+#end class(FolderWatcher)
@@ -0,0 +1,164 @@
+''' benchmarks/corpus.py
+Part of the "Microscope Measurement Tools" benchmarks.
+
+Generates a synthetic corpus of JEOL-style SEM data, modelled on the bundled example "JEOL SEM - etched sidewall 01":
+    - N uncompressed 8-bit TIFFs, each with a data bar holding a burned-in scale bar,
+    - a matching *.txt sidecar for each, with the scale bar length, marker & magnification varied,
+    - an ROI set (`<image>.zip`) of line ROIs for each image,
+    - a CSV calibration table with many entries.
+Everything is written with plain Python, so the corpus can be built under CPython or Jython.
+
+    python benchmarks/corpus.py /tmp/semcorpus --images 1000 --calibrations 5000
+'''
+
+import os, random, re, struct, sys, zipfile
+
+
+EXAMPLE_DIR = os.path.join( os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) ),
+                            'Analyze', 'Microscope Measurement Tools', 'MScopeCals - custom function example' )
+EXAMPLE_TXT = os.path.join( EXAMPLE_DIR, 'JEOL SEM - etched sidewall 01.txt' )
+
+# (magnification, marker) pairs, with the scale bar length that the JEOL 7600F draws for each:
+MAGNIFICATIONS = [ (5000, '1um', 53), (10000, '1um', 106), (25000, '100nm', 26), (50000, '100nm', 53), (100000, '100nm', 106) ]
+
+DATABAR = 64        # height of the data bar, in pixels
+
+
+
+def sidecarText( template, bar, marker, mag, title ):
+    '''The text of a sidecar file, with the scale fields of the template replaced.'''
+    text = re.sub( r'(?m)^\$\$SM_MICRON_BAR [^\r\n]*', '$$SM_MICRON_BAR %i' % bar, template )
+    text = re.sub( r'(?m)^\$\$SM_MICRON_MARKER [^\r\n]*', '$$SM_MICRON_MARKER %s' % marker, text )
+    text = re.sub( r'(?m)^\$CM_MAG [^\r\n]*', '$CM_MAG %i' % mag, text )
+    text = re.sub( r'(?m)^\$CM_TITLE [^\r\n]*', '$CM_TITLE %s' % title, text )
+    return text
+#end sidecarText()
+
+
+
+def tiffBytes( width, height, pixels ):
+    '''A minimal little-endian, uncompressed, single-strip 8-bit grayscale TIFF holding `pixels` (bytes, row by row).'''
+    entries = [     # (tag, type, count, value)
+        (256, 4, 1, width), (257, 4, 1, height), (258, 3, 1, 8), (259, 3, 1, 1), (262, 3, 1, 1),
+        (273, 4, 1, 8), (277, 3, 1, 1), (278, 4, 1, height), (279, 4, 1, len(pixels)),
+        ]
+    ifd = struct.pack( '<H', len(entries) )
+    for tag, fieldtype, count, value in entries:
+        ifd += struct.pack( '<HHI', tag, fieldtype, count ) + ( struct.pack('<HH', value, 0)  if fieldtype == 3  else struct.pack('<I', value) )
+    ifd += struct.pack( '<I', 0 )
+    return b'II*\0' + struct.pack( '<I', 8 + len(pixels) ) + pixels + ifd
+#end tiffBytes()
+
+
+
+def semPixels( width, height, bar, rnd ):
+    '''Noisy image content over a black data bar, with a white scale bar of `bar`+1 pixels burned into it.'''
+    rows = []
+    noise = bytearray( rnd.randrange(40, 200) for i in range( 4 * width ) )
+    for y in range( height - DATABAR ):
+        start = rnd.randrange( 0, 3 * width )
+        rows.append( bytes( noise[start : start + width] ) )
+    barrow = bytearray( width )
+    x0 = width // 2
+    for x in range( x0, min(width, x0 + bar + 1) ):
+        barrow[x] = 255
+    for y in range( DATABAR ):
+        rows.append(  bytes( barrow )  if 3 <= y < 18  else  bytes( bytearray(width) )  )
+    return b''.join( rows )
+#end semPixels()
+
+
+
+def lineRoi( name, x1, y1, x2, y2 ):
+    '''The bytes of an ImageJ *.roi file of a straight line.'''
+    hdr = bytearray( 64 )
+    hdr[0:4] = b'Iout'
+    struct.pack_into( '>h', hdr, 4, 228 )       # version
+    hdr[6] = 3                                  # type = line
+    struct.pack_into( '>hhhh', hdr, 8, int(min(y1, y2)), int(min(x1, x2)), int(max(y1, y2)) + 1, int(max(x1, x2)) + 1 )
+    struct.pack_into( '>ffff', hdr, 18, x1, y1, x2, y2 )
+    return bytes( hdr )
+#end lineRoi()
+
+
+
+def writeRoiSet( path, nrois, width, height, rnd ):
+    zf = zipfile.ZipFile( path, 'w' )
+    try:
+        for i in range( nrois ):
+            coords = [ rnd.uniform(0, width-1), rnd.uniform(0, height-DATABAR-1), rnd.uniform(0, width-1), rnd.uniform(0, height-DATABAR-1) ]
+            zf.writestr( "line%04i.roi" % i, lineRoi( "line%04i" % i, *coords ) )
+    finally:
+        zf.close()
+#end writeRoiSet()
+
+
+
+def writeCalibrationTable( path, ncals, rnd ):
+    '''CSV table of `ncals` calibrations, spread over 50 instruments.'''
+    f = open( path, 'w' )
+    try:
+        f.write( "name,cal,unit,aspect_ratio,group\n" )
+        for i in range( ncals ):
+            instrument = "Scope%02i" % (i % 50)
+            f.write( "%s %ix,%0.5f,um,1.0,%s\n" % (instrument, i + 1, rnd.uniform(0.1, 60.), instrument) )
+    finally:
+        f.close()
+#end writeCalibrationTable()
+
+
+
+def buildCorpus( outdir, images=100, calibrations=1000, rois=50, width=640, height=480, seed=1 ):
+    '''Write the synthetic corpus into `outdir`.  Returns a dict describing it, which the benchmarks store with their results.'''
+    rnd = random.Random( seed )
+    if not os.path.isdir( outdir ):
+        os.makedirs( outdir )
+    f = open( EXAMPLE_TXT, 'rb' )
+    try:
+        template = f.read().decode( 'latin-1' )
+    finally:
+        f.close()
+
+    for i in range( images ):
+        mag, marker, bar = MAGNIFICATIONS[ i % len(MAGNIFICATIONS) ]
+        root = os.path.join( outdir, "sem%05i" % i )
+        f = open( root + '.tif', 'wb' )
+        try:
+            f.write(  tiffBytes( width, height, semPixels( width, height, bar, rnd ) )  )
+        finally:
+            f.close()
+        f = open( root + '.txt', 'wb' )
+        try:
+            f.write(  sidecarText( template, bar, marker, mag, os.path.basename(root) ).encode( 'latin-1' )  )
+        finally:
+            f.close()
+        if rois:
+            writeRoiSet( root + '.zip', rois, width, height, rnd )
+    #end for(images)
+
+    tablepath = os.path.join( outdir, 'calibrations.csv' )
+    writeCalibrationTable( tablepath, calibrations, rnd )
+    return { 'dir':outdir, 'images':images, 'calibrations':calibrations, 'rois':rois, 'width':width, 'height':height, 'seed':seed, 'table':tablepath }
+#end buildCorpus()
+
+
+
+def main( argv ):
+    import optparse
+    op = optparse.OptionParser( usage="%prog OUTDIR [options]" )
+    op.add_option( '--images', type='int', default=100 )
+    op.add_option( '--calibrations', type='int', default=1000 )
+    op.add_option( '--rois', type='int', default=50, help="line ROIs per image" )
+    op.add_option( '--width', type='int', default=640 )
+    op.add_option( '--height', type='int', default=480 )
+    op.add_option( '--seed', type='int', default=1 )
+    opts, args = op.parse_args( argv )
+    if len(args) != 1:
+        op.error( "Please give the output directory." )
+    info = buildCorpus( args[0], opts.images, opts.calibrations, opts.rois, opts.width, opts.height, opts.seed )
+    print( "Wrote %(images)i images with sidecars & ROI sets, and %(calibrations)i calibrations, to %(dir)s" % info )
+#end main()
+
+
+if __name__ == '__main__':
+    main( sys.argv[1:] )
@@ -0,0 +1,454 @@
+''' benchmarks/run_benchmarks.py
+Part of the "Microscope Measurement Tools" benchmarks.
+
+Times the main stages of the plugins on a synthetic corpus (see `corpus.py`), and writes the results as JSON so runs can be compared between releases.
+
+Under plain Python only the pure-Python stages run (sidecar parsing, registry & label building, text placement & label layout, header reading, data-bar scanning, edge snapping, CD metrology, sidewall fits, the export pipeline's overlap,
+reading & writing the tiles under annotations of a mosaic).
+Run it with Fiji's Jython to also time `JEOL_SEM_CalFromTxt.cal()`, `drawText()`, line & scale bar rendering, which need ImageJ:
+    python benchmarks/run_benchmarks.py --images 200 --out results-cpython.json
+    ImageJ-linux64 --headless --jython benchmarks/run_benchmarks.py --images 200 --out results-fiji.json
+
+Stages that can't run are listed under "skipped" with the reason.
+'''
+
+import importlib, json, os, platform, random, shutil, sys, tempfile, time
+
+BENCH_DIR = os.path.dirname( os.path.abspath(__file__) )
+TOOLS_DIR = os.path.join( os.path.dirname(BENCH_DIR), 'Analyze', 'Microscope Measurement Tools' )
+for d in (BENCH_DIR, TOOLS_DIR):
+    if d not in sys.path:
+        sys.path.append( d )
+
+import corpus
+from mmtools import annotate, batch, databar, edges, geometry, metrology, registry, sidewall, sidecar, tiffheader, tiles, vendors
+
+clock = getattr( time, 'perf_counter', time.time )     # time.time on Jython/Python 2
+
+try:
+    importlib.import_module( 'ij' )     # only to tell whether the benchmarks needing ImageJ can run
+    HAVE_IMAGEJ = True
+except ImportError:
+    HAVE_IMAGEJ = False
+
+
+
+class Skip(Exception):
+    '''Raised by a benchmark that can't run here.'''
+    pass
+
+
+
+def timeit( func, repeat ):
+    '''Run `func()` `repeat` times, returns the list of times in seconds.  `func` returns the number of items it processed.'''
+    times = []
+    n = 0
+    for r in range( repeat ):
+        t0 = clock()
+        n = func()
+        times.append( clock() - t0 )
+    return times, n
+#end timeit()
+
+
+
+def result( name, times, n ):
+    times = sorted( times )
+    best, median = times[0], times[ len(times) // 2 ]
+    return {
+        'name' : name,
+        'items' : n,
+        'repeat' : len(times),
+        'best_s' : best,
+        'median_s' : median,
+        'per_item_us' : 1e6 * median / n  if n else None,
+        'items_per_s' : n / median  if median > 0 else None,
+        }
+#end result()
+
+
+
+'''
+################################
+   The benchmarks
+################################
+Each takes the corpus info and returns a function that runs the stage once over the corpus, returning the number of items.
+'''
+
+def bench_sidecar_cold( info ):
+    '''Parse every sidecar, with an empty cache.'''
+    paths = info['sidecars']
+    def run():
+        sidecar._cache.clear()
+        for p in paths:
+            sidecar.jeolScale( p )
+        return len(paths)
+    return run
+
+
+def bench_sidecar_warm( info ):
+    '''Scale of every sidecar, served by the cache.'''
+    paths = info['sidecars']
+    for p in paths:
+        sidecar.jeolScale( p )
+    def run():
+        for p in paths:
+            sidecar.jeolScale( p )
+        return len(paths)
+    return run
+
+
+def bench_jeol_cal( info ):
+    '''`JEOL_SEM_CalFromTxt.cal()` on every image, as called by Choose Microscope Calibration.'''
+    if not HAVE_IMAGEJ:
+        raise Skip( "needs ImageJ (run under Fiji's Jython)" )
+    from ij import ImagePlus
+    from ij.io import FileInfo
+    sys.path.append( corpus.EXAMPLE_DIR )
+    from JEOL_SEM_AutoCal import JEOL_SEM_CalFromTxt
+    calobj = JEOL_SEM_CalFromTxt()
+    imps = []
+    for p in info['tiffs']:
+        fi = FileInfo()
+        fi.directory, fi.fileName = os.path.dirname(p), os.path.basename(p)
+        imp = ImagePlus()
+        imp.setFileInfo( fi )       # the metadata only, the pixels aren't needed
+        imps.append( imp )
+    def run():
+        sidecar._cache.clear()
+        for imp in imps:
+            calobj.cal( imp )
+        return len(imps)
+    return run
+
+
+def bench_registry_build( info ):
+    '''Build the registry from the calibration table.'''
+    def run():
+        reg = registry.CalRegistry(  registry.recordsFromTable( info['table'] )  )
+        return len(reg)
+    return run
+
+
+def bench_registry_labels( info ):
+    '''The chooser labels of every calibration, as built by `uScopeCalDialog()`.'''
+    reg = registry.CalRegistry(  registry.recordsFromTable( info['table'] )  )
+    def run():
+        reg.labels()
+        return len(reg)
+    return run
+
+
+def bench_registry_search( info ):
+    '''Filter the registry, as the chooser's "Filter" field does on each key stroke.'''
+    reg = registry.CalRegistry(  registry.recordsFromTable( info['table'] )  )
+    queries = [ "scope%02i" % i for i in range(50) ] + [ "%ix" % i for i in range(1, 51) ]
+    def run():
+        for q in queries:
+            reg.search( q )
+        return len(queries)
+    return run
+
+
+def bench_place_text( info ):
+    '''`placeText()` for random points, text sizes & positions.'''
+    rnd = random.Random( 2 )
+    w, h = info['width'], info['height']
+    args = [ ( rnd.randrange(w), rnd.randrange(h), rnd.choice(['br','bl','tl','tr']), rnd.randrange(20, 200), rnd.randrange(10, 60), w, h )  for i in range(10000) ]
+    def run():
+        for a in args:
+            annotate.placeText( *a )
+        return len(args)
+    return run
+
+
+def bench_label_layout( info ):
+    '''`LabelLayout.place()` of 500 labels crowded into the middle of one image, as for a dense set of line ROIs.'''
+    rnd = random.Random( 5 )
+    w, h = info['width'], info['height']
+    args = [ ( rnd.randrange(w//4, 3*w//4), rnd.randrange(h//4, 3*h//4), rnd.choice(['br','bl','tl','tr']), rnd.randrange(40, 80), 14 )  for i in range(500) ]
+    def run():
+        layout = geometry.LabelLayout( w, h )
+        for a in args:
+            layout.place( *a )
+        return len(args)
+    return run
+
+
+def bench_header_scale( info ):
+    '''Auto-detect the vendor & read the calibration of every image, from its metadata only.'''
+    paths = info['tiffs']
+    def run():
+        sidecar._cache.clear()
+        for p in paths:
+            vendors.headerScale( p )
+        return len(paths)
+    return run
+
+
+def bench_tiff_tags( info ):
+    '''Read the first IFD of every TIFF.'''
+    paths = info['tiffs']
+    def run():
+        for p in paths:
+            tiffheader.readTags( p )
+        return len(paths)
+    return run
+
+
+def bench_databar( info ):
+    '''Find the scale bar in the data bar of every image.'''
+    w, h = info['width'], info['height']
+    strip = int( round( databar.STRIP_FRACTION * h ) )
+    strips = []
+    for p in info['tiffs'][:100]:
+        f = open( p, 'rb' )
+        try:
+            f.seek( 8 + w * (h - strip) )
+            raw = bytearray( f.read( w * strip ) )
+        finally:
+            f.close()
+        strips.append(  [ list( raw[ y*w : (y+1)*w ] ) for y in range(strip) ]  )
+    def run():
+        for rows in strips:
+            databar.findScaleBar( rows )
+        return len(strips)
+    return run
+
+
+def bench_edge_snap( info ):
+    '''`snapEndpoints()` of hand-placed lines across a noisy trench, as by "Draw Measurement - Line Snapped to Edges".'''
+    rnd = random.Random( 7 )
+    w, h = info['width'], info['height']
+    left, right = 0.3 * w, 0.7 * w
+    pixels = [ ( 180.0  if left <= x < right  else 60.0 ) + rnd.gauss(0, 20)  for y in range(h) for x in range(w) ]
+    sample = edges.Sampler( pixels, w, h )
+    lines = [ ( [left + rnd.uniform(-6, 6), y], [right + rnd.uniform(-6, 6), y + rnd.uniform(-10, 10)] )  for y in [ rnd.uniform(20, h - 20) for i in range(200) ] ]
+    def run():
+        for p1, p2 in lines:
+            edges.snapEndpoints( sample, p1, p2 )
+        return len(lines)
+    return run
+
+
+def bench_cd_region( info ):
+    '''`measureRegion()` of 20 scanlines across a grating of noisy lines, per image of a CD-metrology batch.'''
+    rnd = random.Random( 8 )
+    w, h = info['width'], info['height']
+    pitch = w / 8.0
+    pixels = [ ( 180.0  if (x % pitch) < 0.4 * pitch  else 60.0 ) + rnd.gauss(0, 20)  for y in range(h) for x in range(w) ]
+    sample = edges.Sampler( pixels, w, h )
+    regions = [ ( 0, rnd.randrange(0, h // 2), w, h // 3 )  for i in range(10) ]
+    def run():
+        for region in regions:
+            metrology.measureRegion( sample, region )
+        return len(regions)
+    return run
+
+
+def bench_sidewall( info ):
+    '''`findSidewall()` of a tapered, footed sidewall in a 300 x 300 region, per cross-section of a sidewall batch.'''
+    rnd = random.Random( 9 )
+    w, h = 300, 300
+    def wall( y ):
+        return 100 + 0.1 * ( y - 50 ) + max( 0, y - 220 ) * 0.5
+    pixels = [ ( 30.0  if y < 50  else  150.0  if y >= 250 or x < wall(y)  else 50.0 ) + rnd.gauss(0, 15)  for y in range(h) for x in range(w) ]
+    sample = edges.Sampler( pixels, w, h )
+    def run():
+        for i in range( 5 ):
+            sidewall.findSidewall( sample, (0, 0, w, h), sidewall.LEFT, 0.01, 0.01 )
+        return 5
+    return run
+
+
+def bench_pipeline( info ):
+    '''`batch.Pipeline` of 3 stages of 2 ms each (sleeps, standing in for reading, drawing & writing), per image, 4 images in flight.
+    Run in series, this would take 6 ms per image.'''
+    def stage( value ):
+        time.sleep( 0.002 )
+        return value
+    def run():
+        pipe = batch.Pipeline( [ ('decode', stage, 1), ('annotate', stage, 1), ('encode', stage, 1) ], maxinflight=4 )
+        for i in range( 50 ):
+            pipe.put( i )
+        pipe.join()
+        return 50
+    return run
+
+
+def bench_tile_region( info ):
+    '''Read & write back the pixels under a 300 x 60 pixel measurement (`tiles.readRegion()`/`writeRegion()`), per measurement,
+    in a 6000 x 6000 pixel uncompressed mosaic, as when annotating it in place.'''
+    w = h = 6000
+    path = os.path.join( info['dir'], 'mosaic.tiff-bench' )     # not picked up as one of the corpus TIFFs
+    if not os.path.exists( path ):
+        f = open( path, 'wb' )
+        try:
+            f.write(  corpus.tiffBytes( w, h, b'\0' * (w * h) )  )
+        finally:
+            f.close()
+    layout = tiles.TiffLayout( path )
+    rnd = random.Random( 5 )
+    boxes = [  ( rnd.randrange( w - 300 ), rnd.randrange( h - 60 ), 300, 60 )  for i in range( 50 )  ]
+    def run():
+        for box in boxes:
+            tiles.writeRegion(  layout,  box,  tiles.readRegion( layout, box )  )
+        return len(boxes)
+    return run
+
+
+def _processor( info ):
+    from ij.process import ByteProcessor
+    from mmtools import settings
+    return ByteProcessor( info['width'], info['height'] ), annotate.Style( settings.getSettings() )
+
+
+def bench_draw_text( info ):
+    '''`drawText()` of measurement labels at random points.'''
+    if not HAVE_IMAGEJ:
+        raise Skip( "needs ImageJ (run under Fiji's Jython)" )
+    ip, style = _processor( info )
+    rnd = random.Random( 3 )
+    args = [ ( "%0.3f um" % rnd.uniform(0, 100), rnd.randrange(info['width']), rnd.randrange(info['height']), rnd.choice(['br','bl','tl','tr']) )  for i in range(1000) ]
+    def run():
+        for text, x, y, pos in args:
+            annotate.drawText( ip, text, x, y, pos, style )
+        return len(args)
+    return run
+
+
+def bench_draw_line( info ):
+    '''`drawLine()` of random lines.'''
+    if not HAVE_IMAGEJ:
+        raise Skip( "needs ImageJ (run under Fiji's Jython)" )
+    ip, style = _processor( info )
+    rnd = random.Random( 4 )
+    w, h = info['width'], info['height']
+    lines = [ ( [rnd.randrange(w), rnd.randrange(h)], [rnd.randrange(w), rnd.randrange(h)] )  for i in range(1000) ]
+    def run():
+        for p1, p2 in lines:
+            annotate.drawLine( ip, p1, p2, style )
+        return len(lines)
+    return run
+
+
+def bench_scalebar( info ):
+    '''`drawScaleBar()` with random calibrations, as in a batch with scale bars.'''
+    if not HAVE_IMAGEJ:
+        raise Skip( "needs ImageJ (run under Fiji's Jython)" )
+    from mmtools import scalebar
+    ip, style = _processor( info )
+    rnd = random.Random( 6 )
+    scales = [ rnd.uniform(0.001, 2.0)  for i in range(1000) ]
+    def run():
+        for pw in scales:
+            scalebar.drawScaleBar( ip, pw, 'um', style )
+        return len(scales)
+    return run
+
+
+BENCHMARKS = [
+    ('sidecar_parse_cold', bench_sidecar_cold),
+    ('sidecar_parse_warm', bench_sidecar_warm),
+    ('jeol_cal', bench_jeol_cal),
+    ('registry_build', bench_registry_build),
+    ('registry_labels', bench_registry_labels),
+    ('registry_search', bench_registry_search),
+    ('place_text', bench_place_text),
+    ('label_layout', bench_label_layout),
+    ('header_scale', bench_header_scale),
+    ('tiff_tags', bench_tiff_tags),
+    ('databar_scan', bench_databar),
+    ('edge_snap', bench_edge_snap),
+    ('cd_region', bench_cd_region),
+    ('sidewall_fit', bench_sidewall),
+    ('export_pipeline', bench_pipeline),
+    ('tile_region', bench_tile_region),
+    ('draw_text', bench_draw_text),
+    ('draw_line', bench_draw_line),
+    ('draw_scalebar', bench_scalebar),
+    ]
+
+
+
+def runBenchmarks( info, repeat=5, only=None, log=None ):
+    '''Run the benchmarks on the corpus `info` (from `corpus.buildCorpus()`).  Returns the JSON-able report.'''
+    if log is None:
+        def log( msg ):  print( msg )
+    info = dict( info )
+    names = sorted( os.listdir( info['dir'] ) )
+    info['tiffs'] = [ os.path.join( info['dir'], n ) for n in names  if n.endswith('.tif') ]
+    info['sidecars'] = [ os.path.join( info['dir'], n ) for n in names  if n.endswith('.txt') ]
+
+    results, skipped = [], {}
+    for name, bench in BENCHMARKS:
+        if only and name not in only:  continue
+        try:
+            func = bench( info )
+        except Skip as e:
+            skipped[name] = str(e)
+            log( "%-20s skipped: %s" % (name, e) )
+            continue
+        times, n = timeit( func, repeat )
+        res = result( name, times, n )
+        results.append( res )
+        log( "%-20s %8i items  %10.2f us/item  (best %0.4f s)" % (name, n, res['per_item_us'] or 0, res['best_s']) )
+    #end for(benchmarks)
+
+    return {
+        'meta' : {
+            'timestamp' : time.strftime( '%Y-%m-%dT%H:%M:%S' ),
+            'python' : sys.version.split()[0],
+            'implementation' : platform.python_implementation(),
+            'platform' : sys.platform,
+            'imagej' : HAVE_IMAGEJ,
+            'repeat' : repeat,
+            },
+        'corpus' : dict( (k, v) for k, v in info.items()  if k not in ('tiffs', 'sidecars') ),
+        'results' : results,
+        'skipped' : skipped,
+        }
+#end runBenchmarks()
+
+
+
+def main( argv ):
+    import optparse
+    op = optparse.OptionParser( usage="%prog [options]" )
+    op.add_option( '--corpus', help="existing corpus directory to use, instead of generating one" )
+    op.add_option( '--images', type='int', default=100 )
+    op.add_option( '--calibrations', type='int', default=1000 )
+    op.add_option( '--rois', type='int', default=0, help="line ROIs per image in the generated corpus" )
+    op.add_option( '--width', type='int', default=640 )
+    op.add_option( '--height', type='int', default=480 )
+    op.add_option( '--repeat', type='int', default=5 )
+    op.add_option( '--only', action='append', help="run only this benchmark (can be repeated)" )
+    op.add_option( '--out', help="JSON file to write the results to, default is to print them" )
+    opts, args = op.parse_args( argv )
+
+    tmpdir = None
+    if opts.corpus:
+        info = { 'dir':opts.corpus, 'width':opts.width, 'height':opts.height, 'table':os.path.join( opts.corpus, 'calibrations.csv' ) }
+    else:
+        tmpdir = tempfile.mkdtemp( prefix='mmtools-bench-' )
+        info = corpus.buildCorpus( tmpdir, opts.images, opts.calibrations, opts.rois, opts.width, opts.height )
+    try:
+        report = runBenchmarks( info, opts.repeat, opts.only, log=lambda msg: sys.stderr.write( msg + '\n' ) )
+    finally:
+        if tmpdir:
+            shutil.rmtree( tmpdir, ignore_errors=True )
+
+    text = json.dumps( report, indent=2, sort_keys=True )
+    if opts.out:
+        f = open( opts.out, 'w' )
+        try:
+            f.write( text + '\n' )
+        finally:
+            f.close()
+    else:
+        print( text )
+#end main()
+
+
+if __name__ == '__main__':
+    main( sys.argv[1:] )
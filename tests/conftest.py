@@ -0,0 +1,18 @@
+''' tests/conftest.py
+Part of the "Microscope Measurement Tools" tests.
+
+Puts the plugin folder on `sys.path`, so the pure-Python `mmtools` modules can be tested under plain Python, without Fiji:
+    python -m pytest -q tests
+'''
+
+import os, sys
+
+TESTS_DIR = os.path.dirname( os.path.abspath(__file__) )
+TOOLS_DIR = os.path.join( os.path.dirname(TESTS_DIR), 'Analyze', 'Microscope Measurement Tools' )
+if TOOLS_DIR not in sys.path:
+    sys.path.insert( 0, TOOLS_DIR )
+
+
+def pytest_configure( config ):
+    # mmtools calls Thread.setDaemon(), which Jython 2.7 needs and CPython 3 deprecates:
+    config.addinivalue_line( 'filterwarnings', 'ignore:setDaemon:DeprecationWarning' )
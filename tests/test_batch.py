@@ -0,0 +1,158 @@
+''' tests/test_batch.py
+Tests of the threading & file helpers in `mmtools.batch`: the WorkerPool, Pipeline, BackgroundTask, BatchStats & image file listing.
+'''
+
+import os, threading
+
+import pytest
+
+from mmtools import batch
+
+
+def finishes( func, timeout=10 ):
+    '''True if `func()` returns within `timeout` seconds.  Runs it on a daemon thread, so a deadlock fails the test instead of hanging it.'''
+    t = threading.Thread( target=func )
+    t.daemon = True
+    t.start()
+    t.join( timeout )
+    return not t.is_alive()
+
+
+def feed( pool, items ):
+    def run():
+        for item in items:
+            pool.put( item )
+        pool.join()
+    return run
+
+
+
+def test_iterImageFiles_directory_and_glob( tmp_path ):
+    sub = tmp_path / 'b'
+    sub.mkdir()
+    for path in ( tmp_path / 'z.TIF', tmp_path / 'a.png', tmp_path / 'notes.txt', sub / 'c.jpg' ):
+        path.write_bytes( b'x' )
+    found = list( batch.iterImageFiles( str(tmp_path) ) )
+    assert [ os.path.relpath( p, str(tmp_path) ) for p in found ] == [ 'a.png', 'z.TIF', os.path.join( 'b', 'c.jpg' ) ]
+    assert list( batch.iterImageFiles( str( tmp_path / '*.txt' ) ) ) == [ str( tmp_path / 'notes.txt' ) ]
+
+
+
+def test_savedPath_never_replaces_another_tiff():
+    assert batch.savedPath( os.path.join( 'd', 'a.TIF' ) ) == os.path.join( 'd', 'a.TIF' )
+    assert batch.savedPath( os.path.join( 'd', 'a.jpg' ) ) == os.path.join( 'd', 'a_cal.tif' )      # not over d/a.tif
+
+
+
+def test_workerpool_runs_every_item():
+    done = []
+    lock = threading.Lock()
+    def work( item ):
+        with lock:  done.append( item )
+    pool = batch.WorkerPool( work, workers=3, maxqueue=2 )
+    assert finishes(  feed( pool, range(50) )  )
+    assert sorted( done ) == list( range(50) )
+
+
+def test_workerpool_failed_item_goes_to_onerror():
+    errors = []
+    lock = threading.Lock()
+    def fail( item ):
+        if item % 2:  raise ValueError( item )
+    def onerror( item, e ):
+        with lock:  errors.append( item )
+    pool = batch.WorkerPool( fail, workers=2, onerror=onerror )
+    assert finishes(  feed( pool, range(6) )  )
+    assert sorted( errors ) == [1, 3, 5]
+
+
+def test_workerpool_survives_raising_onerror( capsys ):
+    # an `onerror` that raised used to kill its worker, so the full queue blocked put() for ever
+    errors = []
+    def onerror( item, e ):
+        errors.append( item )
+        raise RuntimeError( "onerror" )
+    def fail( item ):
+        raise ValueError( item )
+    pool = batch.WorkerPool( fail, workers=1, maxqueue=1, onerror=onerror )
+    assert finishes(  feed( pool, range(10) )  )
+    assert errors == list( range(10) )
+    assert "error handler failed" in capsys.readouterr().out
+
+
+
+def test_pipeline_results_pass_through_stages():
+    results = []
+    lock = threading.Lock()
+    def ondone( item, result, seconds ):
+        with lock:  results.append( (item, result) )
+    pipe = batch.Pipeline( [ ('double', lambda x: 2*x, 2), ('add', lambda x: x+1, 1) ], maxinflight=3, ondone=ondone )
+    assert finishes(  feed( pipe, range(20) )  )
+    assert sorted( results ) == [  (ii, 2*ii + 1)  for ii in range(20)  ]
+    assert set( pipe.stagetime ) == set( ['double', 'add'] )
+
+
+def test_pipeline_failed_stage_goes_to_onerror():
+    errors = []
+    def fail( x ):
+        if x % 2:  raise ValueError( x )
+        return x
+    pipe = batch.Pipeline( [ ('check', fail, 1), ('keep', lambda x: x, 1) ], maxinflight=2,
+                           onerror=lambda item, stage, value, e: errors.append( (item, stage) ) )
+    assert finishes(  feed( pipe, range(6) )  )
+    assert sorted( errors ) == [ (1, 'check'), (3, 'check'), (5, 'check') ]
+
+
+def test_pipeline_survives_raising_ondone():
+    # a raising callback used to kill its worker, leaving the bounded queue full & put()/join() blocked for ever
+    def ondone( item, result, seconds ):
+        raise RuntimeError( "ondone" )
+    pipe = batch.Pipeline( [ ('a', lambda x: x, 1), ('b', lambda x: x, 1) ], maxinflight=2, ondone=ondone )
+    assert finishes(  feed( pipe, range(10) )  )
+
+
+def test_pipeline_survives_raising_onerror():
+    def fail( x ):
+        raise ValueError( x )
+    def onerror( item, stage, value, e ):
+        raise RuntimeError( "onerror" )
+    pipe = batch.Pipeline( [ ('a', fail, 1), ('b', lambda x: x, 1) ], maxinflight=2, onerror=onerror )
+    assert finishes(  feed( pipe, range(10) )  )
+
+
+
+def test_backgroundtask_result_and_error():
+    task = batch.BackgroundTask( lambda a, b: a + b, (2, 3) )
+    assert task.wait( 10 )
+    assert task.done() and task.get() == 5 and task.seconds >= 0
+    def fail():
+        raise KeyError( 'x' )
+    task = batch.BackgroundTask( fail )
+    assert task.wait( 10 )
+    with pytest.raises( KeyError ):
+        task.get()
+
+
+def test_backgroundtask_timeout_and_cancel():
+    release = threading.Event()
+    task = batch.BackgroundTask( release.wait, (10,), name='slow' )
+    assert not task.wait( 0.05 )
+    with pytest.raises( RuntimeError ):
+        task.get()      # not finished yet
+    task.cancel()
+    release.set()
+    assert task.wait( 10 )
+    with pytest.raises( RuntimeError ):
+        task.get()      # finished, but the result of a cancelled call is dropped
+
+
+
+@pytest.mark.parametrize( 'verb', [ 'Calibrated', 'Measured', 'Exported' ] )
+def test_batchstats_summary( verb ):
+    stats = batch.BatchStats( verb )  if verb != 'Calibrated'  else batch.BatchStats()
+    stats.add( 0.25 )
+    stats.add( 0.75, ok=False )
+    assert (stats.done, stats.failed) == (1, 1)
+    summary = stats.summary()
+    assert summary.startswith( "%s 2 files (1 failed) in " % verb )
+    assert summary.endswith( "500.0 ms/file" )
@@ -0,0 +1,76 @@
+''' tests/test_calibration.py
+Tests of resolving calibrations without ImageJ, `mmtools.calibration`.
+'''
+
+import pytest
+
+from mmtools import calibration, registry
+
+
+class ImageCal(object):
+    '''A custom calibration that needs the image, like `JEOL_SEM_CalFromTxt`.'''
+    name = "Needs image"
+    def __init__(self, ppu=2.0):
+        self.ppu = ppu
+    def cal(self, imp):
+        if imp is None:
+            raise IOError( "no image" )
+        self.unit, self.aspect_ratio, self.pixel_depth = 'nm', 1.0, 5.0
+        return self.ppu
+
+
+class HeaderCal(object):
+    '''A header extractor, like the ones in `mmtools.vendors`.'''
+    name = "Header"
+    def cal(self, imp):
+        raise IOError( "use fromPath()" )
+    def fromPath(self, path):
+        if not path.endswith( '.tif' ):
+            raise ValueError( "not a TIFF" )
+        return 4.0, 'um', 1.0
+
+
+class BrokenCal(object):
+    name = "Broken"
+    def cal(self, imp):
+        raise ValueError( "no sidecar" )
+
+
+
+def test_pixelSize():
+    assert calibration.pixelSize( 4.0, 1.5 ) == (0.25, 0.375)
+
+
+def test_resolve_fixed_record_with_axes():
+    rec = registry.CalRecord( "Scope 10x", 2.5, 'um', 1.0, pixel_depth=0.2, frame_interval=3, time_unit='sec' )
+    assert calibration.resolveCalibration( rec, None ) == ("Scope 10x", 2.5, 'um', 1.0)
+    assert calibration.resolveCalibration( rec, None, stack=True )[4:] == (0.2, 3.0, 'sec')
+
+
+def test_resolve_custom_works_on_a_copy():
+    custom = ImageCal()
+    rec = registry.CalRecord( custom.name, custom=custom )
+    assert calibration.resolveCalibration( rec, object(), stack=True ) == ("Needs image", 2.0, 'nm', 1.0, 5.0, None, None)
+    assert not hasattr( custom, 'unit' )     # shared instances aren't changed by batch threads
+
+
+def test_autoCalibration_first_that_works():
+    reg = registry.CalRegistry( [ registry.CalRecord( "Broken", custom=BrokenCal() ), registry.CalRecord( "Needs image", custom=ImageCal(3.0) ) ] )
+    assert calibration.autoCalibration( reg, object() )[:2] == ("Needs image", 3.0)
+    with pytest.raises( ValueError ):
+        calibration.autoCalibration( reg, None )
+    with pytest.raises( ValueError ):
+        calibration.autoCalibration( registry.CalRegistry(), object() )
+
+
+def test_headerCalibration():
+    fixed = registry.CalRecord( "Scope", 1.0, 'um' )
+    header = registry.CalRecord( "Header", custom=HeaderCal() )
+    reg = registry.CalRegistry( [ fixed, header ] )
+    assert calibration.headerCalibration( reg, fixed, 'x.png' ) == ("Scope", 1.0, 'um', 1.0)
+    assert calibration.headerCalibration( reg, None, 'x.tif', stack=True ) == ("Header", 4.0, 'um', 1.0, None, None, None)
+    with pytest.raises( ValueError ):
+        calibration.headerCalibration( reg, None, 'x.png' )
+    # a class that needs the opened image comes first, so the image must be opened:
+    reg2 = registry.CalRegistry( [ registry.CalRecord( "Needs image", custom=ImageCal() ), header ] )
+    assert calibration.headerCalibration( reg2, None, 'x.tif' ) is None
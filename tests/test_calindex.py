@@ -0,0 +1,65 @@
+''' tests/test_calindex.py
+Tests of the persistent calibration index, `mmtools.calindex`.
+'''
+
+import os
+
+import pytest
+
+from mmtools import calindex
+
+
+def jeolText( bar, marker, mag ):
+    return "$CM_MAG %i\n$$SM_MICRON_BAR %i\n$$SM_MICRON_MARKER %s\n" % (mag, bar, marker)
+
+
+def addImage( root, name, bar=53, marker='100nm', mag=50000 ):
+    img = root / (name + '.tif')
+    img.write_bytes( b'II*\0' )
+    (root / (name + '.txt')).write_text( jeolText( bar, marker, mag ) )
+    return str( img )
+
+
+
+def test_update_save_and_reload( tmp_path ):
+    a = addImage( tmp_path, 'a' )
+    b = addImage( tmp_path, 'b', 106, '1um', 10000 )
+    (tmp_path / 'plain.tif').write_bytes( b'II*\0' )     # no sidecar, not indexed
+    path = str( tmp_path / 'calindex.tsv' )
+
+    idx = calindex.CalIndex( path )
+    assert idx.update( str(tmp_path) ) == (2, 2, 0)
+    idx.save()
+
+    loaded = calindex.CalIndex( path )
+    ppu, unit, aspect, mag, mtime = loaded.lookup( a )
+    assert (ppu, unit, aspect, mag) == (pytest.approx( 0.53 ), 'nm', 1.0, 50000.0)
+    assert mtime == os.stat( a[:-4] + '.txt' ).st_mtime
+    ppu, unit, aspect, mag, mtime = loaded.lookup( b )
+    assert (unit, aspect, mag) == ('um', 1.0, 10000.0)
+    assert ppu == pytest.approx( 106.0 )
+    assert loaded.lookup( str(tmp_path / 'plain.tif') ) is None
+
+
+def test_update_skips_unchanged_and_drops_deleted( tmp_path ):
+    a = addImage( tmp_path, 'a' )
+    b = addImage( tmp_path, 'b' )
+    idx = calindex.CalIndex( str(tmp_path / 'idx.tsv') )
+    idx.update( str(tmp_path) )
+
+    os.remove( b )
+    assert idx.update( str(tmp_path) ) == (1, 0, 1)     # `a` unchanged, `b` gone
+    assert idx.lookup( b ) is None
+    assert idx.lookup( a ) is not None
+
+
+def test_openIndex_reuses_until_file_changes( tmp_path ):
+    addImage( tmp_path, 'a' )
+    path = str( tmp_path / 'idx.tsv' )
+    calindex.indexTree( str(tmp_path), path, log=lambda msg: None )
+    first = calindex.openIndex( path )
+    assert calindex.openIndex( path ) is first
+
+    st = os.stat( path )
+    os.utime( path, (st.st_atime, st.st_mtime + 10) )
+    assert calindex.openIndex( path ) is not first
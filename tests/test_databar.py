@@ -0,0 +1,76 @@
+''' tests/test_databar.py
+Tests of reading the scale bar burned into SEM data bars, `mmtools.databar`.
+'''
+
+import pytest
+
+from mmtools import databar
+
+
+# a marker glyph, as rows of 0/1 - only its shape matters:
+GLYPH = [ "1111111100",
+          "1100000000",
+          "1111110000",
+          "1100000000",
+          "1100001111" ]
+
+
+def strip( width=200, height=20, bar=None, glyph=None ):
+    '''Rows of a black data bar with a white scale bar `bar` = (x, y, pixels, rows), and the GLYPH at `glyph` = (x, y).'''
+    rows = [ [0] * width  for y in range(height) ]
+    if bar is not None:
+        x, y, n, thick = bar
+        for r in range( y, y + thick ):
+            for c in range( x, x + n ):
+                rows[r][c] = 255
+    if glyph is not None:
+        gx, gy = glyph
+        for r, line in enumerate( GLYPH ):
+            for c, ch in enumerate( line ):
+                rows[gy + r][gx + c] = 255  if ch == '1'  else 0
+    return rows
+
+
+
+def test_rowRuns():
+    assert databar.rowRuns( [0, 9, 9, 0, 0, 9], 5 ) == [ (1, 2), (5, 1) ]
+
+
+def test_findScaleBar_length_is_first_to_last_pixel():
+    rows = strip( bar=(100, 4, 54, 3), glyph=(20, 10) )
+    rows[15][0:30] = [255] * 30     # a single bright line is text, not the bar
+    assert databar.findScaleBar( rows ) == (100, 4, 53, 3)
+
+
+def test_findScaleBar_none():
+    with pytest.raises( ValueError ):
+        databar.findScaleBar(  strip( bar=(10, 4, 10, 3) )  )     # too short
+    with pytest.raises( ValueError ):
+        databar.findScaleBar(  strip( bar=(0, 4, 199, 3) )  )     # a border, not a bar
+
+
+def test_lookupMarker_tolerance():
+    table = { 53:'100nm', 106:'1um' }
+    assert databar.lookupMarker( table, 54 ) == '100nm'
+    assert databar.lookupMarker( table, 105, tolerance=2 ) == '1um'
+    with pytest.raises( ValueError ):
+        databar.lookupMarker( table, 80 )
+    with pytest.raises( ValueError ):
+        databar.lookupMarker( {}, 53 )
+
+
+def test_binarize():
+    assert databar.binarize( [ [0, 255, 255, 0] ], 128 ) == [ 0b0110 ]
+
+
+def test_matchTemplate_and_findMarker():
+    template = ( databar.binarize( [ [255 * int(ch) for ch in line]  for line in GLYPH ], 128 ), len(GLYPH[0]) )
+    rows = strip( bar=(100, 4, 54, 3), glyph=(30, 8) )
+    masks = databar.binarize( rows, 128 )
+    assert databar.matchTemplate( masks, 200, template ) == (30, 8)
+    assert databar.matchTemplate( databar.binarize( strip( bar=(100, 4, 54, 3) ), 128 ), 200, template ) is None
+
+    smaller = ( template[0][:2], template[1] )      # the top of the glyph also matches, but the whole glyph wins
+    assert databar.findMarker( rows, { '100nm':template, '10nm':smaller } ) == '100nm'
+    with pytest.raises( ValueError ):
+        databar.findMarker( strip( bar=(100, 4, 54, 3) ), { '100nm':template } )
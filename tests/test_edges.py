@@ -0,0 +1,68 @@
+''' tests/test_edges.py
+Tests of the edge snapping of measurement lines, `mmtools.edges`.
+'''
+
+import pytest
+
+from mmtools import edges
+
+
+def stepImage( width, height, left, right, dark=10.0, bright=200.0 ):
+    '''A flat list of pixels: a bright vertical bar from column `left` to `right` (inclusive) on a dark background.'''
+    row = [  bright if left <= x <= right else dark  for x in range( width )  ]
+    return row * height
+
+
+
+def test_sampler_interpolates_and_clamps():
+    s = edges.Sampler( [0.0, 10.0, 20.0, 30.0], 2, 2, x0=5, y0=5 )
+    assert s( [5, 6, 5.5, 5.5], [5, 6, 5, 5.5] ) == [0.0, 30.0, 5.0, 15.0]
+    assert s( [0, 100], [0, 100] ) == [0.0, 30.0]       # outside: nearest border value
+    with pytest.raises( ValueError ):
+        edges.Sampler( [0.0, 1.0], 2, 1 )
+
+
+def test_bandPoints_layout():
+    xs, ys, n = edges.bandPoints( (0, 0), (10, 0), reach=2, halfwidth=1 )
+    assert n == 15
+    assert len( xs ) == len( ys ) == 3 * n
+    assert xs[0] == pytest.approx( -2 ) and xs[n-1] == pytest.approx( 12 )
+    assert all(  y == pytest.approx( ys[0] )  for y in ys[:n]  )     # each profile runs along the line
+    assert [ ys[k*n] for k in range(3) ] == [ pytest.approx( v ) for v in (-1, 0, 1) ]
+    with pytest.raises( ValueError ):
+        edges.bandPoints( (3, 3), (3, 3) )
+
+
+def test_bandBox_is_clipped():
+    assert edges.bandBox( (10, 10), (20, 10), 5, 2, 100, 100 ) == (4, 7, 23, 7)
+    x, y, w, h = edges.bandBox( (0, 0), (5, 0), 10, 2, 8, 8 )
+    assert (x, y) == (0, 0) and x + w <= 8 and y + h <= 8
+
+
+def test_findEdges_and_strongestEdge():
+    profile = [0.0] * 10 + [100.0] * 10 + [0.0] * 10
+    grad = edges.gradient( edges.smooth( profile ) )
+    found = edges.findEdges( grad, threshold=10 )
+    assert [ round( pos ) for pos, s in found ] == [10, 20]     # half-way between 9 & 10, 19 & 20
+    assert found[0][1] > 0 > found[1][1]
+    pos, strength = edges.strongestEdge( grad, 0, 15 )
+    assert pos == pytest.approx( 9.5 ) and strength > 0
+    assert edges.strongestEdge( grad, 0, 15, threshold=1000 ) is None
+    assert edges.strongestEdge( grad, 5, 4 ) is None
+
+
+def test_snapEndpoints_onto_bar_edges():
+    width, height = 60, 20
+    sample = edges.Sampler( stepImage( width, height, 20, 39 ), width, height )
+    q1, q2, snapped = edges.snapEndpoints( sample, (23, 10), (36, 10), reach=8 )
+    assert snapped == (True, True)
+    assert q1[0] == pytest.approx( 19.5, abs=0.25 ) and q2[0] == pytest.approx( 39.5, abs=0.25 )
+    assert q1[1] == pytest.approx( 10 ) and q2[1] == pytest.approx( 10 )
+
+
+def test_snapEndpoints_leaves_flat_ends():
+    width, height = 60, 20
+    sample = edges.Sampler( [50.0] * (width * height), width, height )
+    q1, q2, snapped = edges.snapEndpoints( sample, (20, 10), (40, 10) )
+    assert snapped == (False, False)
+    assert (q1, q2) == ([20, 10], [40, 10])
@@ -0,0 +1,29 @@
+''' tests/test_export.py
+Tests of where `mmtools.export` writes the annotated copies.
+'''
+
+import os
+
+import pytest
+
+from mmtools import export
+
+
+def test_outputPath_next_to_image():
+    path = os.path.join( 'data', 'sem', 'a.tif' )
+    assert export.outputPath( path, 'png' ) == os.path.join( 'data', 'sem', 'a_annotated.png' )
+    assert export.outputPath( path, 'zip' ) == os.path.join( 'data', 'sem', 'a_annotated.zip' )
+
+
+def test_outputPath_in_outdir_keeps_subdirectories():
+    root = os.path.join( 'data', 'sem' )
+    path = os.path.join( root, 'wafer1', 'site2', 'a.tif' )
+    out = os.path.join( 'publish' )
+    assert export.outputPath( path, 'jpg', out ) == os.path.join( 'publish', 'a_annotated.jpg' )
+    assert export.outputPath( path, 'jpg', out, root ) == os.path.join( 'publish', 'wafer1', 'site2', 'a_annotated.jpg' )
+    assert export.outputPath( os.path.join( root, 'b.tif' ), 'tif', out, root ) == os.path.join( 'publish', 'b_annotated.tif' )
+
+
+def test_outputPath_rejects_unknown_format():
+    with pytest.raises( KeyError ):
+        export.outputPath( 'a.tif', 'gif' )
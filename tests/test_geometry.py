@@ -0,0 +1,86 @@
+''' tests/test_geometry.py
+Tests of the label placement, scale bar & dirty-rectangle geometry, `mmtools.geometry`.
+'''
+
+import pytest
+
+from mmtools import geometry
+from mmtools.geometry import MARGIN, SPACER
+
+
+def test_midpoint_and_lengths():
+    assert geometry.midpoint( [10, 40], [30, 20] ) == [20, 30]
+    assert geometry.lineLength( (0, 0), (3, 4) ) == 5.0
+    assert geometry.lineLength( (0, 0), (3, 4), 2.0, 0.5 ) == pytest.approx( 6.3245553 )
+    assert geometry.lengthText( 3.14159, 'um' ) == "3.142 um"
+    assert geometry.textPosition( (0, 0), (5, 5) ) == 'bottom right'
+    assert geometry.textPosition( (5, 5), (0, 0) ) == 'top left'
+
+
+def test_parsePosition():
+    assert geometry.parsePosition( ' Bottom Right ' ) == 'br'
+    assert geometry.parsePosition( 'tl' ) == 'tl'
+    with pytest.raises( ValueError ):
+        geometry.parsePosition( 'middle' )
+
+
+def test_placeText_corners_and_edges():
+    assert geometry.placeText( 50, 50, 'br', 20, 10, 200, 200 ) == (50 + SPACER, 50 + SPACER + 10)
+    assert geometry.placeText( 50, 50, 'tl', 20, 10, 200, 200 ) == (50 - SPACER - 20, 50 - SPACER)
+    assert geometry.placeText( 2, 2, 'tl', 20, 10, 200, 200 ) == (MARGIN, 10 + MARGIN)      # pushed inside
+    assert geometry.placeText( 195, 195, 'br', 20, 10, 200, 200 ) == (200 - 20 - MARGIN, 200 - MARGIN)
+
+
+def test_LabelLayout_avoids_overlaps():
+    layout = geometry.LabelLayout( 500, 500, cell=16 )
+    first = layout.place( 100, 100, 'br', 40, 10 )
+    assert first == geometry.placeText( 100, 100, 'br', 40, 10, 500, 500 )
+    second = layout.place( 100, 100, 'br', 40, 10 )     # same point: moves to another corner
+    assert second != first
+    assert len( layout ) == 2 and layout.collisions == 0
+    boxes = [ (x, y - 10, x + 40, y) for x, y in (first, second) ]
+    assert not ( boxes[0][0] < boxes[1][2] and boxes[1][0] < boxes[0][2] and boxes[0][1] < boxes[1][3] and boxes[1][1] < boxes[0][3] )
+
+
+def test_LabelLayout_counts_collisions_when_full():
+    layout = geometry.LabelLayout( 60, 30 )
+    for i in range( 20 ):
+        layout.place( 30, 15, 'br', 40, 10 )
+    assert layout.collisions > 0
+    assert len( layout ) == 20
+
+
+@pytest.mark.parametrize( 'fieldwidth, length', [
+    (10.0, 2.0), (1000.0, 200.0), (30.0, 5.0), (0.6, 0.1), (4.99, 0.5),
+] )
+def test_niceLength( fieldwidth, length ):
+    assert geometry.niceLength( fieldwidth ) == length
+
+
+def test_niceLength_rejects_empty_field():
+    with pytest.raises( ValueError ):
+        geometry.niceLength( 0 )
+
+
+def test_scaleBarLayout_corners():
+    bar, text, box = geometry.scaleBarLayout( 400, 300, 100, 5, 60, 12, 'br' )
+    assert box[0] + box[2] == 400 - MARGIN and box[1] + box[3] == 300 - MARGIN
+    assert bar == (400 - MARGIN - SPACER - 100, 300 - MARGIN - SPACER - 5, 100, 5)
+    assert text == (bar[0] + 20, bar[1] - SPACER)
+    bar, text, box = geometry.scaleBarLayout( 400, 300, 40, 5, 60, 12, 'tl' )
+    assert box[:2] == (MARGIN, MARGIN)
+    assert bar[0] == MARGIN + SPACER + 10       # centred under the wider text
+
+
+def test_dirty_rectangles():
+    assert geometry.lineBox( (10, 20), (5.5, 30), linewidth=3 ) == (2, 17, 12, 17)
+    assert geometry.textBox( 10, 30, 20, 8 ) == (8, 20, 25, 13)
+    assert geometry.clipBox( (-5, -5, 10, 10), 100, 100 ) == (0, 0, 5, 5)
+    assert geometry.clipBox( (100, 0, 10, 10), 100, 100 ) is None
+
+    dirty = geometry.DirtyRect()
+    assert dirty.clip( 100, 100 ) is None
+    dirty.add( (10, 10, 5, 5) )
+    dirty.add( (90, 0, 20, 4) )
+    assert dirty.box == (10, 0, 100, 15)
+    assert dirty.clip( 100, 100 ) == (10, 0, 90, 15)
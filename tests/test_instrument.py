@@ -0,0 +1,82 @@
+''' tests/test_instrument.py
+Tests of the timing instrumentation, `mmtools.instrument`.
+'''
+
+import json
+
+import pytest
+
+from mmtools import instrument
+
+
+@pytest.fixture
+def enabled():
+    instrument.reset()
+    instrument.configure( True )
+    yield
+    instrument.configure( False )
+    instrument.reset()
+
+
+
+def test_disabled_is_a_no_op( capsys ):
+    instrument.reset()
+    instrument.configure( False )
+    with instrument.span( 'x' ):
+        pass
+    instrument.count( 'c' )
+    instrument.note( "%s %s", 1 )      # not even formatted while off
+    assert instrument.stats() == { 'spans' : {}, 'counters' : {} }
+    assert capsys.readouterr().out == ""
+
+
+def test_spans_counters_and_notes( enabled, capsys ):
+    for i in range( 3 ):
+        with instrument.span( 'draw' ):
+            pass
+    instrument.record( 'io', 0.004 )
+    instrument.count( 'hit' )
+    instrument.count( 'hit', 2 )
+    instrument.note( "p1=%s", (1, 2) )
+    s = instrument.stats()
+    assert s['spans']['draw']['count'] == 3
+    assert s['spans']['io']['total_ms'] == pytest.approx( 4.0 )
+    assert s['spans']['io']['histogram_us'] == { '<4096' : 1 }
+    assert s['counters'] == { 'hit' : 3 }
+    assert capsys.readouterr().out == "mmtools: p1=(1, 2)\n"
+
+
+def test_Histogram():
+    h = instrument.Histogram()
+    assert h.asDict()['mean_ms'] == 0.0
+    for seconds in (1e-7, 3e-6, 0.002):
+        h.add( seconds )
+    d = h.asDict()
+    assert (d['count'], d['min_ms'], d['max_ms']) == (3, pytest.approx( 1e-4 ), pytest.approx( 2.0 ))
+    assert d['histogram_us'] == { '<2' : 1, '<4' : 1, '<2048' : 1 }
+
+
+def test_flush_writes_json_or_table( enabled, tmp_path ):
+    instrument.record( 'slow', 0.5 )
+    instrument.record( 'fast', 0.001 )
+    path = tmp_path / 'timing.json'
+    instrument.configure( True, str(path) )
+    instrument.flush()
+    assert json.loads( path.read_text() )['spans']['slow']['count'] == 1
+
+    table = tmp_path / 'timing.txt'
+    instrument.dump( str(table) )
+    lines = table.read_text().splitlines()
+    assert lines[0].split()[:2] == ['span', 'count']
+    assert [ line.split()[0] for line in lines[1:] ] == ['slow', 'fast']      # slowest total first
+
+
+def test_configureFromSettings():
+    class Sets(object):
+        instrumentation = True
+    try:
+        instrument.configureFromSettings( Sets )
+        assert instrument.enabled()
+        assert instrument._state['file'] is None
+    finally:
+        instrument.configure( False )
@@ -0,0 +1,70 @@
+''' tests/test_measure.py
+Tests of the calibrated line measurements & CSV export, `mmtools.measure`.
+'''
+
+import csv
+
+import pytest
+
+from mmtools import measure
+
+
+def readCsv( path ):
+    with open( path ) as f:
+        return list( csv.reader( f ) )
+
+
+
+def test_measurePoints_straight_line():
+    x1, y1, x2, y2, length, angle = measure.measurePoints( [0, 3], [4, 0] )
+    assert (x1, y1, x2, y2, length) == (0, 4, 3, 0, 5.0)
+    assert angle == pytest.approx( 53.130102 )      # y up, as in ImageJ
+
+
+def test_measurePoints_polyline_and_aspect_ratio():
+    x1, y1, x2, y2, length, angle = measure.measurePoints( [0, 10, 10], [0, 0, 10], 0.5, 2.0 )
+    assert (x2, y2) == (5.0, 20.0)
+    assert length == pytest.approx( 25.0 )
+    assert angle == pytest.approx( -75.963757 )     # from the calibrated coordinates, not the pixels
+
+
+def test_findRoiSet_order( tmp_path ):
+    img = str( tmp_path / 'a.tif' )
+    assert measure.findRoiSet( img ) is None
+    (tmp_path / 'a.roi').write_bytes( b'' )
+    assert measure.findRoiSet( img ) == str( tmp_path / 'a.roi' )
+    (tmp_path / 'a_RoiSet.zip').write_bytes( b'' )
+    assert measure.findRoiSet( img ) == str( tmp_path / 'a_RoiSet.zip' )
+    (tmp_path / 'a.zip').write_bytes( b'' )
+    assert measure.findRoiSet( img ) == str( tmp_path / 'a.zip' )
+
+
+def test_MeasurementWriter( tmp_path ):
+    path = str( tmp_path / 'out.csv' )
+    w = measure.MeasurementWriter( path, ['a', 'b'] )
+    w.writeRows(  ( [i, i*i] for i in range(3) )  )
+    w.close()
+    assert w.count == 3
+    assert readCsv( path ) == [ ['a', 'b'], ['0', '0'], ['1', '1'], ['2', '4'] ]
+
+
+def test_exportBatch( tmp_path ):
+    for name in ('a', 'b', 'bad', 'a_cd', 'b_sidewall'):
+        (tmp_path / (name + '.tif')).write_bytes( b'II*\0' )
+    seen = []
+    def measurefile( path ):
+        seen.append( path )
+        if 'bad' in path:
+            raise ValueError( "no calibration" )
+        return [ [path, 1], [path, 2] ], "2 rows"
+    lines = []
+    csvpath = str( tmp_path / 'cd.csv' )
+
+    stats = measure.exportBatch( str(tmp_path), measurefile, csvpath, ['image', 'n'], workers=2, log=lines.append )
+    assert (stats.done, stats.failed) == (2, 1)
+    assert len( seen ) == 3         # annotated copies skipped
+    rows = readCsv( csvpath )
+    assert rows[0] == ['image', 'n'] and len( rows ) == 5
+    assert sum(  1 for line in lines if line.startswith( "FAILED" ) and "no calibration" in line  ) == 1
+    assert lines[-1].startswith( "Measured 3 files (1 failed)" )
+    assert lines[-1].endswith( "4 rows written to %s" % csvpath )
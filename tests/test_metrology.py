@@ -0,0 +1,79 @@
+''' tests/test_metrology.py
+Tests of the critical-dimension measurements, `mmtools.metrology`.
+'''
+
+import pytest
+
+from mmtools import edges, metrology
+
+
+def barsImage( width, height, bars, dark=20.0, bright=180.0 ):
+    '''A flat list of pixels: bright vertical bars, each (left, right) columns inclusive, on a dark background.'''
+    row = [  bright if any( l <= x <= r for l, r in bars ) else dark  for x in range( width )  ]
+    return row * height
+
+
+
+def test_statistics():
+    assert metrology.statistics( [] ) == (0, 0.0, 0.0, 0.0, 0.0)
+    assert metrology.statistics( [4.0] ) == (1, 4.0, 0.0, 4.0, 4.0)
+    n, mean, sigma, lo, hi = metrology.statistics( [1.0, 2.0, 3.0] )
+    assert (n, mean, lo, hi) == (3, 2.0, 1.0, 3.0)
+    assert sigma == pytest.approx( 1.0 )
+
+
+@pytest.mark.parametrize( 'region, clipped', [
+    (None, (0, 0, 100, 50)),
+    ((10, 5, 0, 0), (0, 0, 100, 50)),
+    ((90, 45, 30, 30), (90, 45, 10, 5)),
+    ((-5, -5, 20, 20), (0, 0, 20, 20)),
+] )
+def test_clipRegion( region, clipped ):
+    assert metrology.clipRegion( region, 100, 50 ) == clipped
+
+
+def test_edgePairs_by_polarity():
+    found = [ (10.0, 5.0), (12.0, 6.0), (20.0, -5.0), (30.0, 5.0), (40.0, -5.0) ]
+    assert metrology.edgePairs( found, metrology.BRIGHT ) == [ (12.0, 20.0), (30.0, 40.0) ]
+    assert metrology.edgePairs( found, metrology.DARK ) == [ (20.0, 30.0) ]
+
+
+def test_groupPairs_one_pair_per_scanline():
+    scans = [ [ (10, 20), (40, 50) ], [ (11, 21), (41, 49) ], [ (10, 19) ] ]
+    features = metrology.groupPairs( scans )
+    assert [ f.rows for f in features ] == [ [0, 1, 2], [0, 1] ]
+    assert features[0].widths() == [10, 10, 9]
+    assert features[1].center() == pytest.approx( 45 )
+
+
+def test_measureRegion_bright_bars():
+    width, height = 80, 30
+    sample = edges.Sampler( barsImage( width, height, [ (10, 19), (40, 54) ] ), width, height )
+    features = metrology.measureRegion( sample, (0, 0, width, height), scanlines=5 )
+    assert len( features ) == 2
+    assert [ len( f.rows ) for f in features ] == [5, 5]
+    st = [ f.stats( 2.0 ) for f in features ]
+    assert st[0]['mean'] == pytest.approx( 20.0, abs=0.5 )      # 10 px at 2 units/px
+    assert st[1]['mean'] == pytest.approx( 30.0, abs=0.5 )
+    assert st[0]['sigma'] == pytest.approx( 0.0, abs=1e-6 )
+
+
+def test_measureRegion_dark_and_vertical():
+    width, height = 30, 80
+    column = [  180.0 if 30 <= y <= 49 else 20.0  for y in range( height )  ]      # a bright horizontal bar
+    pixels = [  v  for v in column  for x in range( width )  ]
+    sample = edges.Sampler( pixels, width, height )
+    bright = metrology.measureRegion( sample, (0, 0, width, height), scanlines=4, direction=metrology.VERTICAL )
+    assert len( bright ) == 1
+    assert bright[0].stats()['mean'] == pytest.approx( 20.0, abs=0.5 )
+    assert metrology.measureRegion( sample, (0, 0, width, height), scanlines=4,
+                                    polarity=metrology.DARK, direction=metrology.VERTICAL ) == []
+
+
+def test_featureRows_offset_by_region():
+    f = metrology.Feature()
+    for row in range( 3 ):
+        f.add( row, 10.0, 20.0 )
+    rows = list( metrology.featureRows( 'a.tif', [f], (5, 0, 50, 50), 0.5, 'nm', 'cal' ) )
+    assert rows == [ ['a.tif', 1, 3, '10', '5', '0', '5', '5', 'nm', 'cal'] ]
+    assert len( rows[0] ) == len( metrology.COLUMNS )
@@ -0,0 +1,84 @@
+''' tests/test_registry.py
+Tests of the calibration records & registry, `mmtools.registry`.
+'''
+
+import json
+
+import pytest
+
+from mmtools import registry
+
+
+class Settings(object):
+    '''Stands in for the settings module: just the attributes `recordsFromSettings()` reads.'''
+    def __init__(self, **lists):
+        self.__dict__.update( lists )
+
+
+class CustomCal(object):
+    name = "JEOL: AutoCal"
+    def cal(self, imp):
+        return 1.0
+
+
+
+def test_record_group_and_objective_from_name():
+    rec = registry.CalRecord( "Swift 40x", 3.5, 'um' )
+    assert (rec.group, rec.objective) == ("Swift", "40x")
+    assert rec.label == "Swift 40x      (3.5 pixels/um)"
+    assert not rec.isCustom()
+    other = registry.CalRecord( "FluoroScope 1.5X", 1, 'um', group="Fluoro" )
+    assert (other.group, other.objective) == ("Fluoro", "1.5X")
+
+
+def test_custom_record_group():
+    rec = registry.CalRecord( "Auto", custom=CustomCal() )
+    assert rec.isCustom() and rec.group == registry.CUSTOM_GROUP
+    assert rec.pixel_per_unit is None and rec.label == "Auto"
+
+
+def test_registry_lookups_and_duplicates():
+    reg = registry.CalRegistry( [ registry.CalRecord( "Swift 4x", 0.9, 'um' ), registry.CalRecord( "Swift 40x", 9, 'um' ),
+                                  registry.CalRecord( "Olympus 100x", 54, 'um' ) ] )
+    assert len( reg ) == 3 and reg.groups == ["Swift", "Olympus"]
+    assert reg.find( " swift 40X " ).pixel_per_unit == 9.0
+    assert reg.fromLabel( reg.labels()[2] ).name == "Olympus 100x"
+    assert [ r.name for r in reg.search( "40x swift" ) ] == ["Swift 40x"]
+    assert [ r.name for r in reg.search( "", group="Swift" ) ] == ["Swift 4x", "Swift 40x"]
+    with pytest.raises( ValueError ):
+        reg.add( registry.CalRecord( "SWIFT 4x", 1, 'um' ) )
+    with pytest.raises( ValueError ):
+        reg.find( "nope" )
+
+
+def test_recordsFromSettings_with_stack_axes():
+    sets = Settings( names=["A 5x", "B 10x", CustomCal()], cals=[1.0, 2.0, None], units=['um', 'nm', None], aspect_ratio=[1.0, 2.0, None],
+                     pixel_depth=[0.5, None, None], time_unit='min' )
+    recs = list( registry.recordsFromSettings( sets ) )
+    assert [ r.name for r in recs ] == ["A 5x", "B 10x", "JEOL: AutoCal"]
+    assert (recs[0].pixel_depth, recs[0].time_unit) == (0.5, 'min')
+    assert (recs[1].aspect_ratio, recs[1].pixel_depth) == (2.0, None)
+    assert recs[2].isCustom()
+
+
+def test_recordsFromSettings_length_mismatch():
+    sets = Settings( names=["A", "B"], cals=[1.0], units=['um', 'um'], aspect_ratio=[1.0, 1.0] )
+    with pytest.raises( ValueError ):
+        list( registry.recordsFromSettings( sets ) )
+
+
+def test_tables_csv_and_json( tmp_path ):
+    (tmp_path / 'cals.csv').write_text( "Name, Cal, Unit, Group\nScope 4x, 0.9058, um, Scope\nScope 10x, 2.25, , \n" )
+    (tmp_path / 'cals.json').write_text(  json.dumps( [ {"name": "SEM 1kx", "cal": 0.5, "unit": "nm", "pixel_depth": 10} ] )  )
+    sets = Settings( names=[], cals=[], units=[], aspect_ratio=[], calibration_tables=['cals.csv', 'cals.json'],
+                     __file__=str( tmp_path / 'settings.py' ) )
+    reg = registry.fromSettings( sets )
+    assert [ r.name for r in reg ] == ["Scope 4x", "Scope 10x", "SEM 1kx"]
+    assert reg.find( "Scope 10x" ).unit == 'um'     # the default
+    assert reg.find( "SEM 1kx" ).pixel_depth == 10.0
+
+
+def test_table_row_without_cal( tmp_path ):
+    (tmp_path / 'bad.csv').write_text( "name,unit\nScope 4x,um\n" )
+    with pytest.raises( ValueError ):
+        list( registry.recordsFromTable( str( tmp_path / 'bad.csv' ) ) )
@@ -0,0 +1,60 @@
+''' tests/test_settings.py
+Tests of loading & reloading the user settings, `mmtools.settings`.
+'''
+
+import os, sys
+
+import pytest
+
+from mmtools import settings
+
+
+SETTINGS = '''
+names = ['Scope 4x', 'Scope 10x']
+cals = [0.9, %s]
+units = ['um', 'um']
+aspect_ratio = [1.0, 1.0]
+linethickness = 5.0
+'''
+
+
+@pytest.fixture
+def tmpSettings( tmp_path, monkeypatch ):
+    '''A settings module in a temporary folder, loaded through `mmtools.settings` instead of the real one.'''
+    name = 'mmtools_test_settings_%i' % id( tmp_path )
+    path = tmp_path / (name + '.py')
+    path.write_text( SETTINGS % '2.25' )
+    monkeypatch.setattr( settings, 'SETTINGS_MODULE', name )
+    monkeypatch.setattr( settings, 'TOOLS_DIR', str(tmp_path) )
+    monkeypatch.setattr( settings, '_state', { 'module' : None, 'mtimes' : {}, 'registry' : None, 'tables' : {} } )
+    monkeypatch.setattr( sys, 'path', list(sys.path) )
+    monkeypatch.setattr( sys, 'dont_write_bytecode', True )
+    yield path
+    sys.modules.pop( name, None )
+
+
+
+def test_settings_are_loaded_once( tmpSettings ):
+    sets = settings.getSettings()
+    assert sets.linethickness == 5.0
+    assert settings.getSettings() is sets
+    reg = settings.getRegistry()
+    assert settings.getRegistry() is reg
+    assert reg.find( "Scope 10x" ).pixel_per_unit == 2.25
+
+
+def test_settings_reload_when_changed( tmpSettings ):
+    settings.getSettings()
+    reg = settings.getRegistry()
+    tmpSettings.write_text( SETTINGS % '4.5' )
+    st = os.stat( str(tmpSettings) )
+    os.utime( str(tmpSettings), (st.st_atime, st.st_mtime + 10) )     # a new mtime, even on coarse file systems
+    assert settings.getRegistry() is not reg
+    assert settings.getRegistry().find( "Scope 10x" ).pixel_per_unit == 4.5
+
+
+def test_sourceFile():
+    class Module(object):
+        __file__ = os.path.join( 'x', 'JEOL_SEM_AutoCal$py.class' )
+    assert settings.sourceFile( Module ) == os.path.abspath( os.path.join( 'x', 'JEOL_SEM_AutoCal.py' ) )
+    assert settings.sourceFile( object() ) is None
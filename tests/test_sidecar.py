@@ -0,0 +1,96 @@
+''' tests/test_sidecar.py
+Tests of the JEOL sidecar parser & its cache, `mmtools.sidecar`.
+'''
+
+import io, os
+
+import pytest
+
+from mmtools import sidecar
+
+
+JEOL = "$CM_FORMAT JEOL/SEM\n$CM_MAG 50000\n$$SM_MICRON_BAR 53\n$$SM_MICRON_MARKER 100nm\n$CM_TITLE sample 01\n"
+
+
+def writeText( path, text ):
+    f = io.open( str(path), 'w', encoding='latin-1' )
+    try:
+        f.write( text )
+    finally:
+        f.close()
+    return str( path )
+
+
+
+def test_sidecarPath_replaces_extension():
+    assert sidecar.sidecarPath( os.path.join( 'a', 'img 01.tif' ) ) == os.path.join( 'a', 'img 01.txt' )
+
+
+def test_parseSidecar_keeps_dollar_keys():
+    fields = sidecar.parseSidecar( JEOL )
+    assert fields['$CM_MAG'] == '50000'
+    assert fields['$$SM_MICRON_BAR'] == '53'
+    assert fields['$CM_TITLE'] == 'sample 01'
+
+
+def test_parseSidecar_stops_at_wanted_keys():
+    fields = sidecar.parseSidecar( JEOL, wanted=sidecar.SCALE_KEYS )
+    assert set( sidecar.SCALE_KEYS ) <= set( fields )
+    assert '$CM_TITLE' not in fields    # after the last wanted key
+
+
+@pytest.mark.parametrize( 'marker, expected', [
+    ('100nm', (100.0, 'nm')),
+    ('1.5 um', (1.5, 'um')),
+    ('.5mm', (0.5, 'mm')),
+    ] )
+def test_parseMarker( marker, expected ):
+    assert sidecar.parseMarker( marker ) == expected
+
+
+def test_parseMarker_without_number():
+    with pytest.raises( ValueError ):
+        sidecar.parseMarker( 'nm' )
+
+
+def test_jeolScale_and_magnification( tmp_path ):
+    txt = writeText( tmp_path / 'a.txt', JEOL )
+    ppu, unit = sidecar.jeolScale( txt )
+    assert unit == 'nm'
+    assert ppu == pytest.approx( 0.53 )
+    assert sidecar.jeolMagnification( txt ) == 50000.0
+
+
+def test_jeolScale_missing_fields( tmp_path ):
+    txt = writeText( tmp_path / 'b.txt', "$CM_MAG 1000\n" )
+    with pytest.raises( ValueError ):
+        sidecar.jeolScale( txt )
+    assert sidecar.jeolMagnification( writeText( tmp_path / 'c.txt', "$$SM_MICRON_BAR 1\n" ) ) is None
+
+
+def test_readSidecar_cache_hits_and_invalidation( tmp_path ):
+    sidecar._cache.clear()
+    txt = writeText( tmp_path / 'd.txt', JEOL )
+    sidecar.readSidecar( txt )
+    sidecar.readSidecar( txt )
+    assert (sidecar._cache.hits, sidecar._cache.misses) == (1, 1)
+
+    writeText( txt, JEOL.replace( '53', '106' ) + "$CM_EXTRA 1\n" )     # a different size, so a new cache key
+    assert sidecar.readSidecar( txt )['$$SM_MICRON_BAR'] == '106'
+
+
+def test_readSidecar_partial_parse_is_completed( tmp_path ):
+    sidecar._cache.clear()
+    txt = writeText( tmp_path / 'e.txt', JEOL )
+    sidecar.readSidecar( txt, sidecar.SCALE_KEYS )
+    assert sidecar.readSidecar( txt )['$CM_TITLE'] == 'sample 01'     # the early-stopped parse isn't returned for all the keys
+
+
+def test_LRUCache_evicts_least_recently_used():
+    cache = sidecar.LRUCache( maxsize=2 )
+    cache.put( 'a', 1 )
+    cache.put( 'b', 2 )
+    cache.get( 'a' )
+    cache.put( 'c', 3 )
+    assert cache.get( 'b' ) is None
+    assert (cache.get( 'a' ), cache.get( 'c' )) == (1, 3)
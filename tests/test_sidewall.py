@@ -0,0 +1,81 @@
+''' tests/test_sidewall.py
+Tests of the sidewall angle, depth & footing analysis, `mmtools.sidewall`.
+'''
+
+import math
+
+import pytest
+
+from mmtools import edges, sidewall
+
+
+TOP, FLOOR = 20, 60
+
+
+def crossSection( width, height, wall, material=sidewall.LEFT, dark=20.0, bright=180.0 ):
+    '''A `Sampler` of a cross-section: vacuum above TOP, material below FLOOR, and a sidewall at x = wall( y ) in between.'''
+    pixels = []
+    for y in range( height ):
+        for x in range( width ):
+            if y < TOP:
+                solid = False
+            elif y >= FLOOR:
+                solid = True
+            else:
+                solid = ( x < wall(y) )  if material == sidewall.LEFT  else ( x >= wall(y) )
+            pixels.append( bright if solid else dark )
+    return edges.Sampler( pixels, width, height )
+
+
+
+def test_fitLine_and_ransac():
+    points = [ (0.5 * y + 3, y) for y in range( 10 ) ]
+    a, b = sidewall.fitLine( points )
+    assert (a, b) == (pytest.approx( 0.5 ), pytest.approx( 3 ))
+    a, b, inliers = sidewall.ransacLine( points + [ (40, 2), (-30, 7) ], 0.5 )
+    assert (a, b) == (pytest.approx( 0.5 ), pytest.approx( 3 ))
+    assert len( inliers ) == 10
+    assert sidewall.ransacLine( points + [ (40, 2) ], 0.5 ) == sidewall.ransacLine( points + [ (40, 2) ], 0.5 )   # seeded
+    with pytest.raises( ValueError ):
+        sidewall.ransacLine( [ (1, 5), (2, 5) ], 1.0 )
+
+
+def test_vertical_sidewall():
+    sw = sidewall.findSidewall( crossSection( 80, 80, lambda y: 40 ), (0, 0, 80, 80) )
+    assert sw.angle == pytest.approx( 90, abs=0.5 )
+    assert sw.depth == pytest.approx( FLOOR - TOP, abs=1 )
+    assert sw.footing == 0.0
+    assert sw.x( 40 ) == pytest.approx( 39.5, abs=0.5 )
+
+
+@pytest.mark.parametrize( 'material', [ sidewall.LEFT, sidewall.RIGHT ] )
+def test_tapered_sidewall_in_calibrated_units( material ):
+    slope = 0.25 if material == sidewall.LEFT else -0.25      # the material widens towards the floor
+    sample = crossSection( 80, 80, lambda y: 40 + slope * ( y - TOP ), material )
+    sw = sidewall.findSidewall( sample, (0, 0, 80, 80), material, pixelWidth=2.0, pixelHeight=2.0 )
+    assert sw.angle == pytest.approx( math.degrees( math.atan2( 1, 0.25 ) ), abs=1 )
+    assert sw.depth == pytest.approx( 2 * (FLOOR - TOP), abs=2 )
+    assert sw.slope == pytest.approx( slope, abs=0.02 )
+
+
+def test_footing():
+    sample = crossSection( 80, 80, lambda y: 40 + ( 6 if y >= FLOOR - 5 else 0 ) )
+    sw = sidewall.findSidewall( sample, (0, 0, 80, 80) )
+    assert sw.angle == pytest.approx( 90, abs=1 )
+    assert sw.footing == pytest.approx( 6, abs=1 )
+    assert sw.footheight == pytest.approx( 5, abs=1.5 )
+
+
+def test_errors():
+    flat = edges.Sampler( [50.0] * (40 * 40), 40, 40 )
+    with pytest.raises( ValueError ):
+        sidewall.findSidewall( flat, (0, 0, 40, 40) )
+    with pytest.raises( ValueError ):      # material on the wrong side: the "floor" is above the "top"
+        sidewall.findSidewall( crossSection( 80, 80, lambda y: 40 ), (0, 0, 80, 80), sidewall.RIGHT )
+
+
+def test_sidewallRows():
+    sw = sidewall.Sidewall( 88.123, 0.5, 0.0, 0.0, 20, 60, 0.0, 40.0, [ (40, 30) ], 1, sidewall.LEFT )
+    rows = sidewall.sidewallRows( 'a.tif', sw, 'um', 'cal' )
+    assert rows == [ ['a.tif', '88.12', '0.5', '0', '0', '20.00', '60.00', 1, 1, 'um', 'cal'] ]
+    assert len( rows[0] ) == len( sidewall.COLUMNS )
@@ -0,0 +1,85 @@
+''' tests/test_tiffheader.py
+Tests of reading & patching TIFF headers in place, `mmtools.tiffheader`.
+'''
+
+import struct
+
+import pytest
+
+from mmtools import tiffheader
+
+from tiffs import ascii, rational, writeTiff
+
+
+PIXELS = bytes( bytearray( range(64) ) )
+
+
+
+@pytest.mark.parametrize( 'order', ['<', '>'] )
+def test_readTags( tmp_path, order ):
+    path = writeTiff( tmp_path / 'a.tif', 8, 8, PIXELS, order=order, extra=[
+        (tiffheader.DESCRIPTION, 2, ascii( "ImageJ=1.53t\nunit=nm\n" )), (tiffheader.XRESOLUTION, 5, rational( order, 3, 2 )) ] )
+    assert tiffheader.byteOrder( path ) == order
+    tags = tiffheader.readTags( path )
+    assert tags[256] == (8,) and tags[tiffheader.XRESOLUTION] == (1.5,)
+    assert tiffheader.readTags( path, (tiffheader.DESCRIPTION,) ) == { tiffheader.DESCRIPTION : "ImageJ=1.53t\nunit=nm\n" }
+
+
+def test_readTags_not_a_tiff( tmp_path ):
+    path = tmp_path / 'x.tif'
+    path.write_bytes( b'GIF89a' + b'\0' * 20 )
+    with pytest.raises( ValueError ):
+        tiffheader.readTags( str(path) )
+    with pytest.raises( ValueError ):
+        tiffheader.byteOrder( str(path) )
+
+
+@pytest.mark.parametrize( 'order', ['<', '>'] )
+def test_writeResolution_adds_imagej_description( tmp_path, order ):
+    path = writeTiff( tmp_path / 'b.tif', 8, 8, PIXELS, order=order )
+    tiffheader.writeResolution( path, 0.25, 0.5, u'µm', pixelDepth=2.0, frameInterval=0.1, timeUnit='sec' )
+    tags = tiffheader.readTags( path )
+    assert tags[tiffheader.XRESOLUTION] == (4.0,) and tags[tiffheader.YRESOLUTION] == (2.0,)
+    assert tags[tiffheader.RESOLUTIONUNIT] == (tiffheader.RESUNIT_NONE,)
+    desc = tags[tiffheader.DESCRIPTION]
+    assert desc.startswith( "ImageJ=" )
+    for line in ("unit=micron", "spacing=2.0", "finterval=0.1", "tunit=sec"):
+        assert line in desc.split( "\n" )
+    with open( path, 'rb' ) as f:
+        data = f.read()
+    assert data[8 : 8+64] == PIXELS     # the pixels weren't touched
+
+
+def test_writeResolution_replaces_unit_in_place( tmp_path ):
+    path = writeTiff( tmp_path / 'c.tif', 8, 8, PIXELS, extra=[
+        (tiffheader.DESCRIPTION, 2, ascii( "ImageJ=1.53t\nunit=micron\nloop=false\n" )),
+        (tiffheader.XRESOLUTION, 5, rational( '<', 1, 1 )), (tiffheader.YRESOLUTION, 5, rational( '<', 1, 1 )), (tiffheader.RESOLUTIONUNIT, 3, b'\1\0') ] )
+    tiffheader.writeResolution( path, 2.0, 2.0, 'nm' )
+    tags = tiffheader.readTags( path )
+    assert tags[tiffheader.DESCRIPTION] == "ImageJ=1.53t\nunit=nm\nloop=false\n"
+    assert tags[tiffheader.XRESOLUTION] == (0.5,)
+
+
+def test_writeResolution_foreign_description_uses_centimeters( tmp_path ):
+    path = writeTiff( tmp_path / 'd.tif', 8, 8, PIXELS, extra=[ (tiffheader.DESCRIPTION, 2, ascii( "Made by a camera" )) ] )
+    tiffheader.writeResolution( path, 10.0, 10.0, 'nm' )
+    tags = tiffheader.readTags( path )
+    assert tags[tiffheader.DESCRIPTION] == "Made by a camera"
+    assert tags[tiffheader.RESOLUTIONUNIT] == (tiffheader.RESUNIT_CM,)
+    assert tags[tiffheader.XRESOLUTION][0] == pytest.approx( 1e6 )
+    with pytest.raises( ValueError ):
+        tiffheader.writeResolution( path, 1.0, 1.0, 'pixel' )
+
+
+@pytest.mark.parametrize( 'value', [ 4294967295.0, 1e9, 1234.5678, 1.0, 1/3., 1e-7, 1e-9 ] )
+def test_rational_fits_in_32_bits( value ):
+    num, den = tiffheader._rational( value )
+    struct.pack( 'II', num, den )       # raises if either doesn't fit
+    assert num > 0
+    assert float(num) / den == pytest.approx( value, rel=1e-2 )
+
+
+@pytest.mark.parametrize( 'value', [ 5e9, 0.0, -1.0, 1e-10, float('inf') ] )
+def test_rational_out_of_range( value ):
+    with pytest.raises( ValueError ):
+        tiffheader._rational( value )
@@ -0,0 +1,123 @@
+''' tests/test_tiles.py
+Tests of reading & writing only the pixels under annotations, `mmtools.tiles`.
+'''
+
+import random, struct
+
+import pytest
+
+from mmtools import tiles
+
+from tiffs import writeTiff
+
+
+class FixedStyle(object):
+    '''Stands in for `annotate.Style`: text is 7 x 12 pixels per character, without needing a font.'''
+    linewidth = 3
+    def textSize(self, text):
+        return ( 7 * len(text), 12 )
+
+
+def pixelBytes( width, height, bits, samples, order, seed=1 ):
+    rnd = random.Random( seed )
+    n = width * height * samples
+    if bits == 8:
+        return bytes(  bytearray( rnd.randrange(256) for i in range(n) )  )
+    if bits == 16:
+        return struct.pack( order + '%iH' % n, *[ rnd.randrange(65536) for i in range(n) ] )
+    return struct.pack( order + '%if' % n, *[ rnd.uniform(-1, 1) for i in range(n) ] )
+
+
+def cropBytes( pixels, width, bpp, box ):
+    x, y, w, h = box
+    return b''.join(  pixels[ ((y + r) * width + x) * bpp : ((y + r) * width + x + w) * bpp ]  for r in range(h)  )
+
+
+FORMATS = [ (8, 1, '<', {}), (16, 1, '>', {}), (32, 1, '<', {'rowsperstrip': 7}), (8, 3, '<', {'tile': (16, 16)}), (16, 1, '<', {'tile': (16, 32)}) ]
+
+
+
+@pytest.mark.parametrize( 'bits, samples, order, kwargs', FORMATS )
+def test_readRegion_matches_the_pixels( tmp_path, bits, samples, order, kwargs ):
+    w, h = 45, 37
+    pixels = pixelBytes( w, h, bits, samples, order )
+    layout = tiles.TiffLayout(  writeTiff( tmp_path / 'a.tif', w, h, pixels, bits=bits, samples=samples, order=order, **kwargs )  )
+    assert (layout.width, layout.height, layout.bpp, layout.tiled) == (w, h, bits // 8 * samples, 'tile' in kwargs)
+    for box in [ (0, 0, w, h), (3, 5, 20, 9), (15, 15, 2, 2), (w-1, h-1, 1, 1) ]:
+        assert tiles.readRegion( layout, box ) == cropBytes( pixels, w, layout.bpp, box )
+
+
+@pytest.mark.parametrize( 'bits, samples, order, kwargs', FORMATS )
+def test_writeRegion_only_changes_the_box( tmp_path, bits, samples, order, kwargs ):
+    w, h = 45, 37
+    pixels = pixelBytes( w, h, bits, samples, order )
+    path = writeTiff( tmp_path / 'b.tif', w, h, pixels, bits=bits, samples=samples, order=order, **kwargs )
+    layout = tiles.TiffLayout( path )
+    box = (10, 12, 21, 17)
+    new = b'\x55' * ( box[2] * box[3] * layout.bpp )
+    tiles.writeRegion( layout, box, new )
+
+    assert tiles.readRegion( layout, box ) == new
+    whole = tiles.readRegion( layout, (0, 0, w, h) )
+    expected = bytearray( pixels )
+    for r in range( box[3] ):
+        start = ( (box[1] + r) * w + box[0] ) * layout.bpp
+        expected[ start : start + box[2] * layout.bpp ] = new[:box[2] * layout.bpp]
+    assert whole == bytes( expected )
+    with pytest.raises( ValueError ):
+        tiles.writeRegion( layout, box, new[:-1] )
+
+
+def test_chunks_of_tiles( tmp_path ):
+    layout = tiles.TiffLayout(  writeTiff( tmp_path / 'c.tif', 64, 64, b'\0' * 4096, tile=(16, 16) )  )
+    assert layout.chunks( (0, 0, 16, 16) ) == set([0])
+    assert layout.chunks( (10, 10, 10, 10) ) == set([0, 1, 4, 5])
+    assert len( list( layout.segments( (10, 10, 10, 10) ) ) ) == 20     # one per row of each tile
+
+
+def patchTag( data, tag, old, new ):
+    '''The TIFF bytes `data` with the SHORT value of `tag` changed from `old` to `new`.'''
+    entry = struct.pack( '<HHI', tag, 3, 1 )
+    assert data.count( entry + struct.pack( '<HH', old, 0 ) ) == 1
+    return data.replace(  entry + struct.pack( '<HH', old, 0 ),  entry + struct.pack( '<HH', new, 0 )  )
+
+
+@pytest.mark.parametrize( 'bits, tag, old, new', [
+    (8, tiles.COMPRESSION, 1, 5),       # LZW
+    (8, tiles.PHOTOMETRIC, 1, 3),       # palette
+    (32, tiles.SAMPLEFORMAT, 3, 1),     # 32-bit integers
+    ] )
+def test_unsupported_layouts( tmp_path, bits, tag, old, new ):
+    data = open(  writeTiff( tmp_path / 'ok.tif', 4, 4, b'\0' * (16 * bits // 8), bits=bits ),  'rb' ).read()
+    tiles.TiffLayout( str( tmp_path / 'ok.tif' ) )
+    (tmp_path / 'bad.tif').write_bytes(  patchTag( data, tag, old, new )  )
+    with pytest.raises( ValueError ):
+        tiles.TiffLayout( str( tmp_path / 'bad.tif' ) )
+
+
+
+def test_planRegions_merges_overlapping_measurements():
+    lines = [ ((10, 10), (60, 10)), ((20, 14), (70, 14)), ((300, 300), (350, 340)) ]
+    regions = tiles.planRegions( 500, 400, lines, FixedStyle(), 0.5, 0.5, 'um' )
+    assert len( regions ) == 2
+    merged = [ r for r in regions  if len(r.labels) == 2 ][0]
+    assert merged.labels[0][2] == "25.000 um"
+    for region in regions:
+        x, y, w, h = region.box
+        assert x >= 0 and y >= 0 and x + w <= 500 and y + h <= 400
+        for p1, p2, text, (tx, ty) in region.labels:
+            assert x <= min( p1[0], p2[0] ) and max( p1[0], p2[0] ) < x + w     # the line & its text are inside the region
+            assert x <= tx and tx + 7 * len(text) <= x + w and y <= ty - 12 and ty <= y + h
+
+
+
+def test_drawingRange_is_common_to_all_regions():
+    class Layout(object):
+        samples, bits, order = 1, 32, '<'
+    raws = [ struct.pack( '<3f', 0.5, 0.25, float('nan') ), struct.pack( '<2f', -2.0, 8.0 ) ]
+    assert tiles.drawingRange( Layout, raws ) == (-2.0, 8.0)
+    assert tiles.drawingRange( Layout, [ struct.pack( '<2f', 3.0, 3.0 ) ] ) == (3.0, 4.0)        # flat: still a range to map colors into
+    Layout.bits = 16
+    assert tiles.drawingRange( Layout, raws ) == (0, 65535)
+    Layout.samples, Layout.bits = 3, 8
+    assert tiles.drawingRange( Layout, raws ) is None
@@ -0,0 +1,91 @@
+''' tests/test_vendors.py
+Tests of the vendor calibration extractors, `mmtools.vendors`.
+'''
+
+import pytest
+
+from mmtools import tiffheader, vendors
+
+from tiffs import ascii, rational, writeTiff
+
+
+def tiff( tmp_path, name, extra=() ):
+    return writeTiff( tmp_path / name, 4, 4, b'\0' * 16, extra=list(extra) )
+
+
+
+def test_metricScale_picks_readable_unit():
+    assert vendors.metricScale( 4.8e-9 ) == (pytest.approx( 1/4.8 ), 'nm')
+    assert vendors.metricScale( 2.0, u'µm' ) == (pytest.approx( 0.5 ), 'um')
+    assert vendors.metricScale( 5e-3 ) == (pytest.approx( 0.2 ), 'mm')
+    with pytest.raises( ValueError ):
+        vendors.metricScale( 1.0, 'furlong' )
+
+
+def test_zeiss( tmp_path ):
+    path = tiff( tmp_path, 'z.tif', [ (tiffheader.ZEISS_SEM, 2, ascii( "AP_PIXEL_SIZE\nPixel Size = 1.116 nm\n" )) ] )
+    assert vendors.headerScale( path ) == (vendors.ZeissTiff.name, pytest.approx( 1/1.116 ), 'nm', 1.0)
+
+
+def test_fei_with_aspect( tmp_path ):
+    path = tiff( tmp_path, 'f.tif', [ (tiffheader.FEI_HELIOS, 2, ascii( "[Scan]\r\nPixelWidth=4.8e-009\nPixelHeight=9.6e-009\n" )) ] )
+    name, ppu, unit, aspect = vendors.headerScale( path )
+    assert (name, unit) == (vendors.FEITiff.name, 'nm')
+    assert (ppu, aspect) == (pytest.approx( 1/4.8 ), pytest.approx( 2.0 ))
+
+
+def test_jeol_sidecar( tmp_path ):
+    path = tiff( tmp_path, 'j.tif' )
+    (tmp_path / 'j.txt').write_text( "$CM_MAG 50000\n$$SM_MICRON_BAR 53\n$$SM_MICRON_MARKER 100nm\n" )
+    assert vendors.headerScale( path ) == (vendors.JEOLSidecar.name, pytest.approx( 0.53 ), 'nm', 1.0)
+
+
+def test_hitachi_sidecar_is_read_once( tmp_path, monkeypatch ):
+    path = tiff( tmp_path, 'h.tif' )
+    (tmp_path / 'h.txt').write_text( "[SemImageFile]\nPixelSize=1.984375\n" )
+    assert vendors.headerScale( path ) == (vendors.HitachiSidecar.name, pytest.approx( 1/1.984375 ), 'nm', 1.0)
+
+    (tmp_path / 'h2.txt').write_text( "PixelSize=2.5\n" )
+    opened = []
+    realopen = vendors.io.open
+    monkeypatch.setattr( vendors.io, 'open', lambda *args, **kwargs: opened.append( args[0] ) or realopen( *args, **kwargs ) )
+    hitachi = vendors.HitachiSidecar()
+    path2 = str( tmp_path / 'h2.tif' )
+    assert hitachi.detect( path2, {} )
+    assert hitachi.scale( path2, {} ) == (pytest.approx( 0.4 ), 'nm', 1.0)
+    assert len( opened ) == 1       # detect() & scale() share one parse
+
+
+def test_tiff_resolution( tmp_path ):
+    ij = tiff( tmp_path, 'ij.tif', [ (tiffheader.DESCRIPTION, 2, ascii( "ImageJ=1.53t\nunit=micron\n" )),
+                                     (tiffheader.XRESOLUTION, 5, rational( '<', 4, 1 )), (tiffheader.YRESOLUTION, 5, rational( '<', 2, 1 )) ] )
+    assert vendors.headerScale( ij ) == (vendors.TiffResolution.name, 4.0, 'um', 2.0)
+    cm = tiff( tmp_path, 'cm.tif', [ (tiffheader.XRESOLUTION, 5, rational( '<', 5000, 1 )), (tiffheader.RESOLUTIONUNIT, 3, b'\3\0') ] )
+    assert vendors.headerScale( cm )[1:] == (pytest.approx( 0.5 ), 'um', 1.0)     # 2 um pixels
+    dpi = tiff( tmp_path, 'dpi.tif', [ (tiffheader.XRESOLUTION, 5, rational( '<', 72, 1 )), (tiffheader.RESOLUTIONUNIT, 3, b'\2\0') ] )
+    with pytest.raises( ValueError ):
+        vendors.headerScale( dpi )      # inches are a print resolution, not a calibration
+
+
+def test_register_and_autodetect( tmp_path, monkeypatch ):
+    monkeypatch.setattr( vendors, 'EXTRACTORS', list( vendors.EXTRACTORS ) )
+    class Everything(vendors.HeaderExtractor):
+        name = "Everything"
+        def detect(self, path, tags):
+            return True
+        def scale(self, path, tags):
+            return 1.0, 'nm', 1.0
+    path = tiff( tmp_path, 'plain.tif' )
+    with pytest.raises( ValueError ):
+        vendors.headerScale( path )
+    vendors.register( Everything() )
+    assert vendors.headerScale( path ) == ("Everything", 1.0, 'nm', 1.0)
+
+
+def test_base_extractor_is_abstract( tmp_path ):
+    base = vendors.HeaderExtractor()
+    assert not base.detect( 'x.tif', {} )
+    with pytest.raises( ValueError ):
+        base.scale( 'x.tif', {} )
+    with pytest.raises( ValueError ):
+        base.fromPath(  tiff( tmp_path, 'b.tif' )  )
@@ -0,0 +1,191 @@
+''' tests/test_watch.py
+Tests of the settling & queueing logic of the acquisition-folder watcher, `mmtools.watch`.
+'''
+
+import os
+
+import pytest
+
+from mmtools import watch
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+
+class FakePool(object):
+    '''Stands in for the `batch.WorkerPool` of a running watcher, keeping the queued items.'''
+    def __init__(self):
+        self.items = []
+    def put(self, item):
+        self.items.append( item )
+
+
+@pytest.fixture
+def clock( monkeypatch ):
+    c = FakeClock()
+    monkeypatch.setattr( watch, 'clock', c )
+    return c
+
+
+def makeWatcher( root, sidecarwait=5.0, **kwargs ):
+    w = watch.FolderWatcher( str(root), None, settle=2.0, sidecarwait=sidecarwait, log=lambda msg: None, **kwargs )
+    w._pool = FakePool()
+    return w
+
+
+def queued( w ):
+    return [ os.path.basename( path ) for path, seen in w._pool.items ]
+
+def age( path, seconds=60 ):
+    '''Make a file look as if it was last written `seconds` ago, i.e. complete when the watcher starts.'''
+    t = os.stat( str(path) ).st_mtime - seconds
+    os.utime( str(path), (t, t) )
+
+
+
+def test_rejects_missing_directory( tmp_path ):
+    with pytest.raises( ValueError ):
+        watch.FolderWatcher( str( tmp_path / 'nope' ), None )
+
+
+def test_waits_for_file_and_sidecar_to_settle( tmp_path, clock ):
+    w = makeWatcher( tmp_path )
+    (tmp_path / 'a.tif').write_bytes( b'II*\0data' )
+    (tmp_path / 'a.txt').write_text( "$CM_MAG 1000\n" )
+    assert w.poll() == 0        # first seen
+    clock.now += 1.0
+    assert w.poll() == 0        # not settled yet
+    clock.now += 1.5
+    assert w.poll() == 1
+    assert queued( w ) == ['a.tif']
+    assert w._pool.items[0][1] == 1000.0        # the time it was first seen, for the latency
+    clock.now += 10
+    assert w.poll() == 0        # only once per session
+    assert w.stats.queued == 1
+
+
+def test_queued_sidecars_are_not_watched_again( tmp_path, clock ):
+    (tmp_path / 'old.tif').write_bytes( b'II*\0' )
+    (tmp_path / 'old.txt').write_text( "$CM_MAG 1000\n" )
+    age( tmp_path / 'old.tif' )
+    w = makeWatcher( tmp_path )
+    for ii in range( 3 ):
+        (tmp_path / ('a%i.tif' % ii)).write_bytes( b'II*\0' )
+        (tmp_path / ('a%i.txt' % ii)).write_text( "$CM_MAG 1000\n" )
+    w.poll()
+    clock.now += 3
+    assert w.poll() == 3
+    clock.now += 3
+    assert w.poll() == 0
+    assert w._files == {}       # neither the *.txt files queued with their images, nor the old one, are stat'ed again
+
+
+def test_saved_tiff_is_not_calibrated_again( tmp_path, clock ):
+    w = makeWatcher( tmp_path, sidecarwait=0, stamp=False )
+    (tmp_path / 'a.png').write_bytes( b'PNG' )
+    w.poll()
+    clock.now += 3
+    assert w.poll() == 1
+    (tmp_path / 'a_cal.tif').write_bytes( b'II*\0' )      # as written by the worker, `batch.savedPath()`
+    w.poll()
+    clock.now += 3
+    assert w.poll() == 0
+
+
+def test_changing_file_restarts_settle_time( tmp_path, clock ):
+    w = makeWatcher( tmp_path, sidecarwait=0 )
+    img = tmp_path / 'b.tif'
+    img.write_bytes( b'II*\0' )
+    w.poll()
+    clock.now += 1.5
+    img.write_bytes( b'II*\0more data' )
+    assert w.poll() == 0
+    clock.now += 1.5
+    assert w.poll() == 0        # 3 s since first seen, but only 1.5 s since it changed
+    clock.now += 1.0
+    assert w.poll() == 1
+
+
+def test_empty_files_and_other_types_are_not_queued( tmp_path, clock ):
+    w = makeWatcher( tmp_path, sidecarwait=0 )
+    (tmp_path / 'empty.tif').write_bytes( b'' )
+    (tmp_path / 'notes.doc').write_bytes( b'x' )
+    w.poll()
+    clock.now += 10
+    assert w.poll() == 0
+    assert list( w._files ) == [ str( tmp_path / 'empty.tif' ) ]
+
+
+def test_waits_for_sidecar_until_timeout( tmp_path, clock ):
+    w = makeWatcher( tmp_path )
+    (tmp_path / 'c.tif').write_bytes( b'II*\0' )
+    w.poll()
+    clock.now += 3.0
+    assert w.poll() == 0        # complete, but its *.txt file may still come
+    clock.now += 2.5
+    assert w.poll() == 1        # given up waiting for the *.txt file
+
+
+def test_sidecar_being_written_holds_the_image( tmp_path, clock ):
+    w = makeWatcher( tmp_path )
+    (tmp_path / 'd.tif').write_bytes( b'II*\0' )
+    w.poll()
+    clock.now += 3.0
+    (tmp_path / 'd.txt').write_text( "$CM_MAG 1000\n" )
+    assert w.poll() == 0
+    clock.now += 10.0           # well past `sidecarwait`, but the *.txt file exists, so it's waited for
+    assert w.poll() == 1
+
+
+def test_existing_files( tmp_path, clock ):
+    (tmp_path / 'old.tif').write_bytes( b'II*\0' )
+    age( tmp_path / 'old.tif' )
+    w = makeWatcher( tmp_path, sidecarwait=0 )
+    wall = makeWatcher( tmp_path, sidecarwait=0, existing=True )
+    for x in (w, wall):  x.poll()
+    clock.now += 3
+    assert (w.poll(), wall.poll()) == (0, 1)
+
+
+def test_existing_file_still_written_is_calibrated( tmp_path, clock ):
+    (tmp_path / 'old.tif').write_bytes( b'II*\0' )
+    age( tmp_path / 'old.tif' )
+    (tmp_path / 'new.tif').write_bytes( b'II*' )        # the microscope is still writing it
+    w = makeWatcher( tmp_path, sidecarwait=0 )
+    w.poll()
+    (tmp_path / 'new.tif').write_bytes( b'II*\0' )
+    clock.now += 1
+    assert w.poll() == 0
+    clock.now += 3
+    assert w.poll() == 1
+    assert queued( w ) == ['new.tif']
+
+
+def test_recursive( tmp_path, clock ):
+    sub = tmp_path / 'sub'
+    sub.mkdir()
+    flat = makeWatcher( tmp_path, sidecarwait=0 )
+    deep = makeWatcher( tmp_path, sidecarwait=0, recursive=True )
+    (sub / 'e.TIF').write_bytes( b'II*\0' )
+    for x in (flat, deep):  x.poll()
+    clock.now += 3
+    assert (flat.poll(), deep.poll()) == (0, 1)
+
+
+def test_WatchStats():
+    st = watch.WatchStats()
+    for i in range( 3 ):
+        st.put()
+    st.add( 0.5 )
+    st.add( 1.5 )
+    assert (st.depth(), st.maxdepth) == (1, 3)
+    st.add( 9.0, ok=False )
+    assert (st.done, st.failed, st.depth()) == (2, 1, 0)
+    assert st.latency.count == 2
+    summary = st.summary()
+    assert "calibrated 2 images (1 failed)" in summary
+    assert "max 3" in summary and "latency mean 1000 ms, max 1500 ms" in summary
@@ -0,0 +1,91 @@
+''' tests/tiffs.py
+Part of the "Microscope Measurement Tools" tests.
+
+Builds small uncompressed TIFF files with plain Python, for the tests of the header, tile & vendor code:
+    data = tiffBytes( 40, 30, pixels, bits=16, order='>', tile=(16, 16), extra=[ (270, 2, b"unit=nm\\0") ] )
+'''
+
+import struct
+
+
+def tiffBytes( width, height, pixels, bits=8, samples=1, order='<', rowsperstrip=None, tile=None, extra=() ):
+    '''The bytes of a TIFF holding `pixels` (bytes, row by row, in the byte order `order`), in strips of `rowsperstrip` rows
+    (default: one strip) or in tiles of `tile` = (width, height) pixels.  `extra` is a list of more tags, as (tag, field type, raw value bytes).'''
+    bpp = bits // 8 * samples
+    chunks = []
+    if tile is None:
+        rows = rowsperstrip or height
+        for y in range( 0, height, rows ):
+            chunks.append(  pixels[ y * width * bpp : min(y + rows, height) * width * bpp ]  )
+    else:
+        tw, th = tile
+        for ty in range( 0, height, th ):
+            for tx in range( 0, width, tw ):
+                data = b''
+                for y in range( ty, ty + th ):
+                    row = pixels[ (y * width + tx) * bpp : (y * width + min(tx + tw, width)) * bpp ]  if y < height  else b''
+                    data += row.ljust( tw * bpp, b'\0' )     # tiles are padded to their full size
+                chunks.append( data )
+    #end if(strips or tiles)
+
+    body = b''
+    offsets = []
+    for data in chunks:
+        offsets.append( 8 + len(body) )
+        body += data
+    counts = [ len(data) for data in chunks ]
+
+    def longs( values ):
+        return struct.pack( order + '%iI' % len(values), *values )
+    def shorts( values ):
+        return struct.pack( order + '%iH' % len(values), *values )
+
+    tags = [ (256, 4, longs([width])), (257, 4, longs([height])), (258, 3, shorts([bits] * samples)), (259, 3, shorts([1])),
+             (262, 3, shorts([2 if samples == 3 else 1])), (277, 3, shorts([samples])) ]
+    if tile is None:
+        tags += [ (273, 4, longs(offsets)), (278, 4, longs([rowsperstrip or height])), (279, 4, longs(counts)) ]
+    else:
+        tags += [ (322, 3, shorts([tile[0]])), (323, 3, shorts([tile[1]])), (324, 4, longs(offsets)), (325, 4, longs(counts)) ]
+    if bits == 32:
+        tags.append(  (339, 3, shorts([3]))  )
+    tags = sorted( tags + list(extra) )
+
+    sizes = { 1:1, 2:1, 3:2, 4:4, 5:8, 7:1, 11:4, 12:8 }
+    ifdoffset = 8 + len(body)
+    ifdoffset += ifdoffset % 2
+    valueoffset = ifdoffset + 2 + 12 * len(tags) + 4
+    entries, values = b'', b''
+    for tag, fieldtype, raw in tags:
+        count = len(raw) // sizes[fieldtype]
+        if len(raw) <= 4:
+            field = raw.ljust( 4, b'\0' )
+        else:
+            field = struct.pack( order + 'I', valueoffset + len(values) )
+            values += raw + ( b'\0'  if len(raw) % 2  else b'' )
+        entries += struct.pack( order + 'HHI', tag, fieldtype, count ) + field
+    #end for(tags)
+    head = ( b'II*\0'  if order == '<'  else b'MM\0*' ) + struct.pack( order + 'I', ifdoffset )
+    return head + body + b'\0' * (ifdoffset - 8 - len(body)) + struct.pack( order + 'H', len(tags) ) + entries + struct.pack( order + 'I', 0 ) + values
+#end tiffBytes()
+
+
+
+def writeTiff( path, width, height, pixels, **kwargs ):
+    '''Write `tiffBytes()` to `path`, and return the path as a string.'''
+    f = open( str(path), 'wb' )
+    try:
+        f.write(  tiffBytes( width, height, pixels, **kwargs )  )
+    finally:
+        f.close()
+    return str( path )
+#end writeTiff()
+
+
+
+def ascii( text ):
+    '''The raw value of an ASCII tag.'''
+    return text.encode( 'latin-1' ) + b'\0'
+
+def rational( order, num, den ):
+    '''The raw value of a RATIONAL tag.'''
+    return struct.pack( order + 'II', num, den )